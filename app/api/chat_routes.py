@@ -2,7 +2,7 @@
 Chat and AI-related API routes
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query
 from typing import Optional
 from datetime import datetime
 
@@ -14,8 +14,10 @@ from db import (
     execute_sql,
     get_execution_logs,
     replay_execution_logs,
-    reset_to_initial_state
+    reset_to_initial_state,
+    refresh_forecast_results
 )
+from db.executor import db_executor, db_read
 
 # Import LLM services
 from services.llm_service import llm_service, LLMRequest
@@ -248,7 +250,10 @@ async def apply_sql_endpoint(request: SQLApplyRequest):
     """
     Applies user-approved SQL transformation with logging
     """
-    result = execute_sql(
+    # execute_sql queues its writes on the write queue itself; it only needs a
+    # worker thread to block on while they are committed
+    result = await db_executor.read(
+        execute_sql,
         request.sql_statement,
         description=request.description,
         user_id=getattr(request, 'user_id', None),
@@ -263,17 +268,21 @@ async def apply_sql_endpoint(request: SQLApplyRequest):
     )
 
 @router.post("/recalculate", response_model=ForecastResponse)
-async def recalculate_forecast():
+@db_read
+def recalculate_forecast(
+    full: bool = Query(False, description="Recompute every forecast result instead of only stale rows")
+):
     """
-    Re-runs all SQL to recalculate outputs
+    Recomputes forecast results affected by changes since the last refresh
     """
-    try:
-        # TODO: Implement full recalculation logic
-        # This would run all the forecast calculations
-        
-        return ForecastResponse(
-            status="success",
-            message="Forecast recalculated successfully"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+    # The recompute is queued on the write queue; a reader thread blocks on it
+    result = refresh_forecast_results(full=full)
+    if result["status"] == "error":
+        raise HTTPException(status_code=500, detail=result["error"])
+    
+    refresh = result["data"]
+    return ForecastResponse(
+        status="success",
+        data=refresh,
+        message=f"Forecast recalculated ({refresh['mode']}): {refresh['rows_recomputed']} rows recomputed"
+    )
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
 from db.models import ForecastResponse
+from db.executor import db_read
 
 router = APIRouter(prefix="/products", tags=["cost"])
 
 @router.get("/cost-summary", response_model=ForecastResponse)
-async def get_products_cost_summary(forecast_id: Optional[str] = Query(None)):
+@db_read
+def get_products_cost_summary(forecast_id: Optional[str] = Query(None)):
     """
     Get cost summary for all products including COGS calculation
     """
@@ -15,62 +17,32 @@ async def get_products_cost_summary(forecast_id: Optional[str] = Query(None)):
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # Get products with their BOM and routing versions
-        cursor.execute("""
-            SELECT u.unit_id, u.unit_name, u.bom_id, u.bom_version, u.router_id, u.router_version, u.base_price
+        # Revenue and quantity for every product in one grouped pass over the resolved sales (see db.scenario_overlays)
+        revenue_filter = "WHERE forecast_id = ?" if forecast_id else ""
+        cursor.execute(f"""
+            SELECT u.unit_id, u.unit_name,
+                   COALESCE(r.total_revenue, 0) as total_revenue,
+                   COALESCE(r.total_quantity, 0) as total_quantity
             FROM units u
-        """)
+            LEFT JOIN (
+                SELECT unit_id, SUM(total_revenue) as total_revenue, SUM(quantity) as total_quantity
+                FROM resolved_sales
+                {revenue_filter}
+                GROUP BY unit_id
+            ) r ON r.unit_id = u.unit_id
+            ORDER BY u.rowid
+        """, [forecast_id] if forecast_id else [])
         products = cursor.fetchall()
         
+        # Per-unit standard costs shared with every other costing endpoint
+        standard_costs = db_manager.get_unit_standard_costs(conn=conn)
+        
         cost_summaries = []
-        for product in products:
-            unit_id, unit_name, bom_id, bom_version, router_id, router_version, base_price = product
-            
-            # Calculate forecasted revenue
-            revenue_query = """
-                SELECT SUM(total_revenue) as total_revenue, SUM(quantity) as total_quantity
-                FROM sales 
-                WHERE unit_id = ?
-            """
-            params = [unit_id]
-            if forecast_id:
-                revenue_query += " AND forecast_id = ?"
-                params.append(forecast_id)
-            
-            cursor.execute(revenue_query, params)
-            revenue_data = cursor.fetchone()
-            forecasted_revenue = revenue_data[0] if revenue_data[0] else 0
-            forecasted_quantity = revenue_data[1] if revenue_data[1] else 0
-            
-            # Calculate material costs from BOM
-            material_cost = 0
-            if bom_id:
-                cursor.execute("""
-                    SELECT SUM(material_cost) as total_material_cost
-                    FROM bom 
-                    WHERE bom_id = ? AND version = ?
-                """, (bom_id, bom_version))
-                bom_data = cursor.fetchone()
-                material_cost = (bom_data[0] if bom_data[0] else 0) * forecasted_quantity
-            
-            # Calculate labor and machine costs from routing
-            labor_cost = 0
-            machine_cost = 0
-            if router_id:
-                cursor.execute("""
-                    SELECT ro.labor_minutes, ro.machine_minutes, m.machine_rate, lr.rate_amount
-                    FROM router_operations ro
-                    JOIN machines m ON ro.machine_id = m.machine_id
-                    LEFT JOIN labor_rates lr ON ro.labor_type_id = lr.rate_id
-                    WHERE ro.router_id = ?
-                    ORDER BY ro.sequence
-                """, (router_id,))
-                routing_data = cursor.fetchall()
-                
-                for route in routing_data:
-                    labor_minutes, machine_minutes, machine_rate, hourly_rate = route
-                    labor_cost += (labor_minutes / 60) * (hourly_rate if hourly_rate else 0) * forecasted_quantity
-                    machine_cost += (machine_minutes / 60) * (machine_rate if machine_rate else 0) * forecasted_quantity
+        for unit_id, unit_name, forecasted_revenue, forecasted_quantity in products:
+            unit_cost = standard_costs.get(unit_id, {})
+            material_cost = (unit_cost.get('material_cost') or 0) * forecasted_quantity
+            labor_cost = (unit_cost.get('labor_cost') or 0) * forecasted_quantity
+            machine_cost = (unit_cost.get('machine_cost') or 0) * forecasted_quantity
             
             total_cogs = material_cost + labor_cost + machine_cost
             gross_margin = forecasted_revenue - total_cogs
@@ -100,7 +72,8 @@ async def get_products_cost_summary(forecast_id: Optional[str] = Query(None)):
         raise HTTPException(status_code=500, detail=f"Error retrieving cost summary: {str(e)}")
 
 @router.get("/materials/usage", response_model=ForecastResponse)
-async def get_materials_usage(forecast_id: Optional[str] = Query(None)):
+@db_read
+def get_materials_usage(forecast_id: Optional[str] = Query(None)):
     """
     Get material usage forecast for purchasing decisions
     """
@@ -116,7 +89,7 @@ async def get_materials_usage(forecast_id: Optional[str] = Query(None)):
                    SUM(s.quantity * b.qty) as total_quantity_needed,
                    SUM(s.quantity * b.material_cost) as total_cost,
                    GROUP_CONCAT(DISTINCT u.unit_name) as products_using
-            FROM sales s
+            FROM resolved_sales s
             JOIN units u ON s.unit_id = u.unit_id
             JOIN bom b ON u.bom_id = b.bom_id AND u.bom_version = b.version
         """
@@ -154,7 +127,8 @@ async def get_materials_usage(forecast_id: Optional[str] = Query(None)):
         raise HTTPException(status_code=500, detail=f"Error retrieving material usage: {str(e)}")
 
 @router.get("/machines/utilization", response_model=ForecastResponse)
-async def get_machines_utilization(forecast_id: Optional[str] = Query(None)):
+@db_read
+def get_machines_utilization(forecast_id: Optional[str] = Query(None)):
     """
     Get machine utilization forecast and capacity analysis
     """
@@ -169,7 +143,7 @@ async def get_machines_utilization(forecast_id: Optional[str] = Query(None)):
             SELECT m.machine_id, m.machine_name, m.available_minutes_per_month, m.machine_rate,
                    SUM(s.quantity * ro.machine_minutes) as total_minutes_required,
                    SUM(s.quantity * ro.machine_minutes * m.machine_rate / 60) as total_cost
-            FROM sales s
+            FROM resolved_sales s
             JOIN units u ON s.unit_id = u.unit_id
             JOIN router_operations ro ON u.router_id = ro.router_id
             JOIN machines m ON ro.machine_id = m.machine_id
@@ -213,7 +187,8 @@ async def get_machines_utilization(forecast_id: Optional[str] = Query(None)):
         raise HTTPException(status_code=500, detail=f"Error retrieving machine utilization: {str(e)}")
 
 @router.get("/labor/utilization", response_model=ForecastResponse)
-async def get_labor_utilization(forecast_id: Optional[str] = Query(None)):
+@db_read
+def get_labor_utilization(forecast_id: Optional[str] = Query(None)):
     """
     Get labor utilization forecast and cost analysis
     """
@@ -229,7 +204,7 @@ async def get_labor_utilization(forecast_id: Optional[str] = Query(None)):
                    SUM(s.quantity * ro.labor_minutes) as total_minutes_required,
                    SUM(s.quantity * ro.labor_minutes * lr.rate_amount / 60) as total_cost,
                    GROUP_CONCAT(DISTINCT u.unit_name) as products_involved
-            FROM sales s
+            FROM resolved_sales s
             JOIN units u ON s.unit_id = u.unit_id
             JOIN router_operations ro ON u.router_id = ro.router_id
             JOIN labor_rates lr ON ro.labor_type_id = lr.rate_id
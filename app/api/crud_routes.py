@@ -3,6 +3,10 @@ from typing import Optional, Dict, Any, List
 from db import get_forecast_data, get_saved_forecast_results
 from db.models import ForecastResponse, SQLApplyRequest
 from db import execute_sql
+from db.schema_catalog import UnknownTableError
+from db.executor import db_read, db_write
+from db.bulk_sales import OPERATIONS, upsert_sales
+from db.scenario_overlays import remove_sales_of
 import uuid
 import sqlite3
 from datetime import datetime
@@ -10,28 +14,24 @@ from datetime import datetime
 router = APIRouter(prefix="/forecast", tags=["forecast"])
 
 @router.get("", response_model=ForecastResponse)
-async def get_forecast(forecast_id: Optional[str] = Query(None, description="Filter by forecast ID")):
+@db_read
+def get_forecast(forecast_id: Optional[str] = Query(None, description="Filter by forecast ID")):
     """
     Returns computed forecast state with joined data
     """
-    result = get_forecast_data()
+    # Filtered in SQL on resolved_sales, so overlays include their inherited lines
+    result = get_forecast_data(forecast_id)
     if result["status"] == "error":
         raise HTTPException(status_code=500, detail=result["error"])
     
-    # If forecast_id is provided, filter the sales data
-    if forecast_id and result["data"].get("sales_forecast"):
-        result["data"]["sales_forecast"] = [
-            sale for sale in result["data"]["sales_forecast"] 
-            if sale.get("forecast_id") == forecast_id
-        ]
-    
     return ForecastResponse(
         status="success",
         data=result["data"]
     )
 
 @router.get("/scenarios", response_model=ForecastResponse)
-async def get_forecast_scenarios():
+@db_read
+def get_forecast_scenarios():
     """
     Get all available forecast scenarios
     """
@@ -60,7 +60,8 @@ async def get_forecast_scenarios():
         raise HTTPException(status_code=500, detail=f"Error retrieving forecast scenarios: {str(e)}")
 
 @router.post("/scenario", response_model=ForecastResponse)
-async def create_forecast_scenario(scenario_data: Dict[str, Any]):
+@db_write
+def create_forecast_scenario(scenario_data: Dict[str, Any]):
     """
     Create a new forecast scenario with auto-generated FXXX ID
     """
@@ -108,99 +109,39 @@ async def create_forecast_scenario(scenario_data: Dict[str, Any]):
 async def bulk_update_forecast(bulk_data: Dict[str, Any]):
     """
     Bulk update forecast data with operations: add, subtract, replace
+
+    Lines are matched on (customer_id, unit_id, period, forecast_id) and
+    applied with one staged UPSERT (see db.bulk_sales), run as one job on
+    the write queue, group committed with other queued writes.
     """
     try:
         from db.database import db_manager
         
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
         forecasts = bulk_data.get('forecasts', [])
         operation = bulk_data.get('operation', 'replace')  # Default to replace
         
         if not forecasts:
             raise HTTPException(status_code=400, detail="No forecast data provided")
+        if operation not in OPERATIONS:
+            raise HTTPException(status_code=400, detail=f"Unknown operation '{operation}'; expected one of {', '.join(OPERATIONS)}")
         
-        updated_count = 0
-        
-        for forecast in forecasts:
-            # Check if record exists
-            cursor.execute("""
-                SELECT quantity, unit_price, total_revenue
-                FROM sales 
-                WHERE customer_id = ? AND unit_id = ? AND period = ? AND forecast_id = ?
-            """, (
-                forecast.get('customer_id'),
-                forecast.get('unit_id'),
-                forecast.get('period'),
-                forecast.get('forecast_id', 'F001')
-            ))
-            
-            existing_record = cursor.fetchone()
-            
-            if existing_record:
-                # Record exists - apply operation
-                existing_quantity, existing_price, existing_revenue = existing_record
-                new_quantity = existing_quantity
-                new_price = existing_price
-                
-                if operation == 'add':
-                    new_quantity = existing_quantity + forecast.get('quantity', 0)
-                    new_price = forecast.get('unit_price', existing_price)  # Use new price if provided
-                elif operation == 'subtract':
-                    new_quantity = max(0, existing_quantity - forecast.get('quantity', 0))
-                    new_price = existing_price  # Keep existing price
-                elif operation == 'replace':
-                    new_quantity = forecast.get('quantity', 0)
-                    new_price = forecast.get('unit_price', 0)
-                
-                new_revenue = new_quantity * new_price
-                
-                cursor.execute("""
-                    UPDATE sales SET quantity = ?, unit_price = ?, total_revenue = ?
-                    WHERE customer_id = ? AND unit_id = ? AND period = ? AND forecast_id = ?
-                """, (
-                    new_quantity,
-                    new_price,
-                    new_revenue,
-                    forecast.get('customer_id'),
-                    forecast.get('unit_id'),
-                    forecast.get('period'),
-                    forecast.get('forecast_id', 'F001')
-                ))
-            else:
-                # Record doesn't exist - insert new one
-                sale_id = str(uuid.uuid4())
-                cursor.execute("""
-                    INSERT INTO sales (sale_id, customer_id, unit_id, period, quantity, unit_price, total_revenue, forecast_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    sale_id,
-                    forecast.get('customer_id'),
-                    forecast.get('unit_id'),
-                    forecast.get('period'),
-                    forecast.get('quantity', 0),
-                    forecast.get('unit_price', 0),
-                    forecast.get('total_revenue', 0),
-                    forecast.get('forecast_id', 'F001')
-                ))
-            
-            updated_count += 1
-        
-        conn.commit()
-        db_manager.close_connection(conn)
+        result = await db_manager.write_queue.run(lambda conn: upsert_sales(conn.cursor(), forecasts, operation))
+        updated_count = result["updated_count"]
         
         return ForecastResponse(
             status="success",
-            data={"updated_count": updated_count},
+            data=result,
             message=f"Bulk updated {updated_count} forecast records using {operation} operation"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error bulk updating forecast: {str(e)}")
 
 @router.get("/results", response_model=ForecastResponse)
-async def get_saved_forecast_results_endpoint(
+@db_read
+def get_saved_forecast_results_endpoint(
     period: Optional[str] = Query(None, description="Filter by period (e.g., '2024-01')"),
     limit: Optional[int] = Query(None, description="Limit number of results")
 ):
@@ -222,7 +163,8 @@ async def get_saved_forecast_results_endpoint(
     )
 
 @router.post("/create", response_model=ForecastResponse)
-async def create_forecast_endpoint(forecast_data: Dict[str, Any]):
+@db_write
+def create_forecast_endpoint(forecast_data: Dict[str, Any]):
     """
     Create new forecast data
     """
@@ -263,10 +205,11 @@ async def create_forecast_endpoint(forecast_data: Dict[str, Any]):
             table_name = forecast_data['table']
             data = forecast_data['data']
             
-            # Get table columns
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            column_names = [col[1] for col in columns]
+            # Get table columns; also rejects unknown table names before they reach the SQL
+            try:
+                column_names = db_manager.get_table_schema(table_name, conn).columns
+            except UnknownTableError as e:
+                raise HTTPException(status_code=400, detail=str(e))
             
             # Filter data to only include valid columns
             valid_data = {k: v for k, v in data.items() if k in column_names}
@@ -306,7 +249,8 @@ async def create_forecast_endpoint(forecast_data: Dict[str, Any]):
                 pass
 
 @router.post("/update", response_model=ForecastResponse)
-async def update_forecast_endpoint(update_data: Dict[str, Any]):
+@db_write
+def update_forecast_endpoint(update_data: Dict[str, Any]):
     """
     Update existing forecast data
     """
@@ -331,14 +275,11 @@ async def update_forecast_endpoint(update_data: Dict[str, Any]):
                 raise HTTPException(status_code=400, detail=f"Invalid router_operations record_id: {record_id}. Expected format: router_id-sequence")
         
         # Get the primary key column name for the table
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = cursor.fetchall()
-        primary_key = None
-        
-        for col in columns:
-            if col[5] == 1:  # Primary key flag
-                primary_key = col[1]
-                break
+        try:
+            schema = db_manager.get_table_schema(table_name, conn)
+        except UnknownTableError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        primary_key = schema.primary_key[0] if schema.primary_key else None
         
         if not primary_key:
             # If no primary key found, use common naming conventions
@@ -362,7 +303,7 @@ async def update_forecast_endpoint(update_data: Dict[str, Any]):
                 primary_key = 'id'
         
         # Validate update columns and filter out unknown keys (be forgiving)
-        column_names = [col[1] for col in columns]
+        column_names = schema.columns
         invalid_columns = [col for col in updates.keys() if col not in column_names]
         # Only keep valid columns in the update set
         updates = {k: v for k, v in updates.items() if k in column_names}
@@ -406,6 +347,8 @@ async def update_forecast_endpoint(update_data: Dict[str, Any]):
                 raise HTTPException(status_code=400, detail="Invalid router_operations record ID format. Expected: router_id-sequence")
         else:
             # Standard single-key update
+            if not schema.has_column(primary_key):
+                raise HTTPException(status_code=400, detail=f"Cannot determine the key column of table {table_name}")
             # Build update query dynamically
             set_clause = ", ".join([f"{key} = ?" for key in updates.keys()])
             values = list(updates.values()) + [record_id]
@@ -435,7 +378,8 @@ async def update_forecast_endpoint(update_data: Dict[str, Any]):
             db_manager.close_connection(conn)
 
 @router.delete("/delete/{table_name}/{record_id}", response_model=ForecastResponse)
-async def delete_forecast_record(
+@db_write
+def delete_forecast_record(
     table_name: str,
     record_id: str,
     cascade: bool = Query(False),
@@ -452,14 +396,11 @@ async def delete_forecast_record(
         cursor = conn.cursor()
         
         # Get the primary key column name
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = cursor.fetchall()
-        primary_key = None
-        
-        for col in columns:
-            if col[5] == 1:  # Primary key flag
-                primary_key = col[1]
-                break
+        try:
+            schema = db_manager.get_table_schema(table_name, conn)
+        except UnknownTableError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        primary_key = schema.primary_key[0] if schema.primary_key else None
         
         if not primary_key:
             # If no primary key found, use common naming conventions
@@ -533,6 +474,8 @@ async def delete_forecast_record(
                 raise HTTPException(status_code=400, detail="Invalid router_operations record ID format. Expected: router_id-sequence")
         else:
             # Standard single-key deletion
+            if not schema.has_column(primary_key):
+                raise HTTPException(status_code=400, detail=f"Cannot determine the key column of table {table_name}")
             # Check if the record exists before deleting
             cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE {primary_key} = ?", (record_id,))
             count = cursor.fetchone()[0]
@@ -545,12 +488,13 @@ async def delete_forecast_record(
                 try:
                     if table_name == 'customers':
                         if forecast_id:
-                            cursor.execute("DELETE FROM sales WHERE customer_id = ? AND forecast_id = ?", (record_id, forecast_id))
+                            # An overlay tombstones the lines it inherits
+                            remove_sales_of(cursor, forecast_id, 'customer_id', record_id)
                         else:
                             cursor.execute("DELETE FROM sales WHERE customer_id = ?", (record_id,))
                     elif table_name == 'units':
                         if forecast_id:
-                            cursor.execute("DELETE FROM sales WHERE unit_id = ? AND forecast_id = ?", (record_id, forecast_id))
+                            remove_sales_of(cursor, forecast_id, 'unit_id', record_id)
                         else:
                             cursor.execute("DELETE FROM sales WHERE unit_id = ?", (record_id,))
                 except Exception:
@@ -595,7 +539,8 @@ async def delete_forecast_record(
             db_manager.close_connection(conn)
 
 @router.get("/bom_definitions", response_model=ForecastResponse)
-async def get_bom_definitions():
+@db_read
+def get_bom_definitions():
     """Get all BOM definitions for the frontend"""
     conn = None
     try:
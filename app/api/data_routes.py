@@ -2,13 +2,17 @@ from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional
 
 from db import get_table_data
+from db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from db.executor import db_executor, db_read
+from utils.streaming import STREAM_QUERY_DESCRIPTION, StreamFormat, streaming_rows_response
 
 
 router = APIRouter(prefix="/data", tags=["data"])
 
 
 @router.get("/health")
-async def data_health_check():
+@db_read
+def data_health_check():
     """Quick health check for data endpoints - returns database status"""
     try:
         from db.database import db_manager
@@ -42,7 +46,10 @@ async def data_health_check():
             "table_count": table_count,
             "total_rows": total_rows,
             "has_data": total_rows > 0,
-            "key_tables": table_status
+            "key_tables": table_status,
+            "connection_pool": db_manager.pool_stats(),
+            "db_executor": db_executor.stats(),
+            "write_queue": db_manager.write_queue.stats()
         }
         
     except Exception as e:
@@ -54,19 +61,92 @@ async def data_health_check():
 
 
 @router.get("/{table_name}")
-async def get_table_data_endpoint(
+@db_read
+def get_table_data_endpoint(
     request: Request,
     table_name: str,
     forecast_id: Optional[str] = Query(None),
     limit: Optional[int] = Query(None, ge=0),
     offset: Optional[int] = Query(None, ge=0),
+    stream: Optional[StreamFormat] = Query(None, description=STREAM_QUERY_DESCRIPTION),
+    cursor: Optional[str] = Query(None, description="Continuation token from a previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Rows per keyset page"),
+    include_total: bool = Query(False, description="Also return the total row count"),
+    sort_by: Optional[str] = Query(None, description="Column to order keyset pages by"),
 ):
-    """Get data from a specific table with optional filtering"""
+    """Get data from a specific table with optional filtering.
+
+    Passing ``page_size`` or ``cursor`` switches to keyset pagination: pages
+    are ordered by ``sort_by`` (if given) then the primary key, and
+    ``pagination.next_cursor`` fetches the following page.
+    """
     try:
         filters = dict(request.query_params)
-        filters.pop("forecast_id", None)
-        filters.pop("limit", None)
-        filters.pop("offset", None)
+        for param in ("forecast_id", "limit", "offset", "stream",
+                      "cursor", "page_size", "include_total", "sort_by"):
+            filters.pop(param, None)
+
+        if cursor is not None or page_size is not None:
+            from db.database import db_manager
+
+            try:
+                result = db_manager.get_table_page(
+                    table_name,
+                    forecast_id=forecast_id,
+                    filters=filters or None,
+                    cursor=cursor,
+                    page_size=page_size or DEFAULT_PAGE_SIZE,
+                    include_total=include_total,
+                    sort_by=sort_by,
+                )
+            except ValueError as e:
+                # Covers InvalidCursorError and unknown sort columns
+                raise HTTPException(status_code=400, detail=str(e))
+
+            return {
+                "status": result["status"],
+                "data": result["data"],
+                "columns": result["columns"],
+                "pagination": result["pagination"],
+                "metadata": {
+                    "table_name": table_name,
+                    "row_count": len(result["data"]),
+                    "has_data": len(result["data"]) > 0,
+                    "forecast_id": forecast_id,
+                    "filters_applied": bool(filters),
+                    "sort_by": sort_by
+                }
+            }
+
+        if stream:
+            from db.database import db_manager
+
+            try:
+                rows = db_manager.stream_table_data(
+                    table_name,
+                    forecast_id=forecast_id,
+                    filters=filters or None,
+                    limit=limit,
+                    offset=offset,
+                )
+            except ValueError as e:
+                # Covers UnknownTableError and unknown filter columns
+                raise HTTPException(status_code=400, detail=str(e))
+            return streaming_rows_response(
+                stream,
+                rows.batches(),
+                rows_key="data",
+                head={
+                    "columns": rows.columns,
+                    "metadata": {
+                        "table_name": table_name,
+                        "forecast_id": forecast_id,
+                        "filters_applied": bool(filters),
+                        "limit": limit,
+                        "offset": offset
+                    }
+                },
+            )
 
         result = get_table_data(
             table_name,
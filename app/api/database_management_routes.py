@@ -8,9 +8,10 @@ from fastapi.responses import JSONResponse
 from typing import Dict, Any
 import os
 import sqlite3
-import shutil
 from datetime import datetime
 from pathlib import Path
+from db.executor import db_read, db_write
+from db.templates import clone_database
 
 router = APIRouter()
 
@@ -32,49 +33,30 @@ def get_database_paths():
 
 
 @router.post("/database/reset-clean")
-async def reset_database_clean():
+@db_write
+def reset_database_clean():
     """Reset the database to a completely clean state (all tables, no data)"""
     try:
         # Import here to avoid circular imports
         from db.database import db_manager
         
         paths = get_database_paths()
-        database_path = paths['database_path']
+        database_path = db_manager.database_path
         saved_databases_dir = paths['saved_databases_dir']
         
         # Ensure directories exist
         Path(saved_databases_dir).mkdir(parents=True, exist_ok=True)
-        Path(database_path).parent.mkdir(parents=True, exist_ok=True)
-        
-        # Close all existing connections
-        db_manager.close_all_connections()
         
-        # Create backup
+        # Create backup; the backup API copies a consistent snapshot of a live database
         backup_path = None
         if os.path.exists(database_path):
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_filename = f"reset_backup_{timestamp}.db"
             backup_path = os.path.join(saved_databases_dir, backup_filename)
-            shutil.copy2(database_path, backup_path)
-        
-        # Close any remaining connections and remove database files
-        try:
-            temp_conn = sqlite3.connect(database_path, timeout=1.0)
-            temp_conn.execute("PRAGMA journal_mode=DELETE")
-            temp_conn.close()
-        except:
-            pass  # Ignore connection issues
-        
-        # Remove database files
-        for file_path in [database_path, f"{database_path}-wal", f"{database_path}-shm"]:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except:
-                    pass  # Ignore if files are locked
+            clone_database(database_path, backup_path)
         
-        # Recreate the database using the existing database manager
-        db_manager.create_tables()
+        # Swap in a copy of the empty schema template
+        db_manager.restore_template(empty=True)
         
         # Count tables to verify creation
         conn = db_manager.get_connection()
@@ -102,7 +84,8 @@ async def reset_database_clean():
 
 
 @router.post("/database/clear-data")
-async def clear_database_data():
+@db_write
+def clear_database_data():
     """Clear all data from existing tables while keeping the structure"""
     try:
         # Import here to avoid circular imports
@@ -180,7 +163,8 @@ async def clear_database_data():
 
 
 @router.post("/database/verify-empty")
-async def verify_database_empty():
+@db_write
+def verify_database_empty():
     """Verify that all tables are empty"""
     try:
         # Import here to avoid circular imports
@@ -230,7 +214,8 @@ async def verify_database_empty():
 
 
 @router.get("/database/info")
-async def get_database_info():
+@db_read
+def get_database_info():
     """Get information about the current database"""
     try:
         # Import here to avoid circular imports
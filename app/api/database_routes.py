@@ -15,9 +15,12 @@ from db import (
     switch_database,
     get_current_database_path
 )
+from db.executor import db_executor, db_read, db_write
 
 # Import utilities
+from db.bulk_loader import DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE
 from utils.data_loader import load_csv_to_table
+from utils.streaming import STREAM_QUERY_DESCRIPTION, StreamFormat, streaming_rows_response
 from utils.data_quality import get_data_quality_issues
 
 router = APIRouter(prefix="/database", tags=["Database Management"])
@@ -29,45 +32,93 @@ router = APIRouter(prefix="/database", tags=["Database Management"])
 @router.post("/load_table", response_model=ForecastResponse)
 async def load_table_endpoint(
     table_name: str = Query(..., description="Destination table name"),
-    mode: str = Query("append", description="append or replace"),
+    mode: str = Query("append", description="append, replace, or upsert (on the primary key)"),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=MAX_CHUNK_SIZE, description="Rows parsed and validated per chunk"),
     csv_file: UploadFile = File(...),
 ):
-    """Load CSV data into a database table"""
+    """Load CSV data into a database table.
+
+    The upload is streamed from its spooled file in chunks; invalid rows
+    reject the whole load with a 400 listing the offending lines.
+    """
     try:
-        csv_bytes = await csv_file.read()
-        result = load_csv_to_table(table_name, csv_bytes, if_exists=mode)
+        result = await db_executor.write(load_csv_to_table, table_name, csv_file.file, if_exists=mode, chunk_size=chunk_size)
         if result["status"] == "error":
+            if "errors" in result:
+                raise HTTPException(status_code=400, detail={"error": result["error"], "errors": result["errors"]})
             raise HTTPException(status_code=500, detail=result["error"])
         return ForecastResponse(
             status="success",
-            data={"rows_loaded": result["rows_loaded"]},
-            message=f"Loaded {result['rows_loaded']} rows into {table_name}"
+            data={
+                "rows_loaded": result["rows_loaded"],
+                "mode": result["mode"],
+                "chunks": result["chunks"],
+                "elapsed_seconds": result["elapsed_seconds"],
+                "rows_per_second": result["rows_per_second"],
+                "dropped_columns": result["dropped_columns"],
+                "skipped_indexes": result["skipped_indexes"],
+            },
+            message=f"Loaded {result['rows_loaded']} rows into {table_name} ({result['rows_per_second']} rows/s)"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/quality", response_model=ForecastResponse)
-async def data_quality_endpoint():
+@db_read
+def data_quality_endpoint():
     """Return basic data quality checks"""
     result = get_data_quality_issues()
     if result["status"] == "error":
         raise HTTPException(status_code=500, detail=result["error"])
     return ForecastResponse(status="success", data=result["data"], message="Data quality check complete")
 
+@router.get("/query-plans", response_model=ForecastResponse)
+@db_read
+def query_plan_audit_endpoint():
+    """EXPLAIN the hot route queries and flag any that fall back to a full table scan"""
+    try:
+        from db.database import db_manager
+
+        audit = db_manager.audit_query_plans()
+        message = ("No full table scans in audited queries" if audit["ok"]
+                   else f"Full table scans in: {', '.join(audit['flagged'])}")
+        return ForecastResponse(status="success", data=audit, message=message)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # =============================================================================
 # EXECUTION LOG ENDPOINTS
 # =============================================================================
 
 @router.get("/logs/execution", response_model=ForecastResponse)
-async def get_execution_logs_endpoint(
+@db_read
+def get_execution_logs_endpoint(
     limit: Optional[int] = Query(None, description="Limit number of logs"),
     user_id: Optional[str] = Query(None, description="Filter by user ID"),
     session_id: Optional[str] = Query(None, description="Filter by session ID"),
-    status: Optional[str] = Query(None, description="Filter by status (success/error)")
+    status: Optional[str] = Query(None, description="Filter by status (success/error)"),
+    stream: Optional[StreamFormat] = Query(None, description=STREAM_QUERY_DESCRIPTION)
 ):
     """
     Get execution logs with optional filtering
     """
+    if stream:
+        from db.database import db_manager
+        try:
+            rows = db_manager.stream_execution_logs(
+                limit=limit, user_id=user_id, session_id=session_id, status=status
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return streaming_rows_response(
+            stream,
+            rows.batches(),
+            rows_key="logs",
+            head={"columns": rows.columns, "summary": rows.metadata["summary"]},
+        )
+    
     result = get_execution_logs(limit=limit, user_id=user_id, session_id=session_id, status=status)
     if result["status"] == "error":
         raise HTTPException(status_code=500, detail=result["error"])
@@ -83,7 +134,8 @@ async def get_execution_logs_endpoint(
     )
 
 @router.post("/rollback/replay", response_model=ForecastResponse)
-async def replay_execution_logs_endpoint(
+@db_write
+def replay_execution_logs_endpoint(
     target_date: Optional[str] = Query(None, description="Replay up to this date (YYYY-MM-DD HH:MM:SS)"),
     max_log_id: Optional[int] = Query(None, description="Replay up to this log ID"),
     user_id: Optional[str] = Query(None, description="Filter by user ID"),
@@ -108,21 +160,28 @@ async def replay_execution_logs_endpoint(
     )
 
 @router.post("/rollback/reset", response_model=ForecastResponse)
-async def reset_database_endpoint():
+@db_read
+def reset_database_endpoint(
+    shadow: bool = Query(True, description="Rebuild in a side file and swap it in, instead of reloading in place")
+):
     """
     Reset database to initial state by reloading CSV data
     """
-    result = reset_to_initial_state()
+    # Not on the writer lane: a shadow rebuild only holds writes for the swap,
+    # and an in-place reset queues its own writes
+    result = reset_to_initial_state(shadow)
     if result["status"] == "error":
         raise HTTPException(status_code=500, detail=result["error"])
     
     return ForecastResponse(
         status="success",
-        message=result["message"]
+        message=result["message"],
+        data={"reloaded_tables": result["reloaded_tables"], **result.get("shadow", {})}
     )
 
 @router.get("/snapshot")
-async def export_snapshot():
+@db_read
+def export_snapshot():
     """
     Exports current SQLite DB file
     """
@@ -145,7 +204,8 @@ async def export_snapshot():
 # =============================================================================
 
 @router.post("/save")
-async def save_database(request: dict):
+@db_write
+def save_database(request: dict):
     """
     Save a copy of the current database to the app/data folder
     """
@@ -192,7 +252,8 @@ async def save_database(request: dict):
         raise HTTPException(status_code=500, detail=f"Failed to save database: {str(e)}")
 
 @router.post("/save-current")
-async def save_current_state():
+@db_write
+def save_current_state():
     """
     Save the current database state with an automatic timestamp (no custom name required)
     """
@@ -235,7 +296,8 @@ async def save_current_state():
         raise HTTPException(status_code=500, detail=f"Failed to save current state: {str(e)}")
 
 @router.get("/list")
-async def list_saved_databases():
+@db_read
+def list_saved_databases():
     """
     List all saved databases in the app/data folder
     """
@@ -307,7 +369,8 @@ async def list_saved_databases():
         raise HTTPException(status_code=500, detail=f"Failed to list databases: {str(e)}")
 
 @router.post("/load")
-async def load_database(request: dict):
+@db_write
+def load_database(request: dict):
     """
     Load a saved database from the app/data folder
     """
@@ -378,7 +441,8 @@ async def load_database(request: dict):
         raise HTTPException(status_code=500, detail=f"Failed to load database: {str(e)}")
 
 @router.post("/switch")
-async def switch_database_endpoint(request: dict):
+@db_write
+def switch_database_endpoint(request: dict):
     """
     Switch to a different database file without copying (alternative method)
     """
@@ -419,7 +483,8 @@ async def switch_database_endpoint(request: dict):
         raise HTTPException(status_code=500, detail=f"Failed to switch database: {str(e)}")
 
 @router.delete("/delete/{filename}")
-async def delete_saved_database(filename: str):
+@db_write
+def delete_saved_database(filename: str):
     """
     Delete a saved database file
     """
@@ -451,7 +516,8 @@ async def delete_saved_database(filename: str):
         raise HTTPException(status_code=500, detail=f"Failed to delete database: {str(e)}")
 
 @router.post("/revert-to-last-save")
-async def revert_to_last_save():
+@db_write
+def revert_to_last_save():
     """
     Revert to the most recent autosave (find the latest autosave_*.db file)
     """
@@ -523,7 +589,8 @@ async def revert_to_last_save():
         raise HTTPException(status_code=500, detail=f"Failed to revert to last save: {str(e)}")
 
 @router.get("/current")
-async def get_current_database_info():
+@db_read
+def get_current_database_info():
     """
     Get information about the currently active database
     """
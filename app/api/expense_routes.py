@@ -5,6 +5,8 @@ import uuid
 import json
 import calendar
 
+import numpy as np
+
 from db import get_forecast_data
 from db.models import (
     ExpenseCategory, ExpenseCategoryCreate,
@@ -14,6 +16,17 @@ from db.models import (
     ForecastResponse
 )
 from db.database import db_manager
+from db.expense_allocations import allocation_schedule, insert_allocations, regenerate_allocations
+from db.expense_rollup import (
+    expense_data_version,
+    expense_rollup_current,
+    month_periods,
+    refresh_expense_rollup,
+    rollup_report_query,
+)
+from db.recurrence import frequency_steps, next_occurrence, to_days
+from db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursorError, KeysetPaginator
+from db.executor import db_read, db_write
 
 router = APIRouter(prefix="/expenses", tags=["expenses"])
 
@@ -22,7 +35,8 @@ router = APIRouter(prefix="/expenses", tags=["expenses"])
 # ========================
 
 @router.get("/categories", response_model=ForecastResponse)
-async def get_expense_categories(
+@db_read
+def get_expense_categories(
     category_type: Optional[str] = Query(None, description="Filter by category type"),
     parent_category_id: Optional[str] = Query(None, description="Filter by parent category")
 ):
@@ -83,7 +97,8 @@ async def get_expense_categories(
         db_manager.close_connection(conn)
 
 @router.post("/categories", response_model=ForecastResponse)
-async def create_expense_category(category: ExpenseCategoryCreate):
+@db_write
+def create_expense_category(category: ExpenseCategoryCreate):
     """
     Create a new expense category
     """
@@ -121,20 +136,27 @@ async def create_expense_category(category: ExpenseCategoryCreate):
 # ========================
 
 @router.get("/", response_model=ForecastResponse)
-async def get_expenses(
+@db_read
+def get_expenses(
     category_id: Optional[str] = Query(None, description="Filter by category"),
     frequency: Optional[str] = Query(None, description="Filter by frequency"),
     is_active: Optional[bool] = Query(None, description="Filter by active status"),
     department: Optional[str] = Query(None, description="Filter by department"),
     vendor: Optional[str] = Query(None, description="Filter by vendor"),
-    forecast_id: Optional[str] = Query(None, description="Filter by forecast ID")
+    forecast_id: Optional[str] = Query(None, description="Filter by forecast ID"),
+    cursor: Optional[str] = Query(None, description="Continuation token from a previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Expenses per keyset page"),
+    include_total: bool = Query(False, description="Also return the total expense count")
 ):
     """
-    Get all expenses with optional filtering and category details
+    Get all expenses with optional filtering and category details.
+    
+    Passing ``page_size`` or ``cursor`` returns one keyset page ordered by
+    expense name, with ``pagination.next_cursor`` for the next one.
     """
     try:
         conn = db_manager.get_connection()
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
         
         # Query with JOIN to get category details
         query = """
@@ -177,18 +199,27 @@ async def get_expenses(
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
             
-        query += " ORDER BY e.expense_name"
+        pagination = None
+        if cursor is not None or page_size is not None:
+            paginator = KeysetPaginator(["expense_name", "expense_id"], scope="expenses")
+            try:
+                page_rows, pagination = paginator.paginate(
+                    db_cursor, query, params,
+                    cursor=cursor, page_size=page_size or DEFAULT_PAGE_SIZE, include_total=include_total
+                )
+            except InvalidCursorError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            results = [tuple(row.values()) for row in page_rows]
+        else:
+            query += " ORDER BY e.expense_name"
+            db_cursor.execute(query, params)
+            results = db_cursor.fetchall()
         
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        # Next payment of every listed expense at once: (start_date, frequency, end_date)
+        next_payment_dates = calculate_next_payments([(row[7], row[6], row[8]) for row in results])
         
         expenses = []
-        for row in results:
-            # Calculate next payment info
-            next_payment_date, next_payment_amount = calculate_next_payment(
-                row[7], row[6], row[5], row[8]  # start_date, frequency, amount, end_date
-            )
-            
+        for row, next_payment_date in zip(results, next_payment_dates):
             # Calculate annual cost
             annual_cost = calculate_annual_cost(row[5], row[6])  # amount, frequency
             
@@ -217,66 +248,50 @@ async def get_expenses(
                 created_date=row[21],
                 updated_date=row[22],
                 next_payment_date=next_payment_date,
-                next_payment_amount=next_payment_amount,
+                next_payment_amount=row[5] if next_payment_date else None,
                 total_annual_cost=annual_cost
             )
             expenses.append(expense.dict())
         
+        data = {"expenses": expenses}
+        if pagination is not None:
+            data["pagination"] = pagination
+        
         return ForecastResponse(
             status="success",
-            data=expenses,
+            data=data,
             message=f"Retrieved {len(expenses)} expenses"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve expenses: {str(e)}")
     finally:
         db_manager.close_connection(conn)
 
 @router.post("/", response_model=ForecastResponse)
-async def create_expense(expense: ExpenseCreate):
+@db_write
+def create_expense(expense: ExpenseCreate):
     """
     Create a new expense and generate allocations
     """
+    conn = None
     try:
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
         # Generate expense ID
         expense_id = f"EXP-{str(uuid.uuid4())[:8].upper()}"
         current_time = datetime.now().isoformat()
         
-        # Insert expense
-        cursor.execute("""
-            INSERT INTO expenses
-            (expense_id, expense_name, category_id, amount, frequency, start_date, end_date,
-             vendor, description, payment_method, approval_required, approved_by, approval_date,
-             expense_allocation, amortization_months, department, cost_center, is_active,
-             forecast_id, created_date, updated_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            expense_id, expense.expense_name, expense.category_id, expense.amount,
-            expense.frequency, expense.start_date, expense.end_date, expense.vendor,
-            expense.description, expense.payment_method, expense.approval_required,
-            expense.approved_by, expense.approval_date, expense.expense_allocation,
-            expense.amortization_months, expense.department, expense.cost_center,
-            expense.is_active, expense.forecast_id, current_time, current_time
-        ))
-        
         # Generate allocations
-        allocations = generate_expense_allocations(expense_id, expense)
-        
-        for allocation in allocations:
-            allocation_id = f"ALLOC-{str(uuid.uuid4())[:8].upper()}"
-            cursor.execute("""
-                INSERT INTO expense_allocations
-                (allocation_id, expense_id, period, allocated_amount, allocation_type, payment_status)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                allocation_id, expense_id, allocation['period'], allocation['amount'],
-                allocation['type'], 'pending'
-            ))
+        allocations = allocation_schedule([{**expense.dict(), "expense_id": expense_id}])
         
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            INSERT INTO expenses ({', '.join(EXPENSE_INSERT_COLUMNS)})
+            VALUES ({', '.join('?' for _ in EXPENSE_INSERT_COLUMNS)})
+        """, _expense_row(expense_id, expense, current_time))
+        insert_allocations(cursor, allocations)
         conn.commit()
         
         return ForecastResponse(
@@ -285,16 +300,104 @@ async def create_expense(expense: ExpenseCreate):
             message=f"Expense '{expense.expense_name}' created successfully"
         )
         
+    except ValueError as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        if conn:
+            conn.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create expense: {str(e)}")
     finally:
-        db_manager.close_connection(conn)
+        if conn:
+            db_manager.close_connection(conn)
+
+@router.post("/bulk", response_model=ForecastResponse)
+@db_write
+def create_expenses_bulk(expenses: List[ExpenseCreate]):
+    """
+    Create many expenses and their allocations in one transaction
+
+    Allocations are generated for all expenses at once (see db.expense_allocations)
+    and both tables are written with executemany.
+    """
+    conn = None
+    try:
+        current_time = datetime.now().isoformat()
+        expense_ids = [f"EXP-{str(uuid.uuid4())[:8].upper()}" for _ in expenses]
+        allocations = allocation_schedule(
+            {**expense.dict(), "expense_id": expense_id} for expense_id, expense in zip(expense_ids, expenses)
+        )
+        
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(f"""
+            INSERT INTO expenses ({', '.join(EXPENSE_INSERT_COLUMNS)})
+            VALUES ({', '.join('?' for _ in EXPENSE_INSERT_COLUMNS)})
+        """, [_expense_row(expense_id, expense, current_time) for expense_id, expense in zip(expense_ids, expenses)])
+        insert_allocations(cursor, allocations)
+        conn.commit()
+        
+        return ForecastResponse(
+            status="success",
+            data={"expense_ids": expense_ids, "allocations_created": len(allocations)},
+            message=f"Created {len(expenses)} expenses"
+        )
+        
+    except ValueError as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to create expenses: {str(e)}")
+    finally:
+        if conn:
+            db_manager.close_connection(conn)
+
+@router.post("/allocations/regenerate", response_model=ForecastResponse)
+@db_write
+def regenerate_expense_allocations(
+    forecast_id: str = Query(..., description="Forecast ID whose expense allocations are regenerated")
+):
+    """
+    Regenerate the allocations of every expense in a forecast scenario
+    """
+    conn = None
+    try:
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        result = regenerate_allocations(cursor, forecast_id=forecast_id)
+        conn.commit()
+        
+        return ForecastResponse(
+            status="success",
+            data=result,
+            message=f"Regenerated {result['allocations_created']} allocations for {result['expenses']} expenses"
+        )
+        
+    except ValueError as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        # Do not hand a half-applied diff back to the pool
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to regenerate expense allocations: {str(e)}")
+    finally:
+        if conn:
+            db_manager.close_connection(conn)
 
 @router.put("/{expense_id}", response_model=ForecastResponse)
-async def update_expense(expense_id: str, expense_update: ExpenseUpdate):
+@db_write
+def update_expense(expense_id: str, expense_update: ExpenseUpdate):
     """
     Update an existing expense and regenerate allocations if necessary
     """
+    conn = None
     try:
         conn = db_manager.get_connection()
         cursor = conn.cursor()
@@ -321,60 +424,37 @@ async def update_expense(expense_id: str, expense_update: ExpenseUpdate):
         
         # If critical fields changed, regenerate allocations
         critical_fields = ['amount', 'frequency', 'start_date', 'end_date', 'expense_allocation', 'amortization_months']
+        conflicts = []
         if any(field in expense_update.dict(exclude_unset=True) for field in critical_fields):
-            # Delete existing allocations
-            cursor.execute("DELETE FROM expense_allocations WHERE expense_id = ?", (expense_id,))
-            
-            # Get updated expense data
-            cursor.execute("""
-                SELECT expense_name, category_id, amount, frequency, start_date, end_date,
-                       expense_allocation, amortization_months
-                FROM expenses WHERE expense_id = ?
-            """, (expense_id,))
-            row = cursor.fetchone()
-            
-            if row:
-                # Create expense object for allocation generation
-                expense_data = ExpenseCreate(
-                    expense_name=row[0],
-                    category_id=row[1],
-                    amount=row[2],
-                    frequency=row[3],
-                    start_date=row[4],
-                    end_date=row[5],
-                    expense_allocation=row[6],
-                    amortization_months=row[7]
-                )
-                
-                # Generate new allocations
-                allocations = generate_expense_allocations(expense_id, expense_data)
-                
-                for allocation in allocations:
-                    allocation_id = f"ALLOC-{str(uuid.uuid4())[:8].upper()}"
-                    cursor.execute("""
-                        INSERT INTO expense_allocations
-                        (allocation_id, expense_id, period, allocated_amount, allocation_type, payment_status)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        allocation_id, expense_id, allocation['period'], allocation['amount'],
-                        allocation['type'], 'pending'
-                    ))
+            conflicts = regenerate_allocations(cursor, expense_ids=[expense_id])["conflicts"]
         
         conn.commit()
         
+        # Settled allocations are never rewritten; report where they no longer match the schedule
+        message = "Expense updated successfully"
+        if conflicts:
+            message += f"; {len(conflicts)} settled allocations kept as they were"
         return ForecastResponse(
             status="success",
-            data={"expense_id": expense_id},
-            message="Expense updated successfully"
+            data={"expense_id": expense_id, "allocation_conflicts": conflicts},
+            message=message
         )
         
+    except HTTPException:
+        if conn:
+            conn.rollback()
+        raise
     except Exception as e:
+        if conn:
+            conn.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update expense: {str(e)}")
     finally:
-        db_manager.close_connection(conn)
+        if conn:
+            db_manager.close_connection(conn)
 
 @router.delete("/{expense_id}", response_model=ForecastResponse)
-async def delete_expense(expense_id: str):
+@db_write
+def delete_expense(expense_id: str):
     """
     Delete an expense and its allocations
     """
@@ -409,7 +489,8 @@ async def delete_expense(expense_id: str):
 # ========================
 
 @router.get("/allocations", response_model=ForecastResponse)
-async def get_expense_allocations(
+@db_read
+def get_expense_allocations(
     expense_id: Optional[str] = Query(None, description="Filter by expense"),
     period: Optional[str] = Query(None, description="Filter by period (YYYY-MM)"),
     payment_status: Optional[str] = Query(None, description="Filter by payment status"),
@@ -491,7 +572,8 @@ async def get_expense_allocations(
 # ========================
 
 @router.get("/forecast", response_model=ForecastResponse)
-async def get_expense_forecast(
+@db_read
+def get_expense_forecast(
     start_period: str = Query(..., description="Start period (YYYY-MM)"),
     end_period: str = Query(..., description="End period (YYYY-MM)"),
     category_type: Optional[str] = Query(None, description="Filter by category type"),
@@ -560,8 +642,10 @@ async def get_expense_forecast(
         db_manager.close_connection(conn)
 
 @router.get("/report", response_model=ForecastResponse)
-async def get_expense_report(
-    forecast_id: Optional[str] = Query(None, description="Filter by forecast ID")
+@db_read
+def get_expense_report(
+    forecast_id: Optional[str] = Query(None, description="Filter by forecast ID"),
+    cached: bool = Query(False, description="Serve the last report if no expense data changed since")
 ):
     """
     Get comprehensive expense report with summary statistics
@@ -569,156 +653,109 @@ async def get_expense_report(
     try:
         conn = db_manager.get_connection()
         cursor = conn.cursor()
+        today = date.today()
+        cache_key = (forecast_id, today.isoformat())
+        version = expense_data_version(cursor)
+        if cached:
+            report = db_manager.expense_reports.get(cache_key, version)
+            if report is not None:
+                return ForecastResponse(
+                    status="success",
+                    data=report,
+                    message="Expense report generated successfully (cached)"
+                )
         
-        # Calculate totals by frequency
-        freq_query = """
-            SELECT
-                SUM(CASE WHEN frequency = 'monthly' THEN amount * 12 ELSE 0 END) as monthly_annual,
-                SUM(CASE WHEN frequency = 'quarterly' THEN amount * 4 ELSE 0 END) as quarterly_annual,
-                SUM(CASE WHEN frequency = 'annually' THEN amount ELSE 0 END) as annual_total,
-                SUM(CASE WHEN frequency = 'one_time' THEN amount ELSE 0 END) as one_time_total
-            FROM expenses WHERE is_active = 1{}
-        """.format(" AND forecast_id = ?" if forecast_id else "")
+        forecast_filter = " AND e.forecast_id = ?" if forecast_id else ""
         params: List[Any] = [forecast_id] if forecast_id else []
-        cursor.execute(freq_query, params)
-        totals = cursor.fetchone()
-        
-        # Calculate totals by category type
-        cat_query = """
-            SELECT c.category_type, SUM(
-                CASE
-                    WHEN e.frequency = 'monthly' THEN e.amount * 12
-                    WHEN e.frequency = 'quarterly' THEN e.amount * 4
-                    WHEN e.frequency = 'biannually' THEN e.amount * 2
-                    WHEN e.frequency = 'annually' THEN e.amount
-                    WHEN e.frequency = 'weekly' THEN e.amount * 52
-                    ELSE e.amount
-                END
-            ) as annual_total
-            FROM expenses e
-            JOIN expense_categories c ON e.category_id = c.category_id
-            WHERE e.is_active = 1{}
-            GROUP BY c.category_type
-        """.format(" AND e.forecast_id = ?" if forecast_id else "")
-        cursor.execute(cat_query, params)
-        category_totals = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Get upcoming payments (next 30 days)
-        today = date.today()
-        next_month = today + timedelta(days=30)
-        current_period = today.strftime("%Y-%m")
-        next_period = next_month.strftime("%Y-%m")
         
-        upcoming_query = """
-            SELECT e.expense_name, a.allocated_amount, a.period, c.category_name
-            FROM expense_allocations a
-            JOIN expenses e ON a.expense_id = e.expense_id
-            JOIN expense_categories c ON e.category_id = c.category_id
-            WHERE a.period IN (?, ?) AND a.payment_status = 'pending'{}
-            ORDER BY a.period, e.expense_name
-        """.format(" AND e.forecast_id = ?" if forecast_id else "")
-        upcoming_params: List[Any] = [current_period, next_period]
-        if forecast_id:
-            upcoming_params.append(forecast_id)
-        cursor.execute(upcoming_query, upcoming_params)
-        upcoming_payments = [
+        # Totals by frequency and annual cost, per category
+        cursor.execute(f"""
+            SELECT e.category_id, c.category_name, c.category_type,
+                SUM(CASE WHEN e.frequency = 'monthly' THEN e.amount * 12 ELSE 0 END) as monthly_annual,
+                SUM(CASE WHEN e.frequency = 'quarterly' THEN e.amount * 4 ELSE 0 END) as quarterly_annual,
+                SUM(CASE WHEN e.frequency = 'annually' THEN e.amount ELSE 0 END) as annual_total,
+                SUM(CASE WHEN e.frequency = 'one_time' THEN e.amount ELSE 0 END) as one_time_total,
+                SUM(
+                    CASE
+                        WHEN e.frequency = 'monthly' THEN e.amount * 12
+                        WHEN e.frequency = 'quarterly' THEN e.amount * 4
+                        WHEN e.frequency = 'biannually' THEN e.amount * 2
+                        WHEN e.frequency = 'annually' THEN e.amount
+                        WHEN e.frequency = 'weekly' THEN e.amount * 52
+                        ELSE e.amount
+                    END
+                ) as annualized_total,
+                COUNT(e.expense_id) as expense_count
+            FROM expenses e
+            LEFT JOIN expense_categories c ON e.category_id = c.category_id
+            WHERE e.is_active = 1{forecast_filter}
+            GROUP BY e.category_id
+        """, params)
+        category_rows = cursor.fetchall()
+        totals = [sum(row[i] or 0 for row in category_rows) for i in range(3, 7)]
+        category_totals: Dict[str, float] = {}
+        for row in category_rows:
+            if row[1] is not None:
+                category_totals[row[2]] = category_totals.get(row[2], 0) + row[7]
+        
+        # Top categories by total annual cost
+        top_categories = [
             {
-                'expense_name': row[0],
-                'amount': row[1],
-                'period': row[2],
-                'category_name': row[3]
-            } for row in cursor.fetchall()
+                'category_name': row[1],
+                'category_type': row[2],
+                'annual_total': row[7],
+                'expense_count': row[8]
+            } for row in sorted(
+                (row for row in category_rows if row[1] is not None), key=lambda row: row[7], reverse=True
+            )[:10]
         ]
         
-        # Get overdue payments
-        overdue_query = """
+        # Pending payments up to next month: overdue before this month, upcoming this and next month
+        periods = month_periods(today, 12)
+        current_period, next_period = periods[0], periods[1]
+        cursor.execute(f"""
             SELECT e.expense_name, a.allocated_amount, a.period, c.category_name
             FROM expense_allocations a
             JOIN expenses e ON a.expense_id = e.expense_id
             JOIN expense_categories c ON e.category_id = c.category_id
-            WHERE a.period < ? AND a.payment_status = 'pending'{}
+            WHERE a.period <= ? AND a.payment_status = 'pending'{forecast_filter}
             ORDER BY a.period, e.expense_name
-        """.format(" AND e.forecast_id = ?" if forecast_id else "")
-        overdue_params: List[Any] = [current_period]
-        if forecast_id:
-            overdue_params.append(forecast_id)
-        cursor.execute(overdue_query, overdue_params)
-        overdue_payments = [
-            {
+        """, [next_period] + params)
+        upcoming_payments = []
+        overdue_payments = []
+        for row in cursor.fetchall():
+            payment = {
                 'expense_name': row[0],
                 'amount': row[1],
                 'period': row[2],
                 'category_name': row[3]
-            } for row in cursor.fetchall()
-        ]
-        
-        # Get top categories by total annual cost
-        cursor.execute("""
-            SELECT c.category_name, c.category_type, SUM(
-                CASE 
-                    WHEN e.frequency = 'monthly' THEN e.amount * 12
-                    WHEN e.frequency = 'quarterly' THEN e.amount * 4
-                    WHEN e.frequency = 'biannually' THEN e.amount * 2
-                    WHEN e.frequency = 'annually' THEN e.amount
-                    WHEN e.frequency = 'weekly' THEN e.amount * 52
-                    ELSE e.amount
-                END
-            ) as annual_total,
-            COUNT(e.expense_id) as expense_count
-            FROM expenses e
-            JOIN expense_categories c ON e.category_id = c.category_id
-            WHERE e.is_active = 1
-            GROUP BY c.category_id, c.category_name, c.category_type
-            ORDER BY annual_total DESC
-            LIMIT 10
-        """)
-        top_categories = [
-            {
-                'category_name': row[0],
-                'category_type': row[1],
-                'annual_total': row[2],
-                'expense_count': row[3]
-            } for row in cursor.fetchall()
+            }
+            (overdue_payments if row[2] < current_period else upcoming_payments).append(payment)
+        
+        # Monthly forecast for the next 12 calendar months, from the monthly rollup;
+        # a stale rollup is rebuilt once on the writer, never on this read connection
+        if not expense_rollup_current(cursor):
+            db_manager.write_queue.execute(refresh_expense_rollup)
+        cursor.execute(*rollup_report_query(periods[0], periods[-1], forecast_id))
+        monthly_forecasts = [
+            ExpenseForecast(
+                period=row[0],
+                category_id=row[1],
+                category_name=row[2],
+                category_type=row[3],
+                total_scheduled=row[4],
+                total_amortized=row[5],
+                total_one_time=row[6],
+                total_amount=row[7],
+                expense_count=row[8]
+            ).dict() for row in cursor.fetchall()
         ]
         
-        # Get monthly forecast for next 12 months
-        monthly_forecasts = []
-        for i in range(12):
-            forecast_date = today + timedelta(days=30*i)
-            period = forecast_date.strftime("%Y-%m")
-            
-            cursor.execute("""
-                SELECT c.category_id, c.category_name, c.category_type,
-                       SUM(CASE WHEN a.allocation_type = 'scheduled' THEN a.allocated_amount ELSE 0 END) as total_scheduled,
-                       SUM(CASE WHEN a.allocation_type = 'amortized' THEN a.allocated_amount ELSE 0 END) as total_amortized,
-                       SUM(CASE WHEN a.allocation_type = 'one_time' THEN a.allocated_amount ELSE 0 END) as total_one_time,
-                       SUM(a.allocated_amount) as total_amount,
-                       COUNT(DISTINCT a.expense_id) as expense_count
-                FROM expense_allocations a
-                JOIN expenses e ON a.expense_id = e.expense_id
-                JOIN expense_categories c ON e.category_id = c.category_id
-                WHERE a.period = ?
-                GROUP BY c.category_id, c.category_name, c.category_type
-            """, (period,))
-            
-            for row in cursor.fetchall():
-                monthly_forecasts.append(ExpenseForecast(
-                    period=period,
-                    category_id=row[0],
-                    category_name=row[1],
-                    category_type=row[2],
-                    total_scheduled=row[3],
-                    total_amortized=row[4],
-                    total_one_time=row[5],
-                    total_amount=row[6],
-                    expense_count=row[7]
-                ).dict())
-        
         report = ExpenseReportSummary(
-            total_monthly=totals[0] or 0,
-            total_quarterly=totals[1] or 0,
-            total_annual=totals[2] or 0,
-            total_one_time=totals[3] or 0,
+            total_monthly=totals[0],
+            total_quarterly=totals[1],
+            total_annual=totals[2],
+            total_one_time=totals[3],
             factory_overhead_total=category_totals.get('factory_overhead', 0),
             admin_expense_total=category_totals.get('admin_expense', 0),
             cogs_total=category_totals.get('cogs', 0),
@@ -726,11 +763,12 @@ async def get_expense_report(
             overdue_payments=overdue_payments,
             top_categories=top_categories,
             monthly_forecast=monthly_forecasts
-        )
+        ).dict()
+        db_manager.expense_reports.put(cache_key, version, report)
         
         return ForecastResponse(
             status="success",
-            data=report.dict(),
+            data=report,
             message="Expense report generated successfully"
         )
         
@@ -743,54 +781,37 @@ async def get_expense_report(
 # Helper Functions
 # ========================
 
-def calculate_next_payment(start_date: str, frequency: str, amount: float, end_date: str = None) -> tuple:
-    """Calculate the next payment date and amount for an expense"""
+EXPENSE_INSERT_COLUMNS = (
+    'expense_id', 'expense_name', 'category_id', 'amount', 'frequency', 'start_date', 'end_date',
+    'vendor', 'description', 'payment_method', 'approval_required', 'approved_by', 'approval_date',
+    'expense_allocation', 'amortization_months', 'department', 'cost_center', 'is_active',
+    'forecast_id', 'created_date', 'updated_date'
+)
+
+def _expense_row(expense_id: str, expense: ExpenseCreate, current_time: str) -> tuple:
+    """Values of EXPENSE_INSERT_COLUMNS for a new expense"""
+    values = {**expense.dict(), "expense_id": expense_id, "created_date": current_time, "updated_date": current_time}
+    return tuple(values[column] for column in EXPENSE_INSERT_COLUMNS)
+
+def calculate_next_payments(schedules: List[tuple]) -> List[Optional[str]]:
+    """Next payment date, today or later, of (start_date, frequency, end_date) schedules.
+
+    None for a finished schedule, and for one whose dates or frequency cannot be read.
+    """
+    if not schedules:
+        return []
     try:
-        start = datetime.strptime(start_date, "%Y-%m-%d").date()
-        today = date.today()
-        
-        if end_date:
-            end = datetime.strptime(end_date, "%Y-%m-%d").date()
-            if today > end:
-                return None, None
-        
-        if frequency == 'one_time':
-            if today <= start:
-                return start_date, amount
-            else:
-                return None, None
-        
-        # Calculate next occurrence
-        current = start
-        while current <= today:
-            if frequency == 'weekly':
-                current += timedelta(weeks=1)
-            elif frequency == 'monthly':
-                if current.month == 12:
-                    current = current.replace(year=current.year + 1, month=1)
-                else:
-                    current = current.replace(month=current.month + 1)
-            elif frequency == 'quarterly':
-                month = current.month + 3
-                year = current.year
-                if month > 12:
-                    month -= 12
-                    year += 1
-                current = current.replace(year=year, month=month)
-            elif frequency == 'biannually':
-                month = current.month + 6
-                year = current.year
-                if month > 12:
-                    month -= 12
-                    year += 1
-                current = current.replace(year=year, month=month)
-            elif frequency == 'annually':
-                current = current.replace(year=current.year + 1)
-        
-        return current.strftime("%Y-%m-%d"), amount
-        
-    except Exception as e:
-        return None, None
+        starts, frequencies, ends = zip(*schedules)
+        step_months, step_days = frequency_steps(frequencies)
+        dates = next_occurrence(
+            to_days(starts), step_months, step_days, np.datetime64(date.today(), 'D'), to_days(ends)
+        )
+    except ValueError:
+        if len(schedules) == 1:
+            return [None]
+        # Isolate the unreadable schedules
+        return [next_date for schedule in schedules for next_date in calculate_next_payments([schedule])]
+    return [None if np.isnat(next_date) else str(next_date) for next_date in dates]
 
 def calculate_annual_cost(amount: float, frequency: str) -> float:
     """Calculate the annual cost of an expense based on its frequency"""
@@ -803,95 +824,3 @@ def calculate_annual_cost(amount: float, frequency: str) -> float:
         'one_time': 0  # Not annualized
     }
     return amount * multipliers.get(frequency, 0)
-
-def generate_expense_allocations(expense_id: str, expense: ExpenseCreate) -> List[Dict[str, Any]]:
-    """Generate expense allocations based on frequency and allocation method"""
-    allocations = []
-    start_date = datetime.strptime(expense.start_date, "%Y-%m-%d").date()
-    
-    if expense.end_date:
-        end_date = datetime.strptime(expense.end_date, "%Y-%m-%d").date()
-    else:
-        # Default to 2 years from start if no end date
-        end_date = start_date.replace(year=start_date.year + 2)
-    
-    if expense.frequency == 'one_time':
-        period = start_date.strftime("%Y-%m")
-        if expense.expense_allocation == 'amortized' and expense.amortization_months:
-            # Spread over multiple months
-            monthly_amount = expense.amount / expense.amortization_months
-            current_date = start_date
-            for _ in range(expense.amortization_months):
-                allocations.append({
-                    'period': current_date.strftime("%Y-%m"),
-                    'amount': monthly_amount,
-                    'type': 'amortized'
-                })
-                # Move to next month
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
-        else:
-            # All at once
-            allocations.append({
-                'period': period,
-                'amount': expense.amount,
-                'type': 'one_time'
-            })
-    else:
-        # Recurring expense
-        current_date = start_date
-        while current_date <= end_date:
-            if expense.expense_allocation == 'amortized' and expense.amortization_months:
-                # For recurring expenses, amortize each payment
-                periods_to_amortize = min(expense.amortization_months, 
-                                        (end_date.year - current_date.year) * 12 + end_date.month - current_date.month + 1)
-                monthly_amount = expense.amount / periods_to_amortize
-                
-                amortize_date = current_date
-                for _ in range(periods_to_amortize):
-                    allocations.append({
-                        'period': amortize_date.strftime("%Y-%m"),
-                        'amount': monthly_amount,
-                        'type': 'amortized'
-                    })
-                    # Move to next month for amortization
-                    if amortize_date.month == 12:
-                        amortize_date = amortize_date.replace(year=amortize_date.year + 1, month=1)
-                    else:
-                        amortize_date = amortize_date.replace(month=amortize_date.month + 1)
-            else:
-                # Immediate allocation
-                allocations.append({
-                    'period': current_date.strftime("%Y-%m"),
-                    'amount': expense.amount,
-                    'type': 'scheduled'
-                })
-            
-            # Move to next payment date
-            if expense.frequency == 'weekly':
-                current_date += timedelta(weeks=1)
-            elif expense.frequency == 'monthly':
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
-            elif expense.frequency == 'quarterly':
-                month = current_date.month + 3
-                year = current_date.year
-                if month > 12:
-                    month -= 12
-                    year += 1
-                current_date = current_date.replace(year=year, month=month)
-            elif expense.frequency == 'biannually':
-                month = current_date.month + 6
-                year = current_date.year
-                if month > 12:
-                    month -= 12
-                    year += 1
-                current_date = current_date.replace(year=year, month=month)
-            elif expense.frequency == 'annually':
-                current_date = current_date.replace(year=current_date.year + 1)
-    
-    return allocations
\ No newline at end of file
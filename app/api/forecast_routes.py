@@ -3,35 +3,46 @@ from typing import Optional, Dict, Any, List
 from db import get_forecast_data, get_saved_forecast_results
 from db.models import ForecastResponse, SQLApplyRequest
 from db import execute_sql
-import uuid
+from db.executor import db_read, db_write
+from db.scenarios import delete_scenario_rows, duplicate_scenario
+from db.scenario_overlays import (
+    create_overlay,
+    delete_overlay_state,
+    overlay_children,
+    remove_sales_lines,
+    scenario_bases,
+    scenario_revenue,
+)
+from utils.streaming import STREAM_QUERY_DESCRIPTION, StreamFormat, streaming_rows_response
 import sqlite3
-from datetime import datetime
 
 router = APIRouter(prefix="/forecast", tags=["forecast"])
 
+def _restore_foreign_keys(conn):
+    """Turn foreign keys back on for a connection that skipped them; needs no open transaction"""
+    if conn.in_transaction:
+        conn.rollback()
+    conn.execute("PRAGMA foreign_keys=ON")
+
 @router.get("", response_model=ForecastResponse)
-async def get_forecast(forecast_id: Optional[str] = Query(None, description="Filter by forecast ID")):
+@db_read
+def get_forecast(forecast_id: Optional[str] = Query(None, description="Filter by forecast ID")):
     """
     Returns computed forecast state with joined data
     """
-    result = get_forecast_data()
+    # Filtered in SQL on resolved_sales, so overlays include their inherited lines
+    result = get_forecast_data(forecast_id)
     if result["status"] == "error":
         raise HTTPException(status_code=500, detail=result["error"])
     
-    # If forecast_id is provided, filter the sales data
-    if forecast_id and result["data"].get("sales_forecast"):
-        result["data"]["sales_forecast"] = [
-            sale for sale in result["data"]["sales_forecast"] 
-            if sale.get("forecast_id") == forecast_id
-        ]
-    
     return ForecastResponse(
         status="success",
         data=result["data"]
     )
 
 @router.get("/scenarios", response_model=ForecastResponse)
-async def get_forecast_scenarios():
+@db_read
+def get_forecast_scenarios():
     """
     Get all available forecast scenarios
     """
@@ -60,7 +71,8 @@ async def get_forecast_scenarios():
         raise HTTPException(status_code=500, detail=f"Error retrieving forecast scenarios: {str(e)}")
 
 @router.post("/scenario", response_model=ForecastResponse)
-async def create_forecast_scenario(scenario_data: Dict[str, Any]):
+@db_write
+def create_forecast_scenario(scenario_data: Dict[str, Any]):
     """
     Create a new forecast scenario with auto-generated FXXX ID
     """
@@ -105,12 +117,17 @@ async def create_forecast_scenario(scenario_data: Dict[str, Any]):
         raise HTTPException(status_code=500, detail=f"Error creating forecast scenario: {str(e)}")
 
 @router.post("/scenario/{forecast_id}/duplicate", response_model=ForecastResponse)
-async def duplicate_forecast_scenario(forecast_id: str, scenario_data: Dict[str, Any] = None):
+@db_write
+def duplicate_forecast_scenario(forecast_id: str, scenario_data: Dict[str, Any] = None):
     """Duplicate an existing forecast scenario and its related data"""
-    try:
-        from db.database import db_manager
+    from db.database import db_manager
 
+    conn = None
+    try:
         conn = db_manager.get_connection()
+        # The copies reference the parents of rows already in the database,
+        # so per-row foreign key checks are skipped (see db.scenarios)
+        conn.execute("PRAGMA foreign_keys=OFF")
         cursor = conn.cursor()
 
         # Verify source scenario exists
@@ -130,91 +147,167 @@ async def duplicate_forecast_scenario(forecast_id: str, scenario_data: Dict[str,
         name = (scenario_data or {}).get('name', f"{original_name} Copy")
         description = (scenario_data or {}).get('description', original_description)
 
-        cursor.execute(
-            "INSERT INTO forecast (forecast_id, name, description) VALUES (?, ?, ?)",
-            (new_forecast_id, name, description)
-        )
-
-        # Duplicate sales
-        cursor.execute("SELECT customer_id, unit_id, period, quantity, unit_price, total_revenue FROM sales WHERE forecast_id = ?", (forecast_id,))
-        for s in cursor.fetchall():
-            cursor.execute(
-                """
-                INSERT INTO sales (sale_id, customer_id, unit_id, period, quantity, unit_price, total_revenue, forecast_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (f"SAL-{uuid.uuid4().hex[:8].upper()}", s[0], s[1], s[2], s[3], s[4], s[5], new_forecast_id)
-            )
-
-        # Duplicate expenses
-        cursor.execute("SELECT expense_name, category_id, amount, frequency, start_date, end_date, vendor, description, payment_method, approval_required, approved_by, approval_date, expense_allocation, amortization_months, department, cost_center, is_active FROM expenses WHERE forecast_id = ?", (forecast_id,))
-        for e in cursor.fetchall():
+        if scenario_bases(cursor, [forecast_id])[forecast_id] != forecast_id:
+            # An overlay holds only its changes; its duplicate is another overlay of the same base
+            summary = create_overlay(cursor, forecast_id, new_forecast_id, name, description,
+                                     db_manager.get_table_schema)
+        else:
             cursor.execute(
-                """
-                INSERT INTO expenses (expense_id, expense_name, category_id, amount, frequency, start_date, end_date, vendor, description, payment_method, approval_required, approved_by, approval_date, expense_allocation, amortization_months, department, cost_center, is_active, forecast_id, created_date, updated_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    f"EXP-{uuid.uuid4().hex[:8].upper()}", e[0], e[1], e[2], e[3], e[4], e[5], e[6], e[7], e[8], e[9], e[10], e[11], e[12], e[13], e[14], e[15], e[16], new_forecast_id, datetime.now().isoformat(), datetime.now().isoformat()
-                )
+                "INSERT INTO forecast (forecast_id, name, description) VALUES (?, ?, ?)",
+                (new_forecast_id, name, description)
             )
 
-        # Duplicate payroll
-        cursor.execute("SELECT employee_name, department, weekly_hours, hourly_rate, rate_type, labor_type, start_date, end_date, next_review_date, expected_raise, benefits_eligible, allocations FROM payroll WHERE forecast_id = ?", (forecast_id,))
-        for p in cursor.fetchall():
-            cursor.execute(
-                """
-                INSERT INTO payroll (employee_id, employee_name, department, weekly_hours, hourly_rate, rate_type, labor_type, start_date, end_date, next_review_date, expected_raise, benefits_eligible, allocations, forecast_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    f"EMP-{int(datetime.now().timestamp())}{uuid.uuid4().hex[:4]}", p[0], p[1], p[2], p[3], p[4], p[5], p[6], p[7], p[8], p[9], p[10], p[11], new_forecast_id
-                )
-            )
+            # Copy sales, expenses with their allocations, and payroll set-based
+            summary = duplicate_scenario(cursor, forecast_id, new_forecast_id, db_manager.get_table_schema)
 
         conn.commit()
-        db_manager.close_connection(conn)
 
         return ForecastResponse(
             status="success",
-            data={"forecast_id": new_forecast_id, "name": name, "description": description},
-            message=f"Forecast scenario {forecast_id} duplicated as {new_forecast_id}"
+            data={"forecast_id": new_forecast_id, "name": name, "description": description, **summary},
+            message=f"Forecast scenario {forecast_id} duplicated as {new_forecast_id} in {summary['elapsed_seconds']}s"
         )
 
     except HTTPException:
+        if conn:
+            conn.rollback()
         raise
     except Exception as e:
+        if conn:
+            conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error duplicating forecast scenario: {str(e)}")
+    finally:
+        if conn:
+            _restore_foreign_keys(conn)
+            db_manager.close_connection(conn)
+
+@router.post("/scenario/{forecast_id}/overlay", response_model=ForecastResponse)
+@db_write
+def create_overlay_scenario(forecast_id: str, scenario_data: Dict[str, Any] = None):
+    """Create a copy-on-write variant of a scenario that stores only its changes to the sales"""
+    from db.database import db_manager
+
+    conn = None
+    try:
+        conn = db_manager.get_connection()
+        # Expenses and payroll are copied as in duplicate (see db.scenarios)
+        conn.execute("PRAGMA foreign_keys=OFF")
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT name, description FROM forecast WHERE forecast_id = ?", (forecast_id,))
+        row = cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Forecast scenario not found")
+
+        original_name, original_description = row
+
+        cursor.execute("SELECT forecast_id FROM forecast WHERE forecast_id LIKE 'F%' ORDER BY forecast_id DESC LIMIT 1")
+        last_forecast = cursor.fetchone()
+        next_number = int(last_forecast[0][1:]) + 1 if last_forecast else 1
+        new_forecast_id = f"F{next_number:03d}"
+
+        name = (scenario_data or {}).get('name', f"{original_name} Variant")
+        description = (scenario_data or {}).get('description', original_description)
+
+        summary = create_overlay(cursor, forecast_id, new_forecast_id, name, description, db_manager.get_table_schema)
+
+        conn.commit()
+
+        return ForecastResponse(
+            status="success",
+            data={"forecast_id": new_forecast_id, "name": name, "description": description, **summary},
+            message=f"Overlay scenario {new_forecast_id} of {summary['parent_forecast_id']} created in {summary['elapsed_seconds']}s"
+        )
+
+    except HTTPException:
+        if conn:
+            conn.rollback()
+        raise
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error creating overlay scenario: {str(e)}")
+    finally:
+        if conn:
+            _restore_foreign_keys(conn)
+            db_manager.close_connection(conn)
+
+@router.post("/scenario/{forecast_id}/remove_lines", response_model=ForecastResponse)
+@db_write
+def remove_scenario_sales_lines(forecast_id: str, request: Dict[str, Any]):
+    """Remove sales lines (customer_id, unit_id, period) from a scenario; overlays record them as deleted"""
+    from db.database import db_manager
+
+    conn = None
+    try:
+        lines = request.get('lines', [])
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        result = remove_sales_lines(cursor, forecast_id, lines)
+        conn.commit()
+
+        return ForecastResponse(
+            status="success",
+            data=result,
+            message=f"Removed {len(lines)} sales lines from forecast scenario {forecast_id}"
+        )
+
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error removing sales lines: {str(e)}")
+    finally:
+        if conn:
+            db_manager.close_connection(conn)
 
 @router.delete("/scenario/{forecast_id}", response_model=ForecastResponse)
-async def delete_forecast_scenario(forecast_id: str):
+@db_write
+def delete_forecast_scenario(forecast_id: str):
     """Delete a forecast scenario and its related data"""
-    try:
-        from db.database import db_manager
+    from db.database import db_manager
 
+    conn = None
+    try:
         conn = db_manager.get_connection()
         cursor = conn.cursor()
 
-        # Delete related data
-        for table in ["sales", "expenses", "payroll"]:
-            cursor.execute(f"DELETE FROM {table} WHERE forecast_id = ?", (forecast_id,))
+        # Overlays read their base's rows, so a base cannot go before them
+        children = overlay_children(cursor, forecast_id)
+        if children:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Forecast scenario {forecast_id} is the base of overlays {', '.join(children)}; delete them first"
+            )
+
+        # Delete related data, including the allocations of its expenses and overlay tombstones
+        delete_scenario_rows(cursor, forecast_id)
+        delete_overlay_state(cursor, forecast_id)
 
         # Delete scenario
         cursor.execute("DELETE FROM forecast WHERE forecast_id = ?", (forecast_id,))
 
         conn.commit()
-        db_manager.close_connection(conn)
 
         return ForecastResponse(
             status="success",
             message=f"Forecast scenario {forecast_id} deleted successfully"
         )
 
+    except HTTPException:
+        if conn:
+            conn.rollback()
+        raise
     except Exception as e:
+        if conn:
+            conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error deleting forecast scenario: {str(e)}")
+    finally:
+        if conn:
+            db_manager.close_connection(conn)
 
 @router.get("/comparison", response_model=ForecastResponse)
-async def compare_forecast_scenarios(
+@db_read
+def compare_forecast_scenarios(
     forecast_ids: List[str] = Query(..., description="Forecast IDs to compare")
 ):
     """Return aggregate metrics for multiple forecast scenarios"""
@@ -226,11 +319,8 @@ async def compare_forecast_scenarios(
 
         placeholders = ",".join("?" for _ in forecast_ids)
 
-        cursor.execute(
-            f"SELECT forecast_id, SUM(total_revenue) FROM sales WHERE forecast_id IN ({placeholders}) GROUP BY forecast_id",
-            forecast_ids,
-        )
-        sales = {row[0]: row[1] or 0 for row in cursor.fetchall()}
+        # Overlays add their deltas to their base's total (see db.scenario_overlays)
+        sales = scenario_revenue(cursor, forecast_ids)
 
         cursor.execute(
             f"SELECT forecast_id, SUM(amount) FROM expenses WHERE forecast_id IN ({placeholders}) GROUP BY forecast_id",
@@ -267,13 +357,28 @@ async def compare_forecast_scenarios(
         )
 
 @router.get("/results", response_model=ForecastResponse)
-async def get_saved_forecast_results_endpoint(
+@db_read
+def get_saved_forecast_results_endpoint(
     period: Optional[str] = Query(None, description="Filter by period (e.g., '2024-01')"),
-    limit: Optional[int] = Query(None, description="Limit number of results")
+    limit: Optional[int] = Query(None, description="Limit number of results"),
+    stream: Optional[StreamFormat] = Query(None, description=STREAM_QUERY_DESCRIPTION)
 ):
     """
     Get saved forecast results from the database
     """
+    if stream:
+        from db.database import db_manager
+        try:
+            rows = db_manager.stream_saved_forecast_results(period=period, limit=limit)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return streaming_rows_response(
+            stream,
+            rows.batches(),
+            rows_key="results",
+            head={"columns": rows.columns, "summary": rows.metadata["summary"]},
+        )
+    
     result = get_saved_forecast_results(period=period, limit=limit)
     if result["status"] == "error":
         raise HTTPException(status_code=500, detail=result["error"])
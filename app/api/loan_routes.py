@@ -5,136 +5,45 @@ Provides comprehensive loan management, amortization schedule calculation, and c
 
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List
-from datetime import datetime, timedelta
 import uuid
 import math
 from decimal import Decimal, ROUND_HALF_UP
 
+import numpy as np
+
 from db.models import (
     ForecastResponse, Loan, LoanCreate, LoanUpdate, LoanPayment, LoanPaymentCreate,
     AmortizationSchedule, LoanWithDetails, LoanSummary, CashFlowProjection
 )
+from db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursorError, KeysetPaginator
+from db.executor import db_read, db_write
+from db.loan_amortization import (
+    amortization_schedule,
+    calculate_loan_payment,
+    insert_loan_payments,
+    regenerate_loan_schedules,
+)
+from db.recurrence import frequency_steps, nth_occurrence
 
 router = APIRouter(prefix="/loans", tags=["loans"])
 
-def calculate_loan_payment(principal: float, annual_rate: float, term_months: int, payment_type: str = "amortizing") -> float:
-    """Calculate monthly loan payment amount"""
-    if payment_type == "interest_only":
-        return principal * (annual_rate / 12)
-    
-    # Amortizing loan payment calculation
-    if annual_rate == 0:
-        return principal / term_months
-    
-    monthly_rate = annual_rate / 12
-    payment = principal * (monthly_rate * (1 + monthly_rate) ** term_months) / ((1 + monthly_rate) ** term_months - 1)
-    
-    return round(payment, 2)
+def payment_dates(start_date: str, payment_frequency: str, count: int) -> List[str]:
+    """Dates of the first ``count`` payments, whole payment periods after the start date.
 
-def generate_amortization_schedule(
-    loan_id: str,
-    principal: float,
-    annual_rate: float,
-    term_months: int,
-    start_date: str,
-    payment_type: str = "amortizing",
-    balloon_payment: Optional[float] = None,
-    balloon_date: Optional[str] = None,
-    payment_frequency: str = "monthly"
-) -> List[LoanPayment]:
-    """Generate complete amortization schedule for a loan"""
-    
-    payments = []
-    remaining_balance = principal
-    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-    
-    # Calculate payment frequency multiplier
-    frequency_months = {"monthly": 1, "quarterly": 3, "annually": 12}
-    freq_months = frequency_months.get(payment_frequency, 1)
-    
-    # Adjust calculations for payment frequency
-    periods_per_year = 12 / freq_months
-    period_rate = annual_rate / periods_per_year
-    total_periods = term_months // freq_months
-    
-    if payment_type == "interest_only":
-        # Interest-only payments
-        interest_payment = principal * period_rate
-        principal_payment = 0
-        
-        for payment_num in range(1, total_periods + 1):
-            payment_date = start_dt + timedelta(days=30.44 * freq_months * payment_num)  # Average month length
-            
-            # Check if this is the balloon payment date
-            is_balloon = False
-            if balloon_date and payment_date >= datetime.strptime(balloon_date, '%Y-%m-%d'):
-                principal_payment = remaining_balance
-                is_balloon = True
-            
-            payment_amount = interest_payment + principal_payment
-            remaining_balance -= principal_payment
-            
-            payment = LoanPayment(
-                payment_id=f"{loan_id}-{payment_num:03d}",
-                loan_id=loan_id,
-                payment_number=payment_num,
-                payment_date=payment_date.strftime('%Y-%m-%d'),
-                payment_amount=round(payment_amount, 2),
-                principal_payment=round(principal_payment, 2),
-                interest_payment=round(interest_payment, 2),
-                remaining_balance=round(remaining_balance, 2),
-                payment_status="scheduled"
-            )
-            payments.append(payment)
-            
-            if is_balloon:
-                break
-            
-            # Reset principal payment for next iteration
-            principal_payment = 0
-    
-    else:
-        # Amortizing loan
-        payment_amount = calculate_loan_payment(principal, annual_rate, term_months, payment_type)
-        
-        # Adjust payment for frequency
-        if payment_frequency != "monthly":
-            payment_amount = payment_amount * freq_months
-        
-        for payment_num in range(1, total_periods + 1):
-            payment_date = start_dt + timedelta(days=30.44 * freq_months * payment_num)
-            
-            interest_payment = remaining_balance * period_rate
-            principal_payment = payment_amount - interest_payment
-            
-            # Ensure we don't pay more principal than remaining balance
-            if principal_payment > remaining_balance:
-                principal_payment = remaining_balance
-                payment_amount = principal_payment + interest_payment
-            
-            remaining_balance -= principal_payment
-            
-            payment = LoanPayment(
-                payment_id=f"{loan_id}-{payment_num:03d}",
-                loan_id=loan_id,
-                payment_number=payment_num,
-                payment_date=payment_date.strftime('%Y-%m-%d'),
-                payment_amount=round(payment_amount, 2),
-                principal_payment=round(principal_payment, 2),
-                interest_payment=round(interest_payment, 2),
-                remaining_balance=round(remaining_balance, 2),
-                payment_status="scheduled"
-            )
-            payments.append(payment)
-            
-            if remaining_balance <= 0.01:  # Account for rounding
-                break
-    
-    return payments
+    Raises ValueError for a frequency without a payment period.
+    """
+    step_months, step_days = frequency_steps([payment_frequency or 'monthly'])
+    if not (step_months[0] or step_days[0]):
+        raise ValueError(f"Loan payment frequency has no payment period: {payment_frequency}")
+    dates = nth_occurrence(np.datetime64(start_date, 'D'), step_months[0], step_days[0], np.arange(1, count + 1))
+    return np.datetime_as_string(dates, unit='D').tolist()
 
 @router.post("/", response_model=ForecastResponse)
 async def create_loan(loan_data: LoanCreate):
-    """Create a new loan and generate its amortization schedule"""
+    """Create a new loan and generate its amortization schedule.
+
+    The loan and its schedule are written by one write queue job.
+    """
     try:
         from db.database import db_manager
         
@@ -149,59 +58,37 @@ async def create_loan(loan_data: LoanCreate):
             loan_data.payment_type
         )
         
-        # Calculate next payment date
-        start_date = datetime.strptime(loan_data.start_date, '%Y-%m-%d')
-        next_payment_date = start_date + timedelta(days=30)  # First payment typically 30 days after start
+        # First payment is one payment period after the start
+        next_payment_date = payment_dates(loan_data.start_date, loan_data.payment_frequency, 1)[0]
         
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        # Insert loan
-        cursor.execute("""
-            INSERT INTO loans (
-                loan_id, loan_name, lender, loan_type, principal_amount, interest_rate,
-                loan_term_months, start_date, payment_type, payment_frequency,
-                balloon_payment, balloon_date, description, collateral_description,
-                guarantor, loan_officer, account_number, is_active, current_balance,
-                next_payment_date, monthly_payment_amount
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            loan_id, loan_data.loan_name, loan_data.lender, loan_data.loan_type,
-            loan_data.principal_amount, loan_data.interest_rate, loan_data.loan_term_months,
-            loan_data.start_date, loan_data.payment_type, loan_data.payment_frequency,
-            loan_data.balloon_payment, loan_data.balloon_date, loan_data.description,
-            loan_data.collateral_description, loan_data.guarantor, loan_data.loan_officer,
-            loan_data.account_number, loan_data.is_active, loan_data.principal_amount,
-            next_payment_date.strftime('%Y-%m-%d'), monthly_payment
-        ))
-        
-        # Generate and insert amortization schedule
-        payments = generate_amortization_schedule(
-            loan_id,
-            loan_data.principal_amount,
-            loan_data.interest_rate / 100,
-            loan_data.loan_term_months,
-            loan_data.start_date,
-            loan_data.payment_type,
-            loan_data.balloon_payment,
-            loan_data.balloon_date,
-            loan_data.payment_frequency
-        )
+        # Generate amortization schedule
+        payments = amortization_schedule([{**loan_data.dict(), "loan_id": loan_id}])
         
-        for payment in payments:
+        def insert_loan(conn):
+            cursor = conn.cursor()
+            
+            # Insert loan
             cursor.execute("""
-                INSERT INTO loan_payments (
-                    payment_id, loan_id, payment_number, payment_date, payment_amount,
-                    principal_payment, interest_payment, remaining_balance, payment_status
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO loans (
+                    loan_id, loan_name, lender, loan_type, principal_amount, interest_rate,
+                    loan_term_months, start_date, payment_type, payment_frequency,
+                    balloon_payment, balloon_date, description, collateral_description,
+                    guarantor, loan_officer, account_number, is_active, current_balance,
+                    next_payment_date, monthly_payment_amount
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
-                payment.payment_id, payment.loan_id, payment.payment_number,
-                payment.payment_date, payment.payment_amount, payment.principal_payment,
-                payment.interest_payment, payment.remaining_balance, payment.payment_status
+                loan_id, loan_data.loan_name, loan_data.lender, loan_data.loan_type,
+                loan_data.principal_amount, loan_data.interest_rate, loan_data.loan_term_months,
+                loan_data.start_date, loan_data.payment_type, loan_data.payment_frequency,
+                loan_data.balloon_payment, loan_data.balloon_date, loan_data.description,
+                loan_data.collateral_description, loan_data.guarantor, loan_data.loan_officer,
+                loan_data.account_number, loan_data.is_active, loan_data.principal_amount,
+                next_payment_date, monthly_payment
             ))
+            
+            insert_loan_payments(cursor, payments)
         
-        conn.commit()
-        db_manager.close_connection(conn)
+        await db_manager.write_queue.run(insert_loan)
         
         return ForecastResponse(
             status="success",
@@ -209,23 +96,35 @@ async def create_loan(loan_data: LoanCreate):
             message=f"Loan '{loan_data.loan_name}' created successfully with {len(payments)} scheduled payments"
         )
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating loan: {str(e)}")
 
 @router.get("/", response_model=ForecastResponse)
-async def get_loans(active_only: bool = Query(True)):
-    """Get all loans with summary information"""
+@db_read
+def get_loans(
+    active_only: bool = Query(True),
+    cursor: Optional[str] = Query(None, description="Continuation token from a previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Loans per keyset page"),
+    include_total: bool = Query(False, description="Also return the total loan count")
+):
+    """Get all loans with summary information.
+
+    Passing ``page_size`` or ``cursor`` returns one keyset page, newest first,
+    with ``pagination.next_cursor`` for the next one.
+    """
     try:
         from db.database import db_manager
         
         print(f"Getting loans with active_only={active_only}")
         
         conn = db_manager.get_connection()
-        cursor = conn.cursor()
+        db_cursor = conn.cursor()
         
         # First, let's check if the loans table exists and has data
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='loans'")
-        if not cursor.fetchone():
+        db_cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='loans'")
+        if not db_cursor.fetchone():
             print("Loans table does not exist!")
             return ForecastResponse(
                 status="success",
@@ -234,8 +133,8 @@ async def get_loans(active_only: bool = Query(True)):
             )
         
         # Check if there's any data in the loans table
-        cursor.execute("SELECT COUNT(*) FROM loans")
-        loan_count = cursor.fetchone()[0]
+        db_cursor.execute("SELECT COUNT(*) FROM loans")
+        loan_count = db_cursor.fetchone()[0]
         print(f"Found {loan_count} loans in database")
         
         if loan_count == 0:
@@ -260,19 +159,28 @@ async def get_loans(active_only: bool = Query(True)):
         if active_only:
             query += " WHERE l.is_active = 1"
         
-        query += " GROUP BY l.loan_id ORDER BY l.created_date DESC"
-        
-        print(f"Executing query: {query}")
-        cursor.execute(query, params)
-        loan_rows = cursor.fetchall()
-        
-        # Get column names
-        columns = [description[0] for description in cursor.description]
-        print(f"Columns: {columns}")
+        query += " GROUP BY l.loan_id"
+        
+        pagination = None
+        if cursor is not None or page_size is not None:
+            paginator = KeysetPaginator(["created_date", "loan_id"], descending=True, scope="loans")
+            try:
+                loan_dicts, pagination = paginator.paginate(
+                    db_cursor, query, params,
+                    cursor=cursor, page_size=page_size or DEFAULT_PAGE_SIZE, include_total=include_total
+                )
+            except InvalidCursorError as e:
+                db_manager.close_connection(conn)
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            query += " ORDER BY l.created_date DESC"
+            print(f"Executing query: {query}")
+            db_cursor.execute(query, params)
+            columns = [description[0] for description in db_cursor.description]
+            loan_dicts = [dict(zip(columns, row)) for row in db_cursor.fetchall()]
         
         loans = []
-        for row in loan_rows:
-            loan_dict = dict(zip(columns, row))
+        for loan_dict in loan_dicts:
             print(f"Processing loan: {loan_dict.get('loan_id', 'Unknown')}")
             
             # Calculate payments remaining
@@ -307,7 +215,7 @@ async def get_loans(active_only: bool = Query(True)):
 
             next_payment_date_val = loan_dict.get('next_payment_date')
             if not next_payment_date_val and start_date_val:
-                next_payment_date_val = (datetime.strptime(start_date_val, '%Y-%m-%d') + timedelta(days=30)).strftime('%Y-%m-%d')
+                next_payment_date_val = payment_dates(start_date_val, normalized_payment_frequency, 1)[0]
 
             created_date_val = loan_dict.get('created_date') or start_date_val or ''
             updated_date_val = loan_dict.get('updated_date') or created_date_val
@@ -346,12 +254,17 @@ async def get_loans(active_only: bool = Query(True)):
         db_manager.close_connection(conn)
         
         print(f"Successfully retrieved {len(loans)} loans")
+        data = {"loans": loans}
+        if pagination is not None:
+            data["pagination"] = pagination
         return ForecastResponse(
             status="success",
-            data={"loans": loans},
+            data=data,
             message=f"Retrieved {len(loans)} loans"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"Error in get_loans: {str(e)}")
@@ -359,7 +272,8 @@ async def get_loans(active_only: bool = Query(True)):
         raise HTTPException(status_code=500, detail=f"Error retrieving loans: {str(e)}")
 
 @router.get("/{loan_id}/schedule", response_model=ForecastResponse)
-async def get_amortization_schedule(loan_id: str):
+@db_read
+def get_amortization_schedule(loan_id: str):
     """Get the complete amortization schedule for a loan"""
     try:
         from db.database import db_manager
@@ -431,7 +345,8 @@ async def get_amortization_schedule(loan_id: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving amortization schedule: {str(e)}")
 
 @router.get("/summary", response_model=ForecastResponse)
-async def get_loan_summary():
+@db_read
+def get_loan_summary():
     """Get comprehensive loan portfolio summary"""
     try:
         from db.database import db_manager
@@ -554,7 +469,8 @@ async def get_loan_summary():
         raise HTTPException(status_code=500, detail=f"Error retrieving loan summary: {str(e)}")
 
 @router.get("/cash-flow", response_model=ForecastResponse)
-async def get_loan_cash_flow_projection(
+@db_read
+def get_loan_cash_flow_projection(
     start_period: str = Query(..., description="Start period in YYYY-MM format"),
     end_period: str = Query(..., description="End period in YYYY-MM format")
 ):
@@ -641,8 +557,48 @@ async def get_loan_cash_flow_projection(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving cash flow projection: {str(e)}")
 
+@router.post("/schedules/regenerate", response_model=ForecastResponse)
+@db_write
+def regenerate_schedules(
+    rate_change: float = Query(0.0, description="Percentage points added to every selected loan's interest rate"),
+    dry_run: bool = Query(False, description="Only compute the new schedule totals; change nothing"),
+    include_inactive: bool = Query(False, description="Also regenerate inactive loans")
+):
+    """Regenerate the amortization schedules of all loans at once, optionally after a rate change.
+
+    With dry_run the rate change is a what-if: the totals of the new schedules
+    are returned next to those of the stored ones and nothing is written.
+    """
+    try:
+        from db.database import db_manager
+        
+        conn = db_manager.get_connection()
+        cursor = conn.cursor()
+        
+        result = regenerate_loan_schedules(
+            cursor, rate_change=rate_change, active_only=not include_inactive, persist=not dry_run
+        )
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        db_manager.close_connection(conn)
+        
+        return ForecastResponse(
+            status="success",
+            data=result,
+            message=(
+                f"{'Computed' if dry_run else 'Regenerated'} {result['payments']} payments "
+                f"for {result['loans']} loans"
+            )
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error regenerating loan schedules: {str(e)}")
+
 @router.put("/{loan_id}", response_model=ForecastResponse)
-async def update_loan(loan_id: str, loan_update: LoanUpdate):
+@db_write
+def update_loan(loan_id: str, loan_update: LoanUpdate):
     """Update loan information and regenerate amortization schedule if needed"""
     try:
         from db.database import db_manager
@@ -685,31 +641,8 @@ async def update_loan(loan_id: str, loan_update: LoanUpdate):
             # Delete old payment schedule
             cursor.execute("DELETE FROM loan_payments WHERE loan_id = ?", (loan_id,))
             
-            # Generate new schedule
-            payments = generate_amortization_schedule(
-                loan_id,
-                loan_data['principal_amount'],
-                loan_data['interest_rate'] / 100,
-                loan_data['loan_term_months'],
-                loan_data['start_date'],
-                loan_data['payment_type'],
-                loan_data['balloon_payment'],
-                loan_data['balloon_date'],
-                loan_data['payment_frequency']
-            )
-            
-            # Insert new schedule
-            for payment in payments:
-                cursor.execute("""
-                    INSERT INTO loan_payments (
-                        payment_id, loan_id, payment_number, payment_date, payment_amount,
-                        principal_payment, interest_payment, remaining_balance, payment_status
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    payment.payment_id, payment.loan_id, payment.payment_number,
-                    payment.payment_date, payment.payment_amount, payment.principal_payment,
-                    payment.interest_payment, payment.remaining_balance, payment.payment_status
-                ))
+            # Generate and insert new schedule
+            insert_loan_payments(cursor, amortization_schedule([loan_data]))
             
             # Update monthly payment amount
             monthly_payment = calculate_loan_payment(
@@ -733,7 +666,8 @@ async def update_loan(loan_id: str, loan_update: LoanUpdate):
         raise HTTPException(status_code=500, detail=f"Error updating loan: {str(e)}")
 
 @router.delete("/{loan_id}", response_model=ForecastResponse)
-async def delete_loan(loan_id: str):
+@db_write
+def delete_loan(loan_id: str):
     """Delete a loan and its payment schedule"""
     try:
         from db.database import db_manager
@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 import uuid
 import json
 
+import numpy as np
+
 from db import get_forecast_data
 from db.models import (
     Payroll, PayrollCreate, PayrollBase,
@@ -11,6 +13,9 @@ from db.models import (
     ForecastResponse
 )
 from db.database import db_manager
+from db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursorError, KeysetPaginator
+from db.executor import db_read, db_write
+from db.recurrence import FREQUENCY_STEPS, nth_occurrence, occurrences_through, to_days
 
 router = APIRouter(prefix="/payroll", tags=["payroll"])
 
@@ -19,18 +24,25 @@ router = APIRouter(prefix="/payroll", tags=["payroll"])
 # ========================
 
 @router.get("/employees", response_model=ForecastResponse)
-async def get_employees(
+@db_read
+def get_employees(
     department: Optional[str] = Query(None, description="Filter by department"),
     status: Optional[str] = Query(None, description="Filter by status (active/inactive)"),
     business_unit: Optional[str] = Query(None, description="Filter by business unit allocation"),
-    forecast_id: Optional[str] = Query(None, description="Filter by forecast ID")
+    forecast_id: Optional[str] = Query(None, description="Filter by forecast ID"),
+    cursor: Optional[str] = Query(None, description="Continuation token from a previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Employees per keyset page"),
+    include_total: bool = Query(False, description="Also return the total employee count")
 ):
     """
-    Get all employees with optional filtering
+    Get all employees with optional filtering.
+    
+    Passing ``page_size`` or ``cursor`` returns one keyset page ordered by
+    employee name, with ``pagination.next_cursor`` for the next one.
     """
     try:
         conn = db_manager.get_connection()
-        cursor = conn.cursor()
+        cursor_obj = conn.cursor()
         
         # Base query
         query = """
@@ -56,22 +68,36 @@ async def get_employees(
         if forecast_id:
             conditions.append("forecast_id = ?")
             params.append(forecast_id)
+        if business_unit:
+            # Employees with a non-zero allocation to the business unit
+            conditions.append(
+                "json_valid(allocations) AND json_type(allocations, ?) IS NOT NULL"
+                " AND IFNULL(json_extract(allocations, ?) != 0, 1)"
+            )
+            allocation_path = f'$."{business_unit}"'
+            params.extend([allocation_path, allocation_path])
         
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
-            
-        query += " ORDER BY employee_name"
         
-        cursor.execute(query, params)
-        employees = cursor.fetchall()
+        pagination = None
+        if cursor is not None or page_size is not None:
+            paginator = KeysetPaginator(["employee_name", "employee_id"], scope="payroll")
+            try:
+                rows, pagination = paginator.paginate(
+                    cursor_obj, query, params,
+                    cursor=cursor, page_size=page_size or DEFAULT_PAGE_SIZE, include_total=include_total
+                )
+            except InvalidCursorError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            query += " ORDER BY employee_name"
+            cursor_obj.execute(query, params)
+            columns = [description[0] for description in cursor_obj.description]
+            rows = [dict(zip(columns, row)) for row in cursor_obj.fetchall()]
         
-        # Convert to list of dictionaries
-        columns = [description[0] for description in cursor.description]
         employee_list = []
-        
-        for row in employees:
-            employee_dict = dict(zip(columns, row))
-            
+        for employee_dict in rows:
             # Parse allocations JSON
             if employee_dict.get('allocations'):
                 try:
@@ -88,27 +114,35 @@ async def get_employees(
             else:
                 employee_dict['status'] = 'active'
             
-            # Apply business unit filter if specified
-            if business_unit:
-                allocations = employee_dict.get('allocations', {})
-                if business_unit not in allocations or allocations[business_unit] == 0:
-                    continue
-            
             employee_list.append(employee_dict)
         
         db_manager.close_connection(conn)
         
+        data = {"employees": employee_list}
+        if pagination is not None:
+            data["pagination"] = pagination
+        
         return ForecastResponse(
             status="success",
-            data={"employees": employee_list},
+            data=data,
             message=f"Retrieved {len(employee_list)} employees"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving employees: {str(e)}")
 
+def _active_employees() -> ForecastResponse:
+    """Active employees, for endpoint bodies that are already running on a reader thread"""
+    return get_employees.__wrapped__(
+        department=None, status="active", business_unit=None, forecast_id=None,
+        cursor=None, page_size=None, include_total=False
+    )
+
 @router.get("/employees/{employee_id}", response_model=ForecastResponse)
-async def get_employee(employee_id: str):
+@db_read
+def get_employee(employee_id: str):
     """
     Get a specific employee by ID
     """
@@ -160,7 +194,8 @@ async def get_employee(employee_id: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving employee: {str(e)}")
 
 @router.post("/employees", response_model=ForecastResponse)
-async def create_employee(employee: PayrollCreate):
+@db_write
+def create_employee(employee: PayrollCreate):
     """
     Create a new employee
     """
@@ -209,7 +244,8 @@ async def create_employee(employee: PayrollCreate):
         raise HTTPException(status_code=500, detail=f"Error creating employee: {str(e)}")
 
 @router.put("/employees/{employee_id}", response_model=ForecastResponse)
-async def update_employee(employee_id: str, employee: PayrollBase):
+@db_write
+def update_employee(employee_id: str, employee: PayrollBase):
     """
     Update an existing employee
     """
@@ -255,7 +291,8 @@ async def update_employee(employee_id: str, employee: PayrollBase):
         raise HTTPException(status_code=500, detail=f"Error updating employee: {str(e)}")
 
 @router.delete("/employees/{employee_id}", response_model=ForecastResponse)
-async def delete_employee(employee_id: str):
+@db_write
+def delete_employee(employee_id: str):
     """
     Delete an employee
     """
@@ -290,7 +327,8 @@ async def delete_employee(employee_id: str):
 # ========================
 
 @router.get("/config", response_model=ForecastResponse)
-async def get_payroll_config():
+@db_read
+def get_payroll_config():
     """
     Get payroll tax and benefit configuration
     """
@@ -329,7 +367,8 @@ async def get_payroll_config():
         raise HTTPException(status_code=500, detail=f"Error retrieving payroll config: {str(e)}")
 
 @router.post("/config", response_model=ForecastResponse)
-async def update_payroll_config(config: PayrollConfigCreate):
+@db_write
+def update_payroll_config(config: PayrollConfigCreate):
     """
     Update payroll tax and benefit configuration
     """
@@ -369,7 +408,8 @@ async def update_payroll_config(config: PayrollConfigCreate):
 # ========================
 
 @router.get("/calculations/{employee_id}", response_model=ForecastResponse)
-async def calculate_employee_costs(
+@db_read
+def calculate_employee_costs(
     employee_id: str,
     pay_periods: int = Query(1, description="Number of pay periods to calculate")
 ):
@@ -378,11 +418,11 @@ async def calculate_employee_costs(
     """
     try:
         # Get employee data
-        employee_response = await get_employee(employee_id)
+        employee_response = get_employee.__wrapped__(employee_id)
         employee = employee_response.data["employee"]
         
         # Get payroll config
-        config_response = await get_payroll_config()
+        config_response = get_payroll_config.__wrapped__()
         config = config_response.data["config"]
         
         # Calculate gross pay
@@ -432,7 +472,8 @@ async def calculate_employee_costs(
 # ========================
 
 @router.get("/forecast", response_model=ForecastResponse)
-async def get_payroll_forecast(
+@db_read
+def get_payroll_forecast(
     periods: int = Query(26, description="Number of pay periods to forecast"),
     include_raises: bool = Query(True, description="Include scheduled raises in forecast"),
     forecast_id: Optional[str] = Query(None, description="Filter by forecast ID")
@@ -502,26 +543,35 @@ async def get_payroll_forecast(
         days_until_friday = (4 - today.weekday()) % 7
         if days_until_friday == 0 and today.hour >= 17:  # If it's Friday after 5 PM, go to next Friday
             days_until_friday = 7
-        next_payroll_date = today + timedelta(days=days_until_friday)
+        next_payroll_date = np.datetime64((today + timedelta(days=days_until_friday)).date(), 'D')
+        
+        # Biweekly pay dates; per employee, the number of them up to the end date and before the review
+        step_months, step_days = FREQUENCY_STEPS['biweekly']
+        payroll_dates = nth_occurrence(next_payroll_date, step_months, step_days, np.arange(periods))
+        first_paydays = np.full(len(employees), next_payroll_date)
+        end_dates = to_days([emp.get("end_date") for emp in employees])
+        active_periods = np.where(
+            np.isnat(end_dates), periods, occurrences_through(first_paydays, step_months, step_days, end_dates)
+        )
+        review_dates = to_days([emp.get("next_review_date") for emp in employees])
+        periods_before_review = np.where(
+            np.isnat(review_dates), periods,
+            occurrences_through(first_paydays, step_months, step_days, review_dates - np.timedelta64(1, 'D'))
+        )
         
         for period in range(periods):
-            payroll_date = next_payroll_date + timedelta(days=period * 14)
-            
             period_total = 0
             employee_details = []
             
-            for emp in employees:
+            for i, emp in enumerate(employees):
                 # Check if employee is still active on this date
-                if emp.get("end_date"):
-                    end_date = datetime.strptime(emp["end_date"], '%Y-%m-%d')
-                    if payroll_date.date() > end_date.date():
-                        continue
+                if period >= active_periods[i]:
+                    continue
                 
                 # Apply scheduled raises if enabled
                 adjusted_rate = emp["hourly_rate"]
                 if include_raises and emp.get("next_review_date") and emp.get("expected_raise"):
-                    review_date = datetime.strptime(emp["next_review_date"], '%Y-%m-%d')
-                    if payroll_date.date() >= review_date.date():
+                    if period >= periods_before_review[i]:
                         if emp["expected_raise"] > 1:  # Flat amount
                             adjusted_rate += emp["expected_raise"]
                         else:  # Percentage
@@ -555,7 +605,7 @@ async def get_payroll_forecast(
             
             forecast.append({
                 "period": period + 1,
-                "date": payroll_date.strftime('%Y-%m-%d'),
+                "date": str(payroll_dates[period]),
                 "total_cost": period_total,
                 "employee_count": len(employee_details),
                 "employee_details": employee_details
@@ -577,17 +627,18 @@ async def get_payroll_forecast(
 # ========================
 
 @router.get("/departments", response_model=ForecastResponse)
-async def get_department_analytics():
+@db_read
+def get_department_analytics():
     """
     Get payroll analytics by department
     """
     try:
         # Get all active employees
-        employees_response = await get_employees(status="active")
+        employees_response = _active_employees()
         employees = employees_response.data["employees"]
         
         # Get payroll config
-        config_response = await get_payroll_config()
+        config_response = get_payroll_config.__wrapped__()
         config = config_response.data["config"]
         
         # Calculate department costs
@@ -654,17 +705,18 @@ async def get_department_analytics():
 # ========================
 
 @router.get("/business-units", response_model=ForecastResponse)
-async def get_business_unit_analytics():
+@db_read
+def get_business_unit_analytics():
     """
     Get payroll analytics by business unit allocation
     """
     try:
         # Get all active employees
-        employees_response = await get_employees(status="active")
+        employees_response = _active_employees()
         employees = employees_response.data["employees"]
         
         # Get payroll config
-        config_response = await get_payroll_config()
+        config_response = get_payroll_config.__wrapped__()
         config = config_response.data["config"]
         
         # Standard business units
@@ -739,7 +791,8 @@ async def get_business_unit_analytics():
         raise HTTPException(status_code=500, detail=f"Error retrieving business unit analytics: {str(e)}")
 
 @router.put("/employees/{employee_id}/allocations", response_model=ForecastResponse)
-async def update_employee_allocations(employee_id: str, allocations: Dict[str, float]):
+@db_write
+def update_employee_allocations(employee_id: str, allocations: Dict[str, float]):
     """
     Update business unit allocations for an employee
     """
@@ -786,7 +839,8 @@ async def update_employee_allocations(employee_id: str, allocations: Dict[str, f
 # ========================
 
 @router.post("/bulk-update", response_model=ForecastResponse)
-async def bulk_update_employees(updates: List[Dict[str, Any]]):
+@db_write
+def bulk_update_employees(updates: List[Dict[str, Any]]):
     """
     Bulk update multiple employees
     """
@@ -842,16 +896,17 @@ async def bulk_update_employees(updates: List[Dict[str, Any]]):
 # ========================
 
 @router.get("/reports/summary", response_model=ForecastResponse)
-async def get_payroll_summary():
+@db_read
+def get_payroll_summary():
     """
     Get comprehensive payroll summary report
     """
     try:
         # Get various analytics
-        employees_response = await get_employees(status="active")
-        dept_response = await get_department_analytics()
-        bu_response = await get_business_unit_analytics()
-        forecast_response = await get_payroll_forecast(periods=1)
+        employees_response = _active_employees()
+        dept_response = get_department_analytics.__wrapped__()
+        bu_response = get_business_unit_analytics.__wrapped__()
+        forecast_response = get_payroll_forecast.__wrapped__(periods=1, include_raises=True, forecast_id=None)
         
         employees = employees_response.data["employees"]
         departments = dept_response.data["departments"]
@@ -2,12 +2,16 @@ from fastapi import APIRouter, HTTPException, Query
 from typing import List, Optional, Dict, Any
 from db.models import ForecastResponse
 from db import get_forecast_data
+from db.scenario_aggregation import cost_rollups, revenue_rollups, scenario_sales_frame
+from db.standard_costs import unit_costs_frame
+from db.executor import db_read
 import logging
 
 router = APIRouter(prefix="/reporting", tags=["reporting"])
 
 @router.get("/combined-forecast", response_model=ForecastResponse)
-async def get_combined_forecast_data(
+@db_read
+def get_combined_forecast_data(
     forecast_ids: List[str] = Query(..., description="List of forecast IDs to combine"),
     start_period: Optional[str] = Query(None, description="Start period (YYYY-MM)"),
     end_period: Optional[str] = Query(None, description="End period (YYYY-MM)")
@@ -38,90 +42,15 @@ async def get_combined_forecast_data(
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # Combine revenue data from multiple forecasts
-        for forecast_id in forecast_ids:
-            # Get sales data for this forecast
-            cursor.execute("""
-                SELECT unit_id, customer_id, period, quantity, unit_price, total_revenue
-                FROM sales 
-                WHERE forecast_id = ?
-                AND (? IS NULL OR period >= ?)
-                AND (? IS NULL OR period <= ?)
-            """, (forecast_id, start_period, start_period, end_period, end_period))
-            
-            sales_data = cursor.fetchall()
-            
-            for sale in sales_data:
-                unit_id, customer_id, period, quantity, unit_price, total_revenue = sale
-                
-                # Aggregate revenue
-                combined_data["revenue"]["total"] += total_revenue or 0
-                
-                # By period
-                period_key = str(period)[:7] if period else "unknown"  # Convert to YYYY-MM
-                combined_data["revenue"]["by_period"][period_key] = \
-                    combined_data["revenue"]["by_period"].get(period_key, 0) + (total_revenue or 0)
-                
-                # By product
-                combined_data["revenue"]["by_product"][unit_id] = \
-                    combined_data["revenue"]["by_product"].get(unit_id, 0) + (total_revenue or 0)
-                
-                # By customer
-                combined_data["revenue"]["by_customer"][customer_id] = \
-                    combined_data["revenue"]["by_customer"].get(customer_id, 0) + (total_revenue or 0)
+        # Aggregate every selected scenario at once, then roll revenue and
+        # standard costs up from the grouped frame
+        sales = scenario_sales_frame(cursor, forecast_ids, start_period, end_period)
+        combined_data["revenue"].update(revenue_rollups(sales))
         
-        # Get cost data for combined forecasts
-        # This would ideally call the cost calculation endpoints, but for simplicity we'll calculate here
-        for forecast_id in forecast_ids:
-            cursor.execute("""
-                SELECT u.unit_id, u.unit_name, u.bom_id, u.bom_version, u.router_id, u.router_version,
-                       SUM(s.quantity) as total_quantity
-                FROM sales s
-                JOIN units u ON s.unit_id = u.unit_id
-                WHERE s.forecast_id = ?
-                GROUP BY u.unit_id, u.unit_name, u.bom_id, u.bom_version, u.router_id, u.router_version
-            """, (forecast_id,))
-            
-            products = cursor.fetchall()
-            
-            for product in products:
-                unit_id, unit_name, bom_id, bom_version, router_id, router_version, quantity = product
-                
-                # Calculate material costs from BOM
-                if bom_id and quantity:
-                    cursor.execute("""
-                        SELECT SUM(material_cost) as total_material_cost
-                        FROM bom 
-                        WHERE bom_id = ? AND version = ?
-                    """, (bom_id, bom_version))
-                    bom_data = cursor.fetchone()
-                    material_cost = (bom_data[0] if bom_data and bom_data[0] else 0) * quantity
-                    combined_data["costs"]["materials"] += material_cost
-                
-                # Calculate labor and machine costs from routing
-                if router_id and quantity:
-                    cursor.execute("""
-                        SELECT ro.labor_minutes, ro.machine_minutes, m.machine_rate, lr.rate_amount
-                        FROM router_operations ro
-                        JOIN machines m ON ro.machine_id = m.machine_id
-                        LEFT JOIN labor_rates lr ON ro.labor_type_id = lr.rate_id
-                        WHERE ro.router_id = ?
-                    """, (router_id,))
-                    routing_data = cursor.fetchall()
-                    
-                    for route in routing_data:
-                        labor_minutes, machine_minutes, machine_rate, hourly_rate = route
-                        labor_cost = (labor_minutes / 60) * (hourly_rate if hourly_rate else 0) * quantity
-                        machine_cost = (machine_minutes / 60) * (machine_rate if machine_rate else 0) * quantity
-                        
-                        combined_data["costs"]["labor"] += labor_cost
-                        combined_data["costs"]["manufacturing"] += machine_cost
-        
-        combined_data["costs"]["total"] = (
-            combined_data["costs"]["materials"] + 
-            combined_data["costs"]["labor"] + 
-            combined_data["costs"]["manufacturing"]
-        )
+        unit_costs = unit_costs_frame(db_manager.get_unit_standard_costs(
+            sales['unit_id'].dropna().unique().tolist(), conn=conn
+        ))
+        combined_data["costs"].update(cost_rollups(sales, unit_costs))
         
         # Get payroll data (company-wide, not forecast-specific)
         cursor.execute("""
@@ -180,8 +109,8 @@ async def get_combined_forecast_data(
                        SUM(lp.payment_amount) as total_payment
                 FROM loan_payments lp
                 JOIN loans l ON lp.loan_id = l.loan_id
-                WHERE strftime('%Y-%m', lp.payment_date) >= ? 
-                  AND strftime('%Y-%m', lp.payment_date) <= ?
+                WHERE lp.payment_date >= ? || '-01'
+                  AND lp.payment_date < date(? || '-01', '+1 month')
                   AND l.is_active = 1
                 GROUP BY strftime('%Y-%m', lp.payment_date)
             """, (start_period, end_period))
@@ -211,7 +140,8 @@ async def get_combined_forecast_data(
         raise HTTPException(status_code=500, detail=f"Error combining forecast data: {str(e)}")
 
 @router.get("/financial-statements", response_model=ForecastResponse)
-async def generate_financial_statements(
+@db_read
+def generate_financial_statements(
     forecast_ids: List[str] = Query(..., description="List of forecast IDs"),
     start_period: str = Query(..., description="Start period (YYYY-MM)"),
     end_period: str = Query(..., description="End period (YYYY-MM)")
@@ -221,7 +151,7 @@ async def generate_financial_statements(
     """
     try:
         # Get combined data
-        combined_response = await get_combined_forecast_data(forecast_ids, start_period, end_period)
+        combined_response = get_combined_forecast_data.__wrapped__(forecast_ids, start_period, end_period)
         combined_data = combined_response.data
         
         # Calculate financial statements
@@ -5,175 +5,147 @@ import json
 
 from db.database import db_manager
 from db.models import ForecastResponse
+from db.executor import db_read
+from db.scenario_overlays import sales_forecast_query
+from utils.streaming import STREAM_QUERY_DESCRIPTION, StreamFormat, streaming_rows_response
 
 router = APIRouter(prefix="/source-data", tags=["source-data"])
 
+def _cost_forecast_sale(sale: Dict[str, Any], unit_costs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Extend a sale with its standard COGS and margins"""
+    quantity = sale['quantity'] or 0
+    unit_cost_data = unit_costs.get(sale['unit_id'], {})
+    
+    # Material cost
+    material_cost_per_unit = unit_cost_data.get('material_cost') or 0.0
+    total_material_cost = material_cost_per_unit * quantity
+    
+    # Labor and machine costs
+    labor_cost_per_unit = unit_cost_data.get('labor_cost') or 0.0
+    machine_cost_per_unit = unit_cost_data.get('machine_cost') or 0.0
+    total_labor_cost = labor_cost_per_unit * quantity
+    total_machine_cost = machine_cost_per_unit * quantity
+    
+    # Total costs
+    total_cogs = total_material_cost + total_labor_cost + total_machine_cost
+    
+    # Margins
+    total_revenue = sale['total_revenue'] or 0.0
+    gross_profit = total_revenue - total_cogs
+    margin_percentage = (gross_profit / total_revenue * 100) if total_revenue > 0 else 0
+    
+    return {
+        **sale,  # Include all original sale data
+        'material_cost': total_material_cost,
+        'labor_cost': total_labor_cost,
+        'machine_cost': total_machine_cost,
+        'total_cogs': total_cogs,
+        'gross_profit': gross_profit,
+        'margin_percentage': margin_percentage,
+        'material_cost_per_unit': material_cost_per_unit,
+        'labor_cost_per_unit': labor_cost_per_unit,
+        'machine_cost_per_unit': machine_cost_per_unit
+    }
+
+
+def _sales_forecast_summary(total_revenue: float, total_cogs: float, record_count: int) -> Dict[str, Any]:
+    total_gross_profit = total_revenue - total_cogs
+    overall_margin = (total_gross_profit / total_revenue * 100) if total_revenue > 0 else 0
+    return {
+        "total_revenue": total_revenue,
+        "total_cogs": total_cogs,
+        "total_gross_profit": total_gross_profit,
+        "overall_margin_percentage": overall_margin,
+        "record_count": record_count
+    }
+
+
+def _stream_sales_forecast(
+    stream: StreamFormat,
+    forecast_id: Optional[str],
+    start_period: Optional[str],
+    end_period: Optional[str],
+):
+    """Cost and emit sales one cursor batch at a time, totalling the summary as rows go out"""
+    unit_costs = db_manager.get_unit_standard_costs()
+    query, params = sales_forecast_query(forecast_id, start_period, end_period)
+    rows = db_manager.stream_query(query, params)
+    totals = {"total_revenue": 0.0, "total_cogs": 0.0, "record_count": 0}
+
+    def costed_batches():
+        for batch in rows.batches():
+            costed = [_cost_forecast_sale(sale, unit_costs) for sale in batch]
+            totals["total_revenue"] += sum(f['total_revenue'] or 0 for f in costed)
+            totals["total_cogs"] += sum(f['total_cogs'] or 0 for f in costed)
+            totals["record_count"] += len(costed)
+            yield costed
+
+    return streaming_rows_response(
+        stream,
+        costed_batches(),
+        rows_key="sales_forecast",
+        head={
+            "metadata": {
+                "forecast_id": forecast_id,
+                "start_period": start_period,
+                "end_period": end_period,
+                "generated_at": datetime.now().isoformat(),
+                "source": "calculated_from_source_tables"
+            }
+        },
+        tail=lambda: {"summary": _sales_forecast_summary(
+            totals["total_revenue"], totals["total_cogs"], totals["record_count"]
+        )},
+    )
+
+
 @router.get("/sales-forecast", response_model=ForecastResponse)
-async def get_sales_forecast_from_source(
+@db_read
+def get_sales_forecast_from_source(
     forecast_id: Optional[str] = Query(None, description="Forecast ID to filter sales data"),
     start_period: Optional[str] = Query(None, description="Start period (YYYY-MM)"),
-    end_period: Optional[str] = Query(None, description="End period (YYYY-MM)")
+    end_period: Optional[str] = Query(None, description="End period (YYYY-MM)"),
+    stream: Optional[StreamFormat] = Query(None, description=STREAM_QUERY_DESCRIPTION)
 ):
     """
     Get sales forecast data directly from source tables (sales, customers, units)
     and calculate COGS from BOM, routing, and labor data
     """
     try:
+        if stream:
+            return _stream_sales_forecast(stream, forecast_id, start_period, end_period)
+        
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # Build query with optional period and forecast filtering
-        query = """
-            SELECT s.sale_id, s.customer_id, s.unit_id, s.period, s.quantity,
-                   s.unit_price, s.total_revenue, s.forecast_id,
-                   c.customer_name, c.customer_type, c.region,
-                   u.unit_name, u.unit_description, u.base_price, u.bom_id, u.router_id
-            FROM sales s
-            LEFT JOIN customers c ON s.customer_id = c.customer_id
-            LEFT JOIN units u ON s.unit_id = u.unit_id
-        """
-
-        conditions: List[str] = []
-        params: List[Any] = []
-
-        if forecast_id:
-            conditions.append("s.forecast_id = ?")
-            params.append(forecast_id)
-        if start_period:
-            conditions.append("s.period >= ?")
-            params.append(start_period)
-        if end_period:
-            conditions.append("s.period <= ?")
-            params.append(end_period)
-
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-
-        query += " ORDER BY s.period, s.customer_id, s.unit_id"
-        
+        query, params = sales_forecast_query(forecast_id, start_period, end_period)
         cursor.execute(query, params)
         sales_rows = cursor.fetchall()
         
         columns = [description[0] for description in cursor.description]
         sales_data = [dict(zip(columns, row)) for row in sales_rows]
         
-        # Get BOM costs for all units in this forecast
+        # Standard costs for every unit in this forecast, shared with the other costing endpoints
         unit_ids = list(set(sale['unit_id'] for sale in sales_data if sale['unit_id']))
-        bom_costs = {}
-        
-        if unit_ids:
-            # Get BOM costs
-            placeholders = ','.join(['?' for _ in unit_ids])
-            cursor.execute(f"""
-                SELECT u.unit_id, u.bom_id, SUM(b.material_cost) as total_material_cost
-                FROM units u
-                LEFT JOIN bom b ON u.bom_id = b.bom_id
-                WHERE u.unit_id IN ({placeholders})
-                GROUP BY u.unit_id, u.bom_id
-            """, unit_ids)
-            
-            for row in cursor.fetchall():
-                bom_costs[row[0]] = row[2] or 0.0
-        
-        # Get labor rates for calculations
-        cursor.execute("SELECT rate_id, rate_amount FROM labor_rates")
-        labor_rates = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Get average labor rate from payroll or use default
-        cursor.execute("SELECT AVG(hourly_rate) FROM payroll WHERE hourly_rate > 0")
-        avg_labor_rate_result = cursor.fetchone()
-        avg_labor_rate = avg_labor_rate_result[0] if avg_labor_rate_result[0] else 35.0
-        
-        # Get router operations with machine costs
-        if unit_ids:
-            cursor.execute(f"""
-                SELECT u.unit_id, ro.machine_minutes, ro.labor_minutes, 
-                       m.machine_rate, ro.labor_type_id
-                FROM units u
-                LEFT JOIN router_operations ro ON u.router_id = ro.router_id
-                LEFT JOIN machines m ON ro.machine_id = m.machine_id
-                WHERE u.unit_id IN ({placeholders})
-                ORDER BY u.unit_id, ro.sequence
-            """, unit_ids)
-            
-            router_data = cursor.fetchall()
-            
-            # Calculate costs per unit
-            unit_costs = {}
-            for row in router_data:
-                unit_id = row[0]
-                machine_minutes = row[1] or 0.0
-                labor_minutes = row[2] or 0.0
-                machine_rate = row[3] or 0.0
-                labor_type_id = row[4]
-                
-                if unit_id not in unit_costs:
-                    unit_costs[unit_id] = {'machine_cost': 0.0, 'labor_cost': 0.0}
-                
-                # Machine cost (rate per hour * minutes / 60)
-                unit_costs[unit_id]['machine_cost'] += (machine_rate * machine_minutes / 60.0)
-                
-                # Labor cost (use specific rate or average)
-                labor_rate = labor_rates.get(labor_type_id, avg_labor_rate)
-                unit_costs[unit_id]['labor_cost'] += (labor_rate * labor_minutes / 60.0)
+        unit_costs = db_manager.get_unit_standard_costs(unit_ids, conn=conn) if unit_ids else {}
         
         # Calculate full forecast with costs
-        forecast_data = []
-        for sale in sales_data:
-            unit_id = sale['unit_id']
-            quantity = sale['quantity'] or 0
-            
-            # Material cost
-            material_cost_per_unit = bom_costs.get(unit_id, 0.0)
-            total_material_cost = material_cost_per_unit * quantity
-            
-            # Labor and machine costs
-            unit_cost_data = unit_costs.get(unit_id, {'machine_cost': 0.0, 'labor_cost': 0.0})
-            total_labor_cost = unit_cost_data['labor_cost'] * quantity
-            total_machine_cost = unit_cost_data['machine_cost'] * quantity
-            
-            # Total costs
-            total_cogs = total_material_cost + total_labor_cost + total_machine_cost
-            
-            # Margins
-            total_revenue = sale['total_revenue'] or 0.0
-            gross_profit = total_revenue - total_cogs
-            margin_percentage = (gross_profit / total_revenue * 100) if total_revenue > 0 else 0
-            
-            forecast_record = {
-                **sale,  # Include all original sale data
-                'material_cost': total_material_cost,
-                'labor_cost': total_labor_cost,
-                'machine_cost': total_machine_cost,
-                'total_cogs': total_cogs,
-                'gross_profit': gross_profit,
-                'margin_percentage': margin_percentage,
-                'material_cost_per_unit': material_cost_per_unit,
-                'labor_cost_per_unit': unit_cost_data['labor_cost'],
-                'machine_cost_per_unit': unit_cost_data['machine_cost']
-            }
-            
-            forecast_data.append(forecast_record)
+        forecast_data = [_cost_forecast_sale(sale, unit_costs) for sale in sales_data]
         
         db_manager.close_connection(conn)
         
         # Calculate summary statistics
-        total_revenue = sum(f['total_revenue'] or 0 for f in forecast_data)
-        total_cogs = sum(f['total_cogs'] or 0 for f in forecast_data)
-        total_gross_profit = total_revenue - total_cogs
-        overall_margin = (total_gross_profit / total_revenue * 100) if total_revenue > 0 else 0
+        summary = _sales_forecast_summary(
+            sum(f['total_revenue'] or 0 for f in forecast_data),
+            sum(f['total_cogs'] or 0 for f in forecast_data),
+            len(forecast_data),
+        )
         
         return ForecastResponse(
             status="success",
             data={
                 "sales_forecast": forecast_data,
-                "summary": {
-                    "total_revenue": total_revenue,
-                    "total_cogs": total_cogs,
-                    "total_gross_profit": total_gross_profit,
-                    "overall_margin_percentage": overall_margin,
-                    "record_count": len(forecast_data)
-                },
+                "summary": summary,
                 "metadata": {
                     "forecast_id": forecast_id,
                     "start_period": start_period,
@@ -189,7 +161,8 @@ async def get_sales_forecast_from_source(
         raise HTTPException(status_code=500, detail=f"Failed to generate sales forecast from source: {str(e)}")
 
 @router.get("/cost-breakdown", response_model=ForecastResponse)
-async def get_cost_breakdown_from_source(
+@db_read
+def get_cost_breakdown_from_source(
     forecast_id: Optional[str] = Query(None, description="Forecast ID to analyze costs"),
     unit_id: Optional[str] = Query(None, description="Specific unit ID to analyze")
 ):
@@ -203,7 +176,7 @@ async def get_cost_breakdown_from_source(
         # Get units for this forecast
         query = """
             SELECT DISTINCT u.unit_id, u.unit_name, u.bom_id, u.router_id, u.base_price
-            FROM sales s
+            FROM resolved_sales s
             JOIN units u ON s.unit_id = u.unit_id
         """
 
@@ -338,7 +311,8 @@ async def get_cost_breakdown_from_source(
         raise HTTPException(status_code=500, detail=f"Failed to generate cost breakdown: {str(e)}")
 
 @router.get("/revenue-summary", response_model=ForecastResponse)
-async def get_revenue_summary_from_source(
+@db_read
+def get_revenue_summary_from_source(
     forecast_id: Optional[str] = Query(None, description="Forecast ID to summarize"),
     group_by: str = Query("period", description="Group by: period, customer, unit, or customer_unit")
 ):
@@ -362,7 +336,7 @@ async def get_revenue_summary_from_source(
                        SUM(s.total_revenue) as total_revenue,
                        COUNT(DISTINCT s.customer_id) as customer_count,
                        COUNT(DISTINCT s.unit_id) as product_count
-                FROM sales s
+                FROM resolved_sales s
                 {forecast_filter}
                 GROUP BY s.period
                 ORDER BY s.period
@@ -374,7 +348,7 @@ async def get_revenue_summary_from_source(
                        SUM(s.total_revenue) as total_revenue,
                        COUNT(DISTINCT s.period) as periods_active,
                        COUNT(DISTINCT s.unit_id) as products_ordered
-                FROM sales s
+                FROM resolved_sales s
                 LEFT JOIN customers c ON s.customer_id = c.customer_id
                 {forecast_filter}
                 GROUP BY s.customer_id, c.customer_name, c.customer_type
@@ -388,7 +362,7 @@ async def get_revenue_summary_from_source(
                        AVG(s.unit_price) as avg_unit_price,
                        COUNT(DISTINCT s.customer_id) as customer_count,
                        COUNT(DISTINCT s.period) as periods_active
-                FROM sales s
+                FROM resolved_sales s
                 LEFT JOIN units u ON s.unit_id = u.unit_id
                 {forecast_filter}
                 GROUP BY s.unit_id, u.unit_name, u.unit_type
@@ -401,7 +375,7 @@ async def get_revenue_summary_from_source(
                        SUM(s.total_revenue) as total_revenue,
                        AVG(s.unit_price) as avg_unit_price,
                        COUNT(DISTINCT s.period) as periods_active
-                FROM sales s
+                FROM resolved_sales s
                 LEFT JOIN customers c ON s.customer_id = c.customer_id
                 LEFT JOIN units u ON s.unit_id = u.unit_id
                 {forecast_filter}
@@ -425,7 +399,7 @@ async def get_revenue_summary_from_source(
                    COUNT(DISTINCT customer_id) as unique_customers,
                    COUNT(DISTINCT unit_id) as unique_products,
                    COUNT(DISTINCT period) as periods_covered
-            FROM sales
+            FROM resolved_sales
             { 'WHERE forecast_id = ?' if forecast_id else '' }
         """
 
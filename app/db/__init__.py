@@ -3,7 +3,10 @@
 from .database import (
     initialize_database,
     get_table_data,
+    get_table_schema,
     get_forecast_data,
+    refresh_forecast_results,
+    get_unit_standard_costs,
     get_saved_forecast_results,
     execute_sql,
     get_execution_logs,
@@ -42,7 +45,10 @@ __all__ = [
     # Database functions
     'initialize_database',
     'get_table_data', 
+    'get_table_schema',
     'get_forecast_data',
+    'refresh_forecast_results',
+    'get_unit_standard_costs',
     'get_saved_forecast_results',
     'execute_sql',
     'get_execution_logs',
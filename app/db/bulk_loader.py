@@ -0,0 +1,379 @@
+"""
+Streaming, transactional CSV bulk loader.
+
+``bulk_load`` parses a CSV in chunks of ``chunk_size`` rows, so memory stays
+bounded by one chunk whatever the size of the file. Every chunk is coerced
+to the table's declared column types and validated (numeric and boolean
+values, NOT NULL columns, foreign keys against the parent tables) before it
+is written with ``executemany``. The whole load is a single transaction: a
+bad chunk rolls back everything loaded before it, and the errors name the
+offending CSV lines.
+
+Modes:
+
+- ``append``: insert the rows;
+- ``replace``: delete the table's rows first (the schema, constraints and
+  indexes are kept, unlike ``DataFrame.to_sql``). A managed unique index
+  (``indexes.UNIQUE_INDEXES``) the new rows violate is left off and
+  reported, as ``ensure_indexes`` does, until the duplicates are resolved;
+- ``upsert``: insert, updating the rows whose primary key already exists.
+"""
+
+import time
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import pandas as pd
+
+from .change_tracking import TRACKED_TABLES, record_full_recompute, set_tracking_enabled
+from .schema_catalog import TableSchema
+from .standard_costs import STANDARD_COST_SOURCES, invalidate_all_standard_costs
+from .expense_rollup import EXPENSE_ROLLUP_SOURCES, invalidate_expense_rollup
+from .indexes import UNIQUE_INDEXES, create_index
+
+LOAD_MODES = ("append", "replace", "upsert")
+DEFAULT_CHUNK_SIZE = 50000
+MAX_CHUNK_SIZE = 1000000
+MAX_REPORTED_ERRORS = 50
+
+# Set outside the load transaction and restored afterwards: a 64 MiB page
+# cache for the b-trees being filled. synchronous stays as configured; the
+# load commits once, so syncs are already rare.
+LOAD_PRAGMAS = {"cache_size": "-65536"}
+
+_TRUE_VALUES = {"1", "1.0", "true", "t", "yes", "y"}
+_FALSE_VALUES = {"0", "0.0", "false", "f", "no", "n"}
+
+
+class BulkLoadError(ValueError):
+    """Raised when a CSV cannot be loaded; ``errors`` lists the offending rows"""
+
+    def __init__(self, message: str, errors: List[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def column_affinity(declared_type: str) -> str:
+    """SQLite's type affinity for a declared column type"""
+    declared_type = (declared_type or "").upper()
+    if "INT" in declared_type:
+        return "INTEGER"
+    if any(name in declared_type for name in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if not declared_type or "BLOB" in declared_type:
+        return "BLOB"
+    if any(name in declared_type for name in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    return "NUMERIC"
+
+
+def _is_numeric_column(schema: TableSchema, column: str) -> bool:
+    declared = schema.column_types.get(column, "") if schema.has_column(column) else ""
+    return declared == "BOOLEAN" or column_affinity(declared) in ("INTEGER", "REAL")
+
+
+def _csv_line(index) -> int:
+    # Data rows start on line 2, after the header
+    return int(index) + 2
+
+
+def _coerce_chunk(chunk: pd.DataFrame, schema: TableSchema, errors: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Convert the CSV's text values to the column types, recording values that do not fit"""
+    for column in chunk.columns:
+        declared = schema.column_types.get(column, "")
+        affinity = column_affinity(declared)
+        values = chunk[column]
+        present = values.notna()
+
+        if declared == "BOOLEAN":
+            text = values[present].map(lambda v: str(v).strip().lower())
+            coerced = pd.Series(None, index=values.index, dtype=object)
+            coerced[text.index[text.isin(_TRUE_VALUES)]] = 1
+            coerced[text.index[text.isin(_FALSE_VALUES)]] = 0
+            expected = "a boolean"
+        elif affinity in ("INTEGER", "REAL"):
+            coerced = pd.to_numeric(values, errors="coerce")
+            if affinity == "INTEGER" and (coerced.dropna() % 1 == 0).all():
+                coerced = coerced.astype("Int64")
+            expected = "a number"
+        else:
+            continue
+
+        invalid = present & coerced.isna()
+        for index in values.index[invalid]:
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                break
+            errors.append({"line": _csv_line(index), "column": column, "value": str(values[index]),
+                           "error": f"expected {expected} for {declared} column"})
+        chunk[column] = coerced
+
+    for column in schema.not_null:
+        if column not in chunk.columns:
+            continue
+        for index in chunk.index[chunk[column].isna()]:
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                break
+            errors.append({"line": _csv_line(index), "column": column, "value": None,
+                           "error": "missing value for NOT NULL column"})
+    return chunk
+
+
+class _ForeignKeyChecker:
+    """Checks a chunk's foreign key values against the parent tables' keys.
+
+    Each parent table's keys are read once per load; keys loaded into a
+    self-referencing table count as parents for later rows.
+    """
+
+    def __init__(self, cursor, schema: TableSchema, table_schema: Callable[[str], TableSchema], replacing: bool):
+        self.cursor = cursor
+        self.schema = schema
+        self.table_schema = table_schema
+        self.replacing = replacing
+        self._keys: Dict[tuple, Set[str]] = {}
+
+    def _parent_keys(self, fk: Dict[str, Any]) -> Set[str]:
+        parent = fk["references_table"]
+        column = fk["references_column"] or self.table_schema(parent).primary_key[0]
+        key = (parent, column)
+        if key not in self._keys:
+            if parent == self.schema.name and self.replacing:
+                self._keys[key] = set()
+            else:
+                self.table_schema(parent).validate_columns([column])
+                self.cursor.execute(f"SELECT DISTINCT {column} FROM {parent} WHERE {column} IS NOT NULL")
+                self._keys[key] = {str(row[0]) for row in self.cursor.fetchall()}
+        return self._keys[key]
+
+    def check(self, chunk: pd.DataFrame, errors: List[Dict[str, Any]]):
+        for fk in self.schema.foreign_keys:
+            column = fk["column"]
+            if column not in chunk.columns:
+                continue
+            keys = self._parent_keys(fk)
+            values = chunk[column].dropna().astype(str)
+            if fk["references_table"] == self.schema.name:
+                referenced = fk["references_column"] or self.schema.primary_key[0]
+                if referenced in chunk.columns:
+                    keys.update(chunk[referenced].dropna().astype(str))
+            for index in values.index[~values.isin(keys)]:
+                if len(errors) >= MAX_REPORTED_ERRORS:
+                    return
+                errors.append({"line": _csv_line(index), "column": column, "value": values[index],
+                               "error": f"no {fk['references_table']} row with "
+                                        f"{fk['references_column'] or 'key'} {values[index]!r}"})
+
+
+def _drop_indexes_and_triggers(cursor, table_name: str) -> List[Tuple[str, str]]:
+    """Drop the table's explicitly created indexes and its triggers, returning their names and definitions"""
+    cursor.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL "
+        "ORDER BY type",
+        (table_name,)
+    )
+    objects = cursor.fetchall()
+    for object_type, name, _ in objects:
+        cursor.execute(f"DROP {object_type.upper()} {name}")
+    return [(name, sql) for _, name, sql in objects]
+
+
+def _insert_sql(table_name: str, columns: List[str], mode: str, primary_key: List[str]) -> str:
+    sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    if mode == "upsert":
+        updates = [column for column in columns if column not in primary_key]
+        action = (
+            "DO UPDATE SET " + ", ".join(f"{column} = excluded.{column}" for column in updates)
+            if updates else "DO NOTHING"
+        )
+        sql += f" ON CONFLICT ({', '.join(primary_key)}) {action}"
+    return sql
+
+
+def _chunk_rows(chunk: pd.DataFrame) -> List[tuple]:
+    # tolist() yields Python scalars, which sqlite3 can bind (numpy scalars it cannot)
+    columns = [chunk[column].astype(object).where(chunk[column].notna(), None).tolist() for column in chunk.columns]
+    return list(zip(*columns))
+
+
+class CsvChunkParser:
+    """Parses a CSV into chunks aligned with, and coerced to, a table's columns.
+
+    Uses no database connection and can be pickled, so chunks can be
+    prepared in worker processes (see db.startup_csv). ``transform`` is applied to every parsed chunk before it is aligned
+    with the table (e.g. to fill defaults or rename legacy columns).
+    ``columns`` and ``dropped_columns`` are known after the first chunk.
+    """
+
+    def __init__(self, schema: TableSchema, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 transform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None):
+        self.schema = schema
+        self.chunk_size = chunk_size
+        self.transform = transform
+        self.columns: Optional[List[str]] = None
+        self.dropped_columns: List[str] = []
+
+    def read(self, source: Union[str, IO]):
+        """Reader yielding the raw (string) chunks of ``source``, to pass to ``prepare``"""
+        return pd.read_csv(source, dtype=str, chunksize=self.chunk_size)
+
+    def prepare(self, chunk: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+        """Normalize and coerce one raw chunk; returns it with its invalid values"""
+        schema = self.schema
+        # Ignore padding around values, as pandas' number parsing did
+        # (numeric columns are stripped while being converted)
+        for column in chunk.columns:
+            if not _is_numeric_column(schema, column):
+                chunk[column] = chunk[column].str.strip()
+        if self.transform is not None:
+            chunk = self.transform(chunk)
+        if self.columns is None:
+            self.columns = [c for c in chunk.columns if schema.has_column(c)]
+            self.dropped_columns = [c for c in chunk.columns if not schema.has_column(c)]
+            if not self.columns:
+                raise BulkLoadError(f"CSV has no columns of table {schema.name}")
+        chunk = chunk.reindex(columns=self.columns)
+
+        errors: List[Dict[str, Any]] = []
+        chunk = _coerce_chunk(chunk, schema, errors)
+        return chunk, errors
+
+    def chunks(self, source: Union[str, IO]) -> Iterator[Tuple[pd.DataFrame, List[Dict[str, Any]]]]:
+        """Yield ``(chunk, errors)`` pairs; ``errors`` lists the chunk's invalid values"""
+        with self.read(source) as reader:
+            for chunk in reader:
+                yield self.prepare(chunk)
+
+
+def write_chunks(
+    conn,
+    schema: TableSchema,
+    chunks: Iterable[Tuple[pd.DataFrame, List[Dict[str, Any]]]],
+    mode: str = "append",
+    table_schema: Optional[Callable[[str], TableSchema]] = None,
+    enforce_foreign_keys: bool = True,
+) -> Dict[str, Any]:
+    """Write parsed ``(chunk, errors)`` pairs to ``schema``'s table in one transaction.
+
+    ``table_schema`` resolves parent tables for foreign key checks. Raises
+    BulkLoadError for invalid data and re-raises database errors, rolling
+    the load back in both cases. The connection must not be inside a
+    transaction. Without ``enforce_foreign_keys`` only the loader's own
+    per-chunk check runs, not SQLite's; callers building a database from
+    scratch verify it once with ``PRAGMA foreign_key_check`` instead.
+    ``skipped_indexes`` in the result names the managed unique indexes a
+    replace could not recreate because of duplicate keys.
+    """
+    if mode not in LOAD_MODES:
+        raise BulkLoadError(f"Invalid load mode '{mode}'; expected one of {', '.join(LOAD_MODES)}")
+    if mode == "upsert" and not schema.primary_key:
+        raise BulkLoadError(f"Table {schema.name} has no primary key to upsert on")
+    table_schema = table_schema or (lambda name: schema)
+
+    start = time.perf_counter()
+    rows_loaded = 0
+    chunk_count = 0
+
+    isolation_level = conn.isolation_level
+    cursor = conn.cursor()
+    pragmas = dict(LOAD_PRAGMAS)
+    if not enforce_foreign_keys:
+        pragmas["foreign_keys"] = "OFF"
+    previous_pragmas = {name: cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in pragmas}
+    conn.isolation_level = None
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Foreign keys are validated per chunk below; SQLite's own check
+            # runs at commit, so a replace may delete and reinsert parent rows
+            cursor.execute("PRAGMA defer_foreign_keys=ON")
+            tracked = schema.name in TRACKED_TABLES
+            if tracked:
+                # Journal one full recompute instead of a change per loaded row
+                set_tracking_enabled(cursor, False)
+            recreate: List[Tuple[str, str]] = []
+            skipped_indexes: List[str] = []
+            if mode == "replace":
+                # Maintaining indexes row by row dominates large loads; building
+                # them once over the loaded table is several times faster. The
+                # table's triggers only journal changes and invalidate standard
+                # costs, which is done once for the whole load below, and
+                # without them the DELETE no longer runs row by row.
+                recreate = _drop_indexes_and_triggers(cursor, schema.name)
+                cursor.execute(f"DELETE FROM {schema.name}")
+
+            fk_checker = _ForeignKeyChecker(cursor, schema, table_schema, replacing=mode == "replace")
+            insert_sql = None
+            for chunk, errors in chunks:
+                if insert_sql is None:
+                    columns = list(chunk.columns)
+                    missing_key = [c for c in schema.primary_key if c not in columns]
+                    if mode == "upsert" and missing_key:
+                        raise BulkLoadError(f"CSV is missing primary key column(s) {missing_key} needed to upsert")
+                    insert_sql = _insert_sql(schema.name, columns, mode, schema.primary_key)
+
+                errors = list(errors)
+                fk_checker.check(chunk, errors)
+                if errors:
+                    raise BulkLoadError(
+                        f"Invalid rows in {schema.name} CSV (chunk {chunk_count + 1}); nothing was loaded", errors
+                    )
+
+                cursor.executemany(insert_sql, _chunk_rows(chunk))
+                rows_loaded += len(chunk)
+                chunk_count += 1
+
+            for name, sql in recreate:
+                if name in UNIQUE_INDEXES:
+                    if not create_index(cursor, sql):
+                        skipped_indexes.append(name)
+                else:
+                    cursor.execute(sql)
+            if tracked:
+                set_tracking_enabled(cursor, True)
+                record_full_recompute(cursor, schema.name)
+            if schema.name in STANDARD_COST_SOURCES:
+                invalidate_all_standard_costs(cursor)
+            if schema.name in EXPENSE_ROLLUP_SOURCES:
+                invalidate_expense_rollup(cursor)
+            cursor.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+    finally:
+        for name, value in previous_pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        conn.isolation_level = isolation_level
+
+    elapsed = time.perf_counter() - start
+    return {
+        "table": schema.name,
+        "mode": mode,
+        "rows_loaded": rows_loaded,
+        "chunks": chunk_count,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": int(rows_loaded / elapsed) if elapsed > 0 else rows_loaded,
+        "skipped_indexes": skipped_indexes,
+    }
+
+
+def bulk_load(
+    conn,
+    schema: TableSchema,
+    source: Union[str, IO],
+    mode: str = "append",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    transform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    table_schema: Optional[Callable[[str], TableSchema]] = None,
+) -> Dict[str, Any]:
+    """Stream a CSV file (path or binary file object) into ``schema``'s table.
+
+    Parses chunk by chunk while writing, so memory is bounded by one chunk;
+    see CsvChunkParser and write_chunks.
+    """
+    parser = CsvChunkParser(schema, chunk_size, transform)
+    result = write_chunks(conn, schema, parser.chunks(source), mode, table_schema)
+    result["dropped_columns"] = parser.dropped_columns
+    return result
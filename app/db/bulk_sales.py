@@ -0,0 +1,166 @@
+"""
+Set-based add/subtract/replace of sales forecast lines.
+
+A forecast line is identified by (customer_id, unit_id, period, forecast_id),
+enforced by the ``uq_sales_forecast_line`` unique index (see indexes.py).
+``upsert_sales`` stages the incoming lines in a temp table with one
+``executemany`` and applies them with a single
+``INSERT ... SELECT ... ON CONFLICT DO UPDATE``; ``total_revenue`` is
+recomputed in SQL from the resulting quantity and price.
+
+Lines are applied in their given order, so a key repeated within one batch
+behaves as if the lines had been sent one by one. Databases whose sales
+table still holds duplicate keys cannot have the unique index; they fall
+back to matching and writing one line at a time.
+
+Lines of an overlay scenario that it inherits from its parent are copied
+into the overlay first (see scenario_overlays.copy_parent_lines), so they
+are updated rather than inserted anew.
+"""
+
+import uuid
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .indexes import has_index
+from .scenario_overlays import copy_parent_lines
+
+SALES_LINE_INDEX = "uq_sales_forecast_line"
+SALES_LINE_KEY = ("customer_id", "unit_id", "period", "forecast_id")
+
+OPERATIONS = ("add", "subtract", "replace")
+
+STAGE_TABLE = "temp.bulk_sales_stage"
+
+# Resulting (quantity, unit_price) of an existing line for each operation.
+# The staged has_price flag tells an omitted unit_price, which "add" keeps, from a given one.
+_UPDATES = {
+    "add": (
+        "COALESCE(sales.quantity, 0) + excluded.quantity",
+        "CASE WHEN (SELECT has_price FROM {stage} WHERE sale_id = excluded.sale_id) "
+        "THEN excluded.unit_price ELSE sales.unit_price END",
+    ),
+    "subtract": (
+        "MAX(0, COALESCE(sales.quantity, 0) - excluded.quantity)",
+        "sales.unit_price",
+    ),
+    "replace": (
+        "excluded.quantity",
+        "excluded.unit_price",
+    ),
+}
+
+
+def _staged_rows(lines: Iterable[Dict[str, Any]]) -> List[Tuple[Any, ...]]:
+    rows = []
+    for seq, line in enumerate(lines):
+        rows.append((
+            seq,
+            str(uuid.uuid4()),
+            line.get("customer_id"),
+            line.get("unit_id"),
+            line.get("period"),
+            line.get("forecast_id", "F001"),
+            line.get("quantity") or 0,
+            line.get("unit_price"),
+            int("unit_price" in line and line["unit_price"] is not None),
+        ))
+    return rows
+
+
+def upsert_sales(cursor, lines: List[Dict[str, Any]], operation: str = "replace") -> Dict[str, Any]:
+    """Apply ``operation`` to the sales lines matching each of ``lines``, inserting missing ones.
+
+    - add: quantity is increased; unit_price is replaced if given
+    - subtract: quantity is decreased, not below 0; unit_price is kept
+    - replace: quantity and unit_price are replaced
+
+    A missing line is inserted with the given quantity and unit_price
+    (0 if omitted). Runs in the caller's transaction. Returns the number of
+    lines applied and whether the set-based path was used.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation '{operation}'; expected one of {', '.join(OPERATIONS)}")
+    if not has_index(cursor, SALES_LINE_INDEX):
+        return {"updated_count": _upsert_line_by_line(cursor, lines, operation), "set_based": False}
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STAGE_TABLE} (
+            seq INTEGER PRIMARY KEY,
+            sale_id TEXT NOT NULL UNIQUE,
+            customer_id TEXT,
+            unit_id TEXT,
+            period TEXT,
+            forecast_id TEXT,
+            quantity REAL NOT NULL,
+            unit_price REAL,
+            has_price INTEGER NOT NULL
+        )
+    """)
+    cursor.execute(f"DELETE FROM {STAGE_TABLE}")
+    try:
+        cursor.executemany(
+            f"INSERT INTO {STAGE_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            _staged_rows(lines)
+        )
+        copy_parent_lines(cursor, f"SELECT customer_id, unit_id, period, forecast_id FROM {STAGE_TABLE}")
+        quantity, unit_price = _UPDATES[operation]
+        unit_price = unit_price.format(stage=STAGE_TABLE)
+        # WHERE true: without it SQLite would parse ON CONFLICT as a join constraint
+        cursor.execute(f"""
+            INSERT INTO sales (sale_id, customer_id, unit_id, period, forecast_id,
+                               quantity, unit_price, total_revenue)
+            SELECT sale_id, customer_id, unit_id, period, forecast_id,
+                   quantity, COALESCE(unit_price, 0), quantity * COALESCE(unit_price, 0)
+            FROM {STAGE_TABLE}
+            WHERE true
+            ORDER BY seq
+            ON CONFLICT ({', '.join(SALES_LINE_KEY)}) DO UPDATE SET
+                quantity = {quantity},
+                unit_price = {unit_price},
+                total_revenue = ({quantity}) * ({unit_price})
+        """)
+        updated_count = len(lines)
+    finally:
+        cursor.execute(f"DELETE FROM {STAGE_TABLE}")
+    return {"updated_count": updated_count, "set_based": True}
+
+
+def _upsert_line_by_line(cursor, lines: List[Dict[str, Any]], operation: str) -> int:
+    """Match and write each line separately, for sales tables without the unique key"""
+    updated_count = 0
+    for line in lines:
+        key = (line.get("customer_id"), line.get("unit_id"), line.get("period"), line.get("forecast_id", "F001"))
+        copy_parent_lines(cursor, "SELECT ? AS customer_id, ? AS unit_id, ? AS period, ? AS forecast_id", key)
+        cursor.execute("""
+            SELECT quantity, unit_price
+            FROM sales
+            WHERE customer_id = ? AND unit_id = ? AND period = ? AND forecast_id = ?
+        """, key)
+        existing = cursor.fetchone()
+
+        quantity = line.get("quantity") or 0
+        if existing:
+            existing_quantity, existing_price = existing[0] or 0, existing[1]
+            if operation == "add":
+                new_quantity = existing_quantity + quantity
+                new_price = line.get("unit_price", existing_price)
+            elif operation == "subtract":
+                new_quantity = max(0, existing_quantity - quantity)
+                new_price = existing_price
+            else:
+                new_quantity = quantity
+                new_price = line.get("unit_price") or 0
+            new_price = existing_price if new_price is None else new_price
+            cursor.execute("""
+                UPDATE sales SET quantity = ?, unit_price = ?, total_revenue = ?
+                WHERE customer_id = ? AND unit_id = ? AND period = ? AND forecast_id = ?
+            """, (new_quantity, new_price, new_quantity * (new_price or 0)) + key)
+        else:
+            unit_price = line.get("unit_price") or 0
+            cursor.execute("""
+                INSERT INTO sales (sale_id, customer_id, unit_id, period, forecast_id,
+                                   quantity, unit_price, total_revenue)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (str(uuid.uuid4()),) + key + (quantity, unit_price, quantity * unit_price))
+        updated_count += 1
+    return updated_count
@@ -0,0 +1,186 @@
+"""
+Change tracking for incremental forecast_results recomputation.
+
+Triggers on the costing inputs append rows to ``forecast_change_journal``
+describing which forecast_results rows went stale. A journal row is a key
+pattern over (unit_id, period, customer_id) where NULL means "any":
+
+- all three set            -> one sales key (sales inserts/updates/deletes)
+- only unit_id set         -> every sale of a unit (bom, routing, units changes)
+- only customer_id set     -> every sale of a customer (customer renames)
+- anything else            -> full recompute (machines, payroll, labor_rates)
+
+Overlay tombstones and overlay scenarios themselves are tracked too (see
+``overlay_tracking_ddl``). ``DatabaseManager.refresh_forecast_results``
+consumes the journal.
+"""
+
+from typing import List, Optional
+
+JOURNAL_TABLE = 'forecast_change_journal'
+
+# Row-level triggers skip journaling while a bulk loader has disabled tracking
+# inside its own write transaction; the loader records one full-scope change instead.
+_TRACKING_ENABLED = "(SELECT enabled FROM change_tracking_control WHERE id = 1) IS NOT 0"
+
+# SQL predicate selecting rows of ``{alias}`` covered by journal entries up to :max_change_id
+STALE_ROWS_PREDICATE = f'''(
+    {{alias}}.unit_id IN (
+        SELECT unit_id FROM {JOURNAL_TABLE}
+        WHERE change_id <= :max_change_id AND unit_id IS NOT NULL
+          AND period IS NULL AND customer_id IS NULL
+    )
+    OR {{alias}}.customer_id IN (
+        SELECT customer_id FROM {JOURNAL_TABLE}
+        WHERE change_id <= :max_change_id AND customer_id IS NOT NULL
+          AND unit_id IS NULL AND period IS NULL
+    )
+    OR EXISTS (
+        SELECT 1 FROM {JOURNAL_TABLE} j
+        WHERE j.change_id <= :max_change_id
+          AND j.unit_id = {{alias}}.unit_id
+          AND j.period = {{alias}}.period
+          AND j.customer_id = {{alias}}.customer_id
+    )
+)'''
+
+# Journal entries that match none of the key patterns above force a full rebuild
+FULL_RECOMPUTE_PREDICATE = '''NOT (
+    (unit_id IS NOT NULL AND period IS NOT NULL AND customer_id IS NOT NULL)
+    OR (unit_id IS NOT NULL AND period IS NULL AND customer_id IS NULL)
+    OR (customer_id IS NOT NULL AND unit_id IS NULL AND period IS NULL)
+)'''
+
+# (table, {event: [journal INSERT ... SELECT bodies]})
+_SALES_KEY = "SELECT 'sales', {row}.unit_id, {row}.period, {row}.customer_id"
+_BOM_UNITS = "SELECT 'bom', unit_id, NULL, NULL FROM units WHERE bom_id = {row}.bom_id"
+_ROUTER_UNIT = "SELECT 'routers', {row}.unit_id, NULL, NULL"
+_OPERATION_UNITS = (
+    "SELECT 'router_operations', unit_id, NULL, NULL FROM units WHERE router_id = {row}.router_id"
+)
+_UNIT = "SELECT 'units', {row}.unit_id, NULL, NULL"
+_CUSTOMER = "SELECT 'customers', NULL, NULL, {row}.customer_id"
+_FULL = (
+    "SELECT '{table}', NULL, NULL, NULL "
+    f"WHERE NOT EXISTS (SELECT 1 FROM {JOURNAL_TABLE} "
+    "WHERE unit_id IS NULL AND period IS NULL AND customer_id IS NULL)"
+)
+
+_TRACKED_KEYS = {
+    'sales': _SALES_KEY,
+    'bom': _BOM_UNITS,
+    'routers': _ROUTER_UNIT,
+    'router_operations': _OPERATION_UNITS,
+    'units': _UNIT,
+    'customers': _CUSTOMER,
+}
+_FULL_SCOPE_TABLES = ['machines', 'payroll', 'labor_rates']
+
+TRACKED_TABLES = list(_TRACKED_KEYS) + _FULL_SCOPE_TABLES
+
+
+def _trigger_sql(table: str, event: str, selects: List[str], when: Optional[str] = None) -> str:
+    inserts = "\n".join(
+        f"    INSERT INTO {JOURNAL_TABLE} (source_table, unit_id, period, customer_id) {select};"
+        for select in selects
+    )
+    condition = f"{_TRACKING_ENABLED} AND ({when})" if when else _TRACKING_ENABLED
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_track "
+        f"AFTER {event} ON {table} FOR EACH ROW WHEN {condition}\n"
+        f"BEGIN\n{inserts}\nEND"
+    )
+
+
+def change_tracking_ddl() -> List[str]:
+    """DDL for the journal, its control row and all tracking triggers"""
+    statements = [
+        f'''
+        CREATE TABLE IF NOT EXISTS {JOURNAL_TABLE} (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_table TEXT NOT NULL,
+            unit_id TEXT,
+            period TEXT,
+            customer_id TEXT,
+            changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        f'''
+        CREATE INDEX IF NOT EXISTS idx_{JOURNAL_TABLE}_key
+        ON {JOURNAL_TABLE} (unit_id, period, customer_id)
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS change_tracking_control (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            enabled INTEGER NOT NULL DEFAULT 1
+        )
+        ''',
+        "INSERT OR IGNORE INTO change_tracking_control (id, enabled) VALUES (1, 1)",
+    ]
+
+    for table, key_select in _TRACKED_KEYS.items():
+        statements.append(_trigger_sql(table, 'INSERT', [key_select.format(row='NEW')]))
+        statements.append(_trigger_sql(table, 'DELETE', [key_select.format(row='OLD')]))
+        statements.append(_trigger_sql(
+            table, 'UPDATE', [key_select.format(row='OLD'), key_select.format(row='NEW')]
+        ))
+
+    for table in _FULL_SCOPE_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            statements.append(_trigger_sql(table, event, [_FULL.format(table=table)]))
+
+    return statements
+
+
+def overlay_tracking_ddl(deletions_table: str) -> List[str]:
+    """Tracking triggers for overlay scenarios; run once their tables exist.
+
+    forecast_results are costed from resolved_sales, so overlays' inherited
+    lines go stale too. A tombstone hides one inherited sales key; creating
+    or deleting an overlay adds or removes every line it inherits, which no
+    key pattern describes, so it journals a full recompute.
+    """
+    tombstone_key = f"SELECT '{deletions_table}', {{row}}.unit_id, {{row}}.period, {{row}}.customer_id"
+    statements = [
+        _trigger_sql(deletions_table, 'INSERT', [tombstone_key.format(row='NEW')]),
+        _trigger_sql(deletions_table, 'DELETE', [tombstone_key.format(row='OLD')]),
+        _trigger_sql(deletions_table, 'UPDATE', [tombstone_key.format(row='OLD'), tombstone_key.format(row='NEW')]),
+    ]
+    overlay_changes = {
+        'INSERT': "NEW.parent_forecast_id IS NOT NULL",
+        'DELETE': "OLD.parent_forecast_id IS NOT NULL",
+        'UPDATE': "OLD.parent_forecast_id IS NOT NEW.parent_forecast_id",
+    }
+    for event, when in overlay_changes.items():
+        statements.append(_trigger_sql('forecast', event, [_FULL.format(table='forecast')], when))
+    return statements
+
+
+def record_full_recompute(cursor, source_table: str):
+    """Journal a change that invalidates every forecast_results row"""
+    cursor.execute(
+        f"INSERT INTO {JOURNAL_TABLE} (source_table, unit_id, period, customer_id) VALUES (?, NULL, NULL, NULL)",
+        (source_table,)
+    )
+
+
+def set_tracking_enabled(cursor, enabled: bool):
+    """Toggle row-level journaling; only call inside the caller's own write transaction"""
+    cursor.execute(
+        "UPDATE change_tracking_control SET enabled = ? WHERE id = 1", (1 if enabled else 0,)
+    )
+
+
+def record_scenario_sales(cursor, forecast_id: str):
+    """Journal the units of a scenario's sales, for rows written with tracking disabled.
+
+    One entry per unit rather than per sales key: a whole scenario touches
+    most keys of its units, and per-key entries would cost as much to write
+    as the rows themselves.
+    """
+    cursor.execute(
+        f"INSERT INTO {JOURNAL_TABLE} (source_table, unit_id, period, customer_id) "
+        f"SELECT DISTINCT 'sales', unit_id, NULL, NULL FROM sales "
+        f"WHERE forecast_id = ?",
+        (forecast_id,)
+    )
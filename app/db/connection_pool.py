@@ -0,0 +1,269 @@
+"""
+Bounded SQLite connection pool used by DatabaseManager.
+
+Connections are handed out as ``PooledConnection`` objects, a subclass of
+``sqlite3.Connection``, so existing callers that do ``conn.close()`` (and
+pandas, which checks ``isinstance(con, sqlite3.Connection)``) keep working:
+closing a pooled connection returns it to the pool instead of tearing it down.
+"""
+
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class PoolExhaustedError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes available before the timeout"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that returns itself to its pool on close()"""
+
+    _pool: Optional["ConnectionPool"] = None
+    _checked_out = False
+    _generation = 0
+    _owner_thread: Optional[int] = None
+    _last_used = 0.0
+    _last_checked = 0.0
+
+    def close(self):
+        pool = self._pool
+        if pool is None:
+            super().close()
+        else:
+            pool.release(self)
+
+    def _close_physical(self):
+        """Close the underlying SQLite handle, bypassing the pool"""
+        self._pool = None
+        try:
+            sqlite3.Connection.close(self)
+        except sqlite3.Error:
+            pass
+
+
+class ConnectionPool:
+    """Thread-aware pool of SQLite connections.
+
+    - Idle connections are reused LIFO, preferring the one last released by the
+      calling thread so a request handled on the same worker keeps its page cache.
+    - At most ``max_size`` connections exist at once; callers wait up to
+      ``acquire_timeout`` seconds for one to be released.
+    - Connections idle for longer than ``idle_timeout`` are closed.
+    - Connections idle for longer than ``health_check_interval`` are probed with
+      ``SELECT 1`` before being handed out and are replaced if the probe fails.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], PooledConnection],
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        health_check_interval: float = 30.0,
+        acquire_timeout: float = 30.0,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle: List[PooledConnection] = []
+        self._in_use = weakref.WeakSet()
+        self._pending = 0
+        self._draining = False
+        self._generation = 0
+        self._created = 0
+        self._reused = 0
+        self._evicted = 0
+
+    def _size(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._pending
+
+    def _evict_idle(self, now: float) -> List[PooledConnection]:
+        """Remove idle connections past idle_timeout; caller closes them outside the lock"""
+        if not self.idle_timeout:
+            return []
+        expired = [c for c in self._idle if now - c._last_used > self.idle_timeout]
+        if expired:
+            self._idle = [c for c in self._idle if now - c._last_used <= self.idle_timeout]
+            self._evicted += len(expired)
+        return expired
+
+    def _take_idle(self) -> Optional[PooledConnection]:
+        if not self._idle:
+            return None
+        thread_id = threading.get_ident()
+        for index in range(len(self._idle) - 1, -1, -1):
+            if self._idle[index]._owner_thread == thread_id:
+                return self._idle.pop(index)
+        return self._idle.pop()
+
+    def _is_healthy(self, conn: PooledConnection, now: float) -> bool:
+        if now - conn._last_checked < self.health_check_interval:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        conn._last_checked = now
+        return True
+
+    def acquire(self) -> PooledConnection:
+        """Check out a connection, creating one if the pool has room"""
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            create = False
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    # While draining, checkouts wait for the pool to reopen
+                    if not self._draining:
+                        for stale in self._evict_idle(now):
+                            stale._close_physical()
+                        conn = self._take_idle()
+                        if conn is not None:
+                            conn._checked_out = True
+                            self._in_use.add(conn)
+                            break
+                        if self._size() < self.max_size:
+                            self._pending += 1
+                            create = True
+                            break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            f"Timed out after {self.acquire_timeout}s waiting for a database "
+                            f"connection (pool size {self.max_size})"
+                        )
+                    # Wake periodically: a leaked connection frees its slot when it is
+                    # garbage collected, which does not notify waiters.
+                    self._cond.wait(min(remaining, 1.0))
+                generation = self._generation
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._pending -= 1
+                        self._cond.notify()
+                    raise
+                conn._pool = self
+                conn._checked_out = True
+                conn._generation = generation
+                conn._last_checked = time.monotonic()
+                with self._cond:
+                    self._pending -= 1
+                    self._in_use.add(conn)
+                    self._created += 1
+                return conn
+
+            if self._is_healthy(conn, time.monotonic()):
+                with self._cond:
+                    self._reused += 1
+                return conn
+
+            # Closed before its slot is freed, so a drained pool has no open handles
+            conn._close_physical()
+            with self._cond:
+                self._in_use.discard(conn)
+                self._cond.notify()
+
+    def release(self, conn: PooledConnection):
+        """Return a connection to the pool, discarding it if it is unusable"""
+        with self._cond:
+            if not conn._checked_out:
+                return  # already released; close() called twice
+            conn._checked_out = False
+
+        reusable = True
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            conn.execute("PRAGMA foreign_keys=ON")
+        except sqlite3.Error:
+            reusable = False
+
+        with self._cond:
+            if (
+                reusable
+                and conn._generation == self._generation
+                and len(self._idle) < self.max_size
+            ):
+                self._in_use.discard(conn)
+                conn._owner_thread = threading.get_ident()
+                conn._last_used = time.monotonic()
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+
+        # Closed before its slot is freed, so a drained pool has no open handles
+        conn._close_physical()
+        with self._cond:
+            self._in_use.discard(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        """Close idle connections and retire checked-out ones when they are released"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._generation += 1
+            self._cond.notify_all()
+        for conn in idle:
+            conn._close_physical()
+
+    @contextmanager
+    def drained(self, timeout: Optional[float] = None) -> Iterator[None]:
+        """Hold new checkouts, wait for every connection to be returned, close them all, and yield.
+
+        Checkouts resume when the block exits, on fresh connections, so code
+        run inside it may e.g. replace the database file. Raises
+        PoolExhaustedError (and reopens the pool) if connections are still
+        checked out after ``timeout`` seconds (default: acquire_timeout).
+        """
+        deadline = time.monotonic() + (self.acquire_timeout if timeout is None else timeout)
+        with self._cond:
+            self._draining = True
+            try:
+                while self._in_use or self._pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            f"Timed out draining the connection pool; {len(self._in_use)} connection(s) still in use"
+                        )
+                    self._cond.wait(min(remaining, 1.0))
+            except BaseException:
+                self._draining = False
+                self._cond.notify_all()
+                raise
+            idle, self._idle = self._idle, []
+            self._generation += 1
+        for conn in idle:
+            conn._close_physical()
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._draining = False
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "created": self._created,
+                "reused": self._reused,
+                "evicted": self._evicted,
+                "draining": self._draining,
+            }
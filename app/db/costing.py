@@ -0,0 +1,78 @@
+"""
+Vectorized costing engine for forecast results.
+
+Per-unit standard costs are looked up once and joined onto the sales lines as
+whole columns, so costing a forecast is O(sales + units) instead of scanning
+every routing row for every sale.
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+# Column order of the rows produced by forecast_result_rows(), matching
+# INSERT_FORECAST_RESULTS_SQL
+FORECAST_RESULT_COLUMNS = [
+    'forecast_date', 'period', 'customer_id', 'customer_name', 'unit_id', 'unit_name',
+    'quantity', 'unit_price', 'total_revenue', 'material_cost', 'labor_cost',
+    'machine_cost', 'total_cost', 'gross_margin', 'margin_percentage'
+]
+
+INSERT_FORECAST_RESULTS_SQL = f'''
+    INSERT INTO forecast_results ({', '.join(FORECAST_RESULT_COLUMNS)})
+    VALUES ({', '.join('?' for _ in FORECAST_RESULT_COLUMNS)})
+'''
+
+
+def cost_sales(sales: pd.DataFrame, unit_costs: pd.DataFrame) -> pd.DataFrame:
+    """Compute material, labor and machine cost plus margins for every sales line at once.
+
+    ``sales`` needs ``unit_id``, ``quantity`` and ``total_revenue`` columns;
+    ``unit_costs`` is the standard cost per single unit indexed by unit_id
+    (see ``standard_costs.unit_costs_frame``). The result is aligned to the
+    index of ``sales``.
+    """
+    quantity = pd.to_numeric(sales['quantity'], errors='coerce')
+    revenue = pd.to_numeric(sales['total_revenue'], errors='coerce')
+
+    costs = pd.DataFrame(index=sales.index)
+    for column in ('material_cost', 'labor_cost', 'machine_cost'):
+        per_unit = sales['unit_id'].map(unit_costs[column]).astype(float).fillna(0.0)
+        costs[column] = per_unit * quantity
+    costs['total_cost'] = costs['material_cost'] + costs['labor_cost'] + costs['machine_cost']
+    costs['gross_margin'] = revenue - costs['total_cost']
+    costs['margin_percentage'] = (costs['gross_margin'] / revenue.where(revenue > 0) * 100).fillna(0.0)
+    return costs
+
+
+def _db_values(series: pd.Series) -> List[Any]:
+    """Convert a numeric column to plain Python values with NaN mapped to NULL"""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def forecast_result_rows(
+    sales_data: Sequence[Dict[str, Any]],
+    costs: pd.DataFrame,
+    forecast_date: str,
+) -> List[Tuple[Any, ...]]:
+    """Build forecast_results parameter tuples for executemany().
+
+    Pass-through sale fields are taken from ``sales_data`` untouched so stored
+    quantities and prices keep their original types.
+    """
+    computed = zip(
+        _db_values(costs['material_cost']),
+        _db_values(costs['labor_cost']),
+        _db_values(costs['machine_cost']),
+        _db_values(costs['total_cost']),
+        _db_values(costs['gross_margin']),
+        _db_values(costs['margin_percentage']),
+    )
+    return [
+        (
+            forecast_date, sale['period'], sale['customer_id'], sale['customer_name'],
+            sale['unit_id'], sale['unit_name'], sale['quantity'], sale['unit_price'],
+            sale['total_revenue'], *cost_values
+        )
+        for sale, cost_values in zip(sales_data, computed)
+    ]
@@ -1,15 +1,98 @@
+import multiprocessing
 import sqlite3
 import os
+import threading
+import time
 import pandas as pd
-from typing import Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Tuple
+
+from .connection_pool import ConnectionPool, PooledConnection
+from .change_tracking import (
+    FULL_RECOMPUTE_PREDICATE,
+    JOURNAL_TABLE,
+    STALE_ROWS_PREDICATE,
+    TRACKED_TABLES,
+    change_tracking_ddl,
+    overlay_tracking_ddl,
+    record_full_recompute,
+    set_tracking_enabled,
+)
+from .costing import (
+    INSERT_FORECAST_RESULTS_SQL,
+    cost_sales,
+    forecast_result_rows,
+)
+from .standard_costs import (
+    OPERATION_COSTS_SQL,
+    STANDARD_COST_SOURCES,
+    StandardCostCache,
+    invalidate_all_standard_costs,
+    standard_cost_ddl,
+    unit_costs_frame,
+)
+from .pagination import DEFAULT_PAGE_SIZE, KeysetPaginator
+from .indexes import audit_query_plans, ensure_indexes
+from .schema_catalog import SchemaCatalog, TableSchema, is_ddl
+from .scenario_overlays import DELETIONS_TABLE, RESOLVED_SALES_VIEW, overlay_ddl
+from .expense_rollup import (
+    EXPENSE_ROLLUP_SOURCES,
+    ExpenseReportCache,
+    expense_rollup_ddl,
+    invalidate_expense_rollup,
+)
+from .streaming import DEFAULT_BATCH_SIZE, RowStream
+from .bulk_loader import DEFAULT_CHUNK_SIZE, BulkLoadError, bulk_load, write_chunks
+from .write_queue import WriteQueue, requires_autocommit
+from .startup_csv import (
+    LOAD_STATE_TABLE,
+    PARALLEL_PARSE_MIN_BYTES,
+    STARTUP_CSV_FILES,
+    load_order,
+    load_state_ddl,
+    mark_modified,
+    parse_in_pool,
+    read_load_state,
+    record_load_state,
+    source_hash,
+    startup_csv_parser,
+    with_dependents,
+)
+from .templates import (
+    PRISTINE_TEMPLATE,
+    SCHEMA_TEMPLATE,
+    clone_database,
+    fingerprint,
+    remove_stale_templates,
+    schema_fingerprint,
+    template_path,
+)
+
+# Suffix of the side file a template is cloned into before being swapped in
+SHADOW_SUFFIX = '.shadow'
+
+# Tables a reset keeps; everything else is restored from the pristine template
+RESET_PRESERVED_TABLES = ('execution_log',)
+
+# Schema templates built by this process, by template directory; the schema
+# is defined by this code, so it cannot change while the process runs
+_schema_templates: Dict[str, str] = {}
+_schema_templates_lock = threading.Lock()
 
 class DatabaseManager:
-    def __init__(self, database_path: str = None, data_dir: str = None):
+    def __init__(self, database_path: str = None, data_dir: str = None, build_mode: bool = False,
+                 template_dir: str = None):
         # Allow environment overrides first
         env_db_path = os.getenv('DATABASE_PATH')
         env_data_dir = os.getenv('DATA_DIR')
+        # A side database being built to replace another (see rebuild_from_csv):
+        # no durability until it is swapped in, and the given paths always win
+        self.build_mode = build_mode
 
-        if env_db_path:
+        if build_mode:
+            self.database_path = database_path
+            self.data_dir = data_dir
+        elif env_db_path:
             # Full explicit path provided
             self.database_path = env_db_path
             self.data_dir = env_data_dir if env_data_dir else os.path.dirname(env_db_path)
@@ -33,43 +116,100 @@ class DatabaseManager:
         # Ensure data directory exists
         os.makedirs(os.path.dirname(self.database_path), exist_ok=True)
         os.makedirs(self.data_dir, exist_ok=True)
-    
-    def get_connection(self):
-        """Get a new database connection with timeout and proper settings"""
-        import time
-        max_retries = 3
-        retry_delay = 1.0
         
-        for attempt in range(max_retries):
-            try:
-                conn = sqlite3.connect(self.database_path, timeout=30.0)
+        # Prebuilt databases that resets clone (see templates.py)
+        self.template_dir = (
+            template_dir
+            or os.getenv('DB_TEMPLATE_DIR')
+            or os.path.join(os.path.dirname(self.database_path), 'templates')
+        )
+        self._template_lock = threading.Lock()
+        self._schema_template = None
+        self._template_schemas = None
+        self._csv_hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+        self._pool = ConnectionPool(
+            self._open_connection,
+            max_size=int(os.getenv('DB_POOL_SIZE', '10')),
+            idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+        )
+        self._standard_costs = StandardCostCache(
+            max_entries=int(os.getenv('STANDARD_COST_CACHE_SIZE', '20000')),
+            write=lambda fn: self.write_queue.execute(fn),
+        )
+        self.expense_reports = ExpenseReportCache(
+            max_entries=int(os.getenv('EXPENSE_REPORT_CACHE_SIZE', '64'))
+        )
+        self.schema_catalog = SchemaCatalog(self.get_connection)
+        self.write_queue = WriteQueue(self._open_connection)
+    
+    def _open_connection(self, factory=PooledConnection) -> sqlite3.Connection:
+        """Open a new physical connection with timeout and proper settings.
+
+        Writers in this process are serialized by the write queue, so the busy
+        timeout only has to cover readers checkpointing and other processes.
+        """
+        # Pooled connections migrate between worker threads, but are only
+        # ever used by one thread at a time
+        conn = sqlite3.connect(
+            self.database_path,
+            timeout=30.0,
+            factory=factory,
+            check_same_thread=False,
+        )
+        if self.build_mode:
+            # Rollback journal kept in memory so failed loads still roll back
+            conn.execute("PRAGMA journal_mode=MEMORY")
+            conn.execute("PRAGMA synchronous=OFF")
+        else:
+            # Switching the journal mode needs the write lock; WAL persists in the file
+            if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != 'wal':
                 conn.execute("PRAGMA journal_mode=WAL")
-                conn.execute("PRAGMA synchronous=NORMAL")
-                conn.execute("PRAGMA cache_size=10000")
-                conn.execute("PRAGMA temp_store=MEMORY")
-                # Enforce FK constraints for data integrity
-                conn.execute("PRAGMA foreign_keys=ON")
-                return conn
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e) and attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    raise
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=10000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # Enforce FK constraints for data integrity
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+    
+    def get_connection(self):
+        """Get a pooled database connection; close() returns it to the pool"""
+        return self._pool.acquire()
     
     def close_connection(self, conn):
-        """Close a database connection"""
+        """Return a database connection to the pool"""
         if conn:
             conn.close()
     
     def close_all_connections(self):
-        """Close all database connections - placeholder for SQLite"""
-        # SQLite doesn't need explicit connection pooling management
-        # This method is here for API compatibility
-        # For SQLite, we can't force close all connections, but we can
-        # ensure any cached connections are cleared
-        pass
+        """Close all pooled connections.
+
+        Idle connections are closed immediately; connections still checked out
+        are closed when their holder releases them instead of going back to the pool.
+        """
+        self.write_queue.close()
+        self._pool.close_all()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Get connection pool usage counters"""
+        return self._pool.stats()
+    
+    def get_table_schema(self, table_name: str, conn=None) -> TableSchema:
+        """Get cached columns and keys of a table; raises UnknownTableError if it does not exist"""
+        return self.schema_catalog.table(table_name, conn)
+    
+    def get_unit_standard_costs(self, unit_ids=None, conn=None) -> Dict[str, Dict[str, Any]]:
+        """Get standard material/labor/machine cost per unit, keyed by unit_id.
+
+        Pass ``conn`` to read through a connection the caller already holds.
+        """
+        if conn is not None:
+            return self._standard_costs.get_unit_costs(conn, unit_ids)
+        conn = self.get_connection()
+        try:
+            return self._standard_costs.get_unit_costs(conn, unit_ids)
+        finally:
+            conn.close()
     
     def create_tables(self):
         """Create database tables"""
@@ -106,7 +246,8 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS forecast (
                 forecast_id TEXT PRIMARY KEY,
                 name TEXT NOT NULL,
-                description TEXT
+                description TEXT,
+                parent_forecast_id TEXT
             )
         ''')
         
@@ -413,8 +554,54 @@ class DatabaseManager:
             )
         ''')
         
+        # Change journal + triggers that drive incremental forecast_results refreshes
+        cursor.execute(f"SELECT 1 FROM sqlite_master WHERE type='table' AND name='{JOURNAL_TABLE}'")
+        tracking_existed = cursor.fetchone() is not None
+        for statement in change_tracking_ddl():
+            cursor.execute(statement)
+        if not tracking_existed:
+            # Results computed before tracking existed cannot be trusted
+            record_full_recompute(cursor, 'forecast_results')
+        
+        # Materialized per-unit standard costs + invalidation triggers
+        for statement in standard_cost_ddl():
+            cursor.execute(statement)
+        
+        # Monthly expense rollup + the data version that keys cached expense reports
+        for statement in expense_rollup_ddl():
+            cursor.execute(statement)
+        
+        # Content hashes of the loaded CSV files + triggers flagging later changes
+        for statement in load_state_ddl():
+            cursor.execute(statement)
+        
         conn.commit()
         conn.close()
+        self.schema_catalog.invalidate()
+        self.ensure_indexes()
+    
+    def ensure_indexes(self) -> Dict[str, Any]:
+        """Create or migrate the managed secondary indexes (see db.indexes)"""
+        conn = self.get_connection()
+        try:
+            changes = ensure_indexes(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        for action, names in changes.items():
+            if names and action != "skipped":
+                print(f"Indexes {action}: {', '.join(names)}")
+        if changes["skipped"]:
+            print(f"Warning: unique indexes not created because of duplicate keys: {', '.join(changes['skipped'])}")
+        return changes
+    
+    def audit_query_plans(self) -> Dict[str, Any]:
+        """EXPLAIN the hot route queries and flag full table scans"""
+        conn = self.get_connection()
+        try:
+            return audit_query_plans(conn.cursor())
+        finally:
+            conn.close()
     
     def migrate_payroll_table(self):
         """Migrate existing payroll table to new schema"""
@@ -464,6 +651,7 @@ class DatabaseManager:
             conn.rollback()
         finally:
             self.close_connection(conn)
+            self.schema_catalog.invalidate()
 
     def migrate_expenses_table(self):
         """Add forecast_id column to expenses table if missing"""
@@ -481,122 +669,100 @@ class DatabaseManager:
             conn.rollback()
         finally:
             self.close_connection(conn)
+            self.schema_catalog.invalidate()
 
-    def load_csv_data(self):
-        """Load data from CSV files into the database using staging + transaction per table"""
+    def migrate_forecast_table(self):
+        """Add the overlay parent column to the forecast table and create the overlay schema"""
         conn = self.get_connection()
         cursor = conn.cursor()
+        try:
+            cursor.execute("PRAGMA table_info(forecast)")
+            columns = [col[1] for col in cursor.fetchall()]
+            if 'parent_forecast_id' not in columns:
+                cursor.execute('ALTER TABLE forecast ADD COLUMN parent_forecast_id TEXT')
+            # Copy-on-write overlay scenarios (see db.scenario_overlays)
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='trg_forecast_insert_track'")
+            overlays_tracked = cursor.fetchone() is not None
+            for statement in overlay_ddl() + overlay_tracking_ddl(DELETIONS_TABLE):
+                cursor.execute(statement)
+            if not overlays_tracked:
+                # Results computed before overlays were tracked miss their inherited lines
+                record_full_recompute(cursor, 'forecast')
+            conn.commit()
+            print("Forecast table migration completed successfully")
+        except Exception as e:
+            print(f"Error migrating forecast table: {e}")
+            conn.rollback()
+        finally:
+            self.close_connection(conn)
+            self.schema_catalog.invalidate()
 
-        # Define CSV file mappings
-        csv_mappings = {
-            'customers.csv': 'customers',
-            'units.csv': 'units',
-            'sales.csv': 'sales',
-            'bom.csv': 'bom',
-            'bom_definitions.csv': 'bom_definitions',
-            'routers.csv': 'router_definitions',
-            'router_operations.csv': 'router_operations',
-            'routers_legacy.csv': 'routers',
-            'machines.csv': 'machines',
-            'labor_rates.csv': 'labor_rates',
-            'payroll.csv': 'payroll',
-            'payroll_config.csv': 'payroll_config',
-            'forecast.csv': 'forecast',
-            'expense_categories.csv': 'expense_categories',
-            'expenses.csv': 'expenses',
-            'expense_allocations.csv': 'expense_allocations',
-            'loans.csv': 'loans',
-            'loan_payments.csv': 'loan_payments'
-        }
-        
-        for csv_file, table_name in csv_mappings.items():
+    def load_csv_data(self, tables: List[str] = None) -> List[str]:
+        """Load the startup CSV files into the database.
+
+        ``tables`` limits the load to those tables (see changed_csv_tables,
+        which also includes their dependents); they are emptied first,
+        children before parents. A single writer then commits each table in
+        its own transaction, parents before the tables that reference them.
+        For large data sets the CSV chunks are parsed in a pool of
+        CSV_PARSE_WORKERS processes (default: CPU count, at most 4) while
+        the writer inserts the previous chunks. Returns the loaded tables.
+        """
+        start = time.perf_counter()
+        paths = {}
+        for csv_file, table_name in STARTUP_CSV_FILES.items():
+            if tables is not None and table_name not in tables:
+                continue
             csv_path = os.path.join(self.data_dir, csv_file)
             if os.path.exists(csv_path):
-                try:
-                    df = pd.read_csv(csv_path)
-                    
-                    # Handle versioning for BOM and routing tables
-                    if table_name == 'bom':
-                        if 'version' not in df.columns:
-                            df['version'] = '1.0'
-                        if 'labor_type_id' not in df.columns:
-                            df['labor_type_id'] = 'RATE-001'  # Default to general rate
-                    elif table_name == 'routers':
-                        if 'version' not in df.columns:
-                            df['version'] = '1.0'
-                        if 'labor_type_id' not in df.columns:
-                            df['labor_type_id'] = 'RATE-001'  # Default to general rate
-                    elif table_name == 'loans':
-                        # Normalize critical fields to avoid NULLs breaking API models
-                        if 'payment_frequency' not in df.columns:
-                            df['payment_frequency'] = 'monthly'
-                        else:
-                            df['payment_frequency'] = df['payment_frequency'].fillna('monthly')
-                        if 'payment_type' not in df.columns:
-                            df['payment_type'] = 'amortizing'
-                        else:
-                            df['payment_type'] = df['payment_type'].fillna('amortizing')
-                        if 'is_active' in df.columns:
-                            df['is_active'] = df['is_active'].fillna(1).astype(int)
-                        if 'current_balance' in df.columns and 'principal_amount' in df.columns:
-                            df['current_balance'] = df['current_balance'].fillna(df['principal_amount'])
-                        if 'monthly_payment_amount' in df.columns:
-                            df['monthly_payment_amount'] = df['monthly_payment_amount'].fillna(0)
-                        if 'next_payment_date' in df.columns and 'start_date' in df.columns:
-                            # If next_payment_date missing, leave it null here; app will compute fallback
-                            df['next_payment_date'] = df['next_payment_date']
-                    elif table_name == 'units':
-                        # Update units table to support versioning
-                        if 'bom_id' not in df.columns and 'bom' in df.columns:
-                            df['bom_id'] = df['bom']
-                        if 'router_id' not in df.columns and 'router' in df.columns:
-                            df['router_id'] = df['router']
-                        if 'bom_version' not in df.columns:
-                            df['bom_version'] = '1.0'
-                        if 'router_version' not in df.columns:
-                            df['router_version'] = '1.0'
-                    elif table_name == 'machines':
-                        # Add available_minutes_per_month if not present
-                        if 'available_minutes_per_month' not in df.columns:
-                            df['available_minutes_per_month'] = 10000  # Default capacity
-
-                    # Align DataFrame with existing table schema
-                    cursor.execute(f"PRAGMA table_info({table_name})")
-                    existing_cols = [col[1] for col in cursor.fetchall()]
-                    dropped_cols = [c for c in df.columns if c not in existing_cols]
-                    if dropped_cols:
-                        print(f"Warning: The following columns in {csv_file} are not present in the {table_name} table schema and will be dropped: {dropped_cols}")
-                    df = df[[c for c in df.columns if c in existing_cols]]
-
-                    # Use a staging table to ensure atomic replace
-                    staging = f"{table_name}__staging"
-                    # Replace staging with DataFrame schema and data
-                    df.to_sql(staging, conn, if_exists='replace', index=False)
-
-                    # Build column list for deterministic insert order
-                    cols_csv = ', '.join(df.columns)
-                    try:
-                        cursor.execute("BEGIN")
-                        cursor.execute(f"DELETE FROM {table_name}")
-                        cursor.execute(f"INSERT INTO {table_name} ({cols_csv}) SELECT {cols_csv} FROM {staging}")
-                        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
-                        conn.commit()
-                        print(f"Loaded {csv_file} into {table_name} table (transactional)")
-                    except Exception as tx_err:
-                        conn.rollback()
-                        # Drop staging to avoid clutter, ignore errors
-                        try:
-                            cursor.execute(f"DROP TABLE IF EXISTS {staging}")
-                            conn.commit()
-                        except Exception:
-                            pass
-                        raise tx_err
-                except Exception as e:
-                    print(f"Error loading {csv_file}: {str(e)}")
+                paths[table_name] = csv_path
             else:
                 print(f"CSV file not found: {csv_path}")
+        if tables is not None:
+            self._clear_csv_tables(tables)
+        
+        order = load_order(list(paths), self.get_table_schema)
+        workers = self._csv_parse_workers(list(paths.values()))
+        executor = None
+        if workers > 1:
+            try:
+                # Spawned rather than forked: the writer and pool threads may hold locks
+                executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, NotImplementedError) as e:
+                print(f"Parsing CSV files serially, worker processes unavailable: {e}")
+        
+        rows_total = 0
+        loaded = {}
+        try:
+            for table_name in order:
+                csv_file = os.path.basename(paths[table_name])
+                schema = self.get_table_schema(table_name)
+                content_hash = source_hash(paths[table_name], schema)
+                parser = startup_csv_parser(table_name, schema)
+                if executor is not None:
+                    chunks = parse_in_pool(executor, parser, paths[table_name], ahead=workers + 1)
+                else:
+                    chunks = parser.chunks(paths[table_name])
+                result = self.bulk_write_chunks(table_name, chunks, mode='replace')
+                if result["status"] == "success":
+                    if parser.dropped_columns:
+                        print(f"Warning: The following columns in {csv_file} are not present in the {table_name} table schema and were dropped: {parser.dropped_columns}")
+                    rows_total += result["rows_loaded"]
+                    loaded[table_name] = (csv_file, content_hash, result["rows_loaded"])
+                    print(f"Loaded {csv_file} into {table_name} table: {result['rows_loaded']} rows in "
+                          f"{result['elapsed_seconds']}s ({result['rows_per_second']} rows/s)")
+                else:
+                    print(f"Error loading {csv_file}: {result['error']}")
+                    for error in result.get("errors", [])[:5]:
+                        print(f"  line {error['line']}, {error['column']}: {error['error']}")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        print(f"Loaded {rows_total} rows from {len(order)} CSV files in {time.perf_counter() - start:.3f}s"
+              f"{f' ({workers} parsing processes)' if executor is not None else ''}")
         
         # Create BOM definitions from existing BOM data
+        conn = self.get_connection()
         try:
             cursor = conn.cursor()
             
@@ -632,7 +798,166 @@ class DatabaseManager:
             print(f"Error creating BOM definitions: {str(e)}")
         
         conn.close()
+        
+        # Recorded last: the BOM definitions above must not count as a change
+        def record(conn):
+            cursor = conn.cursor()
+            for table_name, (csv_file, content_hash, rows_loaded) in loaded.items():
+                record_load_state(cursor, table_name, csv_file, content_hash, rows_loaded)
+        
+        self.write_queue.execute(record)
+        return list(loaded)
     
+    def changed_csv_tables(self, include_unsourced: bool = False) -> List[str]:
+        """Startup tables to reload so they match their CSV files again, in load order.
+
+        A table is reloaded when its file's content hash differs from the
+        one it was loaded from, or it was modified since; the tables that
+        reference or are derived from those are reloaded with them. With
+        ``include_unsourced``, tables without a CSV file that hold rows are
+        included too (a reset empties them).
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            state = read_load_state(cursor)
+            changed = []
+            for csv_file, table_name in STARTUP_CSV_FILES.items():
+                csv_path = os.path.join(self.data_dir, csv_file)
+                if os.path.exists(csv_path):
+                    loaded = state.get(table_name)
+                    if (loaded is None or loaded["modified"]
+                            or loaded["content_hash"] != source_hash(csv_path, self.get_table_schema(table_name, conn))):
+                        changed.append(table_name)
+                elif include_unsourced:
+                    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name})")
+                    if cursor.fetchone()[0]:
+                        changed.append(table_name)
+        finally:
+            conn.close()
+        
+        startup_tables = list(dict.fromkeys(STARTUP_CSV_FILES.values()))
+        tables = with_dependents(changed, startup_tables, self.get_table_schema)
+        return load_order([t for t in startup_tables if t in tables], self.get_table_schema)
+    
+    def _clear_csv_tables(self, tables: List[str]):
+        """Empty startup tables, children first, and forget what they were loaded from"""
+        def clear(conn):
+            cursor = conn.cursor()
+            set_tracking_enabled(cursor, False)
+            for table in reversed(load_order(tables, self.get_table_schema)):
+                cursor.execute(f"DELETE FROM {table}")
+                cursor.execute(f"DELETE FROM {LOAD_STATE_TABLE} WHERE table_name = ?", (table,))
+            set_tracking_enabled(cursor, True)
+            if any(table in TRACKED_TABLES for table in tables):
+                record_full_recompute(cursor, 'csv_reload')
+            if any(table in STANDARD_COST_SOURCES for table in tables):
+                invalidate_all_standard_costs(cursor)
+            if any(table in EXPENSE_ROLLUP_SOURCES for table in tables):
+                invalidate_expense_rollup(cursor)
+        
+        self.write_queue.execute(clear)
+    
+    @staticmethod
+    def _csv_parse_workers(paths) -> int:
+        """Worker processes for parsing startup CSVs; 1 parses in the writer itself"""
+        if sum(os.path.getsize(path) for path in paths) < PARALLEL_PARSE_MIN_BYTES:
+            return 1
+        return max(1, int(os.getenv("CSV_PARSE_WORKERS", min(os.cpu_count() or 1, 4))))
+    
+    def bulk_load_csv(self, table_name: str, source, mode: str = "append",
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, transform=None) -> Dict[str, Any]:
+        """Stream a CSV file (path or binary file object) into a table in one transaction.
+
+        Runs as an exclusive write queue job; see db.bulk_loader for the
+        modes (append, replace, upsert) and the per-chunk validation.
+        """
+        def load(conn, schema, table_schema):
+            return bulk_load(conn, schema, source, mode, chunk_size, transform, table_schema)
+        
+        # Replace loads drop the triggers that would flag the change; flagged
+        # up front, a failed load only costs an extra reload
+        self.write_queue.execute(lambda conn: mark_modified(conn.cursor(), table_name))
+        result = self._run_bulk_load(table_name, load)
+        if result["status"] == "success":
+            print(f"Bulk loaded {result['rows_loaded']} rows into {table_name} "
+                  f"({result['mode']}) in {result['elapsed_seconds']}s, {result['rows_per_second']} rows/s")
+        return result
+    
+    def bulk_write_chunks(self, table_name: str, chunks, mode: str = "append") -> Dict[str, Any]:
+        """Write chunks parsed by bulk_loader.CsvChunkParser into a table in one transaction"""
+        def write(conn, schema, table_schema):
+            return write_chunks(conn, schema, chunks, mode, table_schema,
+                                enforce_foreign_keys=not self.build_mode)
+        
+        return self._run_bulk_load(table_name, write)
+    
+    def _run_bulk_load(self, table_name: str, load) -> Dict[str, Any]:
+        def run():
+            conn = self.get_connection()
+            try:
+                schema = self.get_table_schema(table_name, conn)
+                return load(conn, schema, lambda name: self.get_table_schema(name, conn))
+            finally:
+                conn.close()
+        
+        try:
+            result = self.write_queue.execute_exclusive(run)
+        except BulkLoadError as e:
+            return {"status": "error", "error": str(e), "errors": e.errors}
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+        if result.get("skipped_indexes"):
+            print(f"Warning: unique indexes on {table_name} not recreated because of duplicate keys: "
+                  f"{', '.join(result['skipped_indexes'])}")
+        return {"status": "success", **result}
+    
+    def _table_data_query(
+        self,
+        cursor,
+        table_name: str,
+        forecast_id: str = None,
+        filters: Dict[str, Any] = None,
+        limit: int = None,
+        offset: int = None,
+    ):
+        """Build the filtered SELECT used by get_table_data and stream_table_data"""
+        # Validates the table name before it is interpolated below
+        columns = self.get_table_schema(table_name, cursor.connection).columns
+
+        # Build base query
+        query = f"SELECT * FROM {table_name}"
+        params = []
+        where_clauses = []
+
+        # Apply forecast filtering when column exists
+        if forecast_id and "forecast_id" in columns:
+            where_clauses.append("forecast_id = ?")
+            params.append(forecast_id)
+
+        # Apply column filters
+        if filters:
+            for col, val in filters.items():
+                if col in columns:
+                    where_clauses.append(f"{col} = ?")
+                    params.append(val)
+
+        if where_clauses:
+            query += " WHERE " + " AND ".join(where_clauses)
+
+        # Add pagination
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+            if offset:
+                query += " OFFSET ?"
+                params.append(offset)
+        elif offset is not None:
+            query += " LIMIT -1 OFFSET ?"
+            params.append(offset)
+
+        return query, params, columns
+
     def get_table_data(
         self,
         table_name: str,
@@ -646,40 +971,9 @@ class DatabaseManager:
         cursor = conn.cursor()
 
         try:
-            # Get column names
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = [col[1] for col in cursor.fetchall()]
-
-            # Build base query
-            query = f"SELECT * FROM {table_name}"
-            params = []
-            where_clauses = []
-
-            # Apply forecast filtering when column exists
-            if forecast_id and "forecast_id" in columns:
-                where_clauses.append("forecast_id = ?")
-                params.append(forecast_id)
-
-            # Apply column filters
-            if filters:
-                for col, val in filters.items():
-                    if col in columns:
-                        where_clauses.append(f"{col} = ?")
-                        params.append(val)
-
-            if where_clauses:
-                query += " WHERE " + " AND ".join(where_clauses)
-
-            # Add pagination
-            if limit is not None:
-                query += " LIMIT ?"
-                params.append(limit)
-                if offset:
-                    query += " OFFSET ?"
-                    params.append(offset)
-            elif offset is not None:
-                query += " LIMIT -1 OFFSET ?"
-                params.append(offset)
+            query, params, columns = self._table_data_query(
+                cursor, table_name, forecast_id, filters, limit, offset
+            )
 
             # Get data
             cursor.execute(query, params)
@@ -702,48 +996,222 @@ class DatabaseManager:
             conn.close()
 
         return result
+
+    def get_table_page(
+        self,
+        table_name: str,
+        forecast_id: str = None,
+        filters: Dict[str, Any] = None,
+        cursor: str = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        include_total: bool = False,
+        sort_by: str = None,
+    ) -> Dict[str, Any]:
+        """Get one keyset page of a table, ordered by ``sort_by`` (if any) then the primary key.
+
+        Raises InvalidCursorError for a token issued by another table or sort order.
+        """
+        conn = self.get_connection()
+        db_cursor = conn.cursor()
+
+        try:
+            schema = self.get_table_schema(table_name, conn)
+            columns = schema.columns
+            primary_key = schema.primary_key
+
+            if sort_by is not None and sort_by not in columns:
+                raise ValueError(f"Unknown sort column '{sort_by}' for table '{table_name}'")
+
+            query, params, _ = self._table_data_query(db_cursor, table_name, forecast_id, filters)
+            sort_keys = primary_key or ["rowid"]
+            if not primary_key:
+                # Tables without a declared key page on their rowid
+                query = query.replace("SELECT *", "SELECT rowid, *", 1)
+            if sort_by and sort_by not in sort_keys:
+                sort_keys = [sort_by] + sort_keys
+
+            paginator = KeysetPaginator(sort_keys, scope=table_name)
+            data, pagination = paginator.paginate(
+                db_cursor, query, params,
+                cursor=cursor, page_size=page_size, include_total=include_total,
+            )
+            if not primary_key:
+                for row in data:
+                    row.pop("rowid", None)
+
+            result = {
+                "status": "success",
+                "data": data,
+                "columns": columns,
+                "pagination": pagination,
+            }
+        finally:
+            conn.close()
+
+        return result
+
+    def stream_query(self, query: str, params=(), batch_size: int = DEFAULT_BATCH_SIZE) -> RowStream:
+        """Execute a read query and return its rows as a lazily fetched RowStream"""
+        return RowStream(self.get_connection(), query, params, batch_size=batch_size)
+
+    def stream_table_data(
+        self,
+        table_name: str,
+        forecast_id: str = None,
+        filters: Dict[str, Any] = None,
+        limit: int = None,
+        offset: int = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> RowStream:
+        """Like get_table_data, but rows are fetched lazily; raises on query errors"""
+        conn = self.get_connection()
+        try:
+            query, params, _ = self._table_data_query(
+                conn.cursor(), table_name, forecast_id, filters, limit, offset
+            )
+        except Exception:
+            conn.close()
+            raise
+        return RowStream(conn, query, params, batch_size=batch_size)
+    
+    def _refresh_forecast_results(self, conn, full: bool = False) -> Dict[str, Any]:
+        """Recompute the forecast_results rows made stale by journaled changes.
+
+        Only sales whose (unit_id, period, customer_id) is covered by the change
+        journal are re-costed. ``conn`` is only read: when nothing changed no
+        write is queued, otherwise the recompute runs on the write queue and
+        this waits for it.
+        """
+        import time
+        
+        start_time = time.time()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT MAX(change_id) FROM {JOURNAL_TABLE}")
+        pending = cursor.fetchone()[0]
+        if pending is None and not full:
+            return {
+                "mode": "clean",
+                "changes_applied": 0,
+                "rows_recomputed": 0,
+                "forecast_date": None,
+                "execution_time_ms": int((time.time() - start_time) * 1000),
+            }
+        
+        result = self.write_queue.execute(lambda write_conn: self._recompute_forecast_results(write_conn, full))
+        result["execution_time_ms"] = int((time.time() - start_time) * 1000)
+        return result
     
-    def get_forecast_data(self) -> Dict[str, Any]:
-        """Get comprehensive forecast data with joins and append computed results to forecast_results"""
+    def _recompute_forecast_results(self, conn, full: bool) -> Dict[str, Any]:
+        """Write queue job of _refresh_forecast_results.
+
+        The queue holds the write lock for the whole job, so the sales snapshot
+        costed is the one the journal entries read here describe.
+        """
+        from datetime import datetime
+        
+        cursor = conn.cursor()
+        forecast_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute(f"SELECT MAX(change_id), COUNT(*) FROM {JOURNAL_TABLE}")
+        max_change_id, changes_applied = cursor.fetchone()
+        max_change_id = max_change_id or 0
+        
+        if not full:
+            cursor.execute(
+                f"SELECT 1 FROM {JOURNAL_TABLE} WHERE change_id <= ? AND {FULL_RECOMPUTE_PREDICATE} LIMIT 1",
+                (max_change_id,)
+            )
+            full = cursor.fetchone() is not None
+        
+        params = {"max_change_id": max_change_id}
+        if full:
+            cursor.execute("DELETE FROM forecast_results")
+            sales_filter = ""
+        else:
+            cursor.execute(
+                f"DELETE FROM forecast_results WHERE {STALE_ROWS_PREDICATE.format(alias='forecast_results')}",
+                params
+            )
+            sales_filter = f"WHERE {STALE_ROWS_PREDICATE.format(alias='s')}"
+        
+        # Overlay scenarios are costed from their resolved lines, inherited ones included
+        cursor.execute(f'''
+            SELECT s.sale_id, s.customer_id, s.unit_id, s.period, s.quantity,
+                   s.unit_price, s.total_revenue, s.forecast_id,
+                   c.customer_name, u.unit_name, u.base_price, u.bom_id, u.router_id
+            FROM {RESOLVED_SALES_VIEW} s
+            LEFT JOIN customers c ON s.customer_id = c.customer_id
+            LEFT JOIN units u ON s.unit_id = u.unit_id
+            {sales_filter}
+            ORDER BY s.period, s.customer_id
+        ''', params if sales_filter else ())
+        sales_rows = cursor.fetchall()
+        sales_columns = [description[0] for description in cursor.description]
+        sales_data = [dict(zip(sales_columns, row)) for row in sales_rows]
+        
+        if sales_data:
+            # Cost every stale sale in one batch: standard costs are looked up
+            # once per unit, then joined onto the sales lines as columns
+            unit_costs = unit_costs_frame(self._standard_costs.get_unit_costs(
+                conn, [sale['unit_id'] for sale in sales_data]
+            ))
+            sales_frame = pd.DataFrame.from_records(sales_rows, columns=sales_columns)
+            costs = cost_sales(sales_frame, unit_costs)
+            cursor.executemany(
+                INSERT_FORECAST_RESULTS_SQL,
+                forecast_result_rows(sales_data, costs, forecast_date)
+            )
+        
+        cursor.execute(f"DELETE FROM {JOURNAL_TABLE} WHERE change_id <= ?", (max_change_id,))
+        
+        return {
+            "mode": "full" if full else "incremental",
+            "changes_applied": changes_applied,
+            "rows_recomputed": len(sales_data),
+            "forecast_date": forecast_date,
+        }
+    
+    def refresh_forecast_results(self, full: bool = False) -> Dict[str, Any]:
+        """Bring forecast_results up to date with the source tables"""
+        conn = self.get_connection()
+        try:
+            result = {
+                "status": "success",
+                "data": self._refresh_forecast_results(conn, full=full),
+            }
+        except Exception as e:
+            result = {
+                "status": "error",
+                "error": str(e)
+            }
+        finally:
+            conn.close()
+        
+        return result
+    
+    def get_forecast_data(self, forecast_id: str = None) -> Dict[str, Any]:
+        """Get comprehensive forecast data with joins, refreshing stale forecast_results first.
+
+        Sales are read through resolved_sales, so an overlay scenario's
+        ``forecast_id`` returns its inherited lines too, without deleted ones.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Ensure forecast_results table exists
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS forecast_results (
-                    forecast_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    forecast_date TEXT NOT NULL,
-                    period TEXT NOT NULL,
-                    customer_id TEXT,
-                    customer_name TEXT,
-                    unit_id TEXT,
-                    unit_name TEXT,
-                    quantity INTEGER,
-                    unit_price REAL,
-                    total_revenue REAL,
-                    material_cost REAL,
-                    labor_cost REAL,
-                    machine_cost REAL,
-                    total_cost REAL,
-                    gross_margin REAL,
-                    margin_percentage REAL,
-                    FOREIGN KEY (customer_id) REFERENCES customers (customer_id),
-                    FOREIGN KEY (unit_id) REFERENCES units (unit_id)
-                )
-            ''')
-            cursor.execute("DELETE FROM forecast_results")
+            # Only rows affected by changes since the last refresh are rewritten
+            refresh = self._refresh_forecast_results(conn)
             
             # Get sales with customer and unit information
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT s.sale_id, s.customer_id, s.unit_id, s.period, s.quantity,
                        s.unit_price, s.total_revenue, s.forecast_id,
                        c.customer_name, u.unit_name, u.base_price, u.bom_id, u.router_id
-                FROM sales s
+                FROM {RESOLVED_SALES_VIEW} s
                 LEFT JOIN customers c ON s.customer_id = c.customer_id
                 LEFT JOIN units u ON s.unit_id = u.unit_id
+                {"WHERE s.forecast_id = ?" if forecast_id else ""}
                 ORDER BY s.period, s.customer_id
-            ''')
+            ''', (forecast_id,) if forecast_id else ())
             sales_rows = cursor.fetchall()
             
             # Convert sales data to list of dictionaries
@@ -752,117 +1220,29 @@ class DatabaseManager:
                            'unit_name', 'base_price', 'bom_id', 'router_id']
             sales_data = [dict(zip(sales_columns, row)) for row in sales_rows]
             
-            # Get BOM data with total cost per BOM and full BOM details
-            cursor.execute('''
-                SELECT bom_id, SUM(material_cost) as total_bom_cost
-                FROM bom
-                GROUP BY bom_id
-            ''')
-            bom_costs = {row[0]: row[1] for row in cursor.fetchall()}
-
             cursor.execute('SELECT * FROM bom ORDER BY bom_id, bom_line')
             bom_rows = cursor.fetchall()
-            cursor.execute('PRAGMA table_info(bom)')
-            bom_columns = [col[1] for col in cursor.fetchall()]
+            bom_columns = [description[0] for description in cursor.description]
             bom_data = [dict(zip(bom_columns, row)) for row in bom_rows]
             
-            # Get routing information with machine costs - handle shared router_id and machine ID mapping
-            cursor.execute('''
-                SELECT r.router_id, r.unit_id, r.machine_id, r.machine_minutes, r.labor_minutes, r.sequence,
-                       u.unit_name, m.machine_name, m.machine_rate,
-                       (r.machine_minutes * m.machine_rate / 60.0) as machine_cost_per_unit,
-                       r.labor_minutes
-                FROM routers r
-                LEFT JOIN units u ON r.unit_id = u.unit_id
-                LEFT JOIN machines m ON ('WC000' || SUBSTR(r.machine_id, 3)) = m.machine_id
-                ORDER BY r.unit_id, r.sequence
+            # Routing operations with the labor and machine costs summed into
+            # unit standard costs, the costs forecast_results are computed from
+            cursor.execute(f'''
+                SELECT o.router_id, u.unit_id, u.unit_name, o.machine_id, o.machine_name, o.machine_rate,
+                       o.machine_minutes, o.labor_minutes, o.sequence, o.labor_type_id, o.labor_rate,
+                       o.labor_cost, o.machine_cost
+                FROM ({OPERATION_COSTS_SQL}) o
+                JOIN units u ON u.router_id = o.router_id
+                ORDER BY u.unit_id, o.sequence
             ''')
-            router_rows = cursor.fetchall()
+            router_columns = [description[0] for description in cursor.description]
+            router_data = [dict(zip(router_columns, row)) for row in cursor.fetchall()]
             
-            # Convert router data to list of dictionaries
-            router_columns = ['router_id', 'unit_id', 'machine_id', 'machine_minutes', 'labor_minutes', 
-                             'sequence', 'unit_name', 'machine_name', 'machine_rate', 
-                             'machine_cost_per_unit', 'labor_minutes_raw']
-            router_data = [dict(zip(router_columns, row)) for row in router_rows]
-            
-            # Get labor rates for better calculation
-            cursor.execute('SELECT rate_type, AVG(rate_amount) as avg_rate FROM labor_rates GROUP BY rate_type')
-            labor_rates = {row[0]: row[1] for row in cursor.fetchall()}
-            
-            # Get payroll data for labor rate calculation
             cursor.execute('SELECT * FROM payroll ORDER BY employee_id')
-            payroll_rows = cursor.fetchall()
-            
-            # Convert payroll data to list of dictionaries
-            cursor.execute("PRAGMA table_info(payroll)")
-            payroll_columns = [col[1] for col in cursor.fetchall()]
-            payroll_data = [dict(zip(payroll_columns, row)) for row in payroll_rows]
-            
-            # Calculate average labor rate from payroll data or use default
-            avg_labor_rate = 35.0  # Default fallback
-            if payroll_data:
-                total_rate = sum(row['hourly_rate'] for row in payroll_data)
-                avg_labor_rate = total_rate / len(payroll_data)
-            elif 'Hourly' in labor_rates:
-                avg_labor_rate = labor_rates['Hourly']
-            
-            # Compute and save forecast results
-            from datetime import datetime
-            forecast_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Process each sale and compute forecast
-            for sale in sales_data:
-                # Extract values from dictionary
-                sale_id = sale['sale_id']
-                customer_id = sale['customer_id']
-                unit_id = sale['unit_id']
-                period = sale['period']
-                quantity = sale['quantity']
-                unit_price = sale['unit_price']
-                total_revenue = sale['total_revenue']
-                forecast_id = sale['forecast_id']
-                customer_name = sale['customer_name']
-                unit_name = sale['unit_name']
-                base_price = sale['base_price']
-                bom_id = sale['bom_id']
-                router_id = sale['router_id']
-                
-                # Get BOM cost for this unit
-                bom_cost = bom_costs.get(bom_id, 0.0)
-                
-                # Get routing costs for this unit (sum all operations for this unit)
-                machine_cost_per_unit = 0.0
-                labor_cost_per_unit = 0.0
-                for router in router_data:
-                    if router['unit_id'] == unit_id:  # router.unit_id matches sale.unit_id
-                        machine_cost_per_unit += router['machine_cost_per_unit'] or 0.0
-                        labor_cost_per_unit += (router['labor_minutes_raw'] or 0.0) * avg_labor_rate / 60.0  # labor_minutes * rate / 60
-                
-                # Calculate total costs
-                material_cost = bom_cost * quantity
-                labor_cost = labor_cost_per_unit * quantity
-                machine_cost = machine_cost_per_unit * quantity
-                total_cost = material_cost + labor_cost + machine_cost
-                
-                # Calculate margins
-                gross_margin = total_revenue - total_cost
-                margin_percentage = (gross_margin / total_revenue * 100) if total_revenue > 0 else 0
-                
-                # Insert forecast result
-                cursor.execute('''
-                    INSERT INTO forecast_results (
-                        forecast_date, period, customer_id, customer_name, unit_id, unit_name,
-                        quantity, unit_price, total_revenue, material_cost, labor_cost,
-                        machine_cost, total_cost, gross_margin, margin_percentage
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    forecast_date, period, customer_id, customer_name, unit_id, unit_name,
-                    quantity, unit_price, total_revenue, material_cost, labor_cost,
-                    machine_cost, total_cost, gross_margin, margin_percentage
-                ))
+            payroll_columns = [description[0] for description in cursor.description]
+            payroll_data = [dict(zip(payroll_columns, row)) for row in cursor.fetchall()]
             
-            # Commit the forecast results
-            conn.commit()
+            unit_standard_costs = self._standard_costs.get_unit_costs(conn)
             
             # Get the saved forecast results
             cursor.execute('''
@@ -870,10 +1250,7 @@ class DatabaseManager:
                 ORDER BY period, customer_id, unit_id
             ''')
             forecast_results = cursor.fetchall()
-            
-            # Get column names for forecast results
-            cursor.execute("PRAGMA table_info(forecast_results)")
-            forecast_columns = [col[1] for col in cursor.fetchall()]
+            forecast_columns = [description[0] for description in cursor.description]
             
             # Convert forecast results to list of dictionaries
             forecast_data_list = []
@@ -885,14 +1262,13 @@ class DatabaseManager:
                 "data": {
                     "sales_forecast": sales_data,
                     "bom_data": bom_data,
-                    "bom_costs": bom_costs,
                     "router_data": router_data,
                     "payroll_data": payroll_data,
-                    "labor_rates": labor_rates,
+                    "unit_standard_costs": unit_standard_costs,
                     "forecast_results": forecast_data_list,
                     "forecast_columns": forecast_columns,
-                    "forecast_date": forecast_date,
-                    "avg_labor_rate": avg_labor_rate
+                    "forecast_date": refresh["forecast_date"] or self._latest_forecast_date(cursor),
+                    "refresh": refresh
                 }
             }
         except Exception as e:
@@ -905,6 +1281,44 @@ class DatabaseManager:
         
         return result
     
+    def _latest_forecast_date(self, cursor):
+        cursor.execute("SELECT MAX(forecast_date) FROM forecast_results")
+        return cursor.fetchone()[0]
+    
+    def _saved_forecast_results_query(self, period: str = None, limit: int = None):
+        query = "SELECT * FROM forecast_results"
+        params = []
+        
+        if period:
+            query += " WHERE period = ?"
+            params.append(period)
+        
+        query += " ORDER BY forecast_date DESC, period, customer_id, unit_id"
+        
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        
+        return query, params
+    
+    def _forecast_results_summary(self, cursor) -> Dict[str, Any]:
+        cursor.execute('''
+            SELECT 
+                COUNT(*) as total_records,
+                SUM(total_revenue) as total_revenue,
+                SUM(total_cost) as total_cost,
+                SUM(gross_margin) as total_margin,
+                AVG(margin_percentage) as avg_margin_percentage
+            FROM forecast_results
+        ''')
+        summary = cursor.fetchone()
+        return {
+            "total_records": summary[0],
+            "total_revenue": summary[1],
+            "total_cost": summary[2],
+            "total_margin": summary[3],
+            "avg_margin_percentage": summary[4]
+        }
+    
     def get_saved_forecast_results(self, period: str = None, limit: int = None) -> Dict[str, Any]:
         """Get saved forecast results from the database"""
         conn = self.get_connection()
@@ -912,54 +1326,22 @@ class DatabaseManager:
         
         try:
             # Build query with optional filters
-            query = "SELECT * FROM forecast_results"
-            params = []
-            
-            if period:
-                query += " WHERE period = ?"
-                params.append(period)
-            
-            query += " ORDER BY forecast_date DESC, period, customer_id, unit_id"
-            
-            if limit:
-                query += f" LIMIT {limit}"
-            
+            query, params = self._saved_forecast_results_query(period, limit)
             cursor.execute(query, params)
             forecast_results = cursor.fetchall()
             
-            # Get column names
-            cursor.execute("PRAGMA table_info(forecast_results)")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = self.get_table_schema('forecast_results', conn).columns
             
             # Convert to list of dictionaries
             data = []
             for row in forecast_results:
                 data.append(dict(zip(columns, row)))
             
-            # Get summary statistics
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_records,
-                    SUM(total_revenue) as total_revenue,
-                    SUM(total_cost) as total_cost,
-                    SUM(gross_margin) as total_margin,
-                    AVG(margin_percentage) as avg_margin_percentage
-                FROM forecast_results
-            ''')
-            summary = cursor.fetchone()
-            summary_data = {
-                "total_records": summary[0],
-                "total_revenue": summary[1],
-                "total_cost": summary[2],
-                "total_margin": summary[3],
-                "avg_margin_percentage": summary[4]
-            }
-            
             result = {
                 "status": "success",
                 "data": data,
                 "columns": columns,
-                "summary": summary_data
+                "summary": self._forecast_results_summary(cursor)
             }
         except Exception as e:
             result = {
@@ -971,27 +1353,54 @@ class DatabaseManager:
         
         return result
     
-    def execute_sql(self, sql_statement: str, description: str = None, user_id: str = None, session_id: str = None) -> Dict[str, Any]:
-        """Execute SQL statement and return results"""
+    def stream_saved_forecast_results(self, period: str = None, limit: int = None,
+                                      batch_size: int = DEFAULT_BATCH_SIZE) -> RowStream:
+        """Like get_saved_forecast_results, with rows fetched lazily and the summary in ``metadata``"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        try:
+            summary = self._forecast_results_summary(conn.cursor())
+        except Exception:
+            conn.close()
+            raise
+        query, params = self._saved_forecast_results_query(period, limit)
+        return RowStream(conn, query, params, batch_size=batch_size, metadata={"summary": summary})
+    
+    def execute_sql(self, sql_statement: str, description: str = None, user_id: str = None, session_id: str = None) -> Dict[str, Any]:
+        """Execute SQL statement and return results.
+
+        SELECTs run on a pooled connection. Other statements run as write
+        transactions on the write queue, together with their execution_log
+        entry, so concurrent writers are group committed instead of racing
+        for the database lock.
+        """
         # Record execution start time
         import time
         start_time = time.time()
+
+        def elapsed_ms():
+            return int((time.time() - start_time) * 1000)
+
+        def log(status, error_message, rows_affected, execution_time_ms):
+            return lambda wconn: self._log_sql_execution(
+                wconn, sql_statement, description, user_id, session_id,
+                status, error_message, rows_affected, execution_time_ms
+            )
         
         try:
-            cursor.execute(sql_statement)
-            
-            # Calculate execution time
-            execution_time_ms = int((time.time() - start_time) * 1000)
-            
             # Check if it's a SELECT statement
             if sql_statement.strip().upper().startswith('SELECT'):
-                columns = [description[0] for description in cursor.description]
-                rows = cursor.fetchall()
+                conn = self.get_connection()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute(sql_statement)
+                    columns = [description[0] for description in cursor.description]
+                    rows = cursor.fetchall()
+                finally:
+                    conn.close()
                 data = [dict(zip(columns, row)) for row in rows]
-                rows_affected = len(data)
+                
+                # Log the successful execution
+                self.write_queue.execute(log("success", None, len(data), elapsed_ms()))
                 result = {
                     "status": "success",
                     "data": data,
@@ -999,42 +1408,54 @@ class DatabaseManager:
                 }
             else:
                 # For INSERT, UPDATE, DELETE statements
-                conn.commit()
-                rows_affected = cursor.rowcount
+                if requires_autocommit(sql_statement):
+                    rows_affected = self.write_queue.execute_exclusive(
+                        lambda: self._execute_autocommit(sql_statement)
+                    )
+                    self.write_queue.execute(log("success", None, rows_affected, elapsed_ms()))
+                else:
+                    def run(wconn):
+                        rows_affected = wconn.execute(sql_statement).rowcount
+                        log("success", None, rows_affected, elapsed_ms())(wconn)
+                        return rows_affected
+
+                    rows_affected = self.write_queue.execute(run)
+                if is_ddl(sql_statement):
+                    self.schema_catalog.invalidate()
                 result = {
                     "status": "success",
                     "message": f"SQL executed successfully. Rows affected: {rows_affected}"
                 }
             
-            # Log the successful execution
-            self._log_sql_execution(
-                conn, sql_statement, description, user_id, session_id,
-                "success", None, rows_affected, execution_time_ms
-            )
-            
         except Exception as e:
-            # Calculate execution time for failed queries
-            execution_time_ms = int((time.time() - start_time) * 1000)
-            
             # Log the failed execution
-            self._log_sql_execution(
-                conn, sql_statement, description, user_id, session_id,
-                "error", str(e), 0, execution_time_ms
-            )
+            self.write_queue.execute(log("error", str(e), 0, elapsed_ms()))
             
             result = {
                 "status": "error",
                 "error": str(e)
             }
-        finally:
-            conn.close()
         
         return result
     
+    def _execute_autocommit(self, sql_statement: str) -> int:
+        """Run a statement that cannot be part of a transaction (e.g. VACUUM).
+
+        Called as an exclusive write queue job, so no write group is open.
+        """
+        conn = self.get_connection()
+        isolation_level = conn.isolation_level
+        try:
+            conn.isolation_level = None
+            return conn.execute(sql_statement).rowcount
+        finally:
+            conn.isolation_level = isolation_level
+            conn.close()
+    
     def _log_sql_execution(self, conn, sql_statement: str, description: str, user_id: str, 
                           session_id: str, status: str, error_message: str, 
                           rows_affected: int, execution_time_ms: int):
-        """Log SQL execution to the execution_log table"""
+        """Log SQL execution to the execution_log table (committed by the caller)"""
         from datetime import datetime
         
         cursor = conn.cursor()
@@ -1049,8 +1470,6 @@ class DatabaseManager:
             execution_date, sql_statement, description, user_id, session_id,
             status, error_message, rows_affected, execution_time_ms
         ))
-        
-        conn.commit()
     
     def initialize(self):
         """Initialize database - create tables and load data"""
@@ -1061,30 +1480,33 @@ class DatabaseManager:
         database_exists = os.path.exists(self.database_path)
         has_existing_data = False
         
-        if database_exists:
-            try:
-                conn = self.get_connection()
-                cursor = conn.cursor()
-                # Check if key tables have data
-                for table in ['customers', 'units', 'sales', 'bom']:
-                    try:
-                        cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                        count = cursor.fetchone()[0]
-                        if count > 0:
-                            has_existing_data = True
-                            break
-                    except:
-                        continue  # Table might not exist yet
-                conn.close()
-            except:
-                pass  # Database might be corrupted or inaccessible
+        if not database_exists:
+            # A new database starts as a copy of the pristine template
+            template = self.pristine_template()
+            clone_database(template, self.database_path)
+            print(f"Created database from template {os.path.basename(template)}")
+            self.schema_catalog.refresh()
+            print("Database initialization complete")
+            return
         
-        self.create_tables()
-        print("Tables created successfully")
-        self.migrate_payroll_table()
-        print("Payroll table migration completed")
-        self.migrate_expenses_table()
-        print("Expenses table migration completed")
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            # Check if key tables have data
+            for table in ['customers', 'units', 'sales', 'bom']:
+                try:
+                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+                    count = cursor.fetchone()[0]
+                    if count > 0:
+                        has_existing_data = True
+                        break
+                except:
+                    continue  # Table might not exist yet
+            conn.close()
+        except:
+            pass  # Database might be corrupted or inaccessible
+        
+        self.prepare_schema()
         
         # Check for force reload environment variable
         force_reload = os.getenv('FORCE_DB_RELOAD', 'false').lower() == 'true'
@@ -1096,11 +1518,79 @@ class DatabaseManager:
         else:
             if force_reload:
                 print("Force reload requested - loading CSV data over existing data")
+                tables = self.changed_csv_tables()
+                skipped = len(set(STARTUP_CSV_FILES.values())) - len(tables)
+                print(f"Reloading {', '.join(tables) or 'no tables'}; {skipped} tables unchanged since their last load")
+                if tables:
+                    self.load_csv_data(tables)
             else:
                 print("Loading fresh data from CSV files")
-            self.load_csv_data()
+                self.load_csv_data()
             print("Database initialization complete")
+        
+        # Warm the schema catalog so requests don't pay for the first load
+        self.schema_catalog.refresh()
+
+    def prepare_schema(self):
+        """Create the tables and bring older databases up to the current schema"""
+        self.create_tables()
+        print("Tables created successfully")
+        self.migrate_payroll_table()
+        print("Payroll table migration completed")
+        self.migrate_expenses_table()
+        print("Expenses table migration completed")
+        self.migrate_forecast_table()
+        print("Forecast table migration completed")
+        # Indexes on migrated columns could not be created with the tables
+        self.ensure_indexes()
 
+    def _execution_logs_query(self, limit: int = None, user_id: str = None,
+                              session_id: str = None, status: str = None):
+        query = "SELECT * FROM execution_log"
+        params = []
+        conditions = []
+        
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        
+        if session_id:
+            conditions.append("session_id = ?")
+            params.append(session_id)
+        
+        if status:
+            conditions.append("execution_status = ?")
+            params.append(status)
+        
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        
+        query += " ORDER BY execution_date DESC, log_id DESC"
+        
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        
+        return query, params
+    
+    def _execution_log_summary(self, cursor) -> Dict[str, Any]:
+        cursor.execute('''
+            SELECT 
+                COUNT(*) as total_executions,
+                COUNT(CASE WHEN execution_status = 'success' THEN 1 END) as successful_executions,
+                COUNT(CASE WHEN execution_status = 'error' THEN 1 END) as failed_executions,
+                AVG(execution_time_ms) as avg_execution_time_ms,
+                SUM(rows_affected) as total_rows_affected
+            FROM execution_log
+        ''')
+        summary = cursor.fetchone()
+        return {
+            "total_executions": summary[0],
+            "successful_executions": summary[1],
+            "failed_executions": summary[2],
+            "avg_execution_time_ms": summary[3],
+            "total_rows_affected": summary[4]
+        }
+    
     def get_execution_logs(self, limit: int = None, user_id: str = None, 
                           session_id: str = None, status: str = None) -> Dict[str, Any]:
         """Get execution logs with optional filtering"""
@@ -1109,66 +1599,22 @@ class DatabaseManager:
         
         try:
             # Build query with optional filters
-            query = "SELECT * FROM execution_log"
-            params = []
-            conditions = []
-            
-            if user_id:
-                conditions.append("user_id = ?")
-                params.append(user_id)
-            
-            if session_id:
-                conditions.append("session_id = ?")
-                params.append(session_id)
-            
-            if status:
-                conditions.append("execution_status = ?")
-                params.append(status)
-            
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
-            
-            query += " ORDER BY execution_date DESC, log_id DESC"
-            
-            if limit:
-                query += f" LIMIT {limit}"
-            
+            query, params = self._execution_logs_query(limit, user_id, session_id, status)
             cursor.execute(query, params)
             logs = cursor.fetchall()
             
-            # Get column names
-            cursor.execute("PRAGMA table_info(execution_log)")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = self.get_table_schema('execution_log', conn).columns
             
             # Convert to list of dictionaries
             data = []
             for row in logs:
                 data.append(dict(zip(columns, row)))
             
-            # Get summary statistics
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_executions,
-                    COUNT(CASE WHEN execution_status = 'success' THEN 1 END) as successful_executions,
-                    COUNT(CASE WHEN execution_status = 'error' THEN 1 END) as failed_executions,
-                    AVG(execution_time_ms) as avg_execution_time_ms,
-                    SUM(rows_affected) as total_rows_affected
-                FROM execution_log
-            ''')
-            summary = cursor.fetchone()
-            summary_data = {
-                "total_executions": summary[0],
-                "successful_executions": summary[1],
-                "failed_executions": summary[2],
-                "avg_execution_time_ms": summary[3],
-                "total_rows_affected": summary[4]
-            }
-            
             result = {
                 "status": "success",
                 "data": data,
                 "columns": columns,
-                "summary": summary_data
+                "summary": self._execution_log_summary(cursor)
             }
         except Exception as e:
             result = {
@@ -1180,6 +1626,19 @@ class DatabaseManager:
         
         return result
     
+    def stream_execution_logs(self, limit: int = None, user_id: str = None,
+                              session_id: str = None, status: str = None,
+                              batch_size: int = DEFAULT_BATCH_SIZE) -> RowStream:
+        """Like get_execution_logs, with rows fetched lazily and the summary in ``metadata``"""
+        conn = self.get_connection()
+        try:
+            summary = self._execution_log_summary(conn.cursor())
+        except Exception:
+            conn.close()
+            raise
+        query, params = self._execution_logs_query(limit, user_id, session_id, status)
+        return RowStream(conn, query, params, batch_size=batch_size, metadata={"summary": summary})
+    
     def replay_execution_logs(self, target_date: str = None, max_log_id: int = None, 
                              user_id: str = None, session_id: str = None) -> Dict[str, Any]:
         """Replay SQL statements from execution log up to a specific point in time"""
@@ -1212,14 +1671,13 @@ class DatabaseManager:
             cursor.execute(query, params)
             logs_to_replay = cursor.fetchall()
             
-            # Get column names
-            cursor.execute("PRAGMA table_info(execution_log)")
-            columns = [col[1] for col in cursor.fetchall()]
+            columns = self.get_table_schema('execution_log', conn).columns
             
             # Replay each SQL statement
             replayed_count = 0
             failed_count = 0
             errors = []
+            replayed_ddl = False
             
             for log_row in logs_to_replay:
                 log_entry = dict(zip(columns, log_row))
@@ -1230,6 +1688,7 @@ class DatabaseManager:
                     if not sql_statement.strip().upper().startswith('SELECT'):
                         cursor.execute(sql_statement)
                         replayed_count += 1
+                        replayed_ddl = replayed_ddl or is_ddl(sql_statement)
                 except Exception as e:
                     failed_count += 1
                     errors.append({
@@ -1240,6 +1699,8 @@ class DatabaseManager:
             
             # Commit all changes
             conn.commit()
+            if replayed_ddl:
+                self.schema_catalog.invalidate()
             
             result = {
                 "status": "success",
@@ -1258,34 +1719,49 @@ class DatabaseManager:
         
         return result
     
-    def reset_to_initial_state(self) -> Dict[str, Any]:
-        """Reset database to initial state by reloading CSV data"""
+    def reset_to_initial_state(self, shadow: bool = False) -> Dict[str, Any]:
+        """Reset database to initial state by reloading CSV data.
+
+        Only tables whose CSV file changed or whose rows were modified since
+        their last load are reloaded, together with their dependents. With
+        ``shadow`` the database is instead replaced by a copy of the pristine
+        template (see restore_template), so readers never see partly loaded
+        tables and the CSV files are only parsed when the template is stale.
+        """
+        if shadow:
+            try:
+                summary = self.restore_template()
+            except Exception as e:
+                return {"status": "error", "error": str(e)}
+            return {
+                "status": "success",
+                "message": "Database restored from the pristine template",
+                "reloaded_tables": summary["loaded_tables"],
+                "shadow": summary
+            }
+        
         try:
-            # Clear all data tables (but keep execution_log and forecast_results)
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            tables = self.changed_csv_tables(include_unsourced=True)
             
-            tables_to_clear = [
-                'customers', 'units', 'sales', 'bom', 'routers', 'machines', 'labor_rates',
-                'payroll', 'forecast',
-                'router_definitions', 'router_operations',
-                'expense_categories', 'expenses', 'expense_allocations',
-                'loans', 'loan_payments',
-                'forecast_results'  # optional: clear computed results
-            ]
-            
-            for table in tables_to_clear:
-                cursor.execute(f"DELETE FROM {table}")
+            # Computed results are dropped even when no table needs reloading
+            def clear_results(conn):
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM forecast_results")
+                cursor.execute(f"DELETE FROM {JOURNAL_TABLE}")
+                record_full_recompute(cursor, 'reset')
+                invalidate_all_standard_costs(cursor)
+                invalidate_expense_rollup(cursor)
             
-            conn.commit()
-            conn.close()
+            self.write_queue.execute(clear_results)
             
             # Reload CSV data
-            self.load_csv_data()
+            if tables:
+                self.load_csv_data(tables)
             
             result = {
                 "status": "success",
-                "message": "Database reset to initial state with CSV data reloaded"
+                "message": "Database reset to initial state with CSV data reloaded",
+                "reloaded_tables": tables
             }
         except Exception as e:
             result = {
@@ -1295,6 +1771,198 @@ class DatabaseManager:
         
         return result
 
+    def schema_template(self) -> str:
+        """Path of the empty schema template, built the first time this process asks for it"""
+        key = os.path.abspath(self.template_dir)
+        with _schema_templates_lock:
+            path = _schema_templates.get(key)
+            if path is None or not os.path.exists(path):
+                path = self._build_schema_template()
+                _schema_templates[key] = path
+        if self._schema_template != path:
+            # Column lists for hashing the CSVs, which the live database may not have yet
+            self._template_schemas = SchemaCatalog(lambda: sqlite3.connect(path))
+            self._schema_template = path
+        return path
+    
+    def _build_schema_template(self) -> str:
+        os.makedirs(self.template_dir, exist_ok=True)
+        building = os.path.join(self.template_dir, f"{SCHEMA_TEMPLATE}.{os.getpid()}.{threading.get_ident()}.building")
+        _remove_database_files(building)
+        builder = DatabaseManager(database_path=building, data_dir=self.data_dir, build_mode=True)
+        try:
+            builder.prepare_schema()
+            conn = builder.get_connection()
+            try:
+                key = schema_fingerprint(conn)
+            finally:
+                conn.close()
+        finally:
+            builder.close_all_connections()
+        
+        path = template_path(self.template_dir, SCHEMA_TEMPLATE, key)
+        if os.path.exists(path):
+            _remove_database_files(building)
+        else:
+            _fsync_path(building)
+            os.replace(building, path)
+            remove_stale_templates(self.template_dir, SCHEMA_TEMPLATE, keep=path)
+        return path
+    
+    def _csv_source_hash(self, path: str, table_name: str) -> str:
+        """source_hash of a startup CSV, rehashed only when its size or mtime changes"""
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        cached = self._csv_hashes.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, source_hash(path, self._template_schemas.table(table_name)))
+            self._csv_hashes[path] = cached
+        return cached[1]
+    
+    def pristine_template(self) -> str:
+        """Path of the template holding the startup CSV data, rebuilt if the CSVs or schema changed"""
+        schema_template = self.schema_template()
+        parts = [os.path.basename(schema_template)]
+        for csv_file, table_name in sorted(STARTUP_CSV_FILES.items()):
+            csv_path = os.path.join(self.data_dir, csv_file)
+            if os.path.exists(csv_path):
+                parts.append(f"{csv_file}:{self._csv_source_hash(csv_path, table_name)}")
+        path = template_path(self.template_dir, PRISTINE_TEMPLATE, fingerprint(parts))
+        
+        with self._template_lock:
+            if not os.path.exists(path):
+                self._build_pristine_template(schema_template, path)
+                remove_stale_templates(self.template_dir, PRISTINE_TEMPLATE, keep=path)
+        return path
+    
+    def _build_pristine_template(self, schema_template: str, path: str):
+        """Load the CSV files into a copy of the schema template and move it to ``path``.
+
+        The copy is loaded without durability or SQLite foreign key
+        enforcement, then checked with ``quick_check`` and
+        ``foreign_key_check``; a failed build leaves no template behind.
+        """
+        start = time.perf_counter()
+        building = f"{path}.{os.getpid()}.{threading.get_ident()}.building"
+        _remove_database_files(building)
+        clone_database(schema_template, building)
+        
+        builder = DatabaseManager(database_path=building, data_dir=self.data_dir, build_mode=True)
+        try:
+            builder.load_csv_data()
+            conn = builder.get_connection()
+            try:
+                check = conn.execute("PRAGMA quick_check").fetchone()[0]
+                violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+            finally:
+                conn.close()
+            if check != 'ok':
+                raise sqlite3.DatabaseError(f"Template database failed its integrity check: {check}")
+            if violations:
+                tables = sorted({row[0] for row in violations})
+                raise sqlite3.IntegrityError(
+                    f"Template database has {len(violations)} foreign key violation(s) in {', '.join(tables)}"
+                )
+        except BaseException:
+            builder.close_all_connections()
+            _remove_database_files(building)
+            raise
+        builder.close_all_connections()
+        # Built without syncing; it must be on disk before it is published
+        _fsync_path(building)
+        os.replace(building, path)
+        print(f"Built template {os.path.basename(path)} from CSV data in {time.perf_counter() - start:.3f}s")
+    
+    def restore_template(self, empty: bool = False) -> Dict[str, Any]:
+        """Replace the database with a copy of the pristine template, or the schema template if ``empty``.
+
+        The template is cloned into a side file with the backup API, rows of
+        RESET_PRESERVED_TABLES are copied over from the live database while
+        writes are held (not for ``empty``), the connection pool is drained,
+        and the file is renamed over the live one. Readers see the old data
+        until the swap and the new data after it. Only a missing or stale
+        template is built from the CSV files.
+        """
+        start = time.perf_counter()
+        template = self.schema_template() if empty else self.pristine_template()
+        template_seconds = time.perf_counter() - start
+        
+        shadow_path = f"{self.database_path}{SHADOW_SUFFIX}"
+        _remove_database_files(shadow_path)
+        try:
+            clone_start = time.perf_counter()
+            clone_database(template, shadow_path)
+            conn = sqlite3.connect(shadow_path)
+            try:
+                loaded_tables = list(read_load_state(conn.cursor()))
+            finally:
+                conn.close()
+            clone_seconds = time.perf_counter() - clone_start
+            
+            swap_start = time.perf_counter()
+            preserved = () if empty else RESET_PRESERVED_TABLES
+            self.write_queue.execute_exclusive(lambda: self._swap_in(shadow_path, preserved))
+            swap_seconds = time.perf_counter() - swap_start
+        finally:
+            _remove_database_files(shadow_path)
+        print(f"Restored database from template {os.path.basename(template)}: "
+              f"cloned in {clone_seconds:.3f}s, swapped in {swap_seconds:.3f}s")
+        return {
+            "template": os.path.basename(template),
+            "loaded_tables": loaded_tables,
+            "template_seconds": round(template_seconds, 3),
+            "clone_seconds": round(clone_seconds, 3),
+            "swap_seconds": round(swap_seconds, 3),
+        }
+    
+    def _swap_in(self, shadow_path: str, preserved=RESET_PRESERVED_TABLES):
+        """Replace the database file with ``shadow_path``; runs as an exclusive write queue job"""
+        # Writes are held while this job runs, so the preserved rows are current
+        shadow_conn = sqlite3.connect(shadow_path)
+        try:
+            shadow_conn.execute("ATTACH DATABASE ? AS live", (self.database_path,))
+            for table in preserved:
+                columns = ", ".join(self.get_table_schema(table).columns)
+                shadow_conn.execute(f"DELETE FROM main.{table}")
+                shadow_conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM live.{table}")
+            shadow_conn.commit()
+            shadow_conn.execute("DETACH DATABASE live")
+        finally:
+            shadow_conn.close()
+        # Built without syncing; it must be on disk before it replaces the live file
+        _fsync_path(shadow_path)
+        
+        with self._pool.drained():
+            self.write_queue.reset_connection()
+            # Fold the WAL into the old file so no -wal is left behind for the new one
+            conn = sqlite3.connect(self.database_path)
+            try:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(self.database_path + suffix):
+                    os.remove(self.database_path + suffix)
+            os.replace(shadow_path, self.database_path)
+            _fsync_path(os.path.dirname(os.path.abspath(self.database_path)))
+            self.schema_catalog.invalidate()
+            self._standard_costs.clear()
+            self.expense_reports.clear()
+
+
+def _remove_database_files(path: str):
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _fsync_path(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 # Global database manager instance
 db_manager = DatabaseManager()
 
@@ -1306,8 +1974,9 @@ def switch_database(new_database_path: str):
     """Switch to a different database file"""
     global db_manager
     
-    # Close all existing connections
+    # Close all existing connections; the new manager starts with an empty schema catalog
     db_manager.close_all_connections()
+    db_manager.schema_catalog.invalidate()
     
     # Determine appropriate data directory
     # For saved databases, we don't want to look for CSV files
@@ -1344,9 +2013,21 @@ def get_table_data(
     """Get data from a specific table"""
     return db_manager.get_table_data(table_name, forecast_id, filters, limit, offset)
 
-def get_forecast_data() -> Dict[str, Any]:
+def get_forecast_data(forecast_id: str = None) -> Dict[str, Any]:
     """Get comprehensive forecast data"""
-    return db_manager.get_forecast_data()
+    return db_manager.get_forecast_data(forecast_id)
+
+def refresh_forecast_results(full: bool = False) -> Dict[str, Any]:
+    """Recompute stale forecast results (or all of them when full=True)"""
+    return db_manager.refresh_forecast_results(full)
+
+def get_table_schema(table_name: str) -> TableSchema:
+    """Get cached columns and keys of a table"""
+    return db_manager.get_table_schema(table_name)
+
+def get_unit_standard_costs(unit_ids=None) -> Dict[str, Dict[str, Any]]:
+    """Get standard cost per unit, keyed by unit_id"""
+    return db_manager.get_unit_standard_costs(unit_ids)
 
 def get_saved_forecast_results(period: str = None, limit: int = None) -> Dict[str, Any]:
     """Get saved forecast results from the database"""
@@ -1364,6 +2045,6 @@ def replay_execution_logs(target_date: str = None, max_log_id: int = None, user_
     """Replay SQL statements from execution log up to a specific point in time"""
     return db_manager.replay_execution_logs(target_date, max_log_id, user_id, session_id)
 
-def reset_to_initial_state() -> Dict[str, Any]:
+def reset_to_initial_state(shadow: bool = False) -> Dict[str, Any]:
     """Reset database to initial state by reloading CSV data"""
-    return db_manager.reset_to_initial_state() 
+    return db_manager.reset_to_initial_state(shadow) 
@@ -0,0 +1,127 @@
+"""
+Non-blocking database access for the async FastAPI routes.
+
+sqlite3 calls block, and so can acquiring a pooled connection (lock retries,
+waiting for a free connection). Running them on the event loop stalls every
+other request. ``DatabaseExecutor`` moves that work onto threads:
+
+- reads run on a bounded pool of reader threads, so at most ``max_readers``
+  queries execute at once and the rest wait in its queue;
+- writes run one at a time on the database manager's write queue thread
+  (see ``write_queue``), so writers never contend with each other for
+  SQLite's single write lock. Decorated write endpoints run there as
+  exclusive jobs, between the queue's group-committed transactions.
+
+Routes opt in with the ``db_read`` / ``db_write`` decorators, placed under the
+``@router`` decorator of a plain ``def`` endpoint::
+
+    @router.get("/things")
+    @db_read
+    def get_things(...):
+        ...
+
+The endpoint FastAPI sees is a coroutine that awaits the original function
+on the executor; the original stays reachable as ``get_things.__wrapped__``
+for calls from other (already off-loop) endpoint bodies.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+def _write_queue():
+    # Resolved per call: switch_database replaces the global manager
+    from . import database
+    return database.db_manager.write_queue
+
+
+class DatabaseExecutor:
+    """Bounded reader thread pool plus the write queue's writer thread"""
+
+    def __init__(self, max_readers: int = 8):
+        self.max_readers = max_readers
+        self._lock = threading.Lock()
+        self._readers = None
+        self._counts = {"reads_queued": 0, "reads_running": 0, "writes_queued": 0, "writes_running": 0}
+
+    def _reader_pool(self) -> ThreadPoolExecutor:
+        # Created lazily so a shut-down executor can be reused (e.g. across test apps)
+        with self._lock:
+            if self._readers is None:
+                self._readers = ThreadPoolExecutor(max_workers=self.max_readers, thread_name_prefix="db-read")
+            return self._readers
+
+    def _track(self, kind: str, fn: Callable[..., Any]) -> Callable[[], Any]:
+        with self._lock:
+            self._counts[f"{kind}s_queued"] += 1
+
+        def run():
+            with self._lock:
+                self._counts[f"{kind}s_queued"] -= 1
+                self._counts[f"{kind}s_running"] += 1
+            try:
+                return fn()
+            finally:
+                with self._lock:
+                    self._counts[f"{kind}s_running"] -= 1
+
+        return run
+
+    async def _submit(self, kind: str, fn: Callable[..., Any], args, kwargs) -> Any:
+        # Carry context variables into the worker, as asyncio.to_thread does
+        context = contextvars.copy_context()
+        call = self._track(kind, functools.partial(context.run, fn, *args, **kwargs))
+        if kind == "write":
+            return await asyncio.wrap_future(_write_queue().submit_exclusive(call))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader_pool(), call)
+
+    async def read(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking read on a reader thread and await its result"""
+        return await self._submit("read", fn, args, kwargs)
+
+    async def write(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking write alone on the writer thread and await its result"""
+        return await self._submit("write", fn, args, kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"max_readers": self.max_readers, **self._counts}
+
+    def shutdown(self, wait: bool = True):
+        """Stop the reader threads; work already queued is finished when ``wait`` is set.
+
+        The writer thread belongs to the database manager and is stopped by
+        its ``close_all_connections``.
+        """
+        with self._lock:
+            readers, self._readers = self._readers, None
+        if readers is not None:
+            readers.shutdown(wait=wait)
+
+
+# Shared by every route; bounded below the connection pool size (DB_POOL_SIZE,
+# default 10) so the writer and streaming responses can still get a connection
+db_executor = DatabaseExecutor(max_readers=int(os.getenv('DB_READ_WORKERS', '8')))
+
+
+def _offload(kind: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(fn)
+    async def endpoint(*args, **kwargs):
+        return await db_executor._submit(kind, fn, args, kwargs)
+    return endpoint
+
+
+def db_read(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Turn a blocking endpoint into one that awaits it on a reader thread"""
+    return _offload("read", fn)
+
+
+def db_write(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Turn a blocking endpoint into one that awaits it on the writer thread"""
+    return _offload("write", fn)
@@ -0,0 +1,249 @@
+"""
+Array-based expense allocation schedules.
+
+``allocation_schedule`` turns any number of expenses into their allocation
+rows at once. Payment dates come from the closed-form recurrences in
+``db.recurrence`` (weekly steps of 7 days, monthly to annual steps in whole
+months) and are expanded with ``np.repeat``, so there is no per-date Python
+loop:
+
+- an immediate expense allocates each payment to the month it falls in
+  ('scheduled', or 'one_time' for one-time expenses)
+- an amortized expense spreads each payment evenly over the next
+  ``amortization_months`` months; recurring payments stop spreading at the
+  end date's month
+
+Month steps keep the start date's day of month, clamped to shorter months,
+so an expense starting on the 31st pays on the last day of February.
+Recurring expenses without an end date run for ``DEFAULT_HORIZON_MONTHS``.
+
+An allocation is identified by its expense, period and slot, the slot
+numbering the allocations an expense has in one period (weekly and
+amortized schedules may have several). Generated ids are
+``ALLOC-<expense_id>-<period>-<slot>``. ``regenerate_allocations`` compares
+the stored and regenerated allocations by that key and writes only the
+difference, so allocations whose period, amount and type are unchanged
+keep their row and payment status; changed pending ones are updated in
+place. Allocations that are no longer pending (paid, scheduled, overdue)
+are never rewritten or deleted: where the schedule disagrees with them they
+are left as they are and reported as conflicts. Rows are written with
+``executemany``.
+"""
+
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .recurrence import (
+    add_months,
+    frequency_steps,
+    month_index,
+    occurrences_between,
+    period_strings,
+    to_days,
+)
+
+FREQUENCIES = ('weekly', 'monthly', 'quarterly', 'biannually', 'annually', 'one_time')
+
+DEFAULT_HORIZON_MONTHS = 24
+
+SCHEDULE_COLUMNS = ['allocation_id', 'expense_id', 'period', 'allocated_amount', 'allocation_type']
+
+# Expense columns the schedule is computed from
+EXPENSE_SCHEDULE_COLUMNS = (
+    'expense_id', 'amount', 'frequency', 'start_date', 'end_date', 'expense_allocation', 'amortization_months'
+)
+
+
+def _group_offsets(counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(owner, position) of every element when group i holds counts[i] elements"""
+    owner = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    return owner, np.arange(len(owner)) - starts[owner]
+
+
+def allocation_schedule(expenses: Iterable[Mapping[str, Any]]) -> pd.DataFrame:
+    """Allocation rows (SCHEDULE_COLUMNS) of ``expenses``, in expense and date order.
+
+    Each expense needs the EXPENSE_SCHEDULE_COLUMNS keys (end_date,
+    expense_allocation and amortization_months may be missing). Raises
+    ValueError for an unknown frequency or a malformed date.
+    """
+    expenses = list(expenses)
+    if not expenses:
+        return pd.DataFrame(columns=SCHEDULE_COLUMNS)
+
+    expense_ids = np.array([e['expense_id'] for e in expenses], dtype=object)
+    amounts = np.array([e['amount'] for e in expenses], dtype=np.float64)
+    frequencies = [e['frequency'] for e in expenses]
+    unknown = set(frequencies) - set(FREQUENCIES)
+    if unknown:
+        raise ValueError(f"Unknown expense frequency: {', '.join(sorted(map(str, unknown)))}")
+    step_months, step_days = frequency_steps(frequencies)
+    one_time = (step_months == 0) & (step_days == 0)
+    amortize_months = np.array([
+        e.get('amortization_months') or 0 if e.get('expense_allocation') == 'amortized' else 0
+        for e in expenses
+    ], dtype=np.int64)
+    amortize_months[amortize_months < 0] = 0
+
+    start = to_days([e['start_date'] for e in expenses])
+    end = to_days([e.get('end_date') for e in expenses])
+    # Open-ended expenses end after the default horizon, on their start day
+    end = np.where(np.isnat(end), add_months(start, DEFAULT_HORIZON_MONTHS), end)
+    end_month = month_index(end)
+
+    # One element per payment: its expense and the month it falls in
+    owner, _, payment_dates = occurrences_between(
+        start, step_months, step_days, start, np.where(one_time, start, end)
+    )
+    payment_month = month_index(payment_dates)
+
+    # Months each payment is spread over; recurring amortization stops at the end month
+    spread = np.where(amortize_months[owner] > 0, amortize_months[owner], 1)
+    spread = np.where(
+        (amortize_months[owner] > 0) & ~one_time[owner],
+        np.minimum(spread, end_month[owner] - payment_month + 1),
+        spread,
+    )
+
+    payment, j = _group_offsets(spread)
+    row_owner = owner[payment]
+    allocation_type = np.where(
+        amortize_months[row_owner] > 0, 'amortized', np.where(one_time[row_owner], 'one_time', 'scheduled')
+    )
+
+    schedule = pd.DataFrame({
+        'expense_id': expense_ids[row_owner],
+        'period': period_strings(payment_month[payment] + j),
+        'allocated_amount': amounts[row_owner] / spread[payment],
+        'allocation_type': allocation_type,
+    })
+    slot = schedule.groupby(['expense_id', 'period'], sort=False).cumcount() + 1
+    schedule['allocation_id'] = [
+        f"ALLOC-{expense_id}-{period}-{n}" for expense_id, period, n in zip(schedule['expense_id'], schedule['period'], slot)
+    ]
+    return schedule[SCHEDULE_COLUMNS]
+
+
+def insert_allocations(cursor, schedule: pd.DataFrame, payment_status: str = 'pending') -> int:
+    """Write an allocation_schedule with one executemany; returns the rows written"""
+    cursor.executemany(
+        "INSERT INTO expense_allocations "
+        "(allocation_id, expense_id, period, allocated_amount, allocation_type, payment_status) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (allocation_id, expense_id, period, float(amount), allocation_type, payment_status)
+            for allocation_id, expense_id, period, amount, allocation_type in schedule.itertuples(index=False)
+        ]
+    )
+    return len(schedule)
+
+
+def _stored_allocations(cursor, expense_query: str, params: Sequence[Any]) -> pd.DataFrame:
+    """Stored allocations of the expenses selected by ``expense_query``, with their status and slot"""
+    cursor.execute(f"""
+        SELECT allocation_id, expense_id, period, allocated_amount, allocation_type, payment_status,
+               ROW_NUMBER() OVER (PARTITION BY expense_id, period ORDER BY rowid) AS slot
+        FROM expense_allocations
+        WHERE expense_id IN (SELECT expense_id FROM ({expense_query}))
+    """, params)
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=SCHEDULE_COLUMNS + ['payment_status', 'slot'])
+
+
+def allocation_diff(stored: pd.DataFrame, schedule: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Changes that turn ``stored`` allocations into ``schedule``, matched by (expense_id, period, slot).
+
+    Returns ``insert`` (schedule rows), ``update`` (stored allocation_id with
+    the new amount and type) and ``delete`` (stored allocation_id) frames,
+    and ``conflicts``: stored allocations that are no longer pending and
+    would have been updated or deleted, with ``scheduled_amount`` (NaN where
+    the schedule no longer has them). Conflicting rows are in neither
+    ``update`` nor ``delete``.
+    """
+    schedule = schedule.assign(slot=schedule.groupby(['expense_id', 'period'], sort=False).cumcount() + 1)
+    merged = stored.merge(
+        schedule, on=['expense_id', 'period', 'slot'], how='outer', suffixes=('_old', ''), indicator=True
+    )
+    settled = merged['payment_status'].notna() & (merged['payment_status'] != 'pending')
+    both = merged[merged['_merge'] == 'both']
+    changed = (
+        (merged['_merge'] == 'both')
+        & ((merged['allocated_amount_old'] != merged['allocated_amount'])
+           | (merged['allocation_type_old'] != merged['allocation_type']))
+    )
+    removed = merged['_merge'] == 'left_only'
+    conflicts = merged[settled & (changed | removed)]
+
+    inserts = merged[merged['_merge'] == 'right_only'][SCHEDULE_COLUMNS]
+    # Generated ids may be held by a kept row whose slot shifted after a manual delete
+    kept_ids = set(both['allocation_id_old']) | set(conflicts['allocation_id_old'])
+    clashes = inserts['allocation_id'].isin(kept_ids) if len(inserts) else None
+    if clashes is not None and clashes.any():
+        inserts = inserts.copy()
+        inserts.loc[clashes, 'allocation_id'] = [
+            f"{allocation_id}-{uuid.uuid4().hex[:8]}" for allocation_id in inserts.loc[clashes, 'allocation_id']
+        ]
+    return {
+        "insert": inserts,
+        "update": merged[changed & ~settled][['allocation_id_old', 'allocated_amount', 'allocation_type']],
+        "delete": merged[removed & ~settled][['allocation_id_old']],
+        "conflicts": conflicts[['allocation_id_old', 'expense_id', 'period', 'payment_status', 'allocated_amount_old',
+                                'allocated_amount']].rename(columns={
+            'allocation_id_old': 'allocation_id',
+            'allocated_amount_old': 'allocated_amount',
+            'allocated_amount': 'scheduled_amount',
+        }),
+    }
+
+
+def regenerate_allocations(cursor, forecast_id: Optional[str] = None,
+                           expense_ids: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Bring the allocations of a scenario's expenses (or of ``expense_ids``) in line with their schedule.
+
+    Only the difference is written, in the caller's transaction; unchanged
+    allocations keep their payment status, payment date and notes, and
+    allocations that are no longer pending are left untouched and returned
+    under ``conflicts`` where the schedule disagrees with them. With neither
+    argument every expense is regenerated.
+    """
+    started = time.perf_counter()
+    query = f"SELECT {', '.join(EXPENSE_SCHEDULE_COLUMNS)} FROM expenses"
+    conditions: List[str] = []
+    params: List[Any] = []
+    if forecast_id is not None:
+        conditions.append("forecast_id = ?")
+        params.append(forecast_id)
+    if expense_ids is not None:
+        conditions.append(f"expense_id IN ({', '.join('?' for _ in expense_ids)})")
+        params.extend(expense_ids)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    cursor.execute(query, params)
+    expenses = [dict(zip(EXPENSE_SCHEDULE_COLUMNS, row)) for row in cursor.fetchall()]
+
+    diff = allocation_diff(_stored_allocations(cursor, query, params), allocation_schedule(expenses))
+    # Deletes first: an inserted row may take the id of a deleted one
+    cursor.executemany(
+        "DELETE FROM expense_allocations WHERE allocation_id = ?",
+        [(allocation_id,) for allocation_id in diff["delete"]['allocation_id_old']]
+    )
+    cursor.executemany(
+        "UPDATE expense_allocations SET allocated_amount = ?, allocation_type = ? WHERE allocation_id = ?",
+        [
+            (float(amount), allocation_type, allocation_id)
+            for allocation_id, amount, allocation_type in diff["update"].itertuples(index=False)
+        ]
+    )
+    insert_allocations(cursor, diff["insert"])
+    return {
+        "expenses": len(expenses),
+        "allocations_created": len(diff["insert"]),
+        "allocations_updated": len(diff["update"]),
+        "allocations_deleted": len(diff["delete"]),
+        "conflicts": diff["conflicts"].astype(object).where(diff["conflicts"].notna(), None).to_dict('records'),
+        "elapsed_seconds": round(time.perf_counter() - started, 4),
+    }
@@ -0,0 +1,170 @@
+"""
+Monthly expense rollup and the expense data version.
+
+``expense_monthly_rollup`` holds allocation totals per (forecast_id, period,
+category_id), so the expense report reads a few hundred grouped rows instead
+of joining every allocation to its expense and category once per month.
+
+Triggers on expenses, expense_allocations and expense_categories bump
+``expense_data_state.version`` (unless change tracking is suspended, in
+which case the writer calls ``invalidate_expense_rollup``). ``refresh_expense_rollup``, a write
+queue job, rebuilds the rollup with one INSERT ... SELECT when its
+``rollup_version`` lags behind;
+``ExpenseReportCache`` keeps finished reports keyed on the same version, so
+a cached report is served until any expense data changes.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+ROLLUP_TABLE = 'expense_monthly_rollup'
+
+# Tables whose contents feed the rollup and the expense report
+EXPENSE_ROLLUP_SOURCES = ['expenses', 'expense_allocations', 'expense_categories']
+
+_TRACKING_ENABLED = "(SELECT enabled FROM change_tracking_control WHERE id = 1) IS NOT 0"
+
+_BUMP_VERSION = "UPDATE expense_data_state SET version = version + 1 WHERE id = 1;"
+
+_REBUILD_SQL = f'''
+    INSERT INTO {ROLLUP_TABLE} (
+        forecast_id, period, category_id,
+        total_scheduled, total_amortized, total_one_time, total_amount, expense_count
+    )
+    SELECT e.forecast_id, a.period, e.category_id,
+           SUM(CASE WHEN a.allocation_type = 'scheduled' THEN a.allocated_amount ELSE 0 END),
+           SUM(CASE WHEN a.allocation_type = 'amortized' THEN a.allocated_amount ELSE 0 END),
+           SUM(CASE WHEN a.allocation_type = 'one_time' THEN a.allocated_amount ELSE 0 END),
+           SUM(a.allocated_amount),
+           COUNT(DISTINCT a.expense_id)
+    FROM expense_allocations a
+    JOIN expenses e ON a.expense_id = e.expense_id
+    GROUP BY e.forecast_id, a.period, e.category_id
+'''
+
+
+def expense_rollup_ddl() -> List[str]:
+    """DDL for the rollup table, its version state and the triggers that bump it"""
+    statements = [
+        f'''
+        CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+            forecast_id TEXT,
+            period TEXT NOT NULL,
+            category_id TEXT NOT NULL,
+            total_scheduled REAL NOT NULL DEFAULT 0,
+            total_amortized REAL NOT NULL DEFAULT 0,
+            total_one_time REAL NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            expense_count INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        f"CREATE INDEX IF NOT EXISTS idx_{ROLLUP_TABLE}_period ON {ROLLUP_TABLE} (period, forecast_id)",
+        '''
+        CREATE TABLE IF NOT EXISTS expense_data_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 1,
+            rollup_version INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT OR IGNORE INTO expense_data_state (id, version, rollup_version) VALUES (1, 1, 0)",
+    ]
+    for table in EXPENSE_ROLLUP_SOURCES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_expense_version "
+                f"AFTER {event} ON {table} FOR EACH ROW WHEN {_TRACKING_ENABLED}\n"
+                f"BEGIN\n    {_BUMP_VERSION}\nEND"
+            )
+    return statements
+
+
+def invalidate_expense_rollup(cursor):
+    """Mark the rollup and cached reports stale; used by bulk loaders that suspend row triggers"""
+    cursor.execute(_BUMP_VERSION)
+
+
+def expense_data_version(cursor) -> Optional[int]:
+    cursor.execute("SELECT version FROM expense_data_state WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def expense_rollup_current(cursor) -> bool:
+    """Whether the rollup was built from the current expense data"""
+    cursor.execute("SELECT version = rollup_version FROM expense_data_state WHERE id = 1")
+    row = cursor.fetchone()
+    return row is None or bool(row[0])
+
+
+def refresh_expense_rollup(conn) -> bool:
+    """Rebuild the rollup if expense data changed since it was built; returns whether it was rebuilt.
+
+    Runs in the caller's write transaction: submit it to the write queue, so
+    concurrent readers that find the rollup stale queue behind one rebuild
+    and the ones after it find nothing left to do.
+    """
+    cursor = conn.cursor()
+    if expense_rollup_current(cursor):
+        return False
+
+    cursor.execute(f"DELETE FROM {ROLLUP_TABLE}")
+    cursor.execute(_REBUILD_SQL)
+    # The write lock is held since the DELETE, so version cannot move under us
+    cursor.execute("UPDATE expense_data_state SET rollup_version = version WHERE id = 1")
+    return True
+
+
+def rollup_report_query(
+    start_period: str, end_period: str, forecast_id: Optional[str] = None
+) -> Tuple[str, List[Any]]:
+    """The expense report's monthly forecast: rollup totals per period and category"""
+    query = f"""
+        SELECT r.period, r.category_id, c.category_name, c.category_type,
+               SUM(r.total_scheduled), SUM(r.total_amortized), SUM(r.total_one_time),
+               SUM(r.total_amount), SUM(r.expense_count)
+        FROM {ROLLUP_TABLE} r
+        JOIN expense_categories c ON r.category_id = c.category_id
+        WHERE r.period BETWEEN ? AND ?{" AND r.forecast_id = ?" if forecast_id else ""}
+        GROUP BY r.period, r.category_id
+        ORDER BY r.period, r.category_id
+    """
+    params: List[Any] = [start_period, end_period]
+    if forecast_id:
+        params.append(forecast_id)
+    return query, params
+
+
+def month_periods(start: date, count: int) -> List[str]:
+    """``count`` consecutive 'YYYY-MM' periods starting with the month of ``start``"""
+    first = start.year * 12 + start.month - 1
+    return [f"{month // 12:04d}-{month % 12 + 1:02d}" for month in range(first, first + count)]
+
+
+class ExpenseReportCache:
+    """Finished expense reports keyed on their parameters and the expense data version"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key: Hashable, version: Optional[int]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, version: Optional[int], report: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (version, report)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
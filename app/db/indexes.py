@@ -0,0 +1,258 @@
+"""
+Managed secondary indexes and a query plan audit.
+
+``MANAGED_INDEXES`` is the index plan for the hot filter/join columns used by
+the routes. ``ensure_indexes`` brings a database in line with it: missing
+indexes are created, indexes whose definition changed are rebuilt, and
+names listed in ``RETIRED_INDEXES`` are dropped.
+
+Some hot columns are already covered by the automatic index of a UNIQUE
+constraint and are deliberately not duplicated here:
+``router_operations.router_id`` (UNIQUE(router_id, sequence)) and
+``loan_payments.loan_id`` (UNIQUE(loan_id, payment_number)).
+
+``UNIQUE_INDEXES`` are natural keys enforced on existing tables. Creating
+one fails while the table holds duplicate keys; it is then skipped (and
+reported) until the duplicates are resolved, and callers relying on it
+check ``has_index`` first.
+
+``audit_query_plans`` runs ``EXPLAIN QUERY PLAN`` over the route queries in
+``AUDIT_QUERIES`` and flags any full table scan. Queries the routes build are
+audited through the same builders, so the audit cannot drift from the SQL
+that actually runs.
+"""
+
+import re
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+from .expense_rollup import rollup_report_query
+from .scenario_aggregation import scenario_sales_frame_sql
+from .scenario_overlays import sales_forecast_query
+
+# index name -> (table, columns)
+MANAGED_INDEXES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    # Per-scenario sales queries filter on forecast_id and usually a period range
+    "idx_sales_forecast_period": ("sales", ("forecast_id", "period")),
+    "idx_sales_period": ("sales", ("period",)),
+    # Joins to units/customers, cascades, and FK checks when a parent row is deleted
+    "idx_sales_unit_id": ("sales", ("unit_id",)),
+    "idx_sales_customer_id": ("sales", ("customer_id",)),
+    "idx_expense_allocations_period": ("expense_allocations", ("period",)),
+    "idx_expense_allocations_expense": ("expense_allocations", ("expense_id", "period")),
+    "idx_expenses_forecast_id": ("expenses", ("forecast_id",)),
+    "idx_loan_payments_date": ("loan_payments", ("payment_date",)),
+    "idx_payroll_forecast_id": ("payroll", ("forecast_id",)),
+}
+
+# Unique index name -> (table, columns); same shape as MANAGED_INDEXES
+UNIQUE_INDEXES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    # One sales line per customer, unit and period in each scenario (see bulk_sales)
+    "uq_sales_forecast_line": ("sales", ("customer_id", "unit_id", "period", "forecast_id")),
+}
+
+# Managed indexes that were removed from the plan; dropped on migration
+RETIRED_INDEXES: Tuple[str, ...] = ()
+
+# (sql, params), or a builder called with the cursor that returns them
+AuditQuery = Union[Tuple[str, Sequence[Any]], Callable[[Any], Tuple[str, Sequence[Any]]]]
+
+# name -> (query, tables that may be scanned)
+#
+# Scans are allowed only for small lookup tables that drive a join into an
+# indexed fact table.
+AUDIT_QUERIES: Dict[str, Tuple[AuditQuery, Tuple[str, ...]]] = {
+    # /source-data/sales-forecast for one scenario, and for a period range
+    "forecast_sales": (lambda cursor: sales_forecast_query("F001", None, None), ()),
+    "sales_by_period": (lambda cursor: sales_forecast_query(None, "2024-01", "2024-12"), ("forecast",)),
+    # /reports scenario comparison over a base and one of its overlays
+    "scenario_sales": (
+        lambda cursor: scenario_sales_frame_sql(
+            cursor, ["F001", "V001"], "2024-01", None, bases={"F001": "F001", "V001": "F001"}
+        ),
+        (),
+    ),
+    # Monthly forecast section of the expense report
+    "expense_report": (
+        lambda cursor: rollup_report_query("2024-01", "2024-12", "F001"),
+        ("expense_categories",),
+    ),
+    "sales_by_unit": (
+        ("SELECT COUNT(*) FROM sales WHERE unit_id = ? AND forecast_id = ?", ("PROD-001", "F001")), (),
+    ),
+    "sales_by_customer": (
+        ("SELECT COUNT(*) FROM sales WHERE customer_id = ?", ("CUST-001",)), (),
+    ),
+    "router_operations": (
+        ("SELECT * FROM router_operations WHERE router_id = ? ORDER BY sequence", ("R0001",)), (),
+    ),
+    "expense_allocations_by_expense": (
+        ("SELECT * FROM expense_allocations WHERE expense_id = ? ORDER BY period", ("EXP-001",)), (),
+    ),
+    "expenses_by_forecast": (
+        ("SELECT expense_id, amount FROM expenses WHERE forecast_id = ?", ("F001",)), (),
+    ),
+    "loan_payments_by_loan": (
+        ("SELECT * FROM loan_payments WHERE loan_id = ? ORDER BY payment_number", ("LOAN-001",)), (),
+    ),
+    "loan_payments_by_date": (
+        (
+            """
+            SELECT l.loan_id, SUM(lp.payment_amount)
+            FROM loan_payments lp
+            JOIN loans l ON lp.loan_id = l.loan_id
+            WHERE lp.payment_date >= ? AND lp.payment_date < ? AND l.is_active = 1
+            GROUP BY l.loan_id
+            """,
+            ("2024-01-01", "2025-01-01"),
+        ),
+        ("loans",),
+    ),
+    "payroll_by_forecast": (
+        ("SELECT employee_id, hourly_rate FROM payroll WHERE forecast_id = ?", ("F001",)), (),
+    ),
+}
+
+
+def _index_sql(name: str, table: str, columns: Iterable[str], unique: bool = False) -> str:
+    return f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"
+
+
+def has_index(cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def _normalize(sql: str) -> str:
+    return " ".join((sql or "").split())
+
+
+def create_index(cursor, sql: str) -> bool:
+    """Run a CREATE INDEX; False (and no index) when a unique index meets duplicate keys"""
+    try:
+        cursor.execute(sql)
+    except sqlite3.IntegrityError:
+        return False
+    return True
+
+
+def ensure_indexes(cursor) -> Dict[str, List[str]]:
+    """Create, rebuild or drop indexes so the database matches MANAGED_INDEXES.
+
+    Indexes on tables or columns that do not exist yet (e.g. before a column
+    migration) are skipped.
+
+    No ANALYZE is run: statistics gathered while tables are still small would
+    tell the planner the indexes are not selective and stay stale as the data
+    grows, whereas SQLite's default estimates favor the index.
+    """
+    changes = {"created": [], "rebuilt": [], "dropped": [], "skipped": []}
+
+    for name in RETIRED_INDEXES:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name = ?", (name,))
+        if cursor.fetchone():
+            cursor.execute(f"DROP INDEX {name}")
+            changes["dropped"].append(name)
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    tables = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='index'")
+    existing = {row[0]: row[1] for row in cursor.fetchall()}
+
+    table_columns = {}
+    plan = [(name, table, columns, False) for name, (table, columns) in MANAGED_INDEXES.items()]
+    plan += [(name, table, columns, True) for name, (table, columns) in UNIQUE_INDEXES.items()]
+    for name, table, columns, unique in plan:
+        if table not in tables:
+            continue
+        if table not in table_columns:
+            cursor.execute(f"PRAGMA table_info({table})")
+            table_columns[table] = {col[1] for col in cursor.fetchall()}
+        if not table_columns[table].issuperset(columns):
+            continue
+        expected = _index_sql(name, table, columns, unique)
+        if name not in existing:
+            action = "created"
+        elif _normalize(existing[name]) != _normalize(expected):
+            cursor.execute(f"DROP INDEX {name}")
+            action = "rebuilt"
+        else:
+            continue
+        if not create_index(cursor, expected):
+            # Duplicate keys in the table; retried on the next migration
+            changes["skipped"].append(name)
+            continue
+        changes[action].append(name)
+
+    return changes
+
+
+_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+_TABLE_REF_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIASES = {"WHERE", "JOIN", "LEFT", "INNER", "CROSS", "ON", "GROUP", "ORDER", "LIMIT", "USING"}
+
+
+def query_plan(cursor, sql: str, params: Sequence[Any] = ()) -> List[str]:
+    """The detail lines of ``EXPLAIN QUERY PLAN`` for a statement"""
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", tuple(params))
+    return [row[3] for row in cursor.fetchall()]
+
+
+def _table_aliases(sql: str) -> Dict[str, str]:
+    aliases = {}
+    for table, alias in _TABLE_REF_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in _NOT_ALIASES:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(plan: Sequence[str], sql: str, tables: Iterable[str]) -> List[str]:
+    """Tables of ``sql`` that ``plan`` reads with a full scan rather than an index"""
+    tables = set(tables)
+    aliases = _table_aliases(sql)
+    scanned = []
+    for detail in plan:
+        match = _SCAN_RE.match(detail)
+        # A SCAN walks the whole table even when it is in index order; only SEARCH is a lookup
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        # Skips CTEs, subqueries and constant rows, which are not base tables
+        if table in tables and table not in scanned:
+            scanned.append(table)
+    return scanned
+
+
+def _with_views(sql: str, views: Dict[str, str]) -> str:
+    """``sql`` followed by the definitions of the views it reads, so their aliases resolve too"""
+    referenced = {table for table, _ in _TABLE_REF_RE.findall(sql)}
+    return " ".join([sql] + [views[name] for name in referenced if name in views])
+
+
+def audit_query_plans(cursor, queries: Dict[str, Tuple[AuditQuery, Tuple[str, ...]]] = None) -> Dict[str, Any]:
+    """Explain each audited query and flag unexpected full table scans"""
+    queries = AUDIT_QUERIES if queries is None else queries
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    tables = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='view'")
+    views = {row[0]: row[1] for row in cursor.fetchall()}
+
+    results = []
+    for name, (query, allowed_scans) in queries.items():
+        try:
+            sql, params = query(cursor) if callable(query) else query
+            plan = query_plan(cursor, sql, params)
+        except Exception as e:
+            results.append({"query": name, "error": str(e), "plan": [], "full_scans": []})
+            continue
+        scans = [table for table in full_scans(plan, _with_views(sql, views), tables) if table not in allowed_scans]
+        results.append({"query": name, "plan": plan, "full_scans": scans})
+
+    flagged = [result["query"] for result in results if result["full_scans"] or result.get("error")]
+    return {
+        "queries": results,
+        "flagged": flagged,
+        "ok": not flagged,
+    }
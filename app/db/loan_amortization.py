@@ -0,0 +1,224 @@
+"""
+Array-based loan amortization schedules.
+
+``amortization_schedule`` computes the payment rows of any number of loans
+at once. Every payment of every loan is one array element; balances come
+from the closed-form annuity balance rather than a running loop:
+
+    balance after k payments = P * g**k - A * (g**k - 1) / r,  g = 1 + r
+
+where ``r`` is the rate per payment period (annual rate / payments per
+year: 12, 4, 2 or 1 for month steps, 52 weekly, 26 biweekly) and ``A`` the
+level payment. The level payment repays the principal down to a residual
+over ``loan_term_months * payments per year // 12`` payments:
+
+- amortizing loans: the residual is ``balloon_payment`` (0 without one)
+  and ``A`` is rounded to the cent
+- interest-only loans: the residual is the whole principal, so ``A`` is
+  the interest alone
+
+The last payment repays whatever balance is left, which covers the
+residual and cent rounding. With a ``balloon_date`` the schedule ends at
+the first payment on or after it, that payment repaying the balance.
+Payment dates are whole payment periods after ``start_date`` (see
+``db.recurrence``); a frequency without a step, such as one_time, or an
+unknown one raises ValueError.
+
+Rows are written with ``executemany``; ``regenerate_loan_schedules``
+replaces the schedules of many loans in one transaction, optionally with
+shifted interest rates for what-if runs.
+"""
+
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .recurrence import frequency_steps, nth_occurrence, occurrences_through, to_days
+
+PAYMENT_COLUMNS = [
+    'payment_id', 'loan_id', 'payment_number', 'payment_date', 'payment_amount',
+    'principal_payment', 'interest_payment', 'remaining_balance', 'payment_status'
+]
+
+# Loan columns the schedule is computed from
+LOAN_SCHEDULE_COLUMNS = (
+    'loan_id', 'principal_amount', 'interest_rate', 'loan_term_months', 'start_date',
+    'payment_type', 'payment_frequency', 'balloon_payment', 'balloon_date'
+)
+
+_MONEY_COLUMNS = ['payment_amount', 'principal_payment', 'interest_payment', 'remaining_balance']
+
+
+def calculate_loan_payment(principal: float, annual_rate: float, term_months: int, payment_type: str = "amortizing") -> float:
+    """Calculate monthly loan payment amount"""
+    if payment_type == "interest_only":
+        return principal * (annual_rate / 12)
+    
+    # Amortizing loan payment calculation
+    if annual_rate == 0:
+        return principal / term_months
+    
+    monthly_rate = annual_rate / 12
+    payment = principal * (monthly_rate * (1 + monthly_rate) ** term_months) / ((1 + monthly_rate) ** term_months - 1)
+    
+    return round(payment, 2)
+
+
+def amortization_schedule(loans: Iterable[Mapping[str, Any]]) -> pd.DataFrame:
+    """Payment rows (PAYMENT_COLUMNS) of ``loans``, in loan and payment order.
+
+    Each loan needs the LOAN_SCHEDULE_COLUMNS keys; ``interest_rate`` is an
+    annual percentage. Raises ValueError for a malformed date or a payment
+    frequency without a payment period.
+    """
+    loans = list(loans)
+    if not loans:
+        return pd.DataFrame(columns=PAYMENT_COLUMNS)
+
+    loan_ids = np.array([loan['loan_id'] for loan in loans], dtype=object)
+    principal = np.array([loan['principal_amount'] or 0 for loan in loans], dtype=np.float64)
+    annual_rate = np.array([loan['interest_rate'] or 0 for loan in loans], dtype=np.float64) / 100
+    interest_only = np.array([loan.get('payment_type') == 'interest_only' for loan in loans])
+    frequencies = [loan.get('payment_frequency') or 'monthly' for loan in loans]
+    step_months, step_days = frequency_steps(frequencies)
+    no_period = (step_months == 0) & (step_days == 0)
+    if no_period.any():
+        raise ValueError(f"Loan payment frequency has no payment period: {frequencies[np.flatnonzero(no_period)[0]]}")
+    term = np.array([loan['loan_term_months'] or 0 for loan in loans], dtype=np.int64)
+    balloon = np.array([loan.get('balloon_payment') or 0 for loan in loans], dtype=np.float64)
+    start = to_days([loan['start_date'] for loan in loans])
+    balloon_date = to_days([loan.get('balloon_date') for loan in loans])
+
+    per_year = np.where(step_days > 0, 364 // np.maximum(step_days, 1), 12 // np.maximum(step_months, 1))
+    rate = annual_rate / per_year
+    periods = term * per_year // 12
+    residual = np.where(interest_only, principal, np.minimum(balloon, principal))
+
+    # Level payment repaying principal down to the residual over the term
+    growth = (1 + rate) ** periods
+    safe_rate = np.where(rate > 0, rate, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = (principal - residual / growth) * safe_rate / (1 - 1 / growth)
+    level = np.where(rate > 0, annuity, (principal - residual) / np.maximum(periods, 1))
+    level = np.where(interest_only, principal * rate, np.round(level, 2))
+
+    # A balloon date ends the schedule at the first payment on or after it
+    balloon_number = np.maximum(
+        occurrences_through(start, step_months, step_days, balloon_date - np.timedelta64(1, 'D')), 1
+    )
+    counts = np.where(np.isnat(balloon_date), periods, np.minimum(periods, balloon_number))
+    counts = np.maximum(counts, 0)
+
+    # One element per payment
+    owner = np.repeat(np.arange(len(loans)), counts)
+    number = np.arange(len(owner)) - (np.cumsum(counts) - counts)[owner] + 1
+    r = rate[owner]
+    a = level[owner]
+    compounded = (1 + r) ** (number - 1)
+    balance = np.where(
+        r > 0,
+        principal[owner] * compounded - a * (compounded - 1) / np.where(r > 0, r, 1),
+        principal[owner] - a * (number - 1),
+    )
+    balance = np.maximum(balance, 0)
+    interest = balance * r
+    principal_paid = np.where(number == counts[owner], balance, np.clip(a - interest, 0, balance))
+
+    schedule = pd.DataFrame({
+        'payment_id': [f"{loan_id}-{n:03d}" for loan_id, n in zip(loan_ids[owner], number)],
+        'loan_id': loan_ids[owner],
+        'payment_number': number,
+        'payment_date': np.datetime_as_string(nth_occurrence(start[owner], step_months[owner], step_days[owner], number), unit='D'),
+        'payment_amount': principal_paid + interest,
+        'principal_payment': principal_paid,
+        'interest_payment': interest,
+        'remaining_balance': balance - principal_paid,
+        'payment_status': 'scheduled',
+    })
+    schedule[_MONEY_COLUMNS] = schedule[_MONEY_COLUMNS].round(2)
+    return schedule[PAYMENT_COLUMNS]
+
+
+def insert_loan_payments(cursor, schedule: pd.DataFrame) -> int:
+    """Write an amortization_schedule with one executemany; returns the rows written"""
+    cursor.executemany(
+        f"INSERT INTO loan_payments ({', '.join(PAYMENT_COLUMNS)}) VALUES ({', '.join('?' for _ in PAYMENT_COLUMNS)})",
+        [
+            (payment_id, loan_id, int(number), payment_date, float(amount), float(principal_paid),
+             float(interest), float(remaining), status)
+            for payment_id, loan_id, number, payment_date, amount, principal_paid, interest, remaining, status
+            in schedule.itertuples(index=False)
+        ]
+    )
+    return len(schedule)
+
+
+def schedule_totals(schedule: pd.DataFrame) -> Dict[str, float]:
+    return {
+        "total_payments": round(float(schedule['payment_amount'].sum()), 2),
+        "total_interest": round(float(schedule['interest_payment'].sum()), 2),
+    }
+
+
+def regenerate_loan_schedules(cursor, loan_ids: Optional[Sequence[str]] = None, rate_change: float = 0.0,
+                              active_only: bool = True, persist: bool = True) -> Dict[str, Any]:
+    """Recompute the schedules of many loans, with ``rate_change`` percentage points added to their rates.
+
+    With ``persist`` the loans' rates and schedules are replaced in the
+    caller's transaction; without it nothing is written and only the totals
+    are returned, next to those of the stored schedules. Returns the loans
+    and payments computed, the totals and the seconds taken.
+    """
+    started = time.perf_counter()
+    query = f"SELECT {', '.join(LOAN_SCHEDULE_COLUMNS)} FROM loans"
+    conditions: List[str] = []
+    params: List[Any] = []
+    if active_only:
+        conditions.append("is_active = 1")
+    if loan_ids is not None:
+        conditions.append(f"loan_id IN ({', '.join('?' for _ in loan_ids)})")
+        params.extend(loan_ids)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    cursor.execute(query, params)
+    loans = [dict(zip(LOAN_SCHEDULE_COLUMNS, row)) for row in cursor.fetchall()]
+    for loan in loans:
+        loan['interest_rate'] = max((loan['interest_rate'] or 0) + rate_change, 0)
+
+    cursor.execute(
+        "SELECT COALESCE(SUM(payment_amount), 0), COALESCE(SUM(interest_payment), 0) FROM loan_payments "
+        f"WHERE loan_id IN (SELECT loan_id FROM ({query}))",
+        params
+    )
+    current_payments, current_interest = cursor.fetchone()
+
+    schedule = amortization_schedule(loans)
+    computed_seconds = round(time.perf_counter() - started, 4)
+    if persist and loans:
+        if rate_change:
+            cursor.executemany(
+                "UPDATE loans SET interest_rate = ?, monthly_payment_amount = ?, updated_date = CURRENT_TIMESTAMP "
+                "WHERE loan_id = ?",
+                [
+                    (loan['interest_rate'], calculate_loan_payment(
+                        loan['principal_amount'] or 0, loan['interest_rate'] / 100,
+                        loan['loan_term_months'] or 1, loan['payment_type']
+                    ), loan['loan_id'])
+                    for loan in loans
+                ]
+            )
+        cursor.execute(f"DELETE FROM loan_payments WHERE loan_id IN (SELECT loan_id FROM ({query}))", params)
+        insert_loan_payments(cursor, schedule)
+    return {
+        "loans": len(loans),
+        "payments": len(schedule),
+        "rate_change": rate_change,
+        "persisted": persist,
+        **schedule_totals(schedule),
+        "current_total_payments": round(current_payments, 2),
+        "current_total_interest": round(current_interest, 2),
+        "computed_seconds": computed_seconds,
+        "elapsed_seconds": round(time.perf_counter() - started, 4),
+    }
@@ -0,0 +1,142 @@
+"""
+Keyset (cursor-based) pagination.
+
+Instead of ``LIMIT/OFFSET`` (which makes SQLite walk and discard every
+skipped row), each page continues strictly after the sort key of the last row
+returned. The position is handed to clients as an opaque continuation token.
+
+Sort keys are output columns of the base query and should end with a unique
+column (usually the primary key) so the order is total. NULLs sort first,
+matching SQLite, and are handled explicitly so nullable sort columns page
+correctly.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a continuation token is malformed or belongs to another listing"""
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _after_clause(keys: Sequence[str], values: Sequence[Any], descending: bool) -> Tuple[str, List[Any]]:
+    """SQL predicate selecting rows that sort strictly after ``values``"""
+    column, value = _quote(keys[0]), values[0]
+
+    if len(keys) == 1:
+        if descending:
+            return ("0", []) if value is None else (f"({column} < ? OR {column} IS NULL)", [value])
+        return (f"{column} IS NOT NULL", []) if value is None else (f"{column} > ?", [value])
+
+    rest_sql, rest_params = _after_clause(keys[1:], values[1:], descending)
+    if descending:
+        if value is None:
+            return f"({column} IS NULL AND {rest_sql})", rest_params
+        return (
+            f"({column} < ? OR {column} IS NULL OR ({column} = ? AND {rest_sql}))",
+            [value, value, *rest_params],
+        )
+    if value is None:
+        return f"({column} IS NOT NULL OR {rest_sql})", rest_params
+    # The leading >= lets SQLite drive the scan from an index on the first key
+    return (
+        f"({column} >= ? AND ({column} > ? OR {rest_sql}))",
+        [value, value, *rest_params],
+    )
+
+
+class KeysetPaginator:
+    """Pages a base query by its sort keys using opaque continuation tokens.
+
+    ``scope`` names the listing (e.g. the table); tokens issued for one
+    listing or sort order are rejected by another.
+    """
+
+    def __init__(self, sort_keys: Sequence[str], descending: bool = False, scope: str = ""):
+        if not sort_keys:
+            raise ValueError("Keyset pagination needs at least one sort key")
+        self.sort_keys = list(sort_keys)
+        self.descending = descending
+        spec = json.dumps([scope, self.sort_keys, descending])
+        self._signature = hashlib.sha1(spec.encode()).hexdigest()[:12]
+
+    def encode_cursor(self, row: Dict[str, Any]) -> str:
+        payload = json.dumps({"k": [row[key] for key in self.sort_keys], "s": self._signature},
+                             separators=(",", ":"), default=str)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, token: str) -> List[Any]:
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            values, signature = payload["k"], payload["s"]
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise InvalidCursorError("Malformed pagination cursor")
+        if signature != self._signature or not isinstance(values, list) or len(values) != len(self.sort_keys):
+            raise InvalidCursorError("Pagination cursor does not match this listing or sort order")
+        return values
+
+    def page_query(self, base_query: str, params: Sequence[Any], cursor: Optional[str],
+                   page_size: int) -> Tuple[str, List[Any]]:
+        """Wrap ``base_query`` (which must not have its own ORDER BY/LIMIT) for one page.
+
+        One extra row is fetched to tell whether another page follows.
+        """
+        query = f"SELECT * FROM ({base_query}) AS page"
+        query_params = list(params)
+        if cursor:
+            after_sql, after_params = _after_clause(self.sort_keys, self.decode_cursor(cursor), self.descending)
+            query += f" WHERE {after_sql}"
+            query_params.extend(after_params)
+
+        direction = "DESC" if self.descending else "ASC"
+        query += " ORDER BY " + ", ".join(f"{_quote(key)} {direction}" for key in self.sort_keys)
+        query += " LIMIT ?"
+        query_params.append(page_size + 1)
+        return query, query_params
+
+    @staticmethod
+    def count_query(base_query: str, params: Sequence[Any]) -> Tuple[str, List[Any]]:
+        return f"SELECT COUNT(*) FROM ({base_query}) AS counted", list(params)
+
+    def paginate(self, cursor_obj, base_query: str, params: Sequence[Any] = (),
+                 cursor: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE,
+                 include_total: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Run one page of ``base_query`` on a sqlite3 cursor.
+
+        Returns ``(rows, pagination)`` where rows are dicts keyed by output
+        column and ``pagination`` holds ``next_cursor``, ``has_more``,
+        ``page_size`` and ``total_count`` (None unless requested).
+        """
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+        query, query_params = self.page_query(base_query, params, cursor, page_size)
+        cursor_obj.execute(query, query_params)
+        columns = [description[0] for description in cursor_obj.description]
+        rows = [dict(zip(columns, row)) for row in cursor_obj.fetchall()]
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        total_count = None
+        if include_total:
+            count_sql, count_params = self.count_query(base_query, params)
+            cursor_obj.execute(count_sql, count_params)
+            total_count = cursor_obj.fetchone()[0]
+
+        return rows, {
+            "next_cursor": self.encode_cursor(rows[-1]) if has_more else None,
+            "has_more": has_more,
+            "page_size": page_size,
+            "total_count": total_count,
+        }
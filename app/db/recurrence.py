@@ -0,0 +1,125 @@
+"""
+Closed-form calendar recurrences, vectorized over many schedules.
+
+A schedule is a start date and a step of either whole months (monthly to
+annually) or whole days (weekly, biweekly); a one-time schedule has no step
+and a single occurrence. Occurrence ``k`` of a schedule is computed
+directly rather than by stepping from the start:
+
+- day steps: ``start + k * step_days``
+- month steps: ``k * step_months`` months after the start month, on the
+  start date's day of month clamped to shorter months, so a schedule
+  starting on the 31st falls on the last day of every shorter month and
+  returns to the 31st afterwards
+
+Every function takes NumPy arrays (one element per schedule) of
+``datetime64[D]`` dates and integer steps, so the cost of a call scales
+with the number of schedules, or with the occurrences returned, never with
+the occurrences skipped over.
+"""
+
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Frequency -> (step months, step days); both zero for a one-time schedule
+FREQUENCY_STEPS = {
+    'weekly': (0, 7),
+    'biweekly': (0, 14),
+    'monthly': (1, 0),
+    'quarterly': (3, 0),
+    'biannually': (6, 0),
+    'annually': (12, 0),
+    'one_time': (0, 0),
+}
+
+
+def to_days(values: Sequence[Optional[str]]) -> np.ndarray:
+    """datetime64[D] of 'YYYY-MM-DD' strings; NaT where missing"""
+    return np.array([value or 'NaT' for value in values], dtype='datetime64[D]')
+
+
+def month_index(days: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 of datetime64[D] values"""
+    return days.astype('datetime64[M]').astype(np.int64)
+
+
+def day_of_month(days: np.ndarray) -> np.ndarray:
+    return (days - days.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64) + 1
+
+
+def days_in_month(months: np.ndarray) -> np.ndarray:
+    """Days in each month of month indexes"""
+    first = months.astype('datetime64[M]').astype('datetime64[D]')
+    following = (months + 1).astype('datetime64[M]').astype('datetime64[D]')
+    return (following - first).astype(np.int64)
+
+
+def period_strings(months: np.ndarray) -> np.ndarray:
+    """'YYYY-MM' of month indexes"""
+    return np.datetime_as_string(months.astype('datetime64[M]'), unit='M')
+
+
+def frequency_steps(frequencies: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(step months, step days) arrays of frequency names; ValueError for an unknown one"""
+    frequencies = list(frequencies)
+    unknown = set(frequencies) - set(FREQUENCY_STEPS)
+    if unknown:
+        raise ValueError(f"Unknown frequency: {', '.join(sorted(map(str, unknown)))}")
+    steps = np.array([FREQUENCY_STEPS[f] for f in frequencies], dtype=np.int64).reshape(-1, 2)
+    return steps[:, 0], steps[:, 1]
+
+
+def add_months(days: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """``months`` months after ``days``, on the same day of month clamped to the target month"""
+    target = month_index(days) + months
+    day = np.minimum(day_of_month(days), days_in_month(target))
+    return target.astype('datetime64[M]').astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+
+
+def nth_occurrence(start: np.ndarray, step_months: np.ndarray, step_days: np.ndarray,
+                   k: np.ndarray) -> np.ndarray:
+    """Occurrence ``k`` (0 being the start) of each schedule"""
+    k = np.asarray(k, dtype=np.int64)
+    by_days = start + (step_days * k).astype('timedelta64[D]')
+    return np.where(step_days > 0, by_days, add_months(start, step_months * k))
+
+
+def occurrences_through(start: np.ndarray, step_months: np.ndarray, step_days: np.ndarray,
+                        bound: np.ndarray) -> np.ndarray:
+    """Number of occurrences of each schedule on or before ``bound``.
+
+    This is also the index of the first occurrence after ``bound``.
+    """
+    started = ~np.isnat(bound) & (start <= bound)
+    safe_bound = np.where(started, bound, start)
+    days_count = (safe_bound - start).astype(np.int64) // np.maximum(step_days, 1) + 1
+    k = (month_index(safe_bound) - month_index(start)) // np.maximum(step_months, 1)
+    months_count = k + (nth_occurrence(start, step_months, 0, k) <= safe_bound)
+    count = np.where(step_days > 0, days_count, np.where(step_months > 0, months_count, 1))
+    return np.where(started, count, 0)
+
+
+def next_occurrence(start: np.ndarray, step_months: np.ndarray, step_days: np.ndarray,
+                    on_or_after: np.ndarray, end: Optional[np.ndarray] = None) -> np.ndarray:
+    """First occurrence of each schedule on or after ``on_or_after``; NaT past ``end`` or a one-time start"""
+    k = occurrences_through(start, step_months, step_days, on_or_after - np.timedelta64(1, 'D'))
+    following = nth_occurrence(start, step_months, step_days, k)
+    finished = (step_months == 0) & (step_days == 0) & (k > 0)
+    if end is not None:
+        finished |= ~np.isnat(end) & (following > end)
+    return np.where(finished, np.datetime64('NaT', 'D'), following)
+
+
+def occurrences_between(start: np.ndarray, step_months: np.ndarray, step_days: np.ndarray,
+                        first: np.ndarray, last: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """All occurrences from ``first`` through ``last``, inclusive, in schedule and date order.
+
+    Returns (schedule position, occurrence index, date) arrays with one
+    element per occurrence.
+    """
+    skipped = occurrences_through(start, step_months, step_days, first - np.timedelta64(1, 'D'))
+    counts = np.maximum(occurrences_through(start, step_months, step_days, last) - skipped, 0)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    k = skipped[owner] + np.arange(len(owner)) - (np.cumsum(counts) - counts)[owner]
+    return owner, k, nth_occurrence(start[owner], step_months[owner], step_days[owner], k)
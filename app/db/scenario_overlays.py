@@ -0,0 +1,325 @@
+"""
+Copy-on-write overlay scenarios.
+
+An overlay is a ``forecast`` row whose ``parent_forecast_id`` names a base
+(non-overlay) scenario. It holds only its changes to the parent's sales:
+
+- inserts and updates are ordinary ``sales`` rows under the overlay's
+  forecast_id; a row shadows the parent line with the same
+  (customer_id, unit_id, period)
+- deletes are tombstones in ``sales_overlay_deletions``
+
+The ``resolved_sales`` view merges the two: every scenario's own rows, plus
+for each overlay the parent rows it neither shadows nor deleted. Queries that
+filter it on forecast_id read the overlay's rows and one pass over its
+parent. Reports over many variants of one base use ``OVERLAY_DELTAS``
+instead: the base is aggregated once and each variant adds only its deltas.
+
+Expenses and payroll are small per scenario and are copied when an overlay
+is created (see ``create_overlay``), so an overlay costs O(changes) in sales
+rather than O(base size).
+"""
+
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .scenarios import duplicate_scenario
+from .schema_catalog import TableSchema
+
+DELETIONS_TABLE = 'sales_overlay_deletions'
+RESOLVED_SALES_VIEW = 'resolved_sales'
+
+# Scenario tables copied into a new overlay rather than overlaid
+OVERLAY_COPIED_TABLES = ('expenses', 'expense_allocations', 'payroll')
+
+_SAME_LINE = "{a}.customer_id = {b}.customer_id AND {a}.unit_id = {b}.unit_id AND {a}.period = {b}.period"
+
+# Per-overlay changes to its base's sales, one signed row per added or removed line.
+# Needs a CTE ``overlays(forecast_id, base_id)``; ``lines`` is +1/-1 so callers can
+# drop groups whose lines were all removed. CROSS JOIN pins the join order so the
+# base is probed by key from the overlay's few rows rather than scanned.
+OVERLAY_DELTAS = f"""
+    SELECT o.forecast_id, s.period, s.unit_id, s.customer_id,
+           COALESCE(s.total_revenue, 0) AS total_revenue, COALESCE(s.quantity, 0) AS quantity, 1 AS lines
+    FROM overlays o
+    JOIN sales s ON s.forecast_id = o.forecast_id
+    UNION ALL
+    SELECT o.forecast_id, b.period, b.unit_id, b.customer_id,
+           -COALESCE(b.total_revenue, 0), -COALESCE(b.quantity, 0), -1
+    FROM overlays o
+    CROSS JOIN sales s ON s.forecast_id = o.forecast_id
+    CROSS JOIN sales b ON b.forecast_id = o.base_id AND {_SAME_LINE.format(a='b', b='s')}
+    UNION ALL
+    SELECT o.forecast_id, b.period, b.unit_id, b.customer_id,
+           -COALESCE(b.total_revenue, 0), -COALESCE(b.quantity, 0), -1
+    FROM overlays o
+    CROSS JOIN {DELETIONS_TABLE} d ON d.forecast_id = o.forecast_id
+    CROSS JOIN sales b ON b.forecast_id = o.base_id AND {_SAME_LINE.format(a='b', b='d')}
+    WHERE NOT EXISTS (
+        SELECT 1 FROM sales s WHERE s.forecast_id = d.forecast_id AND {_SAME_LINE.format(a='s', b='d')}
+    )
+"""
+
+
+def overlay_ddl() -> List[str]:
+    """DDL for the tombstone table and the resolved_sales view; needs forecast.parent_forecast_id"""
+    return [
+        f'''
+        CREATE TABLE IF NOT EXISTS {DELETIONS_TABLE} (
+            forecast_id TEXT NOT NULL,
+            customer_id TEXT NOT NULL,
+            unit_id TEXT NOT NULL,
+            period TEXT NOT NULL,
+            PRIMARY KEY (forecast_id, customer_id, unit_id, period)
+        ) WITHOUT ROWID
+        ''',
+        f'''
+        CREATE VIEW IF NOT EXISTS {RESOLVED_SALES_VIEW} AS
+        SELECT sale_id, customer_id, unit_id, period, quantity, unit_price, total_revenue, forecast_id
+        FROM sales
+        UNION ALL
+        SELECT b.sale_id, b.customer_id, b.unit_id, b.period, b.quantity, b.unit_price,
+               b.total_revenue, o.forecast_id
+        FROM forecast o
+        JOIN sales b ON b.forecast_id = o.parent_forecast_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM sales s WHERE s.forecast_id = o.forecast_id AND {_SAME_LINE.format(a='s', b='b')}
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM {DELETIONS_TABLE} d WHERE d.forecast_id = o.forecast_id AND {_SAME_LINE.format(a='d', b='b')}
+        )
+        ''',
+    ]
+
+
+def _values(rows: Sequence[Tuple[Any, ...]], width: int) -> Tuple[str, List[Any]]:
+    """A VALUES body for ``rows``, or a SELECT of no rows when there are none"""
+    if not rows:
+        return "SELECT " + ", ".join("NULL" for _ in range(width)) + " WHERE 0", []
+    row = "(" + ", ".join("?" for _ in range(width)) + ")"
+    return "VALUES " + ", ".join(row for _ in rows), [value for r in rows for value in r]
+
+
+def scenario_bases(cursor, forecast_ids: Iterable[str]) -> Dict[str, str]:
+    """Map each forecast id to the scenario its base rows come from: its parent, or itself"""
+    ids = list(dict.fromkeys(forecast_ids))
+    bases = {forecast_id: forecast_id for forecast_id in ids}
+    if ids:
+        cursor.execute(
+            f"SELECT forecast_id, parent_forecast_id FROM forecast "
+            f"WHERE parent_forecast_id IS NOT NULL AND forecast_id IN ({', '.join('?' for _ in ids)})",
+            ids
+        )
+        bases.update(cursor.fetchall())
+    return bases
+
+
+def overlay_children(cursor, forecast_id: str) -> List[str]:
+    cursor.execute("SELECT forecast_id FROM forecast WHERE parent_forecast_id = ? ORDER BY forecast_id", (forecast_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_overlay(cursor, parent_id: str, new_id: str, name: str, description: Optional[str],
+                   table_schema: Callable[[str], TableSchema]) -> Dict[str, Any]:
+    """Create overlay ``new_id`` of scenario ``parent_id`` in the caller's transaction.
+
+    An overlay of an overlay is flattened onto the same base: the parent
+    overlay's sales rows and tombstones are copied, so overlays are never
+    nested and resolving one never reads more than its base.
+    """
+    base_id = scenario_bases(cursor, [parent_id])[parent_id]
+    cursor.execute(
+        "INSERT INTO forecast (forecast_id, name, description, parent_forecast_id) VALUES (?, ?, ?, ?)",
+        (new_id, name, description, base_id)
+    )
+    tables = OVERLAY_COPIED_TABLES
+    tombstones = 0
+    if base_id != parent_id:
+        tables = ('sales',) + tables
+        cursor.execute(
+            f"INSERT INTO {DELETIONS_TABLE} (forecast_id, customer_id, unit_id, period) "
+            f"SELECT ?, customer_id, unit_id, period FROM {DELETIONS_TABLE} WHERE forecast_id = ?",
+            (new_id, parent_id)
+        )
+        tombstones = cursor.rowcount
+    summary = duplicate_scenario(cursor, parent_id, new_id, table_schema, tables=tables)
+    summary["copied"][DELETIONS_TABLE] = tombstones
+    return {"parent_forecast_id": base_id, **summary}
+
+
+def copy_parent_lines(cursor, keys_sql: str, params: Sequence[Any] = ()) -> int:
+    """Copy on write: give overlays their own copy of the parent lines they are about to change.
+
+    ``keys_sql`` selects (customer_id, unit_id, period, forecast_id). Keys of
+    non-overlay scenarios, lines the overlay already holds and lines it
+    deleted are skipped; tombstones of the keys are then cleared, so writing a
+    deleted line creates it afresh. Returns the number of lines copied.
+    """
+    cursor.execute(f"""
+        INSERT INTO sales (sale_id, customer_id, unit_id, period, quantity, unit_price, total_revenue, forecast_id)
+        SELECT 'SAL-' || k.forecast_id || '-' || lower(hex(randomblob(8))),
+               b.customer_id, b.unit_id, b.period, b.quantity, b.unit_price, b.total_revenue, k.forecast_id
+        FROM (SELECT DISTINCT customer_id, unit_id, period, forecast_id FROM ({keys_sql})) k
+        JOIN forecast o ON o.forecast_id = k.forecast_id
+        JOIN sales b ON b.forecast_id = o.parent_forecast_id AND {_SAME_LINE.format(a='b', b='k')}
+        WHERE NOT EXISTS (
+            SELECT 1 FROM sales s WHERE s.forecast_id = k.forecast_id AND {_SAME_LINE.format(a='s', b='k')}
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM {DELETIONS_TABLE} d WHERE d.forecast_id = k.forecast_id AND {_SAME_LINE.format(a='d', b='k')}
+        )
+    """, params)
+    copied = cursor.rowcount
+    cursor.execute(f"""
+        DELETE FROM {DELETIONS_TABLE}
+        WHERE (forecast_id, customer_id, unit_id, period) IN (
+            SELECT forecast_id, customer_id, unit_id, period FROM ({keys_sql})
+        )
+    """, params)
+    return copied
+
+
+def remove_sales_lines(cursor, forecast_id: str, lines: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Delete the (customer_id, unit_id, period) lines of ``lines`` from a scenario.
+
+    In an overlay, lines inherited from the parent are tombstoned instead.
+    """
+    keys = [(line.get("customer_id"), line.get("unit_id"), line.get("period")) for line in lines]
+    cursor.executemany(
+        "DELETE FROM sales WHERE forecast_id = ? AND customer_id = ? AND unit_id = ? AND period = ?",
+        [(forecast_id, *key) for key in keys]
+    )
+    deleted = cursor.rowcount
+    tombstoned = 0
+    base_id = scenario_bases(cursor, [forecast_id])[forecast_id]
+    if base_id != forecast_id:
+        cursor.executemany(f"""
+            INSERT OR IGNORE INTO {DELETIONS_TABLE} (forecast_id, customer_id, unit_id, period)
+            SELECT ?, ?, ?, ?
+            WHERE EXISTS (SELECT 1 FROM sales WHERE forecast_id = ? AND customer_id = ? AND unit_id = ? AND period = ?)
+        """, [(forecast_id, *key, base_id, *key) for key in keys])
+        tombstoned = cursor.rowcount
+    return {"deleted": deleted, "tombstoned": tombstoned}
+
+
+def remove_sales_of(cursor, forecast_id: str, column: str, value: Any) -> Dict[str, int]:
+    """Delete a scenario's sales lines whose ``column`` (customer_id or unit_id) is ``value``.
+
+    In an overlay, lines inherited from the parent are tombstoned instead, as
+    in remove_sales_lines.
+    """
+    if column not in ('customer_id', 'unit_id'):
+        raise ValueError(f"Sales lines cannot be removed by {column}")
+    cursor.execute(f"DELETE FROM sales WHERE forecast_id = ? AND {column} = ?", (forecast_id, value))
+    deleted = cursor.rowcount
+    tombstoned = 0
+    base_id = scenario_bases(cursor, [forecast_id])[forecast_id]
+    if base_id != forecast_id:
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO {DELETIONS_TABLE} (forecast_id, customer_id, unit_id, period)
+            SELECT ?, customer_id, unit_id, period FROM sales WHERE forecast_id = ? AND {column} = ?
+        """, (forecast_id, base_id, value))
+        tombstoned = cursor.rowcount
+    return {"deleted": deleted, "tombstoned": tombstoned}
+
+
+def delete_overlay_state(cursor, forecast_id: str) -> int:
+    """Delete the tombstones of a scenario being deleted"""
+    cursor.execute(f"DELETE FROM {DELETIONS_TABLE} WHERE forecast_id = ?", (forecast_id,))
+    return cursor.rowcount
+
+
+def sales_forecast_query(
+    forecast_id: Optional[str], start_period: Optional[str], end_period: Optional[str]
+) -> Tuple[str, List[Any]]:
+    """Resolved sales joined to customers and units, with optional period and forecast filtering"""
+    query = f"""
+        SELECT s.sale_id, s.customer_id, s.unit_id, s.period, s.quantity,
+               s.unit_price, s.total_revenue, s.forecast_id,
+               c.customer_name, c.customer_type, c.region,
+               u.unit_name, u.unit_description, u.base_price, u.bom_id, u.router_id
+        FROM {RESOLVED_SALES_VIEW} s
+        LEFT JOIN customers c ON s.customer_id = c.customer_id
+        LEFT JOIN units u ON s.unit_id = u.unit_id
+    """
+
+    conditions: List[str] = []
+    params: List[Any] = []
+
+    if forecast_id:
+        conditions.append("s.forecast_id = ?")
+        params.append(forecast_id)
+    if start_period:
+        conditions.append("s.period >= ?")
+        params.append(start_period)
+    if end_period:
+        conditions.append("s.period <= ?")
+        params.append(end_period)
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    query += " ORDER BY s.period, s.customer_id, s.unit_id"
+    return query, params
+
+
+def resolved_sales_frame_sql(
+    cursor, forecast_ids: Sequence[str], bases: Optional[Dict[str, str]] = None
+) -> Tuple[str, List[Any]]:
+    """CTEs ending in ``contributions(period, unit_id, customer_id, total_revenue, quantity, lines)``.
+
+    Summing the contributions by any grain gives the resolved sales of every
+    selected scenario, each counted once per time it is listed. Base rows
+    are read once however many of their overlays are selected. ``bases`` is
+    the scenario_bases of ``forecast_ids`` when the caller already has it.
+    """
+    if bases is None:
+        bases = scenario_bases(cursor, forecast_ids)
+    base_weights = Counter(bases[forecast_id] for forecast_id in forecast_ids)
+    overlay_weights = Counter(forecast_id for forecast_id in forecast_ids if bases[forecast_id] != forecast_id)
+
+    base_values, base_params = _values(list(base_weights.items()), 2)
+    overlay_values, overlay_params = _values(
+        [(forecast_id, bases[forecast_id], weight) for forecast_id, weight in overlay_weights.items()], 3
+    )
+    sql = f"""
+        WITH base_weights(forecast_id, weight) AS ({base_values}),
+        overlays(forecast_id, base_id, weight) AS ({overlay_values}),
+        contributions(period, unit_id, customer_id, total_revenue, quantity, lines) AS (
+            SELECT s.period, s.unit_id, s.customer_id,
+                   COALESCE(s.total_revenue, 0) * w.weight, COALESCE(s.quantity, 0) * w.weight, w.weight
+            FROM base_weights w
+            JOIN sales s ON s.forecast_id = w.forecast_id
+            UNION ALL
+            SELECT d.period, d.unit_id, d.customer_id,
+                   d.total_revenue * o.weight, d.quantity * o.weight, d.lines * o.weight
+            FROM ({OVERLAY_DELTAS}) d
+            JOIN overlays o ON o.forecast_id = d.forecast_id
+        )
+    """
+    return sql, base_params + overlay_params
+
+
+def scenario_revenue(cursor, forecast_ids: Sequence[str]) -> Dict[str, float]:
+    """Total resolved sales revenue of each scenario"""
+    bases = scenario_bases(cursor, forecast_ids)
+    base_ids = sorted(set(bases.values()))
+    cursor.execute(
+        f"SELECT forecast_id, SUM(total_revenue) FROM sales "
+        f"WHERE forecast_id IN ({', '.join('?' for _ in base_ids)}) GROUP BY forecast_id",
+        base_ids
+    )
+    base_totals = {forecast_id: total or 0 for forecast_id, total in cursor.fetchall()}
+
+    overlay_values, params = _values(
+        [(forecast_id, base_id) for forecast_id, base_id in bases.items() if base_id != forecast_id], 2
+    )
+    cursor.execute(f"""
+        WITH overlays(forecast_id, base_id) AS ({overlay_values})
+        SELECT forecast_id, SUM(total_revenue) FROM ({OVERLAY_DELTAS}) GROUP BY forecast_id
+    """, params)
+    deltas = dict(cursor.fetchall())
+    return {
+        forecast_id: float(base_totals.get(base_id, 0) + (deltas.get(forecast_id) or 0))
+        for forecast_id, base_id in bases.items()
+    }
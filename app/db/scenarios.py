@@ -0,0 +1,112 @@
+"""
+Set-based copies of a forecast scenario's rows.
+
+``duplicate_scenario`` copies every table in ``SCENARIO_TABLES`` with one
+``INSERT ... SELECT`` each, in the caller's transaction. The copied rows'
+ids are generated in SQL as ``<prefix>-<new forecast_id>-<source rowid>``,
+which is unique because the new forecast id is and lets the allocation
+copy find the id of its copied expense without a lookup table.
+
+The copies reference the same parents as rows already in the database, so
+callers may run the copy with ``PRAGMA foreign_keys=OFF`` to skip per-row
+checks. Sales are copied with change tracking disabled and journaled with
+one statement afterwards.
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .change_tracking import record_scenario_sales, set_tracking_enabled
+from .schema_catalog import TableSchema
+
+# Tables copied with a scenario, parents first: table -> (id column, id prefix)
+SCENARIO_TABLES = {
+    'sales': ('sale_id', 'SAL'),
+    'expenses': ('expense_id', 'EXP'),
+    'expense_allocations': ('allocation_id', 'ALLOC'),
+    'payroll': ('employee_id', 'EMP'),
+}
+
+# Tables linked to a scenario through their parent rather than a forecast_id: table -> (fk column, parent)
+SCENARIO_CHILD_TABLES = {
+    'expense_allocations': ('expense_id', 'expenses'),
+}
+
+# Columns reset on the copies
+_TIMESTAMP_COLUMNS = ('created_date', 'updated_date')
+
+
+def _copied_id(table: str, alias: str) -> str:
+    prefix = SCENARIO_TABLES[table][1]
+    return f"'{prefix}-' || :forecast_id || '-' || {alias}.rowid"
+
+
+def duplicate_scenario(cursor, source_id: str, new_id: str,
+                       table_schema: Callable[[str], TableSchema],
+                       tables: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Copy the rows of scenario ``source_id`` into the existing scenario ``new_id``.
+
+    ``tables`` limits the copy to those of SCENARIO_TABLES; a child table
+    needs its parent table copied too. Returns the rows copied and seconds
+    taken per table.
+    """
+    params = {"source": source_id, "forecast_id": new_id, "now": datetime.now().isoformat()}
+    copied = {}
+    timings = {}
+    start = time.perf_counter()
+    selected = set(SCENARIO_TABLES if tables is None else tables)
+    for table, (id_column, _) in SCENARIO_TABLES.items():
+        if table not in selected:
+            continue
+        table_start = time.perf_counter()
+        values = {column: f"src.{column}" for column in table_schema(table).columns}
+        values[id_column] = _copied_id(table, "src")
+        if table in SCENARIO_CHILD_TABLES:
+            fk_column, parent = SCENARIO_CHILD_TABLES[table]
+            values[fk_column] = _copied_id(parent, "parent")
+            source = (
+                f"{table} src JOIN {parent} parent ON src.{fk_column} = parent.{SCENARIO_TABLES[parent][0]} "
+                f"WHERE parent.forecast_id = :source"
+            )
+        else:
+            values["forecast_id"] = ":forecast_id"
+            source = f"{table} src WHERE src.forecast_id = :source"
+        for column in _TIMESTAMP_COLUMNS:
+            if column in values:
+                values[column] = ":now"
+
+        journal_set_based = table == 'sales'
+        if journal_set_based:
+            set_tracking_enabled(cursor, False)
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(values)}) SELECT {', '.join(values.values())} FROM {source}",
+            params
+        )
+        copied[table] = cursor.rowcount
+        if journal_set_based:
+            set_tracking_enabled(cursor, True)
+            record_scenario_sales(cursor, new_id)
+        timings[table] = round(time.perf_counter() - table_start, 4)
+    return {
+        "copied": copied,
+        "timings": timings,
+        "elapsed_seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def delete_scenario_rows(cursor, forecast_id: str) -> Dict[str, int]:
+    """Delete the rows of a scenario from SCENARIO_TABLES, children first"""
+    deleted = {}
+    for table in reversed(list(SCENARIO_TABLES)):
+        if table in SCENARIO_CHILD_TABLES:
+            fk_column, parent = SCENARIO_CHILD_TABLES[table]
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {fk_column} IN "
+                f"(SELECT {SCENARIO_TABLES[parent][0]} FROM {parent} WHERE forecast_id = ?)",
+                (forecast_id,)
+            )
+        else:
+            cursor.execute(f"DELETE FROM {table} WHERE forecast_id = ?", (forecast_id,))
+        deleted[table] = cursor.rowcount
+    return deleted
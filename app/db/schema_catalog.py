@@ -0,0 +1,210 @@
+"""
+Process-wide catalog of table schemas.
+
+Column names, types, primary/unique keys and foreign keys are read from
+SQLite once and served from memory, instead of issuing ``PRAGMA table_info``
+on every request. The catalog is dropped whenever the schema may have
+changed (DDL, CSV reloads, switching database files) and rebuilt lazily on
+the next lookup.
+
+Lookups also validate identifiers: callers that interpolate table or column
+names into SQL should only do so for names the catalog knows about.
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Statements that can change the schema; anything else leaves the catalog valid
+DDL_PREFIXES = ("CREATE", "ALTER", "DROP")
+
+_INTERNAL_PREFIXES = ("sqlite_",)
+
+
+class UnknownTableError(ValueError):
+    """Raised when a table name is not in the schema"""
+
+    def __init__(self, table_name: str):
+        super().__init__(f"no such table: {table_name}")
+        self.table_name = table_name
+
+
+class UnknownColumnError(ValueError):
+    """Raised when a column name is not in a table's schema"""
+
+    def __init__(self, table_name: str, column_name: str):
+        super().__init__(f"no such column: {column_name} in table {table_name}")
+        self.table_name = table_name
+        self.column_name = column_name
+
+
+def is_ddl(sql_statement: str) -> bool:
+    """Whether a statement may change the schema"""
+    return sql_statement.lstrip().upper().startswith(DDL_PREFIXES)
+
+
+class TableSchema:
+    """Columns and keys of one table"""
+
+    def __init__(self, name: str, columns: List[str], column_types: Dict[str, str],
+                 primary_key: List[str], unique_keys: List[Tuple[str, ...]],
+                 foreign_keys: List[Dict[str, Any]], not_null: Sequence[str] = ()):
+        self.name = name
+        self.columns = columns
+        self.column_types = column_types
+        self.primary_key = primary_key
+        self.unique_keys = unique_keys
+        self.foreign_keys = foreign_keys
+        self.not_null = list(not_null)
+        self._column_set = frozenset(columns)
+
+    def has_column(self, column_name: str) -> bool:
+        return column_name in self._column_set
+
+    def validate_columns(self, column_names: Sequence[str]) -> List[str]:
+        """Return ``column_names`` unchanged, raising UnknownColumnError for any unknown name"""
+        for column_name in column_names:
+            if column_name not in self._column_set:
+                raise UnknownColumnError(self.name, column_name)
+        return list(column_names)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "columns": list(self.columns),
+            "column_types": dict(self.column_types),
+            "primary_key": list(self.primary_key),
+            "unique_keys": [list(key) for key in self.unique_keys],
+            "foreign_keys": [dict(fk) for fk in self.foreign_keys],
+            "not_null": list(self.not_null),
+        }
+
+
+def _read_table_schema(cursor, table_name: str) -> TableSchema:
+    quoted = '"' + table_name.replace('"', '""') + '"'
+
+    cursor.execute(f"PRAGMA table_info({quoted})")
+    table_info = cursor.fetchall()
+    columns = [col[1] for col in table_info]
+    column_types = {col[1]: (col[2] or "").upper() for col in table_info}
+    primary_key = [col[1] for col in sorted(table_info, key=lambda col: col[5]) if col[5]]
+    not_null = [col[1] for col in table_info if col[3]]
+
+    unique_keys = []
+    cursor.execute(f"PRAGMA index_list({quoted})")
+    for index in cursor.fetchall():
+        # (seq, name, unique, origin, partial); skip partial indexes
+        if index[2] and not index[4]:
+            cursor.execute(f"PRAGMA index_info(\"{index[1]}\")")
+            key = tuple(col[2] for col in sorted(cursor.fetchall()))
+            if key and None not in key and key not in unique_keys:
+                unique_keys.append(key)
+
+    foreign_keys = []
+    cursor.execute(f"PRAGMA foreign_key_list({quoted})")
+    for fk in cursor.fetchall():
+        # (id, seq, table, from, to, on_update, on_delete, match)
+        foreign_keys.append({
+            "id": fk[0],
+            "column": fk[3],
+            "references_table": fk[2],
+            "references_column": fk[4],
+        })
+
+    return TableSchema(table_name, columns, column_types, primary_key, unique_keys, foreign_keys, not_null)
+
+
+class SchemaCatalog:
+    """Lazily loaded, invalidatable snapshot of every table's schema.
+
+    ``connect`` returns a connection used when a lookup needs to (re)load the
+    catalog and the caller did not pass one.
+    """
+
+    def __init__(self, connect: Callable[[], Any]):
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._tables: Optional[Dict[str, TableSchema]] = None
+        self._schema_version: Optional[int] = None
+        self.loads = 0
+
+    def invalidate(self):
+        """Forget the cached schema; the next lookup reloads it"""
+        with self._lock:
+            self._tables = None
+
+    def refresh(self, conn=None) -> Dict[str, TableSchema]:
+        """Reload every table's schema now"""
+        self.invalidate()
+        return self._snapshot(conn)
+
+    def _snapshot(self, conn=None) -> Dict[str, TableSchema]:
+        tables = self._tables
+        if tables is not None:
+            return tables
+
+        with self._lock:
+            if self._tables is not None:
+                return self._tables
+
+            owns_connection = conn is None
+            if owns_connection:
+                conn = self._connect()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("PRAGMA schema_version")
+                schema_version = cursor.fetchone()[0]
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
+                names = [row[0] for row in cursor.fetchall()
+                         if not row[0].startswith(_INTERNAL_PREFIXES)]
+                tables = {name: _read_table_schema(cursor, name) for name in names}
+            finally:
+                if owns_connection:
+                    conn.close()
+
+            self._tables = tables
+            self._schema_version = schema_version
+            self.loads += 1
+            return tables
+
+    def _reload_if_changed(self, conn=None) -> Dict[str, TableSchema]:
+        """Reload if the database schema changed since the catalog was loaded.
+
+        Used on lookup misses so tables created outside the tracked DDL paths
+        are still found, without reloading for every unknown name.
+        """
+        owns_connection = conn is None
+        if owns_connection:
+            conn = self._connect()
+        try:
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if schema_version != self._schema_version:
+                self.invalidate()
+            return self._snapshot(conn)
+        finally:
+            if owns_connection:
+                conn.close()
+
+    def table_names(self, conn=None) -> List[str]:
+        return list(self._snapshot(conn))
+
+    def has_table(self, table_name: str, conn=None) -> bool:
+        try:
+            self.table(table_name, conn)
+        except UnknownTableError:
+            return False
+        return True
+
+    def table(self, table_name: str, conn=None) -> TableSchema:
+        """Schema of ``table_name``; raises UnknownTableError if it does not exist"""
+        schema = self._snapshot(conn).get(table_name)
+        if schema is None:
+            schema = self._reload_if_changed(conn).get(table_name)
+        if schema is None:
+            raise UnknownTableError(table_name)
+        return schema
+
+    def columns(self, table_name: str, conn=None) -> List[str]:
+        return self.table(table_name, conn).columns
+
+    def primary_key(self, table_name: str, conn=None) -> List[str]:
+        return self.table(table_name, conn).primary_key
@@ -0,0 +1,278 @@
+"""
+Per-unit standard cost subsystem.
+
+A unit's standard cost is defined once, here, and shared by every costing
+endpoint:
+
+- material: SUM(bom.material_cost) for the unit's bom_id at its bom_version
+- machine:  SUM(machine_minutes * machines.machine_rate / 60) over router_operations
+- labor:    SUM(labor_minutes * labor_rates.rate_amount / 60) over router_operations,
+            with operations that have no matching labor rate costing nothing
+
+Costs are materialized per (unit_id, bom_version, router_version) in
+``unit_standard_costs`` and kept in an in-process LRU. Triggers on bom,
+router_operations, machines, labor_rates and units delete the affected cache
+rows and bump ``standard_cost_state.version``; the LRU is dropped whenever that
+version moves, so every process sees invalidations made by any connection.
+Missing rows are materialized through the cache's ``write`` callable (the
+database's write queue), so readers never take the write lock themselves.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+CACHE_TABLE = 'unit_standard_costs'
+
+# Tables whose contents feed standard costs
+STANDARD_COST_SOURCES = ['bom', 'router_operations', 'machines', 'labor_rates', 'units']
+
+COST_COLUMNS = ['material_cost', 'labor_cost', 'machine_cost', 'total_cost']
+
+# SQLite's default limit on bound parameters is 999 on older builds
+_MAX_IN_PARAMS = 900
+
+_TRACKING_ENABLED = "(SELECT enabled FROM change_tracking_control WHERE id = 1) IS NOT 0"
+_BUMP_VERSION = "UPDATE standard_cost_state SET version = version + 1 WHERE id = 1;"
+
+# (table, cache rows invalidated by a change to {row})
+_INVALIDATIONS = {
+    'bom': f"DELETE FROM {CACHE_TABLE} WHERE bom_id = {{row}}.bom_id;",
+    'router_operations': f"DELETE FROM {CACHE_TABLE} WHERE router_id = {{row}}.router_id;",
+    'machines': (
+        f"DELETE FROM {CACHE_TABLE} WHERE router_id IN "
+        "(SELECT router_id FROM router_operations WHERE machine_id = {row}.machine_id);"
+    ),
+    'labor_rates': (
+        f"DELETE FROM {CACHE_TABLE} WHERE router_id IN "
+        "(SELECT router_id FROM router_operations WHERE labor_type_id = {row}.rate_id);"
+    ),
+    'units': f"DELETE FROM {CACHE_TABLE} WHERE unit_id = {{row}}.unit_id;",
+}
+
+# Labor and machine cost of every routing operation; a unit's routing costs are their sums
+OPERATION_COSTS_SQL = '''
+    SELECT ro.router_id, ro.sequence, ro.machine_id, ro.machine_minutes, ro.labor_minutes, ro.labor_type_id,
+           m.machine_name, m.machine_rate, lr.rate_amount AS labor_rate,
+           COALESCE(ro.labor_minutes, 0) * COALESCE(lr.rate_amount, 0) / 60.0 AS labor_cost,
+           COALESCE(ro.machine_minutes, 0) * COALESCE(m.machine_rate, 0) / 60.0 AS machine_cost
+    FROM router_operations ro
+    LEFT JOIN machines m ON ro.machine_id = m.machine_id
+    LEFT JOIN labor_rates lr ON ro.labor_type_id = lr.rate_id
+'''
+
+_MATERIALIZE_SQL = f'''
+    INSERT OR REPLACE INTO {CACHE_TABLE} (
+        unit_id, bom_id, bom_version, router_id, router_version,
+        material_cost, labor_cost, machine_cost, total_cost, computed_at
+    )
+    SELECT u.unit_id, u.bom_id, COALESCE(u.bom_version, '1.0'),
+           u.router_id, COALESCE(u.router_version, '1.0'),
+           COALESCE(b.material_cost, 0), COALESCE(r.labor_cost, 0), COALESCE(r.machine_cost, 0),
+           COALESCE(b.material_cost, 0) + COALESCE(r.labor_cost, 0) + COALESCE(r.machine_cost, 0),
+           CURRENT_TIMESTAMP
+    FROM units u
+    LEFT JOIN (
+        SELECT bom_id, COALESCE(version, '1.0') AS version, SUM(material_cost) AS material_cost
+        FROM bom
+        GROUP BY bom_id, COALESCE(version, '1.0')
+    ) b ON b.bom_id = u.bom_id AND b.version = COALESCE(u.bom_version, '1.0')
+    LEFT JOIN (
+        SELECT router_id, SUM(labor_cost) AS labor_cost, SUM(machine_cost) AS machine_cost
+        FROM ({OPERATION_COSTS_SQL})
+        GROUP BY router_id
+    ) r ON r.router_id = u.router_id
+'''
+
+_SELECT_SQL = f'''
+    SELECT u.unit_id, c.bom_id, c.bom_version, c.router_id, c.router_version,
+           c.material_cost, c.labor_cost, c.machine_cost, c.total_cost
+    FROM units u
+    LEFT JOIN {CACHE_TABLE} c
+      ON c.unit_id = u.unit_id
+     AND c.bom_version = COALESCE(u.bom_version, '1.0')
+     AND c.router_version = COALESCE(u.router_version, '1.0')
+'''
+
+_NOT_CACHED = f'''NOT EXISTS (
+    SELECT 1 FROM {CACHE_TABLE} c
+    WHERE c.unit_id = u.unit_id
+      AND c.bom_version = COALESCE(u.bom_version, '1.0')
+      AND c.router_version = COALESCE(u.router_version, '1.0')
+)'''
+
+_RESULT_COLUMNS = [
+    'unit_id', 'bom_id', 'bom_version', 'router_id', 'router_version', *COST_COLUMNS
+]
+
+
+def standard_cost_ddl() -> List[str]:
+    """DDL for the cache table, its version counter and invalidation triggers"""
+    statements = [
+        f'''
+        CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+            unit_id TEXT NOT NULL,
+            bom_version TEXT NOT NULL,
+            router_version TEXT NOT NULL,
+            bom_id TEXT,
+            router_id TEXT,
+            material_cost REAL NOT NULL DEFAULT 0,
+            labor_cost REAL NOT NULL DEFAULT 0,
+            machine_cost REAL NOT NULL DEFAULT 0,
+            total_cost REAL NOT NULL DEFAULT 0,
+            computed_at TEXT,
+            PRIMARY KEY (unit_id, bom_version, router_version)
+        )
+        ''',
+        f"CREATE INDEX IF NOT EXISTS idx_{CACHE_TABLE}_bom ON {CACHE_TABLE} (bom_id)",
+        f"CREATE INDEX IF NOT EXISTS idx_{CACHE_TABLE}_router ON {CACHE_TABLE} (router_id)",
+        '''
+        CREATE TABLE IF NOT EXISTS standard_cost_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT OR IGNORE INTO standard_cost_state (id, version) VALUES (1, 0)",
+    ]
+
+    for table, invalidation in _INVALIDATIONS.items():
+        for event, rows in (('INSERT', ['NEW']), ('DELETE', ['OLD']), ('UPDATE', ['OLD', 'NEW'])):
+            body = "\n".join(f"    {invalidation.format(row=row)}" for row in rows)
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_std_cost "
+                f"AFTER {event} ON {table} FOR EACH ROW WHEN {_TRACKING_ENABLED}\n"
+                f"BEGIN\n{body}\n    {_BUMP_VERSION}\nEND"
+            )
+
+    return statements
+
+
+def invalidate_all_standard_costs(cursor):
+    """Drop every materialized cost; used by bulk loaders that suspend row triggers"""
+    cursor.execute(f"DELETE FROM {CACHE_TABLE}")
+    cursor.execute(_BUMP_VERSION)
+
+
+def _chunks(values: List[str]) -> Iterator[List[str]]:
+    for start in range(0, len(values), _MAX_IN_PARAMS):
+        yield values[start:start + _MAX_IN_PARAMS]
+
+
+class StandardCostCache:
+    """In-process LRU over the unit_standard_costs table.
+
+    ``write(fn)`` runs ``fn(conn)`` as a write transaction and returns its
+    result once committed; without it missing rows are written through the
+    reading connection.
+    """
+
+    def __init__(self, max_entries: int = 20000, write: Optional[Callable[[Callable], Any]] = None):
+        self.max_entries = max_entries
+        self._write = write
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def _sync_version(self, cursor):
+        cursor.execute("SELECT version FROM standard_cost_state WHERE id = 1")
+        row = cursor.fetchone()
+        version = row[0] if row else None
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def _remember(self, costs: Dict[str, Dict[str, Any]]):
+        with self._lock:
+            for unit_id, entry in costs.items():
+                self._entries[unit_id] = entry
+                self._entries.move_to_end(unit_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read(self, cursor, unit_ids: Optional[List[str]]) -> List[tuple]:
+        if unit_ids is None:
+            cursor.execute(_SELECT_SQL)
+            return cursor.fetchall()
+        rows = []
+        for chunk in _chunks(unit_ids):
+            placeholders = ','.join('?' for _ in chunk)
+            cursor.execute(f"{_SELECT_SQL} WHERE u.unit_id IN ({placeholders})", chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+
+    def _materialize(self, conn, unit_ids: Optional[List[str]]):
+        """Compute missing cache rows; ``None`` fills every unit lacking a current row"""
+        # Inside a caller's transaction the rows commit (or roll back) with it
+        owns_transaction = not conn.in_transaction
+        cursor = conn.cursor()
+        try:
+            if unit_ids is None:
+                cursor.execute(f"{_MATERIALIZE_SQL} WHERE {_NOT_CACHED}")
+            else:
+                for chunk in _chunks(unit_ids):
+                    placeholders = ','.join('?' for _ in chunk)
+                    cursor.execute(f"{_MATERIALIZE_SQL} WHERE u.unit_id IN ({placeholders})", chunk)
+            if owns_transaction:
+                conn.commit()
+        except Exception:
+            if owns_transaction:
+                conn.rollback()
+            raise
+
+    def get_unit_costs(self, conn, unit_ids: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Standard cost per unit for ``unit_ids`` (every unit when None).
+
+        Units that are not in the units table are omitted from the result.
+        """
+        cursor = conn.cursor()
+        self._sync_version(cursor)
+
+        result: Dict[str, Dict[str, Any]] = {}
+        if unit_ids is None:
+            wanted = None
+        else:
+            wanted = []
+            with self._lock:
+                for unit_id in dict.fromkeys(u for u in unit_ids if u is not None):
+                    entry = self._entries.get(unit_id)
+                    if entry is None:
+                        wanted.append(unit_id)
+                    else:
+                        self._entries.move_to_end(unit_id)
+                        result[unit_id] = entry
+            if not wanted:
+                return result
+
+        rows = self._read(cursor, wanted)
+        missing = [row[0] for row in rows if row[1] is None and row[5] is None]
+        if missing:
+            # Each chunked statement re-aggregates bom and router_operations, so
+            # large batches are filled with one statement over all uncached units
+            targets = None if len(missing) > _MAX_IN_PARAMS else missing
+            if self._write is not None:
+                self._write(lambda write_conn: self._materialize(write_conn, targets))
+            else:
+                self._materialize(conn, targets)
+            materialized = {row[0]: row for row in self._read(cursor, missing)}
+            rows = [materialized.get(row[0], row) for row in rows]
+
+        loaded = {row[0]: dict(zip(_RESULT_COLUMNS, row)) for row in rows}
+        self._remember(loaded)
+        result.update(loaded)
+        return result
+
+
+def unit_costs_frame(costs: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    """Unit costs as a frame indexed by unit_id, for vectorized costing"""
+    frame = pd.DataFrame.from_records(
+        list(costs.values()), columns=['unit_id', *COST_COLUMNS]
+    )
+    return frame.set_index('unit_id')
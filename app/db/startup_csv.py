@@ -0,0 +1,244 @@
+"""
+CSV files loaded into a fresh database at startup.
+
+``STARTUP_CSV_FILES`` maps each file in the data directory to its table.
+``DatabaseManager.load_csv_data`` commits the tables from a single writer in
+``load_order`` (parents before the tables whose foreign keys reference
+them); for large data sets the chunks are normalized and coerced in a
+process pool (``parse_in_pool``) while the writer inserts earlier ones.
+
+``csv_load_state`` records the content hash each table was loaded from.
+Triggers flag a table as modified on its first change after the load, so a
+reload can skip tables whose file is unchanged and whose rows are still
+exactly what was loaded.
+"""
+
+import functools
+import hashlib
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+import pandas as pd
+
+from .bulk_loader import DEFAULT_CHUNK_SIZE, CsvChunkParser
+from .schema_catalog import TableSchema
+
+STARTUP_CSV_FILES = {
+    'customers.csv': 'customers',
+    'units.csv': 'units',
+    'sales.csv': 'sales',
+    'bom.csv': 'bom',
+    'bom_definitions.csv': 'bom_definitions',
+    'routers.csv': 'router_definitions',
+    'router_operations.csv': 'router_operations',
+    'routers_legacy.csv': 'routers',
+    'machines.csv': 'machines',
+    'labor_rates.csv': 'labor_rates',
+    'payroll.csv': 'payroll',
+    'payroll_config.csv': 'payroll_config',
+    'forecast.csv': 'forecast',
+    'expense_categories.csv': 'expense_categories',
+    'expenses.csv': 'expenses',
+    'expense_allocations.csv': 'expense_allocations',
+    'loans.csv': 'loans',
+    'loan_payments.csv': 'loan_payments'
+}
+
+# Startup table -> tables filled from its rows after loading (see load_csv_data)
+DERIVED_TABLES = {
+    'bom': ('bom_definitions',),
+}
+
+LOAD_STATE_TABLE = 'csv_load_state'
+
+# Bump when prepare_chunk changes how existing files load, so unchanged files reload
+CSV_FORMAT_VERSION = 1
+
+# Below this many bytes of CSV, starting worker processes costs more than parsing
+PARALLEL_PARSE_MIN_BYTES = 16 * 1024 * 1024
+
+
+def prepare_chunk(table_name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Fill defaults and map legacy columns of a startup CSV chunk"""
+    # Handle versioning for BOM and routing tables
+    if table_name == 'bom':
+        if 'version' not in df.columns:
+            df['version'] = '1.0'
+        if 'labor_type_id' not in df.columns:
+            df['labor_type_id'] = 'RATE-001'  # Default to general rate
+    elif table_name == 'routers':
+        if 'version' not in df.columns:
+            df['version'] = '1.0'
+        if 'labor_type_id' not in df.columns:
+            df['labor_type_id'] = 'RATE-001'  # Default to general rate
+    elif table_name == 'loans':
+        # Normalize critical fields to avoid NULLs breaking API models
+        if 'payment_frequency' not in df.columns:
+            df['payment_frequency'] = 'monthly'
+        else:
+            df['payment_frequency'] = df['payment_frequency'].fillna('monthly')
+        if 'payment_type' not in df.columns:
+            df['payment_type'] = 'amortizing'
+        else:
+            df['payment_type'] = df['payment_type'].fillna('amortizing')
+        if 'is_active' in df.columns:
+            df['is_active'] = df['is_active'].fillna('1')
+        if 'current_balance' in df.columns and 'principal_amount' in df.columns:
+            df['current_balance'] = df['current_balance'].fillna(df['principal_amount'])
+        if 'monthly_payment_amount' in df.columns:
+            df['monthly_payment_amount'] = df['monthly_payment_amount'].fillna('0')
+        # A missing next_payment_date stays null; the app computes a fallback
+    elif table_name == 'units':
+        # Update units table to support versioning
+        if 'bom_id' not in df.columns and 'bom' in df.columns:
+            df['bom_id'] = df['bom']
+        if 'router_id' not in df.columns and 'router' in df.columns:
+            df['router_id'] = df['router']
+        if 'bom_version' not in df.columns:
+            df['bom_version'] = '1.0'
+        if 'router_version' not in df.columns:
+            df['router_version'] = '1.0'
+    elif table_name == 'machines':
+        # Add available_minutes_per_month if not present
+        if 'available_minutes_per_month' not in df.columns:
+            df['available_minutes_per_month'] = '10000'  # Default capacity
+    return df
+
+
+def load_state_ddl() -> List[str]:
+    """DDL for the load state table and the triggers flagging modified tables"""
+    statements = [
+        f'''
+        CREATE TABLE IF NOT EXISTS {LOAD_STATE_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            source_file TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            rows_loaded INTEGER NOT NULL,
+            modified INTEGER NOT NULL DEFAULT 0,
+            loaded_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]
+    # Bulk replace loads drop these with the table's other triggers and
+    # recreate them afterwards; callers flag such loads with mark_modified
+    for table in dict.fromkeys(STARTUP_CSV_FILES.values()):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_csv_state "
+                f"AFTER {event} ON {table} FOR EACH ROW "
+                f"WHEN (SELECT modified FROM {LOAD_STATE_TABLE} WHERE table_name = '{table}') = 0\n"
+                f"BEGIN\n"
+                f"    UPDATE {LOAD_STATE_TABLE} SET modified = 1 WHERE table_name = '{table}';\n"
+                f"END"
+            )
+    return statements
+
+
+def source_hash(path: str, schema: TableSchema) -> str:
+    """Hash of a CSV file's bytes and the table columns it loads into"""
+    digest = hashlib.sha256(f"{CSV_FORMAT_VERSION}:{schema.name}:{','.join(schema.columns)}\n".encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_load_state(cursor) -> Dict[str, Dict[str, Any]]:
+    cursor.execute(f"SELECT table_name, source_file, content_hash, rows_loaded, modified, loaded_at FROM {LOAD_STATE_TABLE}")
+    return {
+        row[0]: {"source_file": row[1], "content_hash": row[2], "rows_loaded": row[3],
+                 "modified": bool(row[4]), "loaded_at": row[5]}
+        for row in cursor.fetchall()
+    }
+
+
+def record_load_state(cursor, table_name: str, source_file: str, content_hash: str, rows_loaded: int):
+    cursor.execute(
+        f"INSERT OR REPLACE INTO {LOAD_STATE_TABLE} (table_name, source_file, content_hash, rows_loaded, modified) "
+        f"VALUES (?, ?, ?, ?, 0)",
+        (table_name, source_file, content_hash, rows_loaded)
+    )
+
+
+def mark_modified(cursor, table_name: str):
+    """Flag a table as changed since its CSV load, for writes that bypass the triggers"""
+    cursor.execute(f"UPDATE {LOAD_STATE_TABLE} SET modified = 1 WHERE table_name = ?", (table_name,))
+
+
+def with_dependents(tables: Iterable[str], candidates: Iterable[str],
+                    table_schema: Callable[[str], TableSchema]) -> Set[str]:
+    """``tables`` plus the ``candidates`` that reference or are derived from them, transitively"""
+    candidates = list(candidates)
+    parents = {
+        table: {fk["references_table"] for fk in table_schema(table).foreign_keys} - {table}
+        for table in candidates
+    }
+    for table, derived in DERIVED_TABLES.items():
+        for child in derived:
+            if child in parents:
+                parents[child].add(table)
+
+    selected = set(tables)
+    grew = True
+    while grew:
+        grew = False
+        for table in candidates:
+            if table not in selected and parents[table] & selected:
+                selected.add(table)
+                grew = True
+    return selected
+
+
+def load_order(tables: Sequence[str], table_schema: Callable[[str], TableSchema]) -> List[str]:
+    """Order ``tables`` so each is loaded after the tables its foreign keys reference.
+
+    Ties keep the order of ``tables``; self-references and references to
+    tables outside ``tables`` are ignored.
+    """
+    pending = list(tables)
+    parents = {
+        table: {
+            fk["references_table"] for fk in table_schema(table).foreign_keys
+            if fk["references_table"] != table and fk["references_table"] in pending
+        }
+        for table in pending
+    }
+
+    ordered: List[str] = []
+    while pending:
+        ready = next((t for t in pending if not parents[t] - set(ordered)), None)
+        if ready is None:
+            # A reference cycle: keep the remaining tables in the given order
+            ordered.extend(pending)
+            break
+        ordered.append(ready)
+        pending.remove(ready)
+    return ordered
+
+
+def startup_csv_parser(table_name: str, schema: TableSchema,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE) -> CsvChunkParser:
+    return CsvChunkParser(schema, chunk_size, transform=functools.partial(prepare_chunk, table_name))
+
+
+def parse_in_pool(executor: Executor, parser: CsvChunkParser, path: str,
+                  ahead: int) -> Iterator[Tuple[pd.DataFrame, List[Dict[str, Any]]]]:
+    """Yield ``parser.chunks(path)``, preparing up to ``ahead`` chunks in ``executor``.
+
+    The file is read here and each raw chunk is normalized and coerced by a
+    worker while the caller writes the previous ones. The first chunk is
+    prepared inline, which fixes the parser's columns before it is sent to
+    the workers.
+    """
+    pending: Deque[Future] = deque()
+    with parser.read(path) as reader:
+        for chunk in reader:
+            if parser.columns is None:
+                yield parser.prepare(chunk)
+                continue
+            pending.append(executor.submit(parser.prepare, chunk))
+            if len(pending) >= ahead:
+                yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
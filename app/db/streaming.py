@@ -0,0 +1,53 @@
+"""
+Bounded-memory iteration over query results.
+
+A ``RowStream`` executes its query up front (so errors surface before a
+response starts) and then pulls rows from the SQLite cursor with
+``fetchmany`` as they are consumed. The pooled connection is held until the
+stream is exhausted or closed.
+"""
+
+from typing import Any, Dict, Iterator, List, Sequence
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class RowStream:
+    """Rows of an executed query, fetched from the cursor in batches on demand"""
+
+    def __init__(self, conn, query: str, params: Sequence[Any] = (),
+                 batch_size: int = DEFAULT_BATCH_SIZE, metadata: Dict[str, Any] = None):
+        self.batch_size = batch_size
+        self.metadata = metadata or {}
+        self._conn = conn
+        self._closed = False
+        try:
+            self._cursor = conn.execute(query, params)
+        except Exception:
+            conn.close()
+            raise
+        self.columns = [description[0] for description in self._cursor.description]
+
+    def batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """Yield lists of row dicts, at most ``batch_size`` long"""
+        try:
+            while True:
+                rows = self._cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield [dict(zip(self.columns, row)) for row in rows]
+        finally:
+            self.close()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for batch in self.batches():
+            yield from batch
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._cursor.close()
+        finally:
+            self._conn.close()
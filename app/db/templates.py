@@ -0,0 +1,72 @@
+"""
+Prebuilt template databases cloned for resets, clean databases and tests.
+
+Two kinds of template are kept in ``DatabaseManager.template_dir``:
+
+- ``schema-<fingerprint>.db``: every table, index and trigger, no rows.
+- ``pristine-<fingerprint>.db``: the schema template with the startup CSV
+  files loaded.
+
+The fingerprint is part of the file name. For the schema template it hashes
+the ``sqlite_master`` definitions; the pristine fingerprint adds the content
+hash of each CSV file, so editing a file or changing the schema selects a
+new template and the stale one is removed once it has been replaced.
+Templates are copied with the SQLite online backup API, which takes a
+consistent snapshot and needs neither pandas nor the CSV files.
+"""
+
+import glob
+import hashlib
+import os
+import sqlite3
+from typing import Iterable
+
+SCHEMA_TEMPLATE = 'schema'
+PRISTINE_TEMPLATE = 'pristine'
+
+# Pages copied per backup step; other connections to the source may run between steps
+BACKUP_PAGES_PER_STEP = 4096
+
+
+def fingerprint(parts: Iterable[str]) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b'\n')
+    return digest.hexdigest()[:16]
+
+
+def schema_fingerprint(conn: sqlite3.Connection) -> str:
+    """Fingerprint of the tables, indexes, triggers and views defined in ``conn``"""
+    rows = conn.execute(
+        "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY type, name"
+    ).fetchall()
+    return fingerprint("|".join(row) for row in rows)
+
+
+def template_path(directory: str, kind: str, key: str) -> str:
+    return os.path.join(directory, f"{kind}-{key}.db")
+
+
+def remove_stale_templates(directory: str, kind: str, keep: str):
+    """Remove the ``kind`` templates in ``directory`` other than ``keep``"""
+    for path in glob.glob(os.path.join(directory, f"{kind}-*.db")):
+        if os.path.abspath(path) != os.path.abspath(keep):
+            try:
+                os.remove(path)
+            except OSError as e:
+                # Another process may still be cloning it; it is retried next time
+                print(f"Could not remove stale template {path}: {e}")
+
+
+def clone_database(source_path: str, target_path: str):
+    """Copy the database at ``source_path`` into ``target_path`` with the online backup API"""
+    source = sqlite3.connect(source_path)
+    try:
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP)
+        finally:
+            target.close()
+    finally:
+        source.close()
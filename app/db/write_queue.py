@@ -0,0 +1,303 @@
+"""
+Serialized write pipeline with group commit.
+
+All writes of a ``DatabaseManager`` go through one ``WriteQueue``: a single
+writer thread that owns a single writer connection, so writers in this
+process never race each other for SQLite's write lock (no "database is
+locked" errors, no retry backoff).
+
+Two kinds of jobs are queued:
+
+- transactional jobs, ``fn(conn) -> result``. Whatever is queued while the
+  writer is busy is taken as a group and run in one ``BEGIN IMMEDIATE``
+  transaction, each job under its own SAVEPOINT, then committed once. A job
+  that raises is rolled back to its savepoint without affecting the rest of
+  its group; every caller gets its own result or exception once the group
+  has committed. Jobs must not commit or roll back themselves.
+- exclusive jobs, ``fn() -> result``, for legacy code that opens its own
+  connections and commits itself. They run alone, between groups.
+
+Calls made from the writer thread itself (e.g. an exclusive job that calls
+``execute``) run inline instead of deadlocking on the queue.
+"""
+
+import asyncio
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_MAX_GROUP_SIZE = 64
+
+_TRANSACTIONAL = "transactional"
+_EXCLUSIVE = "exclusive"
+_STOP = object()
+
+# Statements that cannot run inside the queue's transactions, or would end them
+AUTOCOMMIT_PREFIXES = ("VACUUM", "ATTACH", "DETACH", "BEGIN", "COMMIT", "END", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA")
+
+
+def requires_autocommit(sql: str) -> bool:
+    """Whether a statement must run outside a write group transaction"""
+    words = (sql or "").lstrip().split(None, 1)
+    return bool(words) and words[0].upper().rstrip(";") in AUTOCOMMIT_PREFIXES
+
+
+class WriterConnection(sqlite3.Connection):
+    """Writer connection; transaction control belongs to the write queue while a job runs"""
+
+    _job_running = False
+
+    def commit(self):
+        if self._job_running:
+            raise sqlite3.ProgrammingError("Write queue jobs must not commit; the queue commits each group")
+        super().commit()
+
+    def rollback(self):
+        if self._job_running:
+            raise sqlite3.ProgrammingError("Write queue jobs must not roll back; raise to discard the job")
+        super().rollback()
+
+
+class _Writer:
+    """One writer thread with its own job queue and connection"""
+
+    def __init__(self):
+        self.queue: "queue.Queue" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.conn: Optional[WriterConnection] = None
+        self.in_group = False
+
+
+class WriteQueue:
+    """Single writer thread + connection that group-commits queued write transactions.
+
+    ``connect(factory)`` opens the writer connection with the given
+    sqlite3.Connection subclass; it is opened on first use and reopened if
+    it breaks. ``close`` drains the queue and stops the thread; a later
+    submit starts a fresh one, as the connection pool does after close_all.
+    """
+
+    def __init__(self, connect: Callable[..., sqlite3.Connection],
+                 max_group_size: int = DEFAULT_MAX_GROUP_SIZE, name: str = "db-write"):
+        self._connect = connect
+        self.max_group_size = max_group_size
+        self._name = name
+        self._lock = threading.Lock()
+        self._writer: Optional[_Writer] = None
+        self._local = threading.local()
+        self._stats = {"jobs": 0, "failed_jobs": 0, "groups": 0, "max_group_size": 0, "exclusive_jobs": 0}
+
+    # ------------------------------------------------------------------ submit
+
+    def _enqueue(self, kind: str, fn: Callable[..., Any]) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._writer is None:
+                writer = _Writer()
+                writer.thread = threading.Thread(target=self._run, args=(writer,), name=self._name, daemon=True)
+                writer.thread.start()
+                self._writer = writer
+            self._writer.queue.put((kind, fn, future))
+        return future
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Queue a write transaction ``fn(conn)``; the future resolves after its group commits"""
+        return self._enqueue(_TRANSACTIONAL, fn)
+
+    def submit_exclusive(self, fn: Callable[[], Any]) -> Future:
+        """Queue ``fn()`` to run alone on the writer thread, outside any group"""
+        return self._enqueue(_EXCLUSIVE, fn)
+
+    def _current_writer(self) -> Optional[_Writer]:
+        return getattr(self._local, "writer", None)
+
+    def on_writer_thread(self) -> bool:
+        return self._current_writer() is not None
+
+    def execute(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run a write transaction and block until it is committed; returns ``fn``'s result"""
+        writer = self._current_writer()
+        if writer is not None:
+            return self._run_inline(writer, fn)
+        return self.submit(fn).result()
+
+    def execute_exclusive(self, fn: Callable[[], Any]) -> Any:
+        if self.on_writer_thread():
+            return fn()
+        return self.submit_exclusive(fn).result()
+
+    async def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Await a write transaction from async code"""
+        return await asyncio.wrap_future(self.submit(fn))
+
+    # ------------------------------------------------------------------ writer
+
+    def _connection(self, writer: _Writer) -> WriterConnection:
+        if writer.conn is None:
+            conn = self._connect(WriterConnection)
+            # Transactions are issued explicitly by the queue
+            conn.isolation_level = None
+            writer.conn = conn
+        return writer.conn
+
+    @staticmethod
+    def _discard_connection(writer: _Writer):
+        conn, writer.conn = writer.conn, None
+        if conn is not None:
+            try:
+                sqlite3.Connection.close(conn)
+            except sqlite3.Error:
+                pass
+
+    def _run(self, writer: _Writer):
+        self._local.writer = writer
+        pending = None
+        while True:
+            job = pending if pending is not None else writer.queue.get()
+            pending = None
+            if job is _STOP:
+                break
+
+            kind, fn, future = job
+            if kind == _EXCLUSIVE:
+                self._run_exclusive(fn, future)
+                continue
+
+            group = [job]
+            while len(group) < self.max_group_size:
+                try:
+                    queued = writer.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if queued is _STOP or queued[0] == _EXCLUSIVE:
+                    pending = queued
+                    break
+                group.append(queued)
+            self._run_group(writer, group)
+
+        self._discard_connection(writer)
+
+    def _run_exclusive(self, fn, future: Future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        with self._lock:
+            self._stats["exclusive_jobs"] += 1
+
+    @staticmethod
+    def _run_job(conn: WriterConnection, fn) -> Tuple[bool, Any]:
+        # Jobs run inline from another job nest; the outer job is still running after them
+        outer_running = conn._job_running
+        conn.execute("SAVEPOINT write_job")
+        conn._job_running = True
+        try:
+            result = fn(conn)
+        except BaseException as e:
+            conn._job_running = outer_running
+            conn.execute("ROLLBACK TO write_job")
+            conn.execute("RELEASE write_job")
+            return False, e
+        conn._job_running = outer_running
+        conn.execute("RELEASE write_job")
+        return True, result
+
+    def _run_group(self, writer: _Writer, group: List[Tuple[str, Callable, Future]]):
+        group = [job for job in group if job[2].set_running_or_notify_cancel()]
+        if not group:
+            return
+
+        outcomes: List[Tuple[bool, Any]] = []
+        try:
+            conn = self._connection(writer)
+            conn.execute("BEGIN IMMEDIATE")
+            writer.in_group = True
+            try:
+                for _, fn, _ in group:
+                    outcomes.append(self._run_job(conn, fn))
+                conn.execute("COMMIT")
+            finally:
+                writer.in_group = False
+        except BaseException as e:
+            # The group could not be committed: every job in it fails
+            if writer.conn is not None:
+                try:
+                    if writer.conn.in_transaction:
+                        writer.conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    self._discard_connection(writer)
+            outcomes = [(False, e)] * len(group)
+
+        failed = 0
+        for (_, _, future), (ok, value) in zip(group, outcomes):
+            if ok:
+                future.set_result(value)
+            else:
+                failed += 1
+                future.set_exception(value)
+
+        with self._lock:
+            self._stats["groups"] += 1
+            self._stats["jobs"] += len(group)
+            self._stats["failed_jobs"] += failed
+            self._stats["max_group_size"] = max(self._stats["max_group_size"], len(group))
+
+    def _run_inline(self, writer: _Writer, fn):
+        conn = self._connection(writer)
+        if writer.in_group:
+            ok, value = self._run_job(conn, fn)
+            if not ok:
+                raise value
+            return value
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ok, value = self._run_job(conn, fn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if not ok:
+            conn.execute("ROLLBACK")
+            raise value
+        conn.execute("COMMIT")
+        return value
+
+    # ------------------------------------------------------------------ lifecycle
+
+    def reset_connection(self):
+        """Close the writer connection; the next job opens a new one.
+
+        Must be called from an exclusive job, e.g. one that replaces the
+        database file.
+        """
+        writer = self._current_writer()
+        if writer is None or writer.in_group:
+            raise RuntimeError("reset_connection must be called from an exclusive write queue job")
+        self._discard_connection(writer)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            writer = self._writer
+        stats["queued"] = writer.queue.qsize() if writer is not None else 0
+        stats["avg_group_size"] = round(stats["jobs"] / stats["groups"], 2) if stats["groups"] else 0.0
+        return stats
+
+    def close(self, wait: bool = True):
+        """Drain queued jobs, close the writer connection and stop the writer thread.
+
+        Called from a job on the writer thread itself, the thread finishes
+        the jobs queued behind it and exits without being waited for.
+        """
+        with self._lock:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                writer.queue.put(_STOP)
+        if writer is not None and wait and writer.thread is not threading.current_thread():
+            writer.thread.join()
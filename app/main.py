@@ -7,6 +7,7 @@ from db import (
     initialize_database,
     ForecastResponse
 )
+from db.executor import db_executor
 
 # Import API route modules
 from api.data_routes import router as data_router
@@ -28,7 +29,10 @@ async def lifespan(app: FastAPI):
     # Startup
     initialize_database()
     yield
-    # Shutdown (if needed)
+    # Shutdown: let queued database work finish, then stop the worker threads
+    db_executor.shutdown()
+    from db import database
+    database.db_manager.close_all_connections()
 
 app = FastAPI(
     title="Forecast Model + AI Assistant",
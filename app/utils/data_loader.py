@@ -1,22 +1,20 @@
 import io
-import pandas as pd
-from typing import Dict, Any
+from typing import IO, Any, Dict, Union
 
+from db.bulk_loader import DEFAULT_CHUNK_SIZE, LOAD_MODES
 from db.database import db_manager
 
 
-def load_csv_to_table(table_name: str, csv_bytes: bytes, if_exists: str = "append") -> Dict[str, Any]:
-    """Load CSV data into the specified table."""
-    if if_exists not in {"append", "replace"}:
+def load_csv_to_table(table_name: str, csv_data: Union[bytes, IO], if_exists: str = "append",
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Stream CSV data (bytes or a binary file object) into an existing table.
+
+    ``if_exists`` is the load mode: append, replace, or upsert on the
+    table's primary key. The load is validated chunk by chunk and committed
+    as one transaction.
+    """
+    if if_exists not in LOAD_MODES:
         return {"status": "error", "error": "Invalid if_exists option"}
 
-    try:
-        df = pd.read_csv(io.BytesIO(csv_bytes))
-        conn = db_manager.get_connection()
-        df.to_sql(table_name, conn, if_exists=if_exists, index=False)
-        conn.commit()
-        rows_loaded = len(df)
-        db_manager.close_connection(conn)
-        return {"status": "success", "rows_loaded": rows_loaded}
-    except Exception as e:
-        return {"status": "error", "error": str(e)}
+    source = io.BytesIO(csv_data) if isinstance(csv_data, (bytes, bytearray)) else csv_data
+    return db_manager.bulk_load_csv(table_name, source, mode=if_exists, chunk_size=chunk_size)
@@ -0,0 +1,75 @@
+"""
+Streaming HTTP responses for large result sets.
+
+Two wire formats are supported:
+
+- ``ndjson``: one JSON object per line (``application/x-ndjson``)
+- ``json``:   a single JSON document whose rows array is written in chunks,
+              ``{"status": "success", ...head, "<rows_key>": [...], ...tail, "row_count": N}``
+
+Rows are encoded one batch at a time, so memory stays bounded by the batch
+size rather than the result size.
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Literal, Optional
+
+from fastapi.responses import StreamingResponse
+
+StreamFormat = Literal["ndjson", "json"]
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+STREAM_QUERY_DESCRIPTION = "Stream rows as NDJSON ('ndjson') or a chunked JSON document ('json')"
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, default=str, separators=(",", ":"))
+
+
+def _ndjson_chunks(batches: Iterable[List[Dict[str, Any]]]) -> Iterator[str]:
+    for batch in batches:
+        if batch:
+            yield "".join(_dumps(row) + "\n" for row in batch)
+
+
+def _json_chunks(
+    batches: Iterable[List[Dict[str, Any]]],
+    rows_key: str,
+    head: Dict[str, Any],
+    tail: Optional[Callable[[], Dict[str, Any]]],
+) -> Iterator[str]:
+    # Open the document with the head fields, leaving the object unclosed
+    yield _dumps({"status": "success", **head})[:-1] + "," + _dumps(rows_key) + ":["
+
+    row_count = 0
+    for batch in batches:
+        if not batch:
+            continue
+        separator = "," if row_count else ""
+        yield separator + ",".join(_dumps(row) for row in batch)
+        row_count += len(batch)
+
+    closing = dict(tail() if tail else {})
+    closing["row_count"] = row_count
+    yield "]," + _dumps(closing)[1:]
+
+
+def streaming_rows_response(
+    stream_format: StreamFormat,
+    batches: Iterable[List[Dict[str, Any]]],
+    rows_key: str = "data",
+    head: Optional[Dict[str, Any]] = None,
+    tail: Optional[Callable[[], Dict[str, Any]]] = None,
+) -> StreamingResponse:
+    """Build a StreamingResponse that encodes ``batches`` of row dicts lazily.
+
+    ``head`` fields are written before the rows and ``tail()`` is evaluated
+    after the last row, so it can report totals accumulated while streaming.
+    Both are only used by the ``json`` format.
+    """
+    if stream_format == "ndjson":
+        return StreamingResponse(_ndjson_chunks(batches), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(
+        _json_chunks(batches, rows_key, head or {}, tail), media_type="application/json"
+    )
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Audit the query plans of the hot route queries.
+
+Runs EXPLAIN QUERY PLAN for every query in db.indexes.AUDIT_QUERIES and
+reports the ones that read a table with a full scan instead of an index.
+Exits with status 1 if any query is flagged, so it can gate CI.
+
+Usage:
+    python scripts/audit_query_plans.py [--database PATH] [--ensure-indexes] [--verbose]
+
+Without --database the application's configured database is audited.
+--ensure-indexes creates/migrates the managed indexes before auditing.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLite database to audit (defaults to the app database)')
+    parser.add_argument('--ensure-indexes', action='store_true', help='create/migrate managed indexes first')
+    parser.add_argument('--verbose', action='store_true', help='print the full plan of every query')
+    args = parser.parse_args()
+
+    if args.database:
+        if not os.path.exists(args.database):
+            print(f"Database file not found: {args.database}")
+            return 2
+        os.environ['DATABASE_PATH'] = os.path.abspath(args.database)
+
+    from db.database import db_manager
+
+    print(f"Auditing query plans in: {db_manager.database_path}")
+    if args.ensure_indexes:
+        db_manager.ensure_indexes()
+
+    audit = db_manager.audit_query_plans()
+    for result in audit["queries"]:
+        if result.get("error"):
+            status = f"ERROR  {result['error']}"
+        elif result["full_scans"]:
+            status = f"SCAN   {', '.join(result['full_scans'])}"
+        else:
+            status = "ok"
+        print(f"  {result['query']:<34} {status}")
+        if args.verbose or result["full_scans"]:
+            for detail in result["plan"]:
+                print(f"      {detail}")
+
+    if audit["ok"]:
+        print("No full table scans found")
+        return 0
+    print(f"{len(audit['flagged'])} quer{'y' if len(audit['flagged']) == 1 else 'ies'} flagged")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Benchmark /products/cost-summary: set-based implementation vs the previous
+per-unit (N+1) query loop.
+
+Builds a synthetic database per size in a temporary directory and times:
+  - legacy: three queries per unit (revenue, BOM sum, routing operations)
+  - set-based cold: first call, standard costs not yet materialized
+  - set-based warm: repeat call served from the standard cost cache
+
+Usage:
+    python scripts/benchmark_cost_summary.py [--sizes 1000 10000 100000]
+                                             [--sales-per-unit 3]
+                                             [--legacy-max-units 10000]
+
+The legacy loop scans sales once per unit, so it grows quadratically; sizes
+above --legacy-max-units time it for a sample of units against the full
+dataset and extrapolate linearly.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+# Point the global db_manager at a throwaway database before it is imported
+_BENCH_DIR = tempfile.mkdtemp(prefix='cost_summary_bench_')
+os.environ['DATABASE_PATH'] = os.path.join(_BENCH_DIR, 'bench.db')
+os.environ['DATA_DIR'] = _BENCH_DIR
+
+from db.database import db_manager  # noqa: E402
+import api.cost_routes as cost_routes  # noqa: E402
+
+BOM_LINES_PER_UNIT = 3
+OPERATIONS_PER_ROUTER = 2
+MACHINES = 20
+LABOR_RATES = 5
+
+
+def build_dataset(num_units: int, sales_per_unit: int):
+    """Replace the benchmark database contents with ``num_units`` synthetic products"""
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE change_tracking_control SET enabled = 0 WHERE id = 1")
+    for table in ('sales', 'router_operations', 'router_definitions', 'bom', 'units',
+                  'machines', 'labor_rates', 'customers', 'forecast', 'unit_standard_costs',
+                  'forecast_change_journal'):
+        cursor.execute(f"DELETE FROM {table}")
+
+    cursor.execute("INSERT INTO forecast (forecast_id, name) VALUES ('F1', 'Bench')")
+    cursor.execute("INSERT INTO customers (customer_id, customer_name) VALUES ('CUST-1', 'Bench Customer')")
+    cursor.executemany(
+        "INSERT INTO machines (machine_id, machine_name, machine_rate) VALUES (?, ?, ?)",
+        [(f"WC{m:04d}", f"Machine {m}", 50.0 + m) for m in range(MACHINES)]
+    )
+    cursor.executemany(
+        "INSERT INTO labor_rates (rate_id, rate_name, rate_amount, rate_type) VALUES (?, ?, ?, 'Hourly')",
+        [(f"RATE-{r:03d}", f"Rate {r}", 25.0 + r * 5) for r in range(LABOR_RATES)]
+    )
+    cursor.executemany(
+        "INSERT INTO units (unit_id, unit_name, base_price, bom_id, bom_version, router_id, router_version) "
+        "VALUES (?, ?, 100.0, ?, '1.0', ?, '1.0')",
+        [(f"U{u:06d}", f"Unit {u}", f"BOM{u:06d}", f"R{u:06d}") for u in range(num_units)]
+    )
+    cursor.executemany(
+        "INSERT INTO bom (bom_id, version, bom_line, material_description, qty, unit_price, material_cost) "
+        "VALUES (?, '1.0', ?, 'Material', 1, ?, ?)",
+        [(f"BOM{u:06d}", line, 2.0 + line, 2.0 + line)
+         for u in range(num_units) for line in range(1, BOM_LINES_PER_UNIT + 1)]
+    )
+    cursor.executemany(
+        "INSERT INTO router_definitions (router_id, router_name, version) VALUES (?, ?, '1.0')",
+        [(f"R{u:06d}", f"Router {u}") for u in range(num_units)]
+    )
+    cursor.executemany(
+        "INSERT INTO router_operations (router_id, sequence, machine_id, machine_minutes, labor_minutes, labor_type_id) "
+        "VALUES (?, ?, ?, 10, 5, ?)",
+        [(f"R{u:06d}", seq, f"WC{(u + seq) % MACHINES:04d}", f"RATE-{(u + seq) % LABOR_RATES:03d}")
+         for u in range(num_units) for seq in range(1, OPERATIONS_PER_ROUTER + 1)]
+    )
+    cursor.executemany(
+        "INSERT INTO sales (sale_id, customer_id, unit_id, period, quantity, unit_price, total_revenue, forecast_id) "
+        "VALUES (?, 'CUST-1', ?, ?, 4, 100.0, 400.0, 'F1')",
+        [(f"S{u:06d}-{p}", f"U{u:06d}", f"2024-{p + 1:02d}")
+         for u in range(num_units) for p in range(sales_per_unit)]
+    )
+    cursor.execute("UPDATE change_tracking_control SET enabled = 1 WHERE id = 1")
+    cursor.execute("UPDATE standard_cost_state SET version = version + 1 WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+
+def legacy_cost_summary(unit_limit: int = None):
+    """The pre-aggregation implementation: three queries per unit"""
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    query = "SELECT unit_id, unit_name, bom_id, bom_version, router_id, router_version, base_price FROM units"
+    if unit_limit:
+        query += f" LIMIT {int(unit_limit)}"
+    cursor.execute(query)
+    products = cursor.fetchall()
+
+    cost_summaries = []
+    for unit_id, unit_name, bom_id, bom_version, router_id, router_version, base_price in products:
+        cursor.execute(
+            "SELECT SUM(total_revenue), SUM(quantity) FROM sales WHERE unit_id = ?", (unit_id,)
+        )
+        revenue_data = cursor.fetchone()
+        forecasted_revenue = revenue_data[0] if revenue_data[0] else 0
+        forecasted_quantity = revenue_data[1] if revenue_data[1] else 0
+
+        material_cost = 0
+        if bom_id:
+            cursor.execute(
+                "SELECT SUM(material_cost) FROM bom WHERE bom_id = ? AND version = ?", (bom_id, bom_version)
+            )
+            bom_data = cursor.fetchone()
+            material_cost = (bom_data[0] if bom_data[0] else 0) * forecasted_quantity
+
+        labor_cost = 0
+        machine_cost = 0
+        if router_id:
+            cursor.execute("""
+                SELECT ro.labor_minutes, ro.machine_minutes, m.machine_rate, lr.rate_amount
+                FROM router_operations ro
+                JOIN machines m ON ro.machine_id = m.machine_id
+                LEFT JOIN labor_rates lr ON ro.labor_type_id = lr.rate_id
+                WHERE ro.router_id = ?
+                ORDER BY ro.sequence
+            """, (router_id,))
+            for labor_minutes, machine_minutes, machine_rate, hourly_rate in cursor.fetchall():
+                labor_cost += (labor_minutes / 60) * (hourly_rate or 0) * forecasted_quantity
+                machine_cost += (machine_minutes / 60) * (machine_rate or 0) * forecasted_quantity
+
+        total_cogs = material_cost + labor_cost + machine_cost
+        cost_summaries.append({
+            "product_id": unit_id,
+            "forecasted_revenue": forecasted_revenue,
+            "total_cogs": total_cogs,
+        })
+
+    conn.close()
+    return cost_summaries
+
+
+def set_based_cost_summary():
+    response = asyncio.run(cost_routes.get_products_cost_summary(forecast_id=None))
+    return response.data["products"]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, sales_per_unit, legacy_max_units):
+    db_manager.create_tables()
+    print(f"{'units':>8} {'legacy (s)':>14} {'set cold (s)':>13} {'set warm (s)':>13} {'speedup':>9}")
+
+    for num_units in sizes:
+        build_dataset(num_units, sales_per_unit)
+        db_manager._standard_costs.clear()
+
+        new_rows, cold = timed(set_based_cost_summary)
+        _, warm = timed(set_based_cost_summary)
+
+        if num_units <= legacy_max_units:
+            legacy_rows, legacy = timed(legacy_cost_summary)
+            legacy_label = f"{legacy:.3f}"
+            legacy_totals = {row["product_id"]: row["total_cogs"] for row in legacy_rows}
+            mismatches = sum(
+                1 for row in new_rows
+                if abs(row["total_cogs"] - legacy_totals.get(row["product_id"], 0)) > 1e-6
+            )
+            if mismatches:
+                print(f"  warning: {mismatches} products differ from the legacy totals")
+        else:
+            _, sample = timed(legacy_cost_summary, legacy_max_units)
+            # The sample already scans the full-size sales table per unit
+            legacy = sample * num_units / legacy_max_units
+            legacy_label = f"~{legacy:.1f} est"
+
+        print(f"{num_units:>8} {legacy_label:>14} {cold:>13.3f} {warm:>13.3f} {legacy / warm:>8.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--sales-per-unit', type=int, default=3)
+    parser.add_argument('--legacy-max-units', type=int, default=10000)
+    args = parser.parse_args()
+
+    try:
+        run(args.sizes, args.sales_per_unit, args.legacy_max_units)
+    finally:
+        db_manager.close_all_connections()
+        shutil.rmtree(_BENCH_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
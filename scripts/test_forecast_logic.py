@@ -23,7 +23,6 @@ def test_forecast_logic():
     if result["status"] == "success":
         print("✅ Forecast logic test PASSED")
         print(f"Generated {len(result['data']['forecast_results'])} forecast records")
-        print(f"Average labor rate used: ${result['data']['avg_labor_rate']:.2f}")
         
         # Show some sample results
         if result['data']['forecast_results']:
@@ -41,15 +40,11 @@ def test_forecast_logic():
             print(f"  Gross Margin: ${sample['gross_margin']:.2f}")
             print(f"  Margin %: {sample['margin_percentage']:.1f}%")
         
-        # Show BOM costs
-        print(f"\nBOM Costs:")
-        for bom_id, cost in result['data']['bom_costs'].items():
-            print(f"  {bom_id}: ${cost:.2f}")
-        
-        # Show labor rates
-        print(f"\nLabor Rates:")
-        for rate_type, rate in result['data']['labor_rates'].items():
-            print(f"  {rate_type}: ${rate:.2f}")
+        # Show the per-unit standard costs the results were computed from
+        print(f"\nUnit Standard Costs:")
+        for unit_id, cost in result['data']['unit_standard_costs'].items():
+            print(f"  {unit_id}: material ${cost['material_cost'] or 0:.2f}, labor ${cost['labor_cost'] or 0:.2f}, "
+                  f"machine ${cost['machine_cost'] or 0:.2f}")
             
     else:
         print("❌ Forecast logic test FAILED")
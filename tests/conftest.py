@@ -28,7 +28,14 @@ def test_data_dir():
     shutil.rmtree(temp_dir)
 
 @pytest.fixture(scope="session")
-def test_db_manager(test_data_dir):
+def template_root():
+    """Directory of template databases kept between test sessions"""
+    root = os.path.join(tempfile.gettempdir(), "forecast_test_templates")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+@pytest.fixture(scope="session")
+def test_db_manager(test_data_dir, template_root):
     """Create a test database manager with temporary paths"""
     # Create test CSV files
     create_test_csv_files(test_data_dir)
@@ -36,10 +43,11 @@ def test_db_manager(test_data_dir):
     # Create database manager with test paths
     db_manager = DatabaseManager(
         database_path=os.path.join(test_data_dir, "test_forecast.db"),
-        data_dir=test_data_dir
+        data_dir=test_data_dir,
+        template_dir=os.path.join(template_root, "api")
     )
     
-    # Initialize the test database
+    # Initialize the test database (a clone of the pristine template)
     db_manager.initialize()
     
     return db_manager
@@ -250,7 +250,8 @@ class TestAPIEndpoints:
         response = client.get("/data/customers")
         initial_count = len(response.json()["data"])
         
-        # Clear customers table
+        # Clear customers table; the startup sales reference them, so they go first
+        client.post("/apply_sql", json={"sql_statement": "DELETE FROM sales", "description": "Clear for replay test"})
         clear_request = {
             "sql_statement": "DELETE FROM customers",
             "description": "Clear for replay test"
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from app.db.costing import cost_sales, forecast_result_rows
+from app.db.standard_costs import unit_costs_frame
+
+
+class TestCostingEngine:
+    """Test the vectorized forecast costing engine"""
+
+    def test_cost_sales_matches_per_sale_formula(self):
+        sales_data = [
+            {"period": "2024-01", "customer_id": "CUST-001", "customer_name": "Test Corp",
+             "unit_id": "PROD-001", "unit_name": "Widget", "bom_id": "BOM-001",
+             "quantity": 10, "unit_price": 50.0, "total_revenue": 500.0},
+            {"period": "2024-01", "customer_id": "CUST-002", "customer_name": "Test Tech",
+             "unit_id": "PROD-404", "unit_name": "Unrouted", "bom_id": None,
+             "quantity": 3, "unit_price": 0.0, "total_revenue": 0.0},
+        ]
+        unit_costs = unit_costs_frame({
+            "PROD-001": {"unit_id": "PROD-001", "material_cost": 25.0, "labor_cost": 3.0,
+                         "machine_cost": 2.0, "total_cost": 30.0},
+        })
+        costs = cost_sales(pd.DataFrame(sales_data), unit_costs)
+
+        # 10 units x (25 material + 3 labor + 2 machine)
+        assert costs.loc[0, "total_cost"] == pytest.approx(300.0)
+        assert costs.loc[0, "margin_percentage"] == pytest.approx(40.0)
+        # Unknown unit costs nothing; zero revenue yields a zero margin percentage
+        assert costs.loc[1, "total_cost"] == pytest.approx(0.0)
+        assert costs.loc[1, "margin_percentage"] == 0.0
+
+        rows = forecast_result_rows(sales_data, costs, "2024-01-01 00:00:00")
+        assert len(rows) == 2
+        assert rows[0][6] == 10 and isinstance(rows[0][6], int)
+        assert rows[0][12] == pytest.approx(300.0)
@@ -2,13 +2,14 @@ import pytest
 import os
 import tempfile
 import shutil
+import datetime
 from app.db.database import DatabaseManager
 
 class TestDatabaseManager:
     """Test database manager functionality"""
     
     @pytest.fixture
-    def temp_db_manager(self):
+    def temp_db_manager(self, template_root):
         """Create a temporary database manager for testing"""
         temp_dir = tempfile.mkdtemp()
         
@@ -17,7 +18,8 @@ class TestDatabaseManager:
         
         db_manager = DatabaseManager(
             database_path=os.path.join(temp_dir, "test.db"),
-            data_dir=temp_dir
+            data_dir=temp_dir,
+            template_dir=os.path.join(template_root, "database")
         )
         
         yield db_manager
@@ -249,6 +251,438 @@ class TestDatabaseManager:
         assert "total_margin" in summary
         assert "avg_margin_percentage" in summary
     
+    def test_incremental_forecast_refresh(self, temp_db_manager):
+        """Test that only journaled changes are recomputed in forecast_results"""
+        temp_db_manager.initialize()
+        conn = temp_db_manager.get_connection()
+        conn.execute("DELETE FROM sales")
+        conn.executemany(
+            "INSERT INTO sales (sale_id, customer_id, unit_id, period, quantity, unit_price, total_revenue, forecast_id) "
+            "VALUES (?, 'CUST-001', 'PROD-001', ?, 10, 50.0, 500.0, 'F1')",
+            [("SALE-A", "2024-01"), ("SALE-B", "2024-02")],
+        )
+        conn.commit()
+        conn.close()
+
+        first = temp_db_manager.refresh_forecast_results()
+        assert first["status"] == "success"
+        assert first["data"]["mode"] == "full"
+        assert first["data"]["rows_recomputed"] == 2
+
+        # Nothing changed: no rows are rewritten and no write is queued
+        jobs = temp_db_manager.write_queue.stats()["jobs"]
+        assert temp_db_manager.refresh_forecast_results()["data"]["mode"] == "clean"
+        assert temp_db_manager.write_queue.stats()["jobs"] == jobs
+
+        temp_db_manager.execute_sql("UPDATE sales SET quantity = 20, total_revenue = 1000 WHERE sale_id = 'SALE-B'")
+        refresh = temp_db_manager.refresh_forecast_results()["data"]
+        assert refresh["mode"] == "incremental"
+        assert refresh["rows_recomputed"] == 1
+
+        results = temp_db_manager.get_saved_forecast_results()["data"]
+        by_period = {row["period"]: row for row in results}
+        assert len(results) == 2
+        assert by_period["2024-02"]["quantity"] == 20
+        assert by_period["2024-02"]["material_cost"] == pytest.approx(2 * by_period["2024-01"]["material_cost"])
+
+        # A BOM change re-costs every sale of the units built from it
+        temp_db_manager.execute_sql("UPDATE bom SET material_cost = 30.0 WHERE bom_id = 'BOM-001'")
+        refresh = temp_db_manager.refresh_forecast_results()["data"]
+        assert refresh["mode"] == "incremental"
+        assert refresh["rows_recomputed"] == 2
+
+    def test_startup_load_keeps_foreign_keys(self, temp_db_manager):
+        """Test child tables load after their parents, so referenced rows cannot be deleted"""
+        temp_db_manager.initialize()
+        conn = temp_db_manager.get_connection()
+        try:
+            assert conn.execute("SELECT sale_id, customer_id FROM sales").fetchall() == [("SALE-001", "CUST-001")]
+            assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+        finally:
+            conn.close()
+
+        # Customers referenced by loaded sales are protected by the foreign key
+        result = temp_db_manager.execute_sql("DELETE FROM customers")
+        assert result["status"] == "error"
+        assert "FOREIGN KEY" in result["error"]
+        assert len(temp_db_manager.get_table_data('customers')["data"]) == 1
+
+    def test_forecast_results_include_overlays(self, temp_db_manager):
+        """Test overlay scenarios are costed from their resolved sales"""
+        temp_db_manager.initialize()
+        conn = temp_db_manager.get_connection()
+        conn.execute("DELETE FROM sales")
+        conn.executemany(
+            "INSERT INTO sales (sale_id, customer_id, unit_id, period, quantity, unit_price, total_revenue, forecast_id) "
+            "VALUES (?, 'CUST-001', 'PROD-001', ?, 10, 50.0, 500.0, 'F1')",
+            [("SALE-A", "2024-01"), ("SALE-B", "2024-02")],
+        )
+        conn.commit()
+        conn.close()
+        assert temp_db_manager.refresh_forecast_results()["data"]["rows_recomputed"] == 2
+
+        # A new overlay inherits both lines of its parent
+        temp_db_manager.execute_sql(
+            "INSERT INTO forecast (forecast_id, name, parent_forecast_id) VALUES ('F1-WHATIF', 'What-if', 'F1')"
+        )
+        refresh = temp_db_manager.refresh_forecast_results()["data"]
+        assert (refresh["mode"], refresh["rows_recomputed"]) == ("full", 4)
+
+        # A tombstone re-costs only its key, now without the overlay's copy
+        temp_db_manager.execute_sql(
+            "INSERT INTO sales_overlay_deletions (forecast_id, customer_id, unit_id, period) "
+            "VALUES ('F1-WHATIF', 'CUST-001', 'PROD-001', '2024-02')"
+        )
+        refresh = temp_db_manager.refresh_forecast_results()["data"]
+        assert (refresh["mode"], refresh["rows_recomputed"]) == ("incremental", 1)
+        periods = sorted(row["period"] for row in temp_db_manager.get_saved_forecast_results()["data"])
+        assert periods == ["2024-01", "2024-01", "2024-02"]
+
+    def test_unit_standard_costs(self, temp_db_manager):
+        """Test standard costs are materialized once and invalidated by source changes"""
+        temp_db_manager.initialize()
+        conn = temp_db_manager.get_connection()
+        conn.execute("DELETE FROM router_operations")
+        conn.execute(
+            "INSERT INTO router_operations (router_id, sequence, machine_id, machine_minutes, labor_minutes, labor_type_id) "
+            "VALUES ('R0001', 1, 'M0001', 30, 15, 'RATE-001')"
+        )
+        conn.commit()
+        conn.close()
+
+        # Missing rows are materialized by the write queue, not the reading connection
+        jobs = temp_db_manager.write_queue.stats()["jobs"]
+        costs = temp_db_manager.get_unit_standard_costs(["PROD-001"])["PROD-001"]
+        assert temp_db_manager.write_queue.stats()["jobs"] == jobs + 1
+        assert costs["material_cost"] == pytest.approx(25.0)
+        assert costs["machine_cost"] == pytest.approx(50.0)  # 30 min at 100/hr
+        assert costs["labor_cost"] == pytest.approx(8.75)  # 15 min at 35/hr
+        assert costs["total_cost"] == pytest.approx(83.75)
+
+        conn = temp_db_manager.get_connection()
+        assert conn.execute("SELECT COUNT(*) FROM unit_standard_costs").fetchone()[0] == 1
+        conn.close()
+
+        temp_db_manager.execute_sql("UPDATE labor_rates SET rate_amount = 70.0 WHERE rate_id = 'RATE-001'")
+        costs = temp_db_manager.get_unit_standard_costs(["PROD-001"])["PROD-001"]
+        assert costs["labor_cost"] == pytest.approx(17.5)
+
+        temp_db_manager.execute_sql("UPDATE bom SET material_cost = 40.0 WHERE bom_id = 'BOM-001'")
+        costs = temp_db_manager.get_unit_standard_costs()["PROD-001"]
+        assert costs["material_cost"] == pytest.approx(40.0)
+
+    def test_stream_table_data(self, temp_db_manager):
+        """Test rows are streamed in batches and the connection is released afterwards"""
+        temp_db_manager.initialize()
+        conn = temp_db_manager.get_connection()
+        conn.executemany(
+            "INSERT INTO customers (customer_id, customer_name) VALUES (?, ?)",
+            [(f"CUST-{i:03d}", f"Customer {i}") for i in range(2, 6)],
+        )
+        conn.commit()
+        conn.close()
+
+        stream = temp_db_manager.stream_table_data("customers", batch_size=2)
+        assert "customer_id" in stream.columns
+        batches = list(stream.batches())
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert batches[0][0]["customer_id"] == "CUST-001"
+        assert temp_db_manager.pool_stats()["in_use"] == 0
+
+        with pytest.raises(Exception):
+            temp_db_manager.stream_table_data("nonexistent_table")
+        assert temp_db_manager.pool_stats()["in_use"] == 0
+
+    def test_get_table_page(self, temp_db_manager):
+        """Test keyset pages cover every row once, with nullable sort columns"""
+        temp_db_manager.initialize()
+        conn = temp_db_manager.get_connection()
+        conn.executemany(
+            "INSERT INTO customers (customer_id, customer_name, region) VALUES (?, ?, ?)",
+            [(f"CUST-{i:03d}", f"Customer {i}", None if i % 3 else "West") for i in range(2, 9)],
+        )
+        conn.commit()
+        conn.close()
+
+        seen, cursor = [], None
+        while True:
+            page = temp_db_manager.get_table_page(
+                "customers", cursor=cursor, page_size=3, include_total=True, sort_by="region"
+            )
+            assert page["status"] == "success"
+            assert page["pagination"]["total_count"] == 8
+            seen.extend(row["customer_id"] for row in page["data"])
+            cursor = page["pagination"]["next_cursor"]
+            if not page["pagination"]["has_more"]:
+                break
+
+        assert sorted(seen) == [f"CUST-{i:03d}" for i in range(1, 9)]
+        assert len(seen) == len(set(seen))
+
+        with pytest.raises(ValueError):
+            temp_db_manager.get_table_page("customers", cursor="not-a-cursor")
+        first = temp_db_manager.get_table_page("customers", page_size=3, sort_by="region")
+        with pytest.raises(ValueError):
+            # A token issued for one sort order is rejected by another
+            temp_db_manager.get_table_page(
+                "customers", cursor=first["pagination"]["next_cursor"], sort_by="customer_name"
+            )
+
+    def test_schema_catalog(self, temp_db_manager):
+        """Test table schemas are cached and reloaded after DDL"""
+        from app.db.schema_catalog import UnknownTableError
+
+        temp_db_manager.initialize()
+        loads = temp_db_manager.schema_catalog.loads
+
+        payments = temp_db_manager.get_table_schema("loan_payments")
+        assert payments.primary_key == ["payment_id"]
+        assert ("loan_id", "payment_number") in payments.unique_keys
+        assert payments.foreign_keys[0]["references_table"] == "loans"
+        assert temp_db_manager.get_table_data("customers")["columns"] == \
+            temp_db_manager.get_table_schema("customers").columns
+        assert temp_db_manager.schema_catalog.loads == loads
+
+        with pytest.raises(UnknownTableError):
+            temp_db_manager.get_table_schema("nonexistent_table")
+
+        temp_db_manager.execute_sql("ALTER TABLE customers ADD COLUMN notes TEXT")
+        assert temp_db_manager.get_table_schema("customers").has_column("notes")
+
+    def test_managed_indexes(self, temp_db_manager):
+        """Test managed indexes are created, migrated and keep hot queries off full scans"""
+        temp_db_manager.initialize()
+        assert temp_db_manager.ensure_indexes() == {"created": [], "rebuilt": [], "dropped": [], "skipped": []}
+
+        audit = temp_db_manager.audit_query_plans()
+        assert audit["ok"], audit["flagged"]
+        # The route query builders are explained, including the overlay path of the scenario report
+        plans = {result["query"]: result["plan"] for result in audit["queries"]}
+        assert any("d USING PRIMARY KEY" in detail for detail in plans["scenario_sales"])
+
+        # An index with an outdated definition is rebuilt
+        temp_db_manager.execute_sql("DROP INDEX idx_sales_forecast_period")
+        temp_db_manager.execute_sql("CREATE INDEX idx_sales_forecast_period ON sales (forecast_id)")
+        assert temp_db_manager.ensure_indexes()["rebuilt"] == ["idx_sales_forecast_period"]
+
+        temp_db_manager.execute_sql("DROP INDEX idx_sales_forecast_period")
+        audit = temp_db_manager.audit_query_plans()
+        assert "forecast_sales" in audit["flagged"]
+
+    def test_bulk_sales_upsert(self, temp_db_manager):
+        """Test staged sales upserts match the line-by-line path for add, subtract and replace"""
+        from app.db.bulk_sales import upsert_sales
+        temp_db_manager.initialize()
+
+        def line(period, quantity, **extra):
+            return dict(customer_id="CUST-001", unit_id="PROD-001", period=period, forecast_id="F1",
+                        quantity=quantity, **extra)
+
+        batches = [
+            ("add", [line("2024-01", 5), line("2024-02", 3, unit_price=40.0), line("2024-02", 2, unit_price=45.0)]),
+            ("subtract", [line("2024-01", 20), line("2024-02", 1)]),
+            ("replace", [line("2024-03", 7, unit_price=10.0), line("2024-02", 4)]),
+        ]
+
+        def apply_all():
+            for operation, lines in batches:
+                temp_db_manager.write_queue.execute(lambda conn: upsert_sales(conn.cursor(), lines, operation))
+            conn = temp_db_manager.get_connection()
+            try:
+                return conn.execute(
+                    "SELECT period, quantity, unit_price, total_revenue FROM sales ORDER BY period"
+                ).fetchall()
+            finally:
+                conn.close()
+
+        set_based = apply_all()
+        assert set_based == [
+            ("2024-01", 0, 50.0, 0.0),     # 10 + 5 - 20, floored at 0
+            ("2024-02", 4, 0.0, 0.0),      # inserted, added to, then replaced without a price
+            ("2024-03", 7, 10.0, 70.0),
+        ]
+
+        # A sales table without the unique key falls back to matching line by line
+        temp_db_manager.reset_to_initial_state()
+        temp_db_manager.execute_sql("DROP INDEX uq_sales_forecast_line")
+        assert apply_all() == set_based
+
+        # Duplicate keys keep the index from being created
+        temp_db_manager.execute_sql(
+            "INSERT INTO sales (sale_id, customer_id, unit_id, period, forecast_id) "
+            "VALUES ('SALE-DUP', 'CUST-001', 'PROD-001', '2024-03', 'F1')"
+        )
+        assert temp_db_manager.ensure_indexes()["skipped"] == ["uq_sales_forecast_line"]
+
+    def test_duplicate_scenario(self, temp_db_manager):
+        """Test scenarios are copied set-based, including the allocations of their expenses"""
+        from app.db.scenarios import delete_scenario_rows, duplicate_scenario
+        temp_db_manager.initialize()
+        temp_db_manager.execute_sql(
+            "INSERT INTO expense_categories (category_id, category_name, category_type) VALUES ('CAT-1', 'Rent', 'admin_expense')")
+        temp_db_manager.execute_sql(
+            "INSERT INTO expenses (expense_id, expense_name, category_id, amount, frequency, start_date, forecast_id) "
+            "VALUES ('EXP-1', 'Office', 'CAT-1', 100, 'monthly', '2024-01-01', 'F1')")
+        temp_db_manager.execute_sql(
+            "INSERT INTO expense_allocations (allocation_id, expense_id, period, allocated_amount, allocation_type, payment_status) "
+            "VALUES ('ALLOC-1', 'EXP-1', '2024-01', 100, 'scheduled', 'paid'), "
+            "('ALLOC-2', 'EXP-1', '2024-02', 100, 'scheduled', 'pending')")
+        temp_db_manager.execute_sql("INSERT INTO forecast (forecast_id, name) VALUES ('F2', 'Copy')")
+
+        conn = temp_db_manager.get_connection()
+        try:
+            summary = duplicate_scenario(conn.cursor(), 'F1', 'F2', temp_db_manager.get_table_schema)
+            conn.commit()
+            assert summary["copied"] == {"sales": 1, "expenses": 1, "expense_allocations": 2, "payroll": 1}
+            assert set(summary["timings"]) == set(summary["copied"])
+
+            copied = conn.execute(
+                "SELECT a.period, a.payment_status, e.expense_name FROM expense_allocations a "
+                "JOIN expenses e ON a.expense_id = e.expense_id WHERE e.forecast_id = 'F2' ORDER BY a.period"
+            ).fetchall()
+            assert copied == [("2024-01", "paid", "Office"), ("2024-02", "pending", "Office")]
+            assert conn.execute("SELECT quantity FROM sales WHERE forecast_id = 'F2'").fetchall() == [(10,)]
+
+            # The copy is deleted children first, leaving the source untouched
+            assert delete_scenario_rows(conn.cursor(), 'F2')["expense_allocations"] == 2
+            conn.commit()
+            assert conn.execute("SELECT COUNT(*) FROM expense_allocations").fetchone()[0] == 2
+        finally:
+            conn.close()
+
+    def test_overlay_scenario(self, temp_db_manager):
+        """Test overlays copy parent lines on write and record deletes as tombstones"""
+        from app.db.bulk_sales import upsert_sales
+        from app.db.scenario_overlays import create_overlay, remove_sales_lines, remove_sales_of, scenario_revenue
+        temp_db_manager.initialize()
+
+        conn = temp_db_manager.get_connection()
+        try:
+            cursor = conn.cursor()
+            summary = create_overlay(cursor, 'F1', 'V1', 'Variant', None, temp_db_manager.get_table_schema)
+            assert summary["parent_forecast_id"] == 'F1'
+            assert "sales" not in summary["copied"] and summary["copied"]["payroll"] == 1
+
+            line = {"customer_id": "CUST-001", "unit_id": "PROD-001", "period": "2024-01", "forecast_id": "V1"}
+            upsert_sales(cursor, [{**line, "quantity": 5}], "add")
+            upsert_sales(cursor, [{**line, "period": "2024-02", "quantity": 1, "unit_price": 50.0}], "replace")
+            conn.commit()
+            quantities = cursor.execute(
+                "SELECT forecast_id, period, quantity FROM resolved_sales WHERE forecast_id IN ('F1', 'V1') "
+                "ORDER BY forecast_id, period"
+            ).fetchall()
+            assert quantities == [("F1", "2024-01", 10), ("V1", "2024-01", 15), ("V1", "2024-02", 1)]
+
+            assert remove_sales_lines(cursor, 'V1', [line]) == {"deleted": 1, "tombstoned": 1}
+            # An overlay of an overlay is flattened onto the same base
+            summary = create_overlay(cursor, 'V1', 'V2', 'Variant 2', None, temp_db_manager.get_table_schema)
+            conn.commit()
+            assert summary["parent_forecast_id"] == 'F1'
+            assert summary["copied"]["sales"] == 1 and summary["copied"]["sales_overlay_deletions"] == 1
+            assert scenario_revenue(cursor, ['F1', 'V1', 'V2']) == {"F1": 500.0, "V1": 50.0, "V2": 50.0}
+
+            # Removing a customer's lines from an overlay tombstones the inherited ones
+            create_overlay(cursor, 'F1', 'V3', 'Variant 3', None, temp_db_manager.get_table_schema)
+            assert remove_sales_of(cursor, 'V3', 'customer_id', 'CUST-001') == {"deleted": 0, "tombstoned": 1}
+            conn.commit()
+        finally:
+            conn.close()
+
+        # Forecast data filtered on an overlay shows its resolved lines
+        def periods(forecast_id):
+            sales = temp_db_manager.get_forecast_data(forecast_id)["data"]["sales_forecast"]
+            return [(sale["forecast_id"], sale["period"]) for sale in sales]
+        assert periods('F1') == [('F1', '2024-01')]
+        assert periods('V2') == [('V2', '2024-02')]
+        assert periods('V3') == []
+
+    def test_expense_rollup(self, temp_db_manager):
+        """Test the monthly expense rollup is rebuilt only after expense data changes"""
+        from app.db.expense_rollup import expense_data_version, month_periods, refresh_expense_rollup
+        from app.db.expense_allocations import regenerate_allocations
+        temp_db_manager.initialize()
+        conn = temp_db_manager.get_connection()
+        conn.execute("INSERT INTO forecast (forecast_id, name) VALUES ('F2', 'Variant')")
+        conn.execute("INSERT INTO expense_categories (category_id, category_name, category_type) "
+                     "VALUES ('CAT-1', 'Rent', 'factory_overhead')")
+        conn.executemany(
+            "INSERT INTO expenses (expense_id, expense_name, category_id, amount, frequency, start_date, end_date, "
+            "forecast_id) VALUES (?, ?, 'CAT-1', ?, ?, '2024-01-01', '2024-03-31', ?)",
+            [("E1", "Lease", 100.0, "monthly", "F1"), ("E2", "Power", 10.0, "weekly", "F1"),
+             ("E3", "Lease", 50.0, "monthly", "F2")]
+        )
+        regenerate_allocations(conn.cursor())
+        conn.commit()
+
+        refresh = temp_db_manager.write_queue.execute
+        assert refresh(refresh_expense_rollup)
+        assert not refresh(refresh_expense_rollup)
+        rows = conn.execute(
+            "SELECT forecast_id, period, total_amount, expense_count FROM expense_monthly_rollup "
+            "ORDER BY forecast_id, period"
+        ).fetchall()
+        assert rows[:3] == [("F1", "2024-01", 150.0, 2), ("F1", "2024-02", 140.0, 2), ("F1", "2024-03", 140.0, 2)]
+        assert rows[3:] == [("F2", "2024-01", 50.0, 1), ("F2", "2024-02", 50.0, 1), ("F2", "2024-03", 50.0, 1)]
+
+        version = expense_data_version(conn.cursor())
+        conn.execute("UPDATE expense_allocations SET allocated_amount = 70 WHERE expense_id = 'E3' AND period = '2024-02'")
+        conn.commit()
+        assert expense_data_version(conn.cursor()) > version
+        assert refresh(refresh_expense_rollup)
+        assert conn.execute(
+            "SELECT total_amount FROM expense_monthly_rollup WHERE forecast_id = 'F2' AND period = '2024-02'"
+        ).fetchone()[0] == 70.0
+        conn.close()
+
+        assert month_periods(datetime.date(2025, 1, 31), 3) == ["2025-01", "2025-02", "2025-03"]
+        assert month_periods(datetime.date(2024, 11, 1), 3) == ["2024-11", "2024-12", "2025-01"]
+
+    def test_bulk_load_csv(self, temp_db_manager):
+        """Test chunked CSV loads: upsert, type and FK validation, and rollback"""
+        import io
+        temp_db_manager.initialize()
+
+        csv = (b"customer_id,customer_name,customer_type,region\n"
+               b"CUST-001,Renamed Corp,Manufacturing,North\n"
+               b"CUST-002,New Corp,Retail,South\n"
+               b"CUST-003,Third Corp,Retail,East\n")
+        result = temp_db_manager.bulk_load_csv("customers", io.BytesIO(csv), mode="upsert", chunk_size=2)
+        assert result["status"] == "success"
+        assert result["rows_loaded"] == 3 and result["chunks"] == 2
+        assert result["rows_per_second"] > 0
+        names = {row["customer_id"]: row["customer_name"] for row in temp_db_manager.get_table_data("customers")["data"]}
+        assert names == {"CUST-001": "Renamed Corp", "CUST-002": "New Corp", "CUST-003": "Third Corp"}
+
+        # A bad row in a later chunk rolls back the whole load
+        before = temp_db_manager.get_table_data("labor_rates")["data"]
+        csv = (b"rate_id,rate_name,rate_amount,rate_type\n"
+               b"RATE-009,Welder,55.0,hourly\n"
+               b"RATE-010,Painter,not-a-rate,hourly\n")
+        result = temp_db_manager.bulk_load_csv("labor_rates", io.BytesIO(csv), mode="replace", chunk_size=1)
+        assert result["status"] == "error"
+        assert result["errors"][0]["line"] == 3 and result["errors"][0]["column"] == "rate_amount"
+        assert temp_db_manager.get_table_data("labor_rates")["data"] == before
+
+        csv = b"customer_id,unit_id,period,quantity,forecast_id\nCUST-404,PROD-001,2024-03,1,F001\n"
+        result = temp_db_manager.bulk_load_csv("sales", io.BytesIO(csv))
+        assert result["status"] == "error"
+        assert any(error["column"] == "customer_id" for error in result["errors"])
+
+        # Duplicate sales lines leave the unique index off, as ensure_indexes does, instead of failing
+        csv = (b"customer_id,unit_id,period,quantity,forecast_id\n"
+               b"CUST-001,PROD-001,2024-03,1,F1\n"
+               b"CUST-001,PROD-001,2024-03,2,F1\n")
+        result = temp_db_manager.bulk_load_csv("sales", io.BytesIO(csv), mode="replace")
+        assert result["status"] == "success", result
+        assert result["rows_loaded"] == 2 and result["skipped_indexes"] == ["uq_sales_forecast_line"]
+        assert temp_db_manager.ensure_indexes()["skipped"] == ["uq_sales_forecast_line"]
+
+        csv = b"customer_id,unit_id,period,quantity,forecast_id\nCUST-001,PROD-001,2024-03,3,F1\n"
+        result = temp_db_manager.bulk_load_csv("sales", io.BytesIO(csv), mode="replace")
+        # Once the duplicates are gone the next migration creates it
+        assert result["skipped_indexes"] == []
+        assert temp_db_manager.ensure_indexes()["created"] == ["uq_sales_forecast_line"]
+
     def test_execute_sql_select(self, temp_db_manager):
         """Test executing SELECT SQL statements"""
         temp_db_manager.initialize()
@@ -409,7 +843,8 @@ class TestDatabaseManager:
         result = temp_db_manager.get_table_data('customers')
         initial_count = len(result["data"])
         
-        # Clear the customers table
+        # Clear the customers table; the startup sales reference them, so they go first
+        temp_db_manager.execute_sql("DELETE FROM sales")
         temp_db_manager.execute_sql("DELETE FROM customers")
         
         # Verify table is empty
@@ -448,6 +883,97 @@ class TestDatabaseManager:
         result = temp_db_manager.get_table_data('customers')
         assert len(result["data"]) == 1  # Back to original CSV data
     
+    def test_reset_reloads_only_changed_tables(self, temp_db_manager):
+        """Test that resets skip tables whose CSV and rows are unchanged since their load"""
+        import io
+        temp_db_manager.initialize()
+        assert temp_db_manager.changed_csv_tables() == []
+
+        # A modified table is reloaded with the tables that reference it
+        temp_db_manager.execute_sql("UPDATE customers SET region = 'South'")
+        assert temp_db_manager.changed_csv_tables() == ['customers', 'sales']
+
+        # So is a table whose file changed
+        with open(os.path.join(temp_db_manager.data_dir, "machines.csv"), "a") as f:
+            f.write("M0002,Second Machine,Test description,50.00,Light Equipment\n")
+        assert set(temp_db_manager.changed_csv_tables()) == {
+            'customers', 'sales', 'machines', 'router_operations', 'routers'
+        }
+
+        result = temp_db_manager.reset_to_initial_state()
+        assert result["status"] == "success"
+        assert 'labor_rates' not in result["reloaded_tables"]
+        assert temp_db_manager.get_table_data('customers')["data"][0]["region"] == 'North'
+        assert len(temp_db_manager.get_table_data('machines')["data"]) == 2
+        assert temp_db_manager.changed_csv_tables() == []
+
+        # Bulk loads drop the tracking triggers but still flag the table
+        assert temp_db_manager.bulk_load_csv(
+            'labor_rates', io.BytesIO(b"rate_id,rate_name,rate_amount\nRATE-009,Overtime,45.0\n")
+        )["status"] == "success"
+        assert 'labor_rates' in temp_db_manager.changed_csv_tables()
+
+    def test_shadow_reset_swaps_in_rebuilt_database(self, temp_db_manager):
+        """Test that a shadow reset rebuilds aside and swaps in after readers finish"""
+        import threading
+        import time
+        temp_db_manager.initialize()
+        temp_db_manager.execute_sql(
+            "INSERT INTO customers (customer_id, customer_name) VALUES ('CUST-009', 'Shadow Test')",
+            description="Insert before shadow reset"
+        )
+
+        # A reader still holding a connection delays the swap until it is done
+        reader = temp_db_manager.get_connection()
+        seen = []
+
+        def finish_read():
+            time.sleep(0.3)
+            seen.append(reader.execute("SELECT COUNT(*) FROM customers").fetchone()[0])
+            reader.close()
+
+        thread = threading.Thread(target=finish_read)
+        thread.start()
+        result = temp_db_manager.reset_to_initial_state(shadow=True)
+        thread.join()
+
+        assert result["status"] == "success"
+        assert "sales" in result["reloaded_tables"]
+        assert seen == [2]  # the old data, read before the swap
+        assert len(temp_db_manager.get_table_data('customers')["data"]) == 1
+        # The execution log survives the rebuild
+        logs = temp_db_manager.get_execution_logs()["data"]
+        assert any(log["description"] == "Insert before shadow reset" for log in logs)
+        assert not os.path.exists(temp_db_manager.database_path + ".shadow")
+        assert temp_db_manager.changed_csv_tables() == []
+
+    def test_reset_clones_pristine_template(self, temp_db_manager, monkeypatch):
+        """Test that resets clone the prebuilt template and only rebuild it when a CSV changes"""
+        temp_db_manager.initialize()
+        template = temp_db_manager.pristine_template()
+        sales_count = len(temp_db_manager.get_table_data('sales')["data"])
+        temp_db_manager.execute_sql("DELETE FROM sales", description="Clear sales before reset")
+
+        # An up-to-date template is cloned without parsing any CSV file
+        monkeypatch.setattr(DatabaseManager, "load_csv_data", lambda *args, **kwargs: pytest.fail("CSV data reloaded"))
+        result = temp_db_manager.reset_to_initial_state(shadow=True)
+        monkeypatch.undo()
+        assert result["status"] == "success"
+        assert result["shadow"]["template"] == os.path.basename(template)
+        assert len(temp_db_manager.get_table_data('sales')["data"]) == sales_count
+        assert temp_db_manager.changed_csv_tables() == []
+
+        # Changing a CSV file selects a new template and removes the stale one
+        with open(os.path.join(temp_db_manager.data_dir, "customers.csv"), "a") as f:
+            f.write("CUST-002,Second Corp,Technology,West\n")
+        assert temp_db_manager.pristine_template() != template
+        assert not os.path.exists(template)
+
+        # The empty schema template keeps every table but no rows or logs
+        temp_db_manager.restore_template(empty=True)
+        assert temp_db_manager.get_table_data('customers')["data"] == []
+        assert temp_db_manager.get_execution_logs()["data"] == []
+
     def test_get_table_data_invalid_table(self, temp_db_manager):
         """Test getting data from non-existent table"""
         temp_db_manager.initialize()
@@ -469,7 +995,47 @@ class TestDatabaseManager:
         # Test closing connections
         temp_db_manager.close_connection(conn1)
         temp_db_manager.close_connection(conn2)
-    
+
+    def test_connection_pool_reuse(self, temp_db_manager):
+        """Test that released connections are reused and rolled back"""
+        temp_db_manager.initialize()
+
+        conn = temp_db_manager.get_connection()
+        conn.execute("INSERT INTO customers (customer_id, customer_name) VALUES ('CUST-POOL', 'Uncommitted')")
+        conn.close()  # returns to the pool, discarding the open transaction
+
+        reused = temp_db_manager.get_connection()
+        assert reused is conn
+        count = reused.execute("SELECT COUNT(*) FROM customers WHERE customer_id = 'CUST-POOL'").fetchone()[0]
+        assert count == 0
+        assert reused.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        reused.close()
+
+        # Closing twice must not hand the same connection out to two callers
+        reused.close()
+        first = temp_db_manager.get_connection()
+        second = temp_db_manager.get_connection()
+        assert first is not second
+        first.close()
+        second.close()
+
+    def test_close_all_connections(self, temp_db_manager):
+        """Test that close_all_connections retires pooled connections"""
+        held = temp_db_manager.get_connection()
+        idle = temp_db_manager.get_connection()
+        idle.close()
+
+        temp_db_manager.close_all_connections()
+        assert temp_db_manager.pool_stats()["idle"] == 0
+
+        # A connection checked out before close_all is closed on release, not pooled
+        held.close()
+        assert temp_db_manager.pool_stats()["idle"] == 0
+
+        fresh = temp_db_manager.get_connection()
+        assert fresh is not held and fresh is not idle
+        fresh.close()
+
     def test_path_detection(self):
         """Test automatic path detection"""
         db_manager = DatabaseManager()
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.testclient import TestClient
+
+from app.db.executor import DatabaseExecutor, db_executor, db_read, db_write
+
+
+class TestDatabaseExecutor:
+    """Test the off-loop database executor and route decorators"""
+
+    def test_writes_are_serialized_on_one_thread(self):
+        executor = DatabaseExecutor(max_readers=4)
+        active, peak, threads = [0], [0], set()
+        lock = threading.Lock()
+
+        def write():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                threads.add(threading.current_thread().name)
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        async def run():
+            await asyncio.gather(*(executor.write(write) for _ in range(5)))
+            return await executor.read(lambda: threading.current_thread().name)
+
+        reader = asyncio.run(run())
+        executor.shutdown()
+
+        assert peak[0] == 1
+        assert len(threads) == 1 and next(iter(threads)).startswith("db-write")
+        assert reader.startswith("db-read")
+        assert executor.stats()["writes_queued"] == 0
+
+    def test_decorated_endpoints(self):
+        app = FastAPI()
+
+        @app.get("/items/{item_id}")
+        @db_read
+        def get_item(item_id: int, label: Optional[str] = Query(None)):
+            if item_id == 0:
+                raise HTTPException(status_code=404, detail="not found")
+            return {"item_id": item_id, "label": label, "thread": threading.current_thread().name}
+
+        @app.post("/items")
+        @db_write
+        def create_item(item: dict):
+            return {"thread": threading.current_thread().name}
+
+        client = TestClient(app)
+        response = client.get("/items/3", params={"label": "x"})
+        assert response.json()["label"] == "x"
+        assert response.json()["thread"].startswith("db-read")
+        assert client.get("/items/0").status_code == 404
+        assert client.get("/items/abc").status_code == 422
+        assert client.post("/items", json={}).json()["thread"].startswith("db-write")
+
+        # The blocking function stays callable from other endpoint bodies
+        assert get_item.__wrapped__(5, label=None)["item_id"] == 5
+        assert db_executor.stats()["reads_running"] == 0
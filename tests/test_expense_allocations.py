@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+from app.db.expense_allocations import allocation_schedule, regenerate_allocations
+
+
+def _expense(expense_id, frequency, start_date, end_date=None, amount=120.0, **extra):
+    return {"expense_id": expense_id, "amount": amount, "frequency": frequency,
+            "start_date": start_date, "end_date": end_date, **extra}
+
+
+class TestExpenseAllocations:
+    """Test the array-based expense allocation engine"""
+
+    def test_frequencies(self):
+        schedule = allocation_schedule([
+            _expense("E1", "quarterly", "2024-01-15", "2024-12-31"),
+            _expense("E2", "weekly", "2024-01-29", "2024-02-12"),
+            _expense("E3", "one_time", "2024-05-10"),
+        ])
+        rows = list(schedule[["allocation_id", "period", "allocation_type"]].itertuples(index=False, name=None))
+        assert rows == [
+            ("ALLOC-E1-2024-01-1", "2024-01", "scheduled"), ("ALLOC-E1-2024-04-1", "2024-04", "scheduled"),
+            ("ALLOC-E1-2024-07-1", "2024-07", "scheduled"), ("ALLOC-E1-2024-10-1", "2024-10", "scheduled"),
+            ("ALLOC-E2-2024-01-1", "2024-01", "scheduled"), ("ALLOC-E2-2024-02-1", "2024-02", "scheduled"),
+            ("ALLOC-E2-2024-02-2", "2024-02", "scheduled"),
+            ("ALLOC-E3-2024-05-1", "2024-05", "one_time"),
+        ]
+
+    def test_month_end_start_and_default_horizon(self):
+        # Starting on the 31st pays at each month end; no end date runs 24 months
+        schedule = allocation_schedule([_expense("E1", "monthly", "2024-01-31")])
+        assert len(schedule) == 25
+        assert list(schedule["period"][:3]) == ["2024-01", "2024-02", "2024-03"]
+        assert schedule["period"].iloc[-1] == "2026-01"
+
+        # An end date before the clamped payment day excludes that month
+        schedule = allocation_schedule([_expense("E2", "monthly", "2024-01-31", "2024-02-28")])
+        assert list(schedule["period"]) == ["2024-01"]
+
+    def test_amortization(self):
+        schedule = allocation_schedule([
+            _expense("E1", "one_time", "2024-11-01", expense_allocation="amortized", amortization_months=3),
+            # The last payment is spread only up to the end month
+            _expense("E2", "annually", "2024-01-01", "2025-02-01",
+                     expense_allocation="amortized", amortization_months=3),
+        ])
+        rows = list(schedule[["expense_id", "period", "allocated_amount"]].itertuples(index=False, name=None))
+        assert rows == [
+            ("E1", "2024-11", 40.0), ("E1", "2024-12", 40.0), ("E1", "2025-01", 40.0),
+            ("E2", "2024-01", 40.0), ("E2", "2024-02", 40.0), ("E2", "2024-03", 40.0),
+            ("E2", "2025-01", 60.0), ("E2", "2025-02", 60.0),
+        ]
+        assert set(schedule["allocation_type"]) == {"amortized"}
+
+    def test_unknown_frequency(self):
+        with pytest.raises(ValueError):
+            allocation_schedule([_expense("E1", "daily", "2024-01-01")])
+
+    def test_regenerate_scenario(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute(
+            "CREATE TABLE expenses (expense_id TEXT PRIMARY KEY, amount REAL, frequency TEXT, start_date TEXT, "
+            "end_date TEXT, expense_allocation TEXT, amortization_months INTEGER, forecast_id TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE expense_allocations (allocation_id TEXT PRIMARY KEY, expense_id TEXT, period TEXT, "
+            "allocated_amount REAL, allocation_type TEXT, payment_status TEXT)"
+        )
+        conn.executemany("INSERT INTO expenses VALUES (?, ?, ?, ?, ?, 'immediate', NULL, ?)", [
+            ("E1", 10.0, "monthly", "2024-01-01", "2024-06-30", "F1"),
+            ("E2", 20.0, "monthly", "2024-01-01", "2024-03-31", "F2"),
+        ])
+        conn.execute("INSERT INTO expense_allocations VALUES ('OLD', 'E1', '2023-12', 1, 'scheduled', 'pending')")
+
+        result = regenerate_allocations(conn.cursor(), forecast_id="F1")
+        assert (result["expenses"], result["allocations_deleted"], result["allocations_created"]) == (1, 1, 6)
+        counts = dict(conn.execute("SELECT expense_id, COUNT(*) FROM expense_allocations GROUP BY expense_id"))
+        assert counts == {"E1": 6}
+
+        # Only the difference is written: January keeps its payment status
+        conn.execute("UPDATE expense_allocations SET payment_status = 'paid' WHERE period = '2024-01'")
+        assert regenerate_allocations(conn.cursor(), forecast_id="F1")["allocations_updated"] == 0
+        conn.execute("UPDATE expenses SET amount = 15, end_date = '2024-04-30' WHERE expense_id = 'E1'")
+        result = regenerate_allocations(conn.cursor(), expense_ids=["E1"])
+        assert (result["allocations_created"], result["allocations_updated"], result["allocations_deleted"]) == (0, 3, 2)
+        # The paid January allocation is not repriced; the disagreement is reported instead
+        assert result["conflicts"] == [{
+            "allocation_id": "ALLOC-E1-2024-01-1", "expense_id": "E1", "period": "2024-01",
+            "payment_status": "paid", "allocated_amount": 10.0, "scheduled_amount": 15.0,
+        }]
+        assert conn.execute(
+            "SELECT period, allocated_amount, payment_status FROM expense_allocations ORDER BY period LIMIT 2"
+        ).fetchall() == [("2024-01", 10.0, "paid"), ("2024-02", 15.0, "pending")]
+
+        # Settled allocations the shortened schedule no longer has are kept, not deleted
+        conn.execute("UPDATE expense_allocations SET payment_status = 'paid' WHERE period = '2024-04'")
+        conn.execute("UPDATE expenses SET amount = 10, end_date = '2024-02-29' WHERE expense_id = 'E1'")
+        result = regenerate_allocations(conn.cursor(), expense_ids=["E1"])
+        assert (result["allocations_updated"], result["allocations_deleted"]) == (1, 1)
+        assert [(c["period"], c["scheduled_amount"]) for c in result["conflicts"]] == [("2024-04", None)]
+        assert [row[0] for row in conn.execute("SELECT period FROM expense_allocations ORDER BY period")] == [
+            "2024-01", "2024-02", "2024-04"
+        ]
@@ -0,0 +1,101 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from app.db.loan_amortization import amortization_schedule, regenerate_loan_schedules
+
+
+def _loan(loan_id, principal=100000.0, rate=6.0, term=360, **extra):
+    return {"loan_id": loan_id, "principal_amount": principal, "interest_rate": rate, "loan_term_months": term,
+            "start_date": "2024-01-31", "payment_type": "amortizing", "payment_frequency": "monthly",
+            "balloon_payment": None, "balloon_date": None, **extra}
+
+
+class TestLoanAmortization:
+    """Test the array-based loan amortization engine"""
+
+    def test_amortizing(self):
+        schedule = amortization_schedule([_loan("L1")])
+        assert len(schedule) == 360
+        first = schedule.iloc[0]
+        assert (first.payment_id, first.payment_date) == ("L1-001", "2024-02-29")
+        assert (first.payment_amount, first.interest_payment, first.principal_payment) == (599.55, 500.0, 99.55)
+        assert list(schedule["payment_date"][1:3]) == ["2024-03-31", "2024-04-30"]
+        # The last payment clears the balance left by cent rounding
+        assert schedule["principal_payment"].sum() == pytest.approx(100000.0)
+        assert schedule["remaining_balance"].iloc[-1] == 0.0
+
+    def test_interest_only_and_balloons(self):
+        schedule = amortization_schedule([
+            _loan("IO", term=12, payment_type="interest_only"),
+            _loan("BP", term=12, balloon_payment=40000.0),
+            _loan("BD", term=60, payment_type="interest_only", balloon_date="2024-06-15"),
+        ])
+        io = schedule[schedule.loan_id == "IO"]
+        assert set(io["interest_payment"]) == {500.0}
+        assert list(io["principal_payment"][-2:]) == [0.0, 100000.0]
+
+        balloon = schedule[schedule.loan_id == "BP"]
+        # Level payments amortize down to the balloon, which comes with the last one
+        level = balloon["payment_amount"].iloc[0]
+        assert set(balloon["payment_amount"][:-1]) == {level}
+        assert balloon["payment_amount"].iloc[-1] == pytest.approx(level + 40000.0, abs=0.05)
+
+        # A balloon date ends the schedule at the first payment on or after it
+        by_date = schedule[schedule.loan_id == "BD"]
+        assert list(by_date["payment_date"]) == ["2024-02-29", "2024-03-31", "2024-04-30", "2024-05-31", "2024-06-30"]
+        assert by_date["principal_payment"].iloc[-1] == 100000.0
+
+    def test_quarterly(self):
+        schedule = amortization_schedule([_loan("Q", principal=12000.0, rate=0.0, term=12, payment_frequency="quarterly")])
+        assert list(schedule["payment_date"]) == ["2024-04-30", "2024-07-31", "2024-10-31", "2025-01-31"]
+        assert set(schedule["payment_amount"]) == {3000.0}
+
+    @pytest.mark.parametrize("frequency, payments, per_year", [("weekly", 52, 52), ("biweekly", 26, 26)])
+    def test_day_steps(self, frequency, payments, per_year):
+        schedule = amortization_schedule([_loan("W", principal=52000.0, term=12, payment_frequency=frequency)])
+        assert len(schedule) == payments
+        step = 364 // per_year
+        assert list(schedule["payment_date"][:2]) == [
+            str(np.datetime64("2024-01-31") + step), str(np.datetime64("2024-01-31") + 2 * step)
+        ]
+        # Interest accrues at the annual rate over the payments per year, not monthly
+        assert schedule["interest_payment"].iloc[0] == pytest.approx(52000.0 * 0.06 / per_year, abs=0.01)
+        assert schedule["principal_payment"].sum() == pytest.approx(52000.0)
+
+    @pytest.mark.parametrize("frequency", ["one_time", "daily"])
+    def test_frequency_without_period(self, frequency):
+        with pytest.raises(ValueError):
+            amortization_schedule([_loan("X", payment_frequency=frequency)])
+
+    def test_regenerate_rate_change(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute(
+            "CREATE TABLE loans (loan_id TEXT PRIMARY KEY, principal_amount REAL, interest_rate REAL, "
+            "loan_term_months INTEGER, start_date TEXT, payment_type TEXT, payment_frequency TEXT, "
+            "balloon_payment REAL, balloon_date TEXT, is_active INTEGER, monthly_payment_amount REAL, updated_date TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE loan_payments (payment_id TEXT PRIMARY KEY, loan_id TEXT, payment_number INTEGER, "
+            "payment_date TEXT, payment_amount REAL, principal_payment REAL, interest_payment REAL, "
+            "remaining_balance REAL, payment_status TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO loans VALUES (?, 100000, 6.0, 360, '2024-01-31', 'amortizing', 'monthly', NULL, NULL, ?, NULL, NULL)",
+            [("L1", 1), ("L2", 1), ("L3", 0)]
+        )
+        cursor = conn.cursor()
+        stored = regenerate_loan_schedules(cursor)
+        assert (stored["loans"], stored["payments"]) == (2, 720)
+
+        what_if = regenerate_loan_schedules(cursor, rate_change=2.0, persist=False)
+        assert what_if["current_total_interest"] == stored["total_interest"]
+        assert what_if["total_interest"] > stored["total_interest"]
+        assert conn.execute("SELECT SUM(interest_payment) FROM loan_payments").fetchone()[0] == pytest.approx(
+            stored["total_interest"])
+
+        regenerate_loan_schedules(cursor, loan_ids=["L1"], rate_change=2.0)
+        assert conn.execute("SELECT interest_rate, monthly_payment_amount FROM loans WHERE loan_id = 'L1'").fetchone() \
+            == (8.0, 733.76)
+        assert conn.execute("SELECT payment_amount FROM loan_payments WHERE payment_id = 'L1-001'").fetchone()[0] == 733.76
@@ -0,0 +1,69 @@
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.db.recurrence import (
+    frequency_steps,
+    next_occurrence,
+    nth_occurrence,
+    occurrences_between,
+    to_days,
+)
+
+
+def _stepped(start, frequency, k):
+    """Occurrence k computed the slow way, for comparison"""
+    if frequency == 'weekly':
+        return start + timedelta(weeks=k)
+    months = {'monthly': 1, 'quarterly': 3, 'annually': 12}[frequency] * k
+    year, month = divmod(start.month - 1 + months, 12)
+    year += start.year
+    return date(year, month + 1, min(start.day, calendar.monthrange(year, month + 1)[1]))
+
+
+class TestRecurrence:
+    """Test the closed-form recurrence functions"""
+
+    def test_month_end_anchoring(self):
+        months, days = frequency_steps(['monthly', 'annually'])
+        start = to_days(['2024-01-31', '2024-02-29'])
+        assert [str(d) for d in nth_occurrence(start[:1], months[:1], days[:1], np.arange(4))] == [
+            '2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30'
+        ]
+        assert str(nth_occurrence(start, months, days, 1)[1]) == '2025-02-28'
+
+    def test_next_occurrence(self):
+        months, days = frequency_steps(['monthly', 'weekly', 'one_time', 'one_time', 'quarterly'])
+        start = to_days(['2024-01-31', '2024-01-01', '2024-03-01', '2024-03-20', '2024-01-15'])
+        end = to_days([None, None, None, None, '2024-04-01'])
+        result = next_occurrence(start, months, days, np.datetime64('2024-03-10'), end)
+        assert [None if np.isnat(d) else str(d) for d in result] == [
+            '2024-03-31', '2024-03-11', None, '2024-03-20', None
+        ]
+        # An occurrence on the day itself is the next one
+        assert str(next_occurrence(start[:1], months[:1], days[:1], np.datetime64('2024-02-29'))[0]) == '2024-02-29'
+
+    @pytest.mark.parametrize("frequency", ['weekly', 'monthly', 'quarterly', 'annually'])
+    def test_occurrences_between_matches_stepping(self, frequency):
+        starts = [date(2023, 1, 29) + timedelta(days=n * 11) for n in range(40)]
+        first, last = date(2024, 2, 10), date(2025, 8, 31)
+        months, days = frequency_steps([frequency] * len(starts))
+        owner, k, dates = occurrences_between(
+            to_days([s.isoformat() for s in starts]), months, days,
+            np.datetime64(first.isoformat()), np.datetime64(last.isoformat())
+        )
+
+        expected = []
+        for i, start in enumerate(starts):
+            n = 0
+            while _stepped(start, frequency, n) <= last:
+                if _stepped(start, frequency, n) >= first:
+                    expected.append((i, n, _stepped(start, frequency, n).isoformat()))
+                n += 1
+        assert list(zip(owner.tolist(), k.tolist(), [str(d) for d in dates])) == expected
+
+    def test_unknown_frequency(self):
+        with pytest.raises(ValueError):
+            frequency_steps(['daily'])
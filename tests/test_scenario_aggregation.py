@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from app.db.scenario_aggregation import cost_rollups, revenue_rollups, scenario_sales_frame
+from app.db.scenario_overlays import overlay_ddl
+from app.db.standard_costs import unit_costs_frame
+
+
+class TestScenarioAggregation:
+    """Test multi-scenario revenue and cost rollups"""
+
+    @pytest.fixture
+    def cursor(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute(
+            "CREATE TABLE sales (sale_id TEXT, customer_id TEXT, unit_id TEXT, period TEXT, "
+            "quantity INTEGER, unit_price REAL, total_revenue REAL, forecast_id TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE forecast (forecast_id TEXT PRIMARY KEY, name TEXT, description TEXT, "
+            "parent_forecast_id TEXT)"
+        )
+        for statement in overlay_ddl():
+            conn.execute(statement)
+        conn.executemany(
+            "INSERT INTO sales VALUES (?, ?, ?, ?, ?, 10.0, ?, ?)",
+            [
+                ("S1", "CUST-001", "PROD-001", "2024-01-01", 2, 20.0, "F1"),
+                ("S2", "CUST-002", "PROD-001", "2024-02-01", 3, 30.0, "F1"),
+                ("S3", "CUST-001", "PROD-002", "2024-01-15", 1, 10.0, "F2"),
+                ("S4", "CUST-001", "PROD-002", "2024-03-01", 5, 50.0, "F2"),
+                ("S5", "CUST-003", "PROD-001", "2024-01-01", 9, 90.0, "F3"),
+            ],
+        )
+        yield conn.cursor()
+        conn.close()
+
+    def test_revenue_rollups_across_scenarios(self, cursor):
+        sales = scenario_sales_frame(cursor, ["F1", "F2"], "2024-01", "2024-02")
+        revenue = revenue_rollups(sales)
+
+        assert revenue["total"] == pytest.approx(60.0)
+        assert revenue["by_period"] == {"2024-01": pytest.approx(30.0), "2024-02": pytest.approx(30.0)}
+        assert revenue["by_product"] == {"PROD-001": pytest.approx(50.0), "PROD-002": pytest.approx(10.0)}
+        assert revenue["by_customer"] == {"CUST-001": pytest.approx(30.0), "CUST-002": pytest.approx(30.0)}
+
+    def test_cost_rollups_use_unit_costs(self, cursor):
+        sales = scenario_sales_frame(cursor, ["F1", "F1", "F2"])
+        unit_costs = unit_costs_frame({
+            "PROD-001": {"unit_id": "PROD-001", "material_cost": 2.0, "labor_cost": 1.0,
+                         "machine_cost": 0.5, "total_cost": 3.5},
+        })
+        costs = cost_rollups(sales, unit_costs)
+
+        # F1 listed twice: 10 units of PROD-001; PROD-002 has no standard cost
+        assert costs["materials"] == pytest.approx(20.0)
+        assert costs["labor"] == pytest.approx(10.0)
+        assert costs["manufacturing"] == pytest.approx(5.0)
+        assert costs["total"] == pytest.approx(35.0)
+
+    def test_overlay_resolves_against_base(self, cursor):
+        # V1 overlays F1: S1's line changed, S2's line deleted, one line added
+        cursor.execute("INSERT INTO forecast VALUES ('F1', 'Base', NULL, NULL), ('V1', 'Variant', NULL, 'F1')")
+        cursor.executemany(
+            "INSERT INTO sales VALUES (?, ?, ?, ?, ?, 10.0, ?, 'V1')",
+            [
+                ("V1-1", "CUST-001", "PROD-001", "2024-01-01", 4, 40.0),
+                ("V1-2", "CUST-009", "PROD-002", "2024-02-01", 1, 10.0),
+            ],
+        )
+        cursor.execute(
+            "INSERT INTO sales_overlay_deletions VALUES ('V1', 'CUST-002', 'PROD-001', '2024-02-01')"
+        )
+
+        revenue = revenue_rollups(scenario_sales_frame(cursor, ["V1"]))
+        assert revenue["total"] == pytest.approx(50.0)
+        assert revenue["by_customer"] == {"CUST-001": pytest.approx(40.0), "CUST-009": pytest.approx(10.0)}
+
+        # Base and variant together, and the view agrees with the merge
+        assert revenue_rollups(scenario_sales_frame(cursor, ["F1", "V1"]))["total"] == pytest.approx(100.0)
+        cursor.execute("SELECT SUM(total_revenue), COUNT(*) FROM resolved_sales WHERE forecast_id = 'V1'")
+        assert cursor.fetchone() == (pytest.approx(50.0), 2)
+
+    def test_no_scenarios(self, cursor):
+        sales = scenario_sales_frame(cursor, [])
+        assert revenue_rollups(sales)["total"] == 0.0
+        assert cost_rollups(sales, unit_costs_frame({}))["total"] == 0.0
@@ -0,0 +1,51 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from app.db.database import DatabaseManager
+from app.db.startup_csv import load_order, parse_in_pool, startup_csv_parser
+
+
+class TestStartupCsv:
+    """Test the startup CSV load order and pooled parsing"""
+
+    def _manager(self):
+        temp_dir = tempfile.mkdtemp()
+        db_manager = DatabaseManager(database_path=os.path.join(temp_dir, "test.db"), data_dir=temp_dir)
+        db_manager.create_tables()
+        return db_manager
+
+    def test_load_order_puts_parents_first(self):
+        db_manager = self._manager()
+        tables = ["sales", "expense_allocations", "expenses", "customers", "units", "forecast", "expense_categories"]
+
+        order = load_order(tables, db_manager.get_table_schema)
+
+        assert sorted(order) == sorted(tables)
+        for child, parent in [("sales", "customers"), ("sales", "units"), ("sales", "forecast"),
+                              ("expenses", "expense_categories"), ("expense_allocations", "expenses")]:
+            assert order.index(parent) < order.index(child)
+        # Tables without dependencies between them keep their given order
+        assert order.index("customers") < order.index("units")
+
+    def test_parse_in_pool_matches_serial_parse(self):
+        db_manager = self._manager()
+        path = os.path.join(db_manager.data_dir, "machines.csv")
+        with open(path, "w") as f:
+            f.write("machine_id,machine_name,machine_rate\n")
+            for i in range(25):
+                f.write(f"M{i:04d}, Machine {i} ,{i}.5\n")
+        schema = db_manager.get_table_schema("machines")
+
+        serial = list(startup_csv_parser("machines", schema, chunk_size=4).chunks(path))
+        parser = startup_csv_parser("machines", schema, chunk_size=4)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            pooled = list(parse_in_pool(executor, parser, path, ahead=3))
+
+        assert len(pooled) == len(serial) == 7
+        pd.testing.assert_frame_equal(pd.concat([c for c, _ in pooled]), pd.concat([c for c, _ in serial]))
+        # The default capacity column is added by the startup transform
+        assert "available_minutes_per_month" in parser.columns
+        assert pooled[-1][0]["machine_name"].iloc[-1] == "Machine 24"
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+from app.db.write_queue import WriteQueue, requires_autocommit
+
+
+class TestWriteQueue:
+    """Test the single-writer queue and its group commit"""
+
+    @pytest.fixture
+    def write_queue(self):
+        temp_dir = tempfile.mkdtemp()
+        path = os.path.join(temp_dir, "queue.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+        conn.close()
+
+        write_queue = WriteQueue(lambda factory: sqlite3.connect(path, factory=factory, check_same_thread=False))
+        write_queue.path = path
+        yield write_queue
+        write_queue.close()
+
+    def _names(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            return sorted(row[0] for row in conn.execute("SELECT name FROM items"))
+        finally:
+            conn.close()
+
+    def test_group_commit_isolates_failed_jobs(self, write_queue):
+        release = threading.Event()
+        # Hold the writer so the following jobs queue up and form one group
+        blocker = write_queue.submit_exclusive(release.wait)
+
+        def insert(name):
+            return lambda conn: conn.execute("INSERT INTO items (name) VALUES (?)", (name,)).lastrowid
+
+        def insert_twice(conn):
+            conn.execute("INSERT INTO items (name) VALUES ('partial')")
+            conn.execute("INSERT INTO items (name) VALUES ('a')")
+
+        futures = [
+            write_queue.submit(insert("a")),
+            write_queue.submit(insert_twice),
+            write_queue.submit(insert("b")),
+            write_queue.submit(lambda conn: conn.commit()),
+        ]
+        release.set()
+        wait([blocker] + futures)
+
+        assert futures[0].result() and futures[2].result()
+        with pytest.raises(sqlite3.IntegrityError):
+            futures[1].result()
+        with pytest.raises(sqlite3.ProgrammingError):
+            futures[3].result()
+        # The failed job was rolled back alone; the rest of its group committed
+        assert self._names(write_queue.path) == ["a", "b"]
+
+        stats = write_queue.stats()
+        assert stats["groups"] == 1
+        assert stats["max_group_size"] == 4
+        assert stats["failed_jobs"] == 2
+
+    def test_reentrant_calls_from_writer_thread(self, write_queue):
+        def exclusive():
+            # A legacy job calling back into the queue must not deadlock
+            write_queue.execute(lambda conn: conn.execute("INSERT INTO items (name) VALUES ('inner')"))
+            return write_queue.on_writer_thread()
+
+        assert write_queue.execute_exclusive(exclusive) is True
+
+        def nested(conn):
+            conn.execute("INSERT INTO items (name) VALUES ('outer')")
+            with pytest.raises(sqlite3.IntegrityError):
+                write_queue.execute(lambda c: c.execute("INSERT INTO items (name) VALUES ('outer')"))
+            # The outer job still may not end the queue's transaction
+            with pytest.raises(sqlite3.ProgrammingError):
+                conn.commit()
+            return "ok"
+
+        assert write_queue.execute(nested) == "ok"
+        assert self._names(write_queue.path) == ["inner", "outer"]
+
+        # The queue restarts its writer after being closed
+        write_queue.close()
+        write_queue.execute(lambda conn: conn.execute("INSERT INTO items (name) VALUES ('after')"))
+        assert "after" in self._names(write_queue.path)
+
+    def test_requires_autocommit(self):
+        assert requires_autocommit("  vacuum")
+        assert requires_autocommit("PRAGMA foreign_keys=OFF")
+        assert not requires_autocommit("UPDATE items SET name = 'x'")
+        assert not requires_autocommit("CREATE TABLE t (id INTEGER)")